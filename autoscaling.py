@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Adaptive autoscaling of ComfyUI containers from queue depth, arrival rate and cold starts.
+
+A fixed scaledown_window and no warm containers either keeps GPUs idle
+between sparse requests or cold-starts every burst. AutoscalePolicy picks
+Modal's min_containers, buffer_containers and scaledown_window from what the
+containers report, within configured bounds:
+
+- min_containers covers the offered load (arrival rate x execution time,
+  the number of containers busy on average, rounded down) and the
+  containers filled by work already queued.
+- buffer_containers is the headroom of square-root staffing: the containers
+  needed for the load plus `headroom` standard deviations of it, beyond
+  those needed for the load itself, so a burst does not wait for a cold
+  start. Modal keeps them idle next to the busy ones while inputs run.
+- scaledown_window keeps an idle container long enough that the next
+  request finds it warm with probability `warm_probability`; when requests
+  are sparser than max_scaledown_window allows, a warm container is not worth
+  its idle time and the window drops to its minimum.
+
+Both are skipped when cold starts are shorter than cold_start_tolerance:
+starting a container is then cheaper than keeping one idle. A raised
+minimum is kept for `cooldown` seconds, so the pool does not shrink between
+two bursts. max_inputs cannot change once deployed; max_containers stays the
+upper bound.
+
+Containers publish their load through ScalingRegistry; a scheduled function
+in main.py applies the decisions with update_autoscaler. The module doubles
+as a trace-driven simulator comparing cost and latency of static settings
+and the policy:
+
+    python autoscaling.py simulate workload.jsonl --max-containers 4 --cold-start 45
+    python autoscaling.py simulate --synthetic 6 --json autoscaling_results.json
+
+Workload lines are JSON objects with "arrival" (or "at") and "duration" in
+seconds; the workflow itself is not needed.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+# GPU price per hour used by the simulator when none is given
+DEFAULT_PRICE_PER_HOUR = 1.10
+
+# Cold starts of stopped containers kept per shard
+COLD_START_SAMPLES = 20
+
+
+class AutoscalePolicy:
+    """Chooses warm containers and the scaledown window from load signals."""
+
+    def __init__(self, max_containers: int, max_inputs: int, max_min_containers: int = 2,
+                 max_buffer_containers: int = 2, min_scaledown_window: float = 30.0,
+                 max_scaledown_window: float = 900.0, warm_probability: float = 0.8, headroom: float = 1.0,
+                 cold_start_tolerance: float = 15.0, cooldown: float = 300.0):
+        """
+        Initialize the policy.
+
+        Args:
+            max_containers: Upper bound of the pool
+            max_inputs: Inputs one container accepts at once
+            max_min_containers: Upper bound of min_containers
+            max_buffer_containers: Upper bound of buffer_containers
+            min_scaledown_window: Lower bound of scaledown_window in seconds
+            max_scaledown_window: Upper bound of scaledown_window in seconds
+            warm_probability: Chance the next request after an idle period should find a warm container
+            headroom: Buffer containers in standard deviations of the load
+            cold_start_tolerance: Cold starts shorter than this are not avoided
+            cooldown: Seconds a raised minimum is kept before it can be lowered
+        """
+        self.max_containers = max_containers
+        self.max_inputs = max_inputs
+        self.max_min_containers = min(max_min_containers, max_containers)
+        self.max_buffer_containers = max_buffer_containers
+        self.min_scaledown_window = min_scaledown_window
+        self.max_scaledown_window = max_scaledown_window
+        self.warm_probability = warm_probability
+        self.headroom = headroom
+        self.cold_start_tolerance = cold_start_tolerance
+        self.cooldown = cooldown
+
+    def decide(self, signals: Dict[str, float], previous: Optional[Dict[str, Any]] = None,
+               now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Choose the autoscaler settings.
+
+        Args:
+            signals: "rate" (arrivals per second), "service_time" (mean execution
+                seconds), "in_flight" (workflows queued or running) and
+                "cold_start" (seconds), as returned by ScalingRegistry.signals
+            previous: Last decision, for the cooldown
+            now: Current time (time.time() when None)
+
+        Returns:
+            min_containers, buffer_containers and scaledown_window, with the
+            offered load they were derived from and the decision time
+        """
+        now = time.time() if now is None else now
+        rate, service_time = signals["rate"], signals["service_time"]
+        load = rate * service_time
+        # Containers whose every input slot is taken by work already submitted
+        backlog = signals["in_flight"] // self.max_inputs
+        warm_pays = signals["cold_start"] > self.cold_start_tolerance
+
+        min_containers = max(math.floor(load) if warm_pays else 0, backlog)
+        min_containers = min(min_containers, self.max_min_containers)
+        surplus = math.ceil(load + self.headroom * math.sqrt(load)) - math.ceil(load) if warm_pays else 0
+        buffer = max(0, min(surplus, self.max_buffer_containers, self.max_containers - min_containers))
+
+        window = self.min_scaledown_window
+        if warm_pays and rate > 0:
+            # Idle time within which the next Poisson arrival comes with warm_probability
+            needed = -math.log(1 - self.warm_probability) / rate
+            if needed <= self.max_scaledown_window:
+                window = max(self.min_scaledown_window, needed)
+
+        raised_at = now
+        if previous is not None:
+            if min_containers < previous["min_containers"] and now - previous["raised_at"] < self.cooldown:
+                min_containers = previous["min_containers"]
+                buffer = min(max(buffer, previous["buffer_containers"]), self.max_containers - min_containers)
+            if min_containers <= previous["min_containers"]:
+                raised_at = previous["raised_at"]
+        return {"min_containers": min_containers, "buffer_containers": buffer, "scaledown_window": int(window),
+                "load": load, "raised_at": raised_at, "decided": now}
+
+
+class LoadTracker:
+    """Arrivals and execution times of one container over a sliding window."""
+
+    def __init__(self, window: float = 300.0):
+        """
+        Initialize the tracker.
+
+        Args:
+            window: Seconds the arrival rate and execution time are measured over
+        """
+        self.window = window
+        self.arrivals: deque = deque()
+        self.executions: deque = deque()
+        self.cold_start: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        while self.arrivals and now - self.arrivals[0] > self.window:
+            self.arrivals.popleft()
+        while self.executions and now - self.executions[0][0] > self.window:
+            self.executions.popleft()
+
+    def arrival(self):
+        """Count a submission."""
+        with self._lock:
+            self.arrivals.append(time.time())
+
+    def completed(self, seconds: float):
+        """Add the execution time of a finished workflow."""
+        with self._lock:
+            self.executions.append((time.time(), seconds))
+
+    def observe(self, events: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass a streamed submission through, recording its execution time."""
+        for event in events:
+            if event["type"] == "result" and "execution" in event.get("timings", {}):
+                self.completed(event["timings"]["execution"])
+            yield event
+
+    def snapshot(self, in_flight: int) -> Dict[str, Any]:
+        """
+        Report of this container for ScalingRegistry.publish.
+
+        Args:
+            in_flight: Workflows queued or running in the container
+
+        Returns:
+            Arrivals and executions in the window, in-flight count and cold start
+        """
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            return {"arrivals": len(self.arrivals), "window": self.window,
+                    "execution_seconds": sum(seconds for _, seconds in self.executions),
+                    "executions": len(self.executions), "in_flight": in_flight,
+                    "cold_start": self.cold_start, "updated": now}
+
+
+class ScalingRegistry:
+    """
+    Container load reports and autoscaler decisions shared through a dict-like store.
+
+    Each pool of containers is scaled on its own and keyed by its shard: the
+    routing shard number of ComfyUIContainer, or "gpu:<name>" for the pool of
+    a GPU profile.
+    """
+
+    def __init__(self, store, ttl: float = 180.0, default_cold_start: float = 60.0, default_service_time: float = 10.0,
+                 cold_start_samples: int = COLD_START_SAMPLES):
+        """
+        Initialize the registry.
+
+        Args:
+            store: Mapping shared between processes (a modal.Dict in the app)
+            ttl: Seconds after which a container's report is ignored
+            default_cold_start: Cold start assumed until containers report one
+            default_service_time: Execution seconds assumed until containers report some
+            cold_start_samples: Cold starts of stopped containers kept per shard
+        """
+        self.store = store
+        self.ttl = ttl
+        self.cold_start_samples = cold_start_samples
+        self.default_cold_start = default_cold_start
+        self.default_service_time = default_service_time
+
+    def publish(self, shard: Union[int, str], container: str, report: Dict[str, Any]):
+        """Publish a container's LoadTracker.snapshot."""
+        self.store[f"load:{shard}:{container}"] = report
+
+    def signals(self, shard: Union[int, str]) -> Dict[str, float]:
+        """
+        Aggregate the recent reports of a shard's containers, dropping stale ones.
+
+        The cold starts of dropped reports are kept, the last
+        cold_start_samples of them, under one key per shard.
+
+        Returns:
+            Live containers, arrival rate, mean execution time, in-flight
+            workflows and the median reported cold start
+        """
+        now = time.time()
+        reports, stale = [], []
+        for key, report in list(self.store.items()):
+            if not str(key).startswith(f"load:{shard}:"):
+                continue
+            (reports if now - report["updated"] <= self.ttl else stale).append((key, report))
+        # Reports of stopped containers still tell how long a cold start takes
+        samples = list(self.store.get(f"cold_starts:{shard}", []))
+        stale_samples = [r["cold_start"] for _, r in stale if r.get("cold_start") is not None]
+        if stale_samples:
+            samples = (samples + stale_samples)[-self.cold_start_samples:]
+            self.store[f"cold_starts:{shard}"] = samples
+        for key, _ in stale:
+            self.store.pop(key, None)
+        cold_starts = samples + [r["cold_start"] for _, r in reports if r.get("cold_start") is not None]
+        live = [report for _, report in reports]
+        executions = sum(r["executions"] for r in live)
+        return {
+            "containers": len(live),
+            "rate": sum(r["arrivals"] / r["window"] for r in live),
+            "service_time": (sum(r["execution_seconds"] for r in live) / executions if executions
+                             else self.default_service_time),
+            "in_flight": sum(r["in_flight"] for r in live),
+            "cold_start": statistics.median(cold_starts) if cold_starts else self.default_cold_start,
+        }
+
+    def decision(self, shard: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """Last decision applied to a shard."""
+        return self.store.get(f"decision:{shard}")
+
+    def save_decision(self, shard: Union[int, str], decision: Dict[str, Any]):
+        """Record the decision applied to a shard."""
+        self.store[f"decision:{shard}"] = decision
+
+
+# ===========================
+# Trace-driven simulation
+# ===========================
+
+def load_trace(path: str) -> List[Dict[str, float]]:
+    """
+    Read a JSONL workload with arrival times and durations.
+
+    Args:
+        path: Workload file
+
+    Returns:
+        Requests sorted by arrival, with "arrival" and "duration" (None when not recorded)
+    """
+    requests = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            arrival = record.get("arrival", record.get("at"))
+            if arrival is None:
+                raise ValueError(f"{path}:{number}: 'arrival' (or 'at') is required to simulate autoscaling")
+            duration = record.get("duration")
+            requests.append({"arrival": float(arrival), "duration": None if duration is None else float(duration)})
+    return sorted(requests, key=lambda request: request["arrival"])
+
+
+def synthetic_trace(hours: float, seed: int = 0) -> List[Dict[str, float]]:
+    """
+    A day-like trace: quiet stretches, busy hours and short bursts.
+
+    Args:
+        hours: Length of the trace
+        seed: Random seed
+
+    Returns:
+        Requests with arrival and duration (mostly ~8 s generations, some 45 s upscales)
+    """
+    rng = random.Random(seed)
+    requests, now, end = [], 0.0, hours * 3600
+    while now < end:
+        # Each 20-minute period is quiet, busy or a burst
+        kind = rng.choices(("quiet", "busy", "burst"), (0.5, 0.4, 0.1))[0]
+        rate = {"quiet": 1 / 600, "busy": 1 / 30, "burst": 1 / 4}[kind]
+        period_end = min(end, now + (300 if kind == "burst" else 1200))
+        while True:
+            now += rng.expovariate(rate)
+            if now >= period_end:
+                break
+            upscale = rng.random() < 0.1
+            requests.append({"arrival": now, "duration": rng.lognormvariate(math.log(45 if upscale else 8), 0.3)})
+        now = period_end
+    return requests
+
+
+def simulate(requests: List[Dict[str, float]], name: str, settings: Dict[str, Any], max_inputs: int,
+             cold_start: float, policy: Optional[AutoscalePolicy] = None, interval: float = 60.0,
+             signal_window: float = 300.0, price_per_hour: float = DEFAULT_PRICE_PER_HOUR,
+             default_duration: float = 10.0) -> Dict[str, Any]:
+    """
+    Replay a trace against simulated containers under an autoscaling setting.
+
+    Containers run one workflow at a time and accept max_inputs at once. A
+    request goes to the container where it can start first; when every
+    container is full a new one starts, taking `cold_start` seconds. Idle
+    containers stop after scaledown_window unless min_containers (or the
+    buffer while work is in flight) keeps them. With a policy, the settings
+    are re-decided every `interval` seconds from the trace's own signals.
+
+    Args:
+        requests: Trace from load_trace or synthetic_trace
+        name: Label of the run
+        settings: Initial max_containers, min_containers, buffer_containers and scaledown_window
+        max_inputs: Inputs one container accepts at once
+        cold_start: Seconds until a new container can execute
+        policy: Adaptive policy (None keeps the settings fixed)
+        interval: Seconds between policy decisions
+        signal_window: Seconds the policy's arrival rate and execution time are measured over
+        price_per_hour: GPU price of one container
+        default_duration: Execution seconds of requests without a recorded duration
+
+    Returns:
+        Cost, container hours, cold starts hit by requests and latency percentiles
+    """
+    settings = dict(settings)
+    containers: List[Dict[str, Any]] = []
+    jobs: List[Dict[str, float]] = []
+    latencies, cold_hits = [], 0
+    decision = None
+    next_tick = 0.0 if policy else math.inf
+
+    def live(now: float) -> List[Dict[str, Any]]:
+        return [c for c in containers if c["stopped"] is None or c["stopped"] > now]
+
+    def in_flight(container: Dict[str, Any], now: float) -> int:
+        return sum(1 for end in container["ends"] if end > now)
+
+    def spawn(now: float) -> Dict[str, Any]:
+        container = {"started": now, "ready": now + cold_start, "free": now + cold_start, "ends": [], "stopped": None}
+        containers.append(container)
+        return container
+
+    def scale(now: float):
+        # Stop idle containers past their window, keeping the minimum and the buffer
+        pool = live(now)
+        busy = sum(1 for c in pool if in_flight(c, now))
+        floor = max(settings["min_containers"], busy + settings["buffer_containers"] if busy else 0)
+        idle = sorted((c for c in pool if c["free"] <= now), key=lambda c: c["free"])
+        for container in idle:
+            if len(pool) <= floor:
+                break
+            stop = container["free"] + settings["scaledown_window"]
+            if stop <= now:
+                container["stopped"] = stop
+                pool.remove(container)
+        while len(pool) < min(floor, settings["max_containers"]):
+            pool.append(spawn(now))
+
+    for request in requests:
+        now = request["arrival"]
+        while next_tick <= now:
+            recent = [j for j in jobs if next_tick - j["arrival"] <= signal_window and j["arrival"] <= next_tick]
+            done = [j for j in recent if j["end"] <= next_tick]
+            signals = {
+                "rate": len(recent) / signal_window,
+                "service_time": (sum(j["duration"] for j in done) / len(done)) if done else default_duration,
+                "in_flight": sum(1 for j in jobs if j["end"] > next_tick),
+                "cold_start": cold_start,
+            }
+            decision = policy.decide(signals, decision, next_tick)
+            settings.update({key: decision[key] for key in ("min_containers", "buffer_containers", "scaledown_window")})
+            scale(next_tick)
+            next_tick += interval
+        scale(now)
+
+        duration = request["duration"] if request["duration"] is not None else default_duration
+        pool = [c for c in live(now) if in_flight(c, now) < max_inputs]
+        if pool:
+            container = min(pool, key=lambda c: max(now, c["free"]))
+        elif len(live(now)) < settings["max_containers"]:
+            container = spawn(now)
+        else:
+            container = min(live(now), key=lambda c: c["free"])
+        start = max(now, container["free"])
+        cold_hits += container["ready"] > now
+        container["free"] = start + duration
+        container["ends"].append(start + duration)
+        jobs.append({"arrival": now, "duration": duration, "end": start + duration})
+        latencies.append(start + duration - now)
+
+    horizon = max((j["end"] for j in jobs), default=0.0)
+    for container in containers:
+        if container["stopped"] is None:
+            # Containers above the minimum stop after their window; the minimum is billed until the end
+            container["stopped"] = container["free"] + settings["scaledown_window"]
+    kept = sorted(containers, key=lambda c: c["stopped"], reverse=True)[:settings["min_containers"]]
+    for container in kept:
+        container["stopped"] = max(container["stopped"], horizon)
+    seconds = sum(c["stopped"] - c["started"] for c in containers)
+
+    latencies.sort()
+    count = len(latencies)
+
+    def rank(q: float) -> float:
+        return latencies[max(0, math.ceil(q * count) - 1)] if count else 0.0
+
+    return {
+        "name": name,
+        "requests": count,
+        "containers_started": len(containers),
+        "cold_start_hits": cold_hits,
+        "container_hours": seconds / 3600,
+        "cost": seconds / 3600 * price_per_hour,
+        "mean_latency": sum(latencies) / count if count else 0.0,
+        "p50_latency": rank(0.50),
+        "p95_latency": rank(0.95),
+        "p99_latency": rank(0.99),
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Compare static and adaptive autoscaling on a workload trace.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sim = commands.add_parser("simulate", help="Cost versus latency of autoscaling settings")
+    sim.add_argument("workload", nargs="?", help="JSONL workload with 'arrival' and 'duration' per request")
+    sim.add_argument("--synthetic", type=float, help="Generate a synthetic trace of this many hours instead")
+    sim.add_argument("--config", default="config.ini", help="Config file with [RESOURCES] and [AUTOSCALING]")
+    sim.add_argument("--max-containers", type=int, help="Defaults to [RESOURCES] max_containers")
+    sim.add_argument("--max-inputs", type=int, help="Defaults to [RESOURCES] max_inputs")
+    sim.add_argument("--scaledown-window", type=float, help="Static window; defaults to [RESOURCES] scaledown_window")
+    sim.add_argument("--cold-start", type=float, default=60.0, help="Seconds until a new container executes")
+    sim.add_argument("--duration", type=float, default=10.0, help="Execution seconds of requests without one")
+    sim.add_argument("--price", type=float, default=DEFAULT_PRICE_PER_HOUR, help="GPU price per container hour")
+    sim.add_argument("--seed", type=int, default=0)
+    sim.add_argument("--json", help="Append the results to this JSON file")
+    args = parser.parse_args()
+
+    from loaders import ConfigLoader
+
+    cfg = ConfigLoader(args.config).load_configs()
+    resources, scaling = cfg["resources"], cfg["autoscaling"]
+    max_containers = args.max_containers or resources["max_containers"]
+    max_inputs = args.max_inputs or resources["max_inputs"]
+    window = args.scaledown_window if args.scaledown_window is not None else resources["scaledown_window"]
+
+    if args.synthetic:
+        requests = synthetic_trace(args.synthetic, args.seed)
+        source = f"synthetic {args.synthetic:g} h trace"
+    elif args.workload:
+        requests = load_trace(args.workload)
+        source = args.workload
+    else:
+        parser.error("give a workload file or --synthetic HOURS")
+    if not requests:
+        print("⚠ The workload has no requests")
+        return
+    print(f"⏱  Simulating {len(requests)} request(s) from {source}: up to {max_containers} container(s), "
+          f"{max_inputs} input(s) each, {args.cold_start:g}s cold start")
+
+    policy = AutoscalePolicy(
+        max_containers, max_inputs, scaling["max_min_containers"], scaling["max_buffer_containers"],
+        scaling["min_scaledown_window"], scaling["max_scaledown_window"], scaling["warm_probability"],
+        scaling["headroom"], scaling["cold_start_tolerance"], scaling["cooldown"])
+    static = {"max_containers": max_containers, "min_containers": 0, "buffer_containers": 0, "scaledown_window": window}
+    warm = {**static, "min_containers": policy.max_min_containers, "scaledown_window": policy.max_scaledown_window}
+    common = {"max_inputs": max_inputs, "cold_start": args.cold_start, "price_per_hour": args.price,
+              "default_duration": args.duration}
+    results = [
+        simulate(requests, f"static ({window:g}s)", static, **common),
+        simulate(requests, f"always warm ({warm['min_containers']})", warm, **common),
+        simulate(requests, "adaptive", static, policy=policy, interval=scaling["interval"],
+                 signal_window=scaling["signal_window"], **common),
+    ]
+
+    print(f"\n{'setting':<20}{'cost ($)':>10}{'GPU h':>8}{'started':>9}{'cold hits':>11}"
+          f"{'p50 (s)':>9}{'p95 (s)':>9}{'p99 (s)':>9}")
+    for r in results:
+        print(f"{r['name']:<20}{r['cost']:>10.2f}{r['container_hours']:>8.2f}{r['containers_started']:>9}"
+              f"{r['cold_start_hits']:>11}{r['p50_latency']:>9.1f}{r['p95_latency']:>9.1f}{r['p99_latency']:>9.1f}")
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"timestamp": time.time(), "source": source, "args": vars(args), "results": results})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""
+Micro-batching of compatible workflows for the headless API.
+
+Workflows that share the same graph structure and models, and differ only in
+seeds or prompt text, are grouped for up to max_wait_ms and merged into a
+single ComfyUI prompt. Nodes that are identical across the group (model
+loaders, LoRAs, empty latents, encoders of a shared prompt, ...) appear once in
+the merged graph, so ComfyUI executes them once for the whole group; the
+per-request branches are kept side by side. The outputs of the merged prompt
+are split back to the original callers by node id. When ComfyUI blames a
+node of one request's branch for an error, only that request fails; the
+others are run again on their own. The scheduler charges a merged prompt to
+the tenants of its workflows in proportion.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Collection, Dict, List, Optional, Set, Tuple
+
+from comfy_client import ComfyUIError
+from headless_api import HeadlessAPI
+
+# Inputs that may differ between workflows of the same batch
+VARYING_INPUTS = {"seed", "noise_seed", "text", "text_g", "text_l"}
+
+# Separator between the request index and the original node id in merged graphs
+ID_SEPARATOR = ":"
+
+# A queued workflow: (enqueue time, workflow, include_images, priority, tenant, future)
+Pending = Tuple[float, Dict[str, Any], bool, Optional[str], Optional[str], Future]
+
+
+def _is_link(value: Any) -> bool:
+    """Links are [node_id, output_index] pairs in ComfyUI's API format."""
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+def node_hashes(workflow: Dict[str, Any], ignore: frozenset = frozenset()) -> Dict[str, str]:
+    """
+    Hash every node together with everything upstream of it.
+
+    Two nodes have the same hash exactly when they compute the same value, so
+    identical nodes of different workflows can be shared.
+
+    Args:
+        workflow: Workflow graph in API format
+        ignore: Input names left out of the hash
+
+    Returns:
+        Mapping of node id to hex digest
+    """
+    hashes: Dict[str, str] = {}
+
+    def visit(node_id: str, path: Tuple[str, ...]) -> str:
+        if node_id in hashes:
+            return hashes[node_id]
+        if node_id in path:
+            raise ValueError(f"Workflow contains a cycle through node {node_id}")
+        node = workflow[node_id]
+        inputs = {}
+        for name, value in sorted(node.get("inputs", {}).items()):
+            if name in ignore:
+                continue
+            inputs[name] = ["link", visit(value[0], path + (node_id,)), value[1]] if _is_link(value) else value
+        digest = hashlib.sha256(json.dumps([node["class_type"], inputs], sort_keys=True).encode()).hexdigest()
+        hashes[node_id] = digest
+        return digest
+
+    for node_id in workflow:
+        visit(node_id, ())
+    return hashes
+
+
+def batch_signature(workflow: Dict[str, Any]) -> str:
+    """
+    Signature shared by workflows that may be batched together.
+
+    Workflows with the same signature have the same graph structure and the
+    same models and settings, and differ at most in VARYING_INPUTS.
+
+    Args:
+        workflow: Workflow graph in API format
+
+    Returns:
+        Hex digest
+    """
+    hashes = node_hashes(workflow, ignore=frozenset(VARYING_INPUTS))
+    return hashlib.sha256(json.dumps(sorted(hashes.values())).encode()).hexdigest()
+
+
+def is_output_node(node: Dict[str, Any], output_types: Optional[Collection[str]] = None) -> bool:
+    """
+    Output nodes are never shared, every caller gets its own.
+
+    Args:
+        node: Node in API format
+        output_types: Node types flagged output_node in ComfyUI's /object_info;
+            without them, Save* and Preview* node types are assumed to be outputs
+
+    Returns:
+        True for output nodes
+    """
+    class_type = node.get("class_type", "")
+    if output_types is not None:
+        return class_type in output_types
+    return class_type.startswith("Save") or class_type.startswith("Preview")
+
+
+def merge_workflows(workflows: List[Dict[str, Any]],
+                    output_types: Optional[Collection[str]] = None) -> Dict[str, Any]:
+    """
+    Merge workflows into one graph, sharing nodes that compute the same value.
+
+    Node ids of the merged graph are "<request index>:<original id>", using the
+    index of the first workflow that contributed the node.
+
+    Args:
+        workflows: Workflow graphs in API format
+        output_types: Output node types (see is_output_node)
+
+    Returns:
+        Merged workflow graph
+    """
+    return merge_with_owners(workflows, output_types)[0]
+
+
+def merge_with_owners(workflows: List[Dict[str, Any]], output_types: Optional[Collection[str]] = None
+                      ) -> Tuple[Dict[str, Any], Dict[str, Set[int]]]:
+    """
+    Merge workflows like merge_workflows, also telling which requests use each node.
+
+    Args:
+        workflows: Workflow graphs in API format
+        output_types: Output node types (see is_output_node)
+
+    Returns:
+        Tuple of (merged workflow graph, merged node id to the indexes of the
+        requests whose workflows contain the node)
+    """
+    merged: Dict[str, Any] = {}
+    owners: Dict[str, Set[int]] = {}
+    shared: Dict[str, str] = {}
+    for index, workflow in enumerate(workflows):
+        hashes = node_hashes(workflow)
+        mapping: Dict[str, str] = {}
+        for node_id, node in workflow.items():
+            digest = hashes[node_id]
+            output = is_output_node(node, output_types)
+            if not output and digest in shared:
+                mapping[node_id] = shared[digest]
+                continue
+            mapping[node_id] = f"{index}{ID_SEPARATOR}{node_id}"
+            if not output:
+                shared[digest] = mapping[node_id]
+
+        for node_id, node in workflow.items():
+            new_id = mapping[node_id]
+            owners.setdefault(new_id, set()).add(index)
+            if new_id in merged:
+                continue
+            inputs = {
+                name: [mapping[value[0]], value[1]] if _is_link(value) else value
+                for name, value in node.get("inputs", {}).items()
+            }
+            merged[new_id] = {**node, "inputs": inputs}
+    return merged, owners
+
+
+def split_outputs(outputs: List[Dict[str, Any]], count: int) -> List[List[Dict[str, Any]]]:
+    """
+    Split the outputs of a merged prompt back to the original requests.
+
+    Args:
+        outputs: Output files from the merged result (HeadlessAPI format)
+        count: Number of merged workflows
+
+    Returns:
+        One list of outputs per request, with the original node ids restored
+    """
+    per_request: List[List[Dict[str, Any]]] = [[] for _ in range(count)]
+    for output in outputs:
+        index, _, node_id = output["node_id"].partition(ID_SEPARATOR)
+        per_request[int(index)].append({**output, "node_id": node_id})
+    return per_request
+
+
+class MicroBatcher:
+    """Group compatible workflows and run each group as one ComfyUI prompt."""
+
+    def __init__(self, api: HeadlessAPI, max_batch: int = 4, max_wait_ms: float = 50.0,
+                 timeout: Optional[float] = None):
+        """
+        Initialize the batcher.
+
+        Args:
+            api: Headless API used to run merged prompts
+            max_batch: Maximum number of workflows merged into one prompt
+            max_wait_ms: Longest time a workflow waits for batch partners
+            timeout: Seconds to wait for each progress event of a merged prompt
+        """
+        self.api = api
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.groups: Dict[str, List[Pending]] = {}
+        # Output node types of the ComfyUI server, read from /object_info on first use
+        self.output_types: Optional[Collection[str]] = None
+        self.batches_run = 0
+        self.workflows_run = 0
+        # Workflows run again on their own after another workflow of their batch failed
+        self.retries = 0
+        self._cond = threading.Condition()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, workflow: Dict[str, Any], include_images: bool = False, priority: Optional[str] = None,
+               tenant: Optional[str] = None) -> Future:
+        """
+        Queue a workflow for batching.
+
+        Each queued workflow holds one of the API's submission slots until its
+        batch finishes, so a full API rejects it here with QueueFullError
+        instead of letting the groups grow. A merged prompt is scheduled with
+        the highest priority of its workflows, on behalf of the tenant of the
+        first one.
+
+        Args:
+            workflow: Workflow graph in API format
+            include_images: Embed output files as base64 in the result
+            priority: Priority class, when the API has a scheduler
+            tenant: Submitting client, for the scheduler's fair share
+
+        Returns:
+            Future resolving to a result in HeadlessAPI.result format
+        """
+        if self.api.scheduler is not None:
+            self.api.scheduler.rank(priority)
+        self.api.reserve()
+        future: Future = Future()
+        signature = batch_signature(workflow)
+        with self._cond:
+            self.groups.setdefault(signature, []).append(
+                (time.monotonic(), workflow, include_images, priority, tenant, future))
+            self._cond.notify()
+        return future
+
+    def _next_ready_group(self) -> Optional[List[Pending]]:
+        """Pop a group that is full or whose oldest workflow waited long enough."""
+        now = time.monotonic()
+        for signature, group in self.groups.items():
+            if len(group) >= self.max_batch or now - group[0][0] >= self.max_wait:
+                batch, rest = group[:self.max_batch], group[self.max_batch:]
+                if rest:
+                    self.groups[signature] = rest
+                else:
+                    del self.groups[signature]
+                return batch
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                batch = self._next_ready_group()
+                while batch is None:
+                    oldest = min((group[0][0] for group in self.groups.values()), default=None)
+                    wait = None if oldest is None else max(0.0, oldest + self.max_wait - time.monotonic())
+                    self._cond.wait(wait)
+                    batch = self._next_ready_group()
+            threading.Thread(target=self._run, args=(batch,), daemon=True).start()
+
+    def _run(self, batch: List[Pending]):
+        dispatched = time.monotonic()
+        workflows = [workflow for _, workflow, _, _, _, _ in batch]
+        include_images = any(include for _, _, include, _, _, _ in batch)
+        priority = None
+        if self.api.scheduler is not None:
+            priority = min((p for _, _, _, p, _, _ in batch), key=self.api.scheduler.rank)
+        if self.output_types is None:
+            try:
+                self.output_types = self.api.client.output_node_types()
+            except (ComfyUIError, OSError) as e:
+                print(f"⚠ Could not read output node types, assuming Save*/Preview*: {e}")
+        merged, owners = merge_with_owners(workflows, self.output_types)
+        tenants = [tenant for _, _, _, _, tenant, _ in batch]
+        shares = {tenant: tenants.count(tenant) / len(batch) for tenant in tenants}
+        # The batch holds one slot per workflow; the merged submission and retries each take over one
+        held = len(batch)
+        try:
+            submission = self.api.submit(
+                merged, include_images=include_images, timeout=self.timeout, priority=priority,
+                tenant=batch[0][4], reserved=True, shares=shares)
+            held -= 1
+            result = HeadlessAPI.result(submission)
+        except Exception as e:
+            failed = self._blamed(e, owners, len(batch))
+            for index, item in enumerate(batch):
+                if index in failed:
+                    item[5].set_exception(e)
+                else:
+                    # Failed because of another request's branch; run it on its own
+                    held -= 1
+                    threading.Thread(target=self._run_alone, args=(item, dispatched), daemon=True).start()
+            return
+        finally:
+            for _ in range(held):
+                self.api.release()
+
+        with self._cond:
+            self.batches_run += 1
+            self.workflows_run += len(batch)
+        for (enqueued, _, include, _, _, future), outputs in zip(batch, split_outputs(result["outputs"], len(batch))):
+            if not include:
+                outputs = [{k: v for k, v in output.items() if k != "data"} for output in outputs]
+            timings = {**result.get("timings", {}), "batch_wait": dispatched - enqueued}
+            future.set_result({"type": "result", "prompt_id": result["prompt_id"],
+                               "batch_size": len(batch), "outputs": outputs, "timings": timings})
+
+    @staticmethod
+    def _blamed(error: Exception, owners: Dict[str, Set[int]], count: int) -> Set[int]:
+        """Requests whose branch contains a node ComfyUI blamed; all of them when it blamed none."""
+        failed: Set[int] = set()
+        for node_id in getattr(error, "node_ids", ()):
+            failed |= owners.get(node_id, set())
+        return failed or set(range(count))
+
+    def _run_alone(self, item: Pending, dispatched: float):
+        """Run a workflow of a failed batch on its own, taking over one of the batch's slots."""
+        enqueued, workflow, include_images, priority, tenant, future = item
+        submission = None
+        try:
+            submission = self.api.submit(workflow, include_images=include_images, timeout=self.timeout,
+                                         priority=priority, tenant=tenant, reserved=True)
+            result = HeadlessAPI.result(submission)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        finally:
+            if submission is None:
+                self.api.release()
+
+        with self._cond:
+            self.workflows_run += 1
+            self.retries += 1
+        timings = {**result.get("timings", {}), "batch_wait": dispatched - enqueued}
+        future.set_result({**result, "batch_size": 1, "timings": timings})
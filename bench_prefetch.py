@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Benchmark predictive model prefetch with a mock executor.
+
+Synthetic model files are written to a directory, and a mock executor runs a
+queue of jobs: each job loads its checkpoint and LoRA (reads the files in
+full), then "computes" for a fixed time. After a job its models are dropped
+from the page cache, as happens when consecutive prompts use different
+models. The gap between jobs is the time spent loading models; mean and p95
+are taken over every job but the first, whose models cannot be prefetched.
+
+The same queue is run without and with QueuePrefetcher, which reads the next
+jobs' models while the current one computes:
+
+    python bench_prefetch.py --jobs 12 --models 4 --size-mb 512 --compute 1.0
+
+Use --dir to put the model files on the filesystem you want to measure (for
+example the volume mount inside `modal shell`), and --json to append the
+results to a file.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from prefetch import ModelPathsResolver, QueuePrefetcher, warm_file
+
+READ_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def make_models(directory: str, count: int, size_mb: int) -> ModelPathsResolver:
+    """Write `count` checkpoints and LoRAs of random data (reused if present)."""
+    for folder, size in (("checkpoints", size_mb), ("loras", max(1, size_mb // 8))):
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+        for index in range(count):
+            path = os.path.join(directory, folder, f"model_{index}.safetensors")
+            if os.path.exists(path) and os.path.getsize(path) == size * 1024 * 1024:
+                continue
+            with open(path, "wb") as f:
+                for _ in range(size):
+                    f.write(os.urandom(1024 * 1024))
+                f.flush()
+                os.fsync(f.fileno())
+    return ModelPathsResolver({folder: [os.path.join(directory, folder)] for folder in ("checkpoints", "loras")})
+
+
+def make_workflow(index: int) -> Dict[str, Any]:
+    """A workflow loading checkpoint and LoRA number `index`."""
+    return {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": f"model_{index}.safetensors"}},
+        "2": {"class_type": "LoraLoader", "inputs": {"lora_name": f"model_{index}.safetensors",
+                                                    "model": ["1", 0], "clip": ["1", 1]}},
+    }
+
+
+def drop_from_page_cache(path: str):
+    """Evict a file's pages (works for clean pages without privileges)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def load(path: str):
+    """Read a model file in full, like a loader does."""
+    buffer = bytearray(READ_CHUNK_SIZE)
+    with open(path, "rb", buffering=0) as f:
+        while f.readinto(buffer):
+            pass
+
+
+def run_queue(workflows: List[Dict[str, Any]], resolver: ModelPathsResolver, compute: float,
+              prefetcher: Optional[QueuePrefetcher]) -> Dict[str, Any]:
+    """
+    Execute the queue with the mock executor.
+
+    Returns:
+        Per-job model load times (the gaps between jobs) and the total time
+    """
+    paths = {p for folder, dirs in resolver.folders.items() for d in dirs for p in
+             (os.path.join(d, name) for name in os.listdir(d))}
+    for path in paths:
+        drop_from_page_cache(path)
+
+    gaps = []
+    start = time.monotonic()
+    for index, workflow in enumerate(workflows):
+        if prefetcher:
+            prefetcher.update(workflows[index + 1:])
+        models = [resolver.resolve(folder, name) for folder, name in
+                  (("checkpoints", workflow["1"]["inputs"]["ckpt_name"]), ("loras", workflow["2"]["inputs"]["lora_name"]))]
+        load_start = time.monotonic()
+        for path in models:
+            load(path)
+        gaps.append(time.monotonic() - load_start)
+        time.sleep(compute)
+        for path in models:
+            drop_from_page_cache(path)
+        if prefetcher:
+            prefetcher.forget(models)
+    return {"gaps": gaps, "total": time.monotonic() - start}
+
+
+def summarize(label: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Gap statistics; the first job is left out, as nothing can be prefetched for it."""
+    gaps = sorted(result["gaps"][1:] or result["gaps"])
+    return {
+        "label": label,
+        "jobs": len(result["gaps"]),
+        "first_gap": result["gaps"][0],
+        "mean_gap": statistics.mean(gaps),
+        "p95_gap": gaps[min(len(gaps) - 1, int(len(gaps) * 0.95))],
+        "total": result["total"],
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark queue-driven model prefetch with a mock executor.")
+    parser.add_argument("--dir", help="Directory for the synthetic models (default: a temporary directory)")
+    parser.add_argument("--jobs", type=int, default=12)
+    parser.add_argument("--models", type=int, default=4, help="Distinct checkpoints, used round robin")
+    parser.add_argument("--size-mb", type=int, default=512, help="Checkpoint size; LoRAs are 1/8 of it")
+    parser.add_argument("--compute", type=float, default=1.0, help="Seconds each job computes")
+    parser.add_argument("--lookahead", type=int, default=2)
+    parser.add_argument("--json", help="Append the results to this JSON file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.dir or tmp
+        print(f"📦 Writing {args.models} synthetic model(s) of {args.size_mb} MB to {directory}")
+        resolver = make_models(directory, args.models, args.size_mb)
+        workflows = [make_workflow(index % args.models) for index in range(args.jobs)]
+
+        results = [summarize("no prefetch", run_queue(workflows, resolver, args.compute, None))]
+        prefetcher = QueuePrefetcher(resolver.resolve, lookahead=args.lookahead, warm=warm_file)
+        results.append(summarize(f"prefetch (lookahead {args.lookahead})",
+                                 run_queue(workflows, resolver, args.compute, prefetcher)))
+        prefetcher.close()
+
+    print(f"\n{'run':<26}{'first gap (s)':>15}{'mean gap (s)':>14}{'p95 gap (s)':>13}{'total (s)':>11}")
+    for r in results:
+        print(f"{r['label']:<26}{r['first_gap']:>15.3f}{r['mean_gap']:>14.3f}{r['p95_gap']:>13.3f}{r['total']:>11.2f}")
+    if results[0]["mean_gap"] > 0:
+        print(f"\n✓ Mean inter-job gap reduced by {1 - results[1]['mean_gap'] / results[0]['mean_gap']:.0%}")
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"timestamp": time.time(), "args": vars(args), "results": results})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Benchmark lazy (memory-mapped) safetensors loading on a synthetic checkpoint.
+
+A synthetic checkpoint is written with the layout of a full Stable Diffusion
+checkpoint: UNet (70%), text encoder (20%) and VAE (10%) tensors. Each
+scenario runs in a fresh process with the file evicted from the page cache,
+and loads the tensors a workflow needs:
+
+- full:        read the whole file, as an eager safetensors load does
+- lazy:        map the file (header read from the file) and touch only the needed tensors
+- lazy+index:  the same, with the header served from the index cache
+
+    python bench_safetensors.py --size-mb 2048 --tensors 1200
+    python bench_safetensors.py --need all
+
+--need picks the tensors used: "text_encoder" (a CLIP loader reading a full
+checkpoint), "unet", "vae" or "all". Peak RSS and wall time are reported per
+scenario; use --dir to write the file on the filesystem you want to measure
+and --json to append the results to a file.
+"""
+
+import argparse
+import json
+import os
+import resource
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from lazy_safetensors import LazySafetensors, SafetensorsIndex, read_header
+
+# Share of the file per component, and the tensor name prefix ComfyUI uses for it
+COMPONENTS = {
+    "unet": ("model.diffusion_model.", 0.7),
+    "text_encoder": ("cond_stage_model.", 0.2),
+    "vae": ("first_stage_model.", 0.1),
+}
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def write_checkpoint(path: str, size_mb: int, tensors: int):
+    """Write a synthetic F16 checkpoint of roughly `size_mb` MB with `tensors` tensors."""
+    header, offset = {"__metadata__": {"format": "pt"}}, 0
+    for prefix, share in COMPONENTS.values():
+        count = max(1, int(tensors * share))
+        elements = int(size_mb * share * 1024 * 1024 / 2 / count)
+        for index in range(count):
+            header[f"{prefix}block_{index}.weight"] = {
+                "dtype": "F16", "shape": [elements], "data_offsets": [offset, offset + elements * 2]}
+            offset += elements * 2
+    encoded = json.dumps(header).encode()
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(encoded)))
+        f.write(encoded)
+        for _ in range(offset // len(block)):
+            f.write(block)
+        f.write(block[:offset % len(block)])
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def drop_from_page_cache(path: str):
+    """Evict a file's pages (works for clean pages without privileges)."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def needed(names: List[str], need: str) -> List[str]:
+    """Tensors a workflow using `need` loads."""
+    if need == "all":
+        return names
+    return [name for name in names if name.startswith(COMPONENTS[need][0])]
+
+
+def run_scenario(scenario: str, path: str, index_path: str, need: str) -> Dict[str, Any]:
+    """Load the needed tensors of `path` one way; runs in its own process."""
+    start = time.monotonic()
+    if scenario == "full":
+        entry = read_header(path)
+        with open(path, "rb") as f:
+            data = f.read()
+        names = needed(list(entry["tensors"]), need)
+        header_done = time.monotonic()
+        touched = sum(entry["tensors"][name]["end"] - entry["tensors"][name]["start"] for name in names)
+        del data
+    else:
+        index = SafetensorsIndex(index_path) if scenario == "lazy+index" else None
+        lazy = LazySafetensors(path, index)
+        header_done = time.monotonic()
+        names = needed(lazy.keys(), need)
+        for name in names:
+            # Touch every page, as copying the tensor to the GPU does
+            sum(lazy.buffer(name)[::PAGE_SIZE])
+        touched = lazy.nbytes(names)
+        if index:
+            index.save()
+    end = time.monotonic()
+    return {
+        "scenario": scenario,
+        "open": header_done - start,
+        "total": end - start,
+        "tensors": len(names),
+        "bytes_needed": touched,
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark lazy safetensors loading on a synthetic checkpoint.")
+    parser.add_argument("--dir", help="Directory for the synthetic checkpoint (default: a temporary directory)")
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--tensors", type=int, default=1200)
+    parser.add_argument("--need", choices=["text_encoder", "unet", "vae", "all"], default="text_encoder")
+    parser.add_argument("--json", help="Append the results to this JSON file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--file", help=argparse.SUPPRESS)
+    parser.add_argument("--index", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.file, args.index, args.need)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.dir or tmp
+        path = os.path.join(directory, "synthetic_checkpoint.safetensors")
+        index_path = os.path.join(tmp, "safetensors_index.json")
+        print(f"📦 Writing a {args.size_mb} MB synthetic checkpoint with {args.tensors} tensors to {path}")
+        write_checkpoint(path, args.size_mb, args.tensors)
+        # Fill the index, as the first load on the volume does
+        index = SafetensorsIndex(index_path)
+        index.header(path)
+        index.save()
+
+        results = []
+        for scenario in ("full", "lazy", "lazy+index"):
+            drop_from_page_cache(path)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--scenario", scenario, "--file", path,
+                 "--index", index_path, "--need", args.need],
+                check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output))
+        if not args.dir:
+            os.remove(path)
+
+    print(f"\nTensors needed: {args.need} ({results[0]['tensors']} tensors, {results[0]['bytes_needed'] / 1024 ** 2:.0f} MB)")
+    print(f"{'scenario':<14}{'open (s)':>10}{'total (s)':>11}{'peak RSS (MB)':>15}")
+    for r in results:
+        print(f"{r['scenario']:<14}{r['open']:>10.4f}{r['total']:>11.3f}{r['peak_rss'] / 1024 ** 2:>15.0f}")
+    full, lazy = results[0], results[-1]
+    print(f"\n✓ Lazy loading with the index: {full['total'] / lazy['total']:.1f}x faster, "
+          f"{(full['peak_rss'] - lazy['peak_rss']) / 1024 ** 2:.0f} MB less peak RSS")
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"timestamp": time.time(), "args": vars(args), "results": results})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Benchmark ComfyUI time-to-first-byte for a plain launch vs. a snapshot restore.
+
+Plain launch: starts the given command locally and measures the time until
+the URL answers its first byte.
+
+    python bench_startup.py plain --command "comfy launch -- --port 8188" --url http://127.0.0.1:8188
+
+Endpoint: measures a deployed app after letting it scale to zero, so every
+request pays a cold start (or a snapshot restore when memory_snapshot = True).
+
+    python bench_startup.py endpoint --url https://<workspace>--comfyui-app-comfyuicontainer-ui.modal.run --idle 60
+
+Results are printed and, with --json, appended to a file so runs with and
+without memory snapshots can be compared.
+"""
+
+import argparse
+import json
+import os
+import signal
+import statistics
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+
+def time_to_first_byte(url: str, timeout: float, interval: float = 0.2) -> Optional[float]:
+    """
+    Poll a URL until it returns its first byte.
+
+    Args:
+        url: URL to request
+        timeout: Seconds to keep trying
+        interval: Seconds between connection attempts
+
+    Returns:
+        Seconds until the first byte arrived, or None on timeout
+    """
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read(1)
+                return time.monotonic() - start
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            time.sleep(interval)
+    return None
+
+
+def bench_plain(command: str, url: str, runs: int, timeout: float) -> List[Optional[float]]:
+    """
+    Launch a command `runs` times and measure time-to-first-byte for each launch.
+
+    Args:
+        command: Shell command that starts ComfyUI
+        url: URL served by the command
+        runs: Number of launches
+        timeout: Seconds to wait for each launch
+
+    Returns:
+        Time-to-first-byte per run (None for runs that timed out)
+    """
+    results = []
+    for run in range(1, runs + 1):
+        process = subprocess.Popen(command, shell=True, start_new_session=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            ttfb = time_to_first_byte(url, timeout)
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+        print(f"  run {run}: {'timeout' if ttfb is None else f'{ttfb:.2f}s'}")
+        results.append(ttfb)
+    return results
+
+
+def bench_endpoint(url: str, runs: int, idle: float, timeout: float) -> List[Optional[float]]:
+    """
+    Measure a deployed endpoint after it has been idle for `idle` seconds.
+
+    Args:
+        url: Deployed ComfyUI URL
+        runs: Number of measurements
+        idle: Seconds to wait before each request; use more than scaledown_window
+        timeout: Seconds to wait for each request
+
+    Returns:
+        Time-to-first-byte per run (None for runs that timed out)
+    """
+    results = []
+    for run in range(1, runs + 1):
+        if idle > 0:
+            print(f"  waiting {idle:.0f}s for the app to scale down...")
+            time.sleep(idle)
+        ttfb = time_to_first_byte(url, timeout)
+        print(f"  run {run}: {'timeout' if ttfb is None else f'{ttfb:.2f}s'}")
+        results.append(ttfb)
+    return results
+
+
+def summarize(results: List[Optional[float]]) -> Dict[str, Optional[float]]:
+    """Summarize time-to-first-byte measurements."""
+    completed = [r for r in results if r is not None]
+    if not completed:
+        return {"runs": len(results), "timeouts": len(results), "min": None, "median": None, "max": None}
+    return {
+        "runs": len(results),
+        "timeouts": len(results) - len(completed),
+        "min": min(completed),
+        "median": statistics.median(completed),
+        "max": max(completed),
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark ComfyUI time-to-first-byte.")
+    modes = parser.add_subparsers(dest="mode", required=True)
+
+    plain = modes.add_parser("plain", help="Launch ComfyUI locally with a command")
+    plain.add_argument("--command", required=True)
+    plain.add_argument("--url", required=True)
+
+    endpoint = modes.add_parser("endpoint", help="Measure a deployed app after it scales to zero")
+    endpoint.add_argument("--url", required=True)
+    endpoint.add_argument("--idle", type=float, default=60, help="Seconds idle before each request")
+
+    for mode in (plain, endpoint):
+        mode.add_argument("-n", "--runs", type=int, default=3)
+        mode.add_argument("--timeout", type=float, default=600)
+        mode.add_argument("--label", help="Name stored with the results, e.g. 'snapshot'")
+        mode.add_argument("--json", help="Append the results to this JSON file")
+
+    args = parser.parse_args()
+
+    print(f"⏱  Benchmarking {args.mode} startup ({args.runs} run(s))")
+    if args.mode == "plain":
+        results = bench_plain(args.command, args.url, args.runs, args.timeout)
+    else:
+        results = bench_endpoint(args.url, args.runs, args.idle, args.timeout)
+
+    summary = summarize(results)
+    if summary["median"] is not None:
+        print(f"✓ TTFB min {summary['min']:.2f}s / median {summary['median']:.2f}s / max {summary['max']:.2f}s")
+    else:
+        print("✗ No run reached the first byte")
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"mode": args.mode, "label": args.label, "url": args.url,
+                        "results": results, "summary": summary, "timestamp": time.time()})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Replay a workload of workflow submissions and measure latency and throughput.
+
+A workload is a JSONL file with one submission per line:
+
+    {"workflow": "txt2img_api.json"}
+    {"workflow": {"1": {"class_type": "...", "inputs": {...}}}, "label": "sdxl", "at": 2.5}
+
+"workflow" is a graph in ComfyUI API format or the path of one (relative to
+the workload file). Submissions arrive at --rate per second, evenly spaced
+or as a Poisson process (--arrival poisson); without --rate they are sent at
+their "at" offset in seconds from the start of the run. --requests cycles
+the workload to that many submissions.
+
+Targets:
+
+    python bench_workload.py workflows/workload.example.jsonl --mock --rate 4 --requests 40
+    python bench_workload.py workload.jsonl --comfyui http://127.0.0.1:8188 --rate 0.5
+    python bench_workload.py workload.jsonl --url https://<workspace>--comfyui-app-comfyuicontainer-api.modal.run
+
+--url posts to a deployed api (or router) endpoint. --mock and --comfyui run
+the headless API in this process in front of a mock or a real ComfyUI, with
+max_inputs, queue_timeout and max_batch taken from config.ini unless given.
+
+Reports throughput, p50/p95/p99 latency, the time spent in ComfyUI's queue
+versus executing (from the timings returned with each result) and the number
+of cold starts (first result of each container). With --json the results are
+appended to a file together with the [RESOURCES], [API] and [ROUTING] config,
+so runs with different max_inputs, max_containers or scaledown_window can be
+compared.
+"""
+
+import argparse
+import configparser
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Callable, Dict, List, Optional
+
+from batching import MicroBatcher
+from comfy_client import ComfyUIClient
+from headless_api import HeadlessAPI, QueueFullError
+
+# Config sections stored with the results
+CONFIG_SECTIONS = ("RESOURCES", "API", "ROUTING")
+
+
+class RejectedError(Exception):
+    """Raised when the target refuses a submission because its queue is full."""
+
+
+def load_workload(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a workload file.
+
+    Args:
+        path: JSONL file with one submission per line
+
+    Returns:
+        Submissions with the workflow graph loaded
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            workflow = entry.get("workflow", entry.get("prompt"))
+            if isinstance(workflow, str):
+                with open(os.path.join(base_dir, workflow)) as wf:
+                    workflow = json.load(wf)
+                entry.setdefault("label", os.path.splitext(os.path.basename(entry["workflow"]))[0])
+            if not isinstance(workflow, dict) or not workflow:
+                raise ValueError(f"{path}:{number}: 'workflow' must be an API-format graph or a path to one")
+            entries.append({"workflow": workflow, "include_images": bool(entry.get("include_images", False)),
+                            "at": entry.get("at"), "label": entry.get("label", f"line {number}")})
+    if not entries:
+        raise ValueError(f"{path} contains no submissions")
+    return entries
+
+
+def schedule(entries: List[Dict[str, Any]], count: int, rate: Optional[float], arrival: str,
+             seed: int) -> List[float]:
+    """
+    Arrival time of each submission, in seconds from the start of the run.
+
+    Args:
+        entries: Workload submissions
+        count: Number of submissions (the workload is cycled)
+        rate: Submissions per second, or None to use each entry's "at"
+        arrival: "uniform" (evenly spaced) or "poisson" (exponential gaps)
+        seed: Seed of the Poisson process
+
+    Returns:
+        Arrival offsets
+    """
+    if rate is None:
+        offsets = [float(entry["at"] or 0.0) for entry in entries]
+        # Each repetition of the workload starts one mean gap after the previous one ends
+        span = max(offsets) * len(offsets) / (len(offsets) - 1) if len(offsets) > 1 else max(offsets)
+        return [offsets[i % len(offsets)] + (i // len(offsets)) * span for i in range(count)]
+    if arrival == "poisson":
+        rng, at, times = random.Random(seed), 0.0, []
+        for _ in range(count):
+            times.append(at)
+            at += rng.expovariate(rate)
+        return times
+    return [i / rate for i in range(count)]
+
+
+def endpoint_target(url: str, timeout: float) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Submit to a deployed api or route endpoint."""
+    def submit(entry: Dict[str, Any]) -> Dict[str, Any]:
+        body = json.dumps({"workflow": entry["workflow"], "include_images": entry["include_images"]}).encode()
+        request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RejectedError(e.read().decode(errors="replace"))
+            raise
+    return submit
+
+
+def headless_target(base_url: str, max_inputs: int, queue_timeout: float, max_batch: int, max_wait_ms: float,
+                    timeout: float) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Submit through an in-process headless API, as the container does."""
+    api = HeadlessAPI(ComfyUIClient(base_url), max_inputs, queue_timeout)
+    batcher = MicroBatcher(api, max_batch, max_wait_ms, timeout=timeout) if max_batch > 1 else None
+
+    def submit(entry: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            if batcher is not None:
+                return batcher.submit(entry["workflow"], entry["include_images"]).result()
+            return HeadlessAPI.result(api.submit(entry["workflow"], entry["include_images"], timeout=timeout))
+        except QueueFullError as e:
+            raise RejectedError(str(e))
+    return submit
+
+
+def replay(submit: Callable[[Dict[str, Any]], Dict[str, Any]], entries: List[Dict[str, Any]],
+           arrivals: List[float]) -> List[Dict[str, Any]]:
+    """
+    Send every submission at its arrival time and wait for all results.
+
+    Args:
+        submit: Sends one submission and returns its result
+        entries: Workload submissions (cycled)
+        arrivals: Arrival offset of each submission
+
+    Returns:
+        One record per submission with its status, latency and timings
+    """
+    records: List[Dict[str, Any]] = [{} for _ in arrivals]
+    start = time.monotonic()
+
+    def send(index: int):
+        entry = entries[index % len(entries)]
+        sent = time.monotonic()
+        record = {"index": index, "label": entry["label"], "scheduled": arrivals[index], "sent": sent - start}
+        try:
+            result = submit(entry)
+            record.update({"status": "ok", "timings": result.get("timings", {}),
+                           "container": result.get("container"), "batch_size": result.get("batch_size", 1)})
+        except RejectedError as e:
+            record.update({"status": "rejected", "error": str(e)})
+        except Exception as e:
+            record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+        record["latency"] = time.monotonic() - sent
+        record["finished"] = record["sent"] + record["latency"]
+        records[index] = record
+
+    threads = []
+    for index, at in enumerate(arrivals):
+        delay = start + at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=send, args=(index,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return records
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """Mean, p50, p95, p99 and max (nearest rank)."""
+    if not values:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+    return {"mean": sum(ordered) / len(ordered), "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+            "max": ordered[-1]}
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate the records of a run."""
+    ok = [r for r in records if r["status"] == "ok"]
+    duration = max((r["finished"] for r in records), default=0.0) - min((r["sent"] for r in records), default=0.0)
+    timed = [r for r in ok if "execution" in r["timings"]]
+    containers = [r["container"] for r in ok if r.get("container")]
+    return {
+        "requests": len(records),
+        "completed": len(ok),
+        "rejected": sum(r["status"] == "rejected" for r in records),
+        "errors": sum(r["status"] == "error" for r in records),
+        "duration": duration,
+        "throughput": len(ok) / duration if duration > 0 else 0.0,
+        "latency": percentiles([r["latency"] for r in ok]),
+        "queue_wait": percentiles([r["timings"]["queue_wait"] for r in timed]),
+        "execution": percentiles([r["timings"]["execution"] for r in timed]),
+        # Everything outside ComfyUI: network, routing, container start, micro-batch wait
+        "overhead": percentiles([r["latency"] - r["timings"]["queue_wait"] - r["timings"]["execution"]
+                                 for r in timed]),
+        "dispatch_lag": max((r["sent"] - r["scheduled"] for r in records), default=0.0),
+        "cold_starts": sum(bool(c.get("cold_start")) for c in containers),
+        "containers": len({c.get("task_id") for c in containers}),
+    }
+
+
+def config_snapshot(path: str) -> Dict[str, Dict[str, str]]:
+    """Settings of config.ini that shape throughput, stored with the results."""
+    parser = configparser.ConfigParser(inline_comment_prefixes=(";",))
+    parser.optionxform = str
+    parser.read(path)
+    return {section: dict(parser.items(section)) for section in CONFIG_SECTIONS if parser.has_section(section)}
+
+
+def print_summary(summary: Dict[str, Any]):
+    """Print a run summary."""
+    print(f"\n✓ {summary['completed']}/{summary['requests']} completed, {summary['rejected']} rejected, "
+          f"{summary['errors']} errors in {summary['duration']:.1f}s ({summary['throughput']:.2f} workflows/s)")
+    print(f"{'seconds':<14}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name in ("latency", "queue_wait", "execution", "overhead"):
+        stats = summary[name]
+        if stats["mean"] is None:
+            continue
+        print(f"{name:<14}" + "".join(f"{stats[key]:>9.3f}" for key in ("mean", "p50", "p95", "p99", "max")))
+    if summary["containers"]:
+        print(f"📊 Cold starts: {summary['cold_starts']} across {summary['containers']} container(s)")
+    if summary["dispatch_lag"] > 0.1:
+        print(f"⚠ Submissions were sent up to {summary['dispatch_lag']:.2f}s late; the measured rate is lower than requested")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Replay a workload of workflow submissions.")
+    parser.add_argument("workload", help="JSONL file with one submission per line")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="Deployed api or route endpoint")
+    target.add_argument("--comfyui", help="ComfyUI server to drive through an in-process headless API")
+    target.add_argument("--mock", action="store_true", help="Start a mock ComfyUI in this process")
+    parser.add_argument("--rate", type=float, help="Submissions per second (default: each entry's 'at')")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="uniform")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-n", "--requests", type=int, help="Number of submissions (default: one pass)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--config", default="config.ini", help="Config whose settings are used and recorded")
+    parser.add_argument("--max-inputs", type=int, help="Headless API slots (--mock/--comfyui)")
+    parser.add_argument("--queue-timeout", type=float, help="Seconds to wait for a slot (--mock/--comfyui)")
+    parser.add_argument("--max-batch", type=int, help="Micro-batch size (--mock/--comfyui)")
+    parser.add_argument("--node-time", type=float, default=0.05, help="Seconds per node in the mock")
+    parser.add_argument("--label", help="Name stored with the results, e.g. 'max_inputs=4'")
+    parser.add_argument("--json", help="Append the results to this JSON file")
+    args = parser.parse_args()
+
+    entries = load_workload(args.workload)
+    count = args.requests or len(entries)
+    arrivals = schedule(entries, count, args.rate, args.arrival, args.seed)
+    config = config_snapshot(args.config)
+    resources, api = config.get("RESOURCES", {}), config.get("API", {})
+    settings = {
+        "max_inputs": args.max_inputs or int(resources.get("max_inputs", 10)),
+        "queue_timeout": args.queue_timeout if args.queue_timeout is not None else float(api.get("queue_timeout", 0)),
+        "max_batch": args.max_batch or int(api.get("max_batch", 1)),
+        "max_wait_ms": float(api.get("max_wait_ms", 50)),
+    }
+
+    mock = None
+    if args.url:
+        submit, target_name = endpoint_target(args.url, args.timeout), args.url
+    else:
+        if args.mock:
+            from mock_comfyui import MockComfyUI
+            mock = MockComfyUI(node_time=args.node_time).start()
+        base_url = mock.url if mock else args.comfyui
+        submit = headless_target(base_url, settings["max_inputs"], settings["queue_timeout"],
+                                 settings["max_batch"], settings["max_wait_ms"], args.timeout)
+        target_name = "mock" if mock else base_url
+
+    rate = f"{args.rate}/s {args.arrival}" if args.rate else "recorded arrival times"
+    print(f"⏱  Replaying {count} submission(s) from {args.workload} against {target_name} ({rate})")
+    try:
+        records = replay(submit, entries, arrivals)
+    finally:
+        if mock:
+            mock.stop()
+
+    summary = summarize(records)
+    print_summary(summary)
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"timestamp": time.time(), "label": args.label, "target": target_name,
+                        "workload": args.workload, "args": vars(args), "config": config,
+                        "settings": None if args.url else settings, "summary": summary, "requests": records})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
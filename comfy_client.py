@@ -0,0 +1,357 @@
+"""
+Minimal ComfyUI API client.
+
+Talks to ComfyUI's HTTP API (/prompt, /history, /queue, /view) and follows
+execution progress over its websocket (/ws). Only the standard library is
+used, so the client works both inside the container and against the local
+mock server in mock_comfyui.py.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import posixpath
+import socket
+import struct
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Websocket opcodes
+OP_CONTINUATION, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class ComfyUIError(Exception):
+    """Raised when ComfyUI rejects a prompt or reports an execution error."""
+
+    def __init__(self, message: str, node_ids: Iterable[str] = ()):
+        """
+        Initialize the error.
+
+        Args:
+            message: Error message
+            node_ids: Nodes ComfyUI blamed (the failed node, or the nodes of a rejected prompt)
+        """
+        super().__init__(message)
+        self.node_ids = set(node_ids)
+
+
+def websocket_accept_key(key: str) -> str:
+    """Compute the Sec-WebSocket-Accept value for a handshake key."""
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+def encode_frame(payload: bytes, opcode: int = OP_TEXT, mask: bool = False) -> bytes:
+    """
+    Encode a single, final websocket frame.
+
+    Args:
+        payload: Frame payload
+        opcode: Frame opcode
+        mask: Whether to mask the payload (required for client-to-server frames)
+
+    Returns:
+        Encoded frame
+    """
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack("!H", length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack("!Q", length)
+    if mask:
+        key = os.urandom(4)
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+        header += key
+    return header + payload
+
+
+def read_frame(sock_file) -> Tuple[bool, int, bytes]:
+    """
+    Read one websocket frame.
+
+    Args:
+        sock_file: Buffered binary file object wrapping the socket
+
+    Returns:
+        Tuple of (final fragment, opcode, payload)
+    """
+    head = sock_file.read(2)
+    if len(head) < 2:
+        raise ConnectionError("websocket closed")
+    final, opcode = bool(head[0] & 0x80), head[0] & 0x0F
+    masked, length = bool(head[1] & 0x80), head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", sock_file.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", sock_file.read(8))[0]
+    key = sock_file.read(4) if masked else None
+    payload = sock_file.read(length)
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return final, opcode, payload
+
+
+class WebSocket:
+    """Just enough of a websocket client to follow ComfyUI's /ws events."""
+
+    def __init__(self, url: str, timeout: Optional[float] = None):
+        """
+        Open a websocket connection.
+
+        Args:
+            url: ws:// URL
+            timeout: Socket timeout in seconds for connecting and receiving
+        """
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme != "ws":
+            raise ValueError(f"Only ws:// URLs are supported, got {url}")
+        self.sock = socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout)
+        self.file = self.sock.makefile("rb")
+
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = parsed.path + (f"?{parsed.query}" if parsed.query else "")
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parsed.netloc}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+
+        status = self.file.readline().decode()
+        headers = {}
+        while True:
+            line = self.file.readline().decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if " 101 " not in status or headers.get("sec-websocket-accept") != websocket_accept_key(key):
+            self.close()
+            raise ConnectionError(f"websocket handshake failed: {status.strip()}")
+
+    def recv(self) -> Tuple[int, bytes]:
+        """
+        Receive the next complete message, answering pings along the way.
+
+        Returns:
+            Tuple of (opcode, payload); OP_CLOSE when the server closed
+        """
+        message, message_opcode = b"", None
+        while True:
+            final, opcode, payload = read_frame(self.file)
+            if opcode == OP_PING:
+                self.sock.sendall(encode_frame(payload, OP_PONG, mask=True))
+                continue
+            if opcode == OP_CLOSE:
+                return OP_CLOSE, payload
+            if opcode != OP_CONTINUATION:
+                message_opcode = opcode
+            message += payload
+            if final:
+                return message_opcode, message
+
+    def close(self):
+        """Close the connection."""
+        try:
+            self.sock.sendall(encode_frame(b"", OP_CLOSE, mask=True))
+        except OSError:
+            pass
+        self.file.close()
+        self.sock.close()
+
+
+class ComfyUIClient:
+    """Client for a single ComfyUI server."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Base URL of ComfyUI, e.g. http://127.0.0.1:8000
+            timeout: Timeout in seconds for HTTP requests
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, endpoint: str, data: Optional[Dict[str, Any]] = None) -> bytes:
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(
+            f"{self.base_url}{endpoint}", data=body,
+            headers={"Content-Type": "application/json"} if body else {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read().decode(errors="replace")
+            try:
+                # /prompt answers 400 with the errors of each invalid node
+                node_errors = json.loads(body).get("node_errors") or {}
+            except (ValueError, AttributeError):
+                node_errors = {}
+            raise ComfyUIError(f"{endpoint} returned {e.code}: {body}", node_errors) from e
+
+    def _get_json(self, endpoint: str) -> Any:
+        return json.loads(self._request(endpoint))
+
+    def queue_prompt(self, workflow: Dict[str, Any], client_id: str) -> str:
+        """
+        Submit a workflow (API format) to ComfyUI's queue.
+
+        Args:
+            workflow: Workflow graph in API format
+            client_id: Websocket client id that receives the progress events
+
+        Returns:
+            The prompt id assigned by ComfyUI
+        """
+        response = json.loads(self._request("/prompt", {"prompt": workflow, "client_id": client_id}))
+        if response.get("node_errors"):
+            raise ComfyUIError(f"Workflow rejected: {json.dumps(response['node_errors'])}",
+                               response["node_errors"])
+        return response["prompt_id"]
+
+    def get_history(self, prompt_id: str) -> Dict[str, Any]:
+        """Return the history entry of a prompt, or {} if it has not finished."""
+        return self._get_json(f"/history/{prompt_id}").get(prompt_id, {})
+
+    def get_queue(self) -> Dict[str, Any]:
+        """Return ComfyUI's running and pending queue."""
+        return self._get_json("/queue")
+
+    def queue_depth(self) -> int:
+        """Number of prompts running or waiting in ComfyUI's queue."""
+        queue = self.get_queue()
+        return len(queue.get("queue_running", [])) + len(queue.get("queue_pending", []))
+
+    def cancel(self, prompt_id: str) -> Optional[str]:
+        """
+        Stop a prompt: delete it from the queue if it is still waiting, interrupt it if it is running.
+
+        Args:
+            prompt_id: Prompt to stop
+
+        Returns:
+            "deleted", "interrupted", or None when the prompt already finished
+        """
+        queue = self.get_queue()
+        if any(item[1] == prompt_id for item in queue.get("queue_pending", [])):
+            self._request("/queue", {"delete": [prompt_id]})
+            return "deleted"
+        if any(item[1] == prompt_id for item in queue.get("queue_running", [])):
+            # ComfyUI only interrupts the prompt it names, so a prompt started since is not affected
+            self._request("/interrupt", {"prompt_id": prompt_id})
+            return "interrupted"
+        return None
+
+    def output_node_types(self) -> Set[str]:
+        """Node types ComfyUI flags as output nodes (OUTPUT_NODE) in /object_info."""
+        return {name for name, info in self._get_json("/object_info").items() if info.get("output_node")}
+
+    def view(self, filename: str, subfolder: str = "", folder_type: str = "output") -> bytes:
+        """Download an output file."""
+        query = urllib.parse.urlencode({"filename": filename, "subfolder": subfolder, "type": folder_type})
+        return self._request(f"/view?{query}")
+
+    def flush_outputs(self, timeout: float = 60.0) -> bool:
+        """
+        Wait until the images queued by the mxc_async_output node pack are written.
+
+        Args:
+            timeout: Seconds ComfyUI waits for the writes
+
+        Returns:
+            False if writes were still running after `timeout`; True otherwise,
+            also when the node pack is not enabled
+        """
+        try:
+            return self._get_json(f"/mxc/output/flush?timeout={timeout}")["flushed"]
+        except ComfyUIError:
+            # 404: outputs are written synchronously by ComfyUI itself
+            return True
+
+    def wait_outputs(self, outputs: List[Dict[str, Any]], timeout: float = 60.0) -> bool:
+        """
+        Wait until the given output files queued by the mxc_async_output node pack are written.
+
+        Unlike flush_outputs, this neither waits for other prompts' outputs
+        nor commits the volume.
+
+        Args:
+            outputs: Output files, with "filename" and "subfolder"
+            timeout: Seconds ComfyUI waits for the writes
+
+        Returns:
+            False if writes were still running after `timeout`; True otherwise,
+            also when the node pack is not enabled
+        """
+        if not outputs:
+            return True
+        files = [posixpath.join(output.get("subfolder", ""), output["filename"]) for output in outputs]
+        query = urllib.parse.urlencode([("file", file) for file in files] + [("timeout", timeout)])
+        try:
+            return self._get_json(f"/mxc/output/wait?{query}")["written"]
+        except ComfyUIError:
+            # 404: outputs are written synchronously by ComfyUI itself
+            return True
+
+    def connect(self, client_id: str) -> WebSocket:
+        """Open the event websocket for a client id."""
+        ws_url = self.base_url.replace("http://", "ws://", 1)
+        return WebSocket(f"{ws_url}/ws?clientId={client_id}", timeout=self.timeout)
+
+    def run(self, workflow: Dict[str, Any], timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Queue a workflow and yield its progress events until it finishes.
+
+        The websocket is opened before the prompt is queued so no event is
+        missed. The first event yielded has type "queued" and carries the
+        prompt id; the last one has type "completed" and carries the prompt's
+        outputs from /history.
+
+        Args:
+            workflow: Workflow graph in API format
+            timeout: Seconds to wait for each event (None waits forever)
+
+        Yields:
+            ComfyUI events ({"type": ..., "data": ...}) for this prompt
+        """
+        client_id = uuid.uuid4().hex
+        ws = self.connect(client_id)
+        ws.sock.settimeout(timeout)
+        try:
+            prompt_id = self.queue_prompt(workflow, client_id)
+            yield {"type": "queued", "data": {"prompt_id": prompt_id}}
+            while True:
+                opcode, payload = ws.recv()
+                if opcode == OP_CLOSE:
+                    raise ComfyUIError("ComfyUI closed the websocket before the prompt finished")
+                if opcode != OP_TEXT:
+                    # Binary frames are latent previews
+                    continue
+                event = json.loads(payload)
+                data = event.get("data", {})
+                if data.get("prompt_id") not in (None, prompt_id):
+                    continue
+                if event["type"] in ("execution_error", "execution_interrupted"):
+                    raise ComfyUIError(f"{event['type']}: {json.dumps(data)}",
+                                       [data["node_id"]] if data.get("node_id") else [])
+                yield event
+                if event["type"] == "executing" and data.get("node") is None and data.get("prompt_id") == prompt_id:
+                    break
+        finally:
+            ws.close()
+
+        history = self.get_history(prompt_id)
+        yield {"type": "completed", "data": {"prompt_id": prompt_id, "outputs": history.get("outputs", {})}}
@@ -0,0 +1,115 @@
+"""
+MxC async output: save images off the executor thread.
+
+Replaces SaveImage.save_images for the output folder. The images are moved
+to the CPU on the executor thread, then encoded (PNG, WebP or AVIF) and
+written to the volume by a background writer pool, which commits the volume
+once per interval. File names are reserved up front, so the UI and /history
+get them immediately and images still being written are never overwritten.
+Previews (temp folder) keep ComfyUI's own code.
+
+Routes:
+    GET /mxc/output/metrics   writer counters, queue occupancy, latency, throughput
+    GET /mxc/output/flush     wait until every queued image is written and commit (?timeout=seconds)
+    GET /mxc/output/wait      wait until the given images are written (?file=subfolder/name&timeout=seconds);
+                              commits only when commit_interval is 0, as there are no periodic commits then
+
+Enabled by the MXC_OUTPUT_FORMAT environment variable, which main.py sets
+for the ComfyUI process; a format this Pillow build cannot encode falls back
+to PNG. output_writer.py is copied into this package when
+the image is built.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+
+import folder_paths
+import nodes
+import numpy as np
+from aiohttp import web
+from comfy.cli_args import args
+from server import PromptServer
+
+from .output_writer import FORMATS, OutputWriter, encode_image, usable_format
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+FORMAT = os.environ.get("MXC_OUTPUT_FORMAT")
+
+
+def volume_commit():
+    """Commit the volume holding the output folder."""
+    import modal
+
+    modal.Volume.from_name(os.environ["MXC_OUTPUT_VOLUME"]).commit()
+
+
+if FORMAT:
+    # Checked once at import so a Pillow without WebP/AVIF does not fail every save
+    FORMAT = usable_format(FORMAT)
+    COMPRESS_LEVEL = int(os.environ.get("MXC_OUTPUT_PNG_COMPRESS_LEVEL", "4"))
+    LOSSLESS = os.environ.get("MXC_OUTPUT_LOSSLESS", "1") == "1"
+    QUALITY = int(os.environ.get("MXC_OUTPUT_QUALITY", "90"))
+
+    writer = OutputWriter(
+        workers=int(os.environ.get("MXC_OUTPUT_WORKERS", "2")),
+        max_pending=int(os.environ.get("MXC_OUTPUT_MAX_PENDING", "32")),
+        commit=volume_commit if os.environ.get("MXC_OUTPUT_VOLUME") else None,
+        commit_interval=float(os.environ.get("MXC_OUTPUT_COMMIT_INTERVAL", "10")),
+    )
+    # Next free counter per (folder, file name); files still queued are not on disk yet
+    reserved = {}
+    reserved_lock = threading.Lock()
+    _save_images = nodes.SaveImage.save_images
+
+    def save_images(self, images, filename_prefix="ComfyUI", prompt=None, extra_pnginfo=None):
+        if self.type != "output":
+            return _save_images(self, images, filename_prefix, prompt, extra_pnginfo)
+
+        filename_prefix += self.prefix_append
+        full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(
+            filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
+        with reserved_lock:
+            key = (full_output_folder, filename)
+            counter = max(counter, reserved.get(key, 0))
+            reserved[key] = counter + len(images)
+
+        if args.disable_metadata:
+            prompt, extra_pnginfo = None, None
+        results = []
+        for batch_number, image in enumerate(images):
+            array = np.clip(255. * image.cpu().numpy(), 0, 255).astype(np.uint8)
+            name = filename.replace("%batch_num%", str(batch_number))
+            file = f"{name}_{counter + batch_number:05}_.{FORMATS[FORMAT]}"
+            writer.submit(
+                os.path.join(full_output_folder, file),
+                lambda array=array: encode_image(array, FORMAT, COMPRESS_LEVEL, LOSSLESS, QUALITY, prompt, extra_pnginfo))
+            results.append({"filename": file, "subfolder": subfolder, "type": self.type})
+        return {"ui": {"images": results}}
+
+    nodes.SaveImage.save_images = save_images
+
+    @PromptServer.instance.routes.get("/mxc/output/metrics")
+    async def output_metrics(request):
+        return web.json_response(writer.metrics())
+
+    @PromptServer.instance.routes.get("/mxc/output/flush")
+    async def output_flush(request):
+        timeout = float(request.query.get("timeout", "60"))
+        done = await asyncio.get_running_loop().run_in_executor(None, writer.flush, timeout)
+        return web.json_response({"flushed": done, **writer.metrics()})
+
+    @PromptServer.instance.routes.get("/mxc/output/wait")
+    async def output_wait(request):
+        output_dir = folder_paths.get_output_directory()
+        paths = [os.path.join(output_dir, file) for file in request.query.getall("file", [])]
+        timeout = float(request.query.get("timeout", "60"))
+        done = await asyncio.get_running_loop().run_in_executor(None, writer.wait, paths, timeout)
+        if writer.commit_interval <= 0:
+            await asyncio.get_running_loop().run_in_executor(None, writer.commit_now)
+        return web.json_response({"written": done})
+
+    logging.info(f"[mxc_async_output] Writing outputs as {FORMAT} in the background")
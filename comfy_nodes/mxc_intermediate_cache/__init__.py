@@ -0,0 +1,164 @@
+"""
+MxC intermediate cache: reuse conditioning and latents across prompts and containers.
+
+Wraps the function of the text encoder and VAE encoder nodes. Before a node
+runs, its entry key is built from the loader chain feeding its encoder input
+(with every model file's size and modification time) and from its other
+inputs; a cached output is returned from local disk or the volume instead of
+running the encoder, and a computed one is stored for the next prompt or
+container. The node being executed and its prompt are followed through
+PromptServer.send_sync and PromptQueue.put, like the mxc_profiler pack does.
+Metrics are served at /mxc/intermediate_cache/metrics.
+
+Enabled by the MXC_INTERMEDIATE_CACHE_DIR environment variable, which main.py
+sets for the ComfyUI process. intermediate_cache.py and model_loaders.py are
+copied into this package when the image is built.
+"""
+
+import atexit
+import hashlib
+import inspect
+import json
+import logging
+import os
+import time
+
+import execution
+import folder_paths
+import nodes
+from aiohttp import web
+from server import PromptServer
+
+from .intermediate_cache import IntermediateCache, encoder_key, pack, unpack, value_digest
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+# Node types whose output can be cached, and the input holding their encoder
+CACHEABLE_NODES = {
+    "CLIPTextEncode": "clip",
+    "CLIPTextEncodeSDXL": "clip",
+    "CLIPTextEncodeSDXLRefiner": "clip",
+    "CLIPTextEncodeFlux": "clip",
+    "CLIPTextEncodeSD3": "clip",
+    "VAEEncode": "vae",
+    "VAEEncodeForInpaint": "vae",
+}
+
+CACHE_DIR = os.environ.get("MXC_INTERMEDIATE_CACHE_DIR")
+END_EVENTS = ("execution_success", "execution_error", "execution_interrupted")
+
+
+def file_digest(folder, name):
+    """Size and modification time of a model file, or None when it is not found."""
+    try:
+        path = folder_paths.get_full_path(folder, name)
+        stat = os.stat(path) if path else None
+    except (KeyError, OSError):
+        return None
+    return f"{stat.st_size}:{stat.st_mtime_ns}" if stat else None
+
+
+if CACHE_DIR:
+    cache = IntermediateCache(
+        CACHE_DIR,
+        local_bytes=int(float(os.environ.get("MXC_INTERMEDIATE_CACHE_LOCAL_GB", "5")) * 1024 ** 3),
+        volume_dir=os.environ.get("MXC_INTERMEDIATE_CACHE_VOLUME_DIR") or None,
+        volume_bytes=int(float(os.environ.get("MXC_INTERMEDIATE_CACHE_VOLUME_GB", "20")) * 1024 ** 3),
+    )
+    atexit.register(cache.close, 30)
+    enabled = os.environ.get("MXC_INTERMEDIATE_CACHE_NODES", " ".join(CACHEABLE_NODES)).split()
+    graphs = {}
+    current = {"prompt_id": None, "node": None}
+    # Mean compute time of each node type, used to estimate the time a hit saves
+    compute_times = {}
+
+    def entry_key(class_type, encoder_input, kwargs):
+        prompt = graphs.get(current["prompt_id"], {})
+        node = prompt.get(current["node"])
+        if node is None or node.get("class_type") != class_type:
+            return None
+        link = node.get("inputs", {}).get(encoder_input)
+        if not isinstance(link, list):
+            return None
+        encoder = encoder_key(prompt, link[0], file_digest)
+        if encoder is None:
+            return None
+        inputs = {}
+        for name, value in sorted(kwargs.items()):
+            if name == encoder_input:
+                continue
+            inputs[name] = value_digest(value)
+            if inputs[name] is None:
+                return None
+        payload = json.dumps([class_type, encoder, link[1], inputs])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def wrap(class_type, node_class, encoder_input):
+        function = getattr(node_class, node_class.FUNCTION)
+
+        def cached(self, *args, **kwargs):
+            key = None
+            try:
+                key = None if args else entry_key(class_type, encoder_input, kwargs)
+                data = cache.get(key) if key else None
+                if data is not None:
+                    result = unpack(data)
+                    cache.record_saved(compute_times.get(class_type, (0.0, 0))[0])
+                    return result
+            except Exception as e:
+                logging.warning(f"[mxc_intermediate_cache] Lookup failed for {class_type}: {e}")
+
+            start = time.perf_counter()
+            result = function(self, *args, **kwargs)
+            elapsed = time.perf_counter() - start
+            mean, count = compute_times.get(class_type, (0.0, 0))
+            compute_times[class_type] = ((mean * count + elapsed) / (count + 1), count + 1)
+            if key:
+                try:
+                    cache.put(key, pack(result))
+                except Exception as e:
+                    logging.warning(f"[mxc_intermediate_cache] Not caching {class_type}: {e}")
+            return result
+
+        setattr(node_class, node_class.FUNCTION, cached)
+
+    wrapped = []
+    for class_type in enabled:
+        node_class = nodes.NODE_CLASS_MAPPINGS.get(class_type)
+        encoder_input = CACHEABLE_NODES.get(class_type)
+        function_name = getattr(node_class, "FUNCTION", None)
+        # Schema-based nodes implement a classmethod and are not wrapped
+        if (encoder_input and function_name and
+                inspect.isfunction(inspect.getattr_static(node_class, function_name, None))):
+            wrap(class_type, node_class, encoder_input)
+            wrapped.append(class_type)
+
+    _send_sync = PromptServer.send_sync
+
+    def send_sync(self, event, data, sid=None):
+        if isinstance(data, dict):
+            if event == "execution_start":
+                current.update(prompt_id=data.get("prompt_id"), node=None)
+            elif event == "executing":
+                current["node"] = data.get("node")
+            if event in END_EVENTS or (event == "executing" and data.get("node") is None):
+                graphs.pop(data.get("prompt_id"), None)
+        return _send_sync(self, event, data, sid)
+
+    _put = execution.PromptQueue.put
+
+    def put(self, item):
+        # Queue items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        graphs[item[1]] = item[2]
+        return _put(self, item)
+
+    PromptServer.send_sync = send_sync
+    execution.PromptQueue.put = put
+
+    @PromptServer.instance.routes.get("/mxc/intermediate_cache/metrics")
+    async def intermediate_cache_metrics(request):
+        return web.json_response(cache.metrics())
+
+    logging.info(f"[mxc_intermediate_cache] Caching the outputs of {', '.join(wrapped) or 'no nodes'} in {CACHE_DIR} "
+                 f"({len(cache.local.files)} local entries)")
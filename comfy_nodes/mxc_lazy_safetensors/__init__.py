@@ -0,0 +1,78 @@
+"""
+MxC lazy safetensors: load safetensors files as views of a memory mapping.
+
+Replaces comfy.utils.load_torch_file for .safetensors/.sft files loaded to
+the CPU. The state dict it returns holds tensors backed by a mapping of the
+file, so only the tensors a model actually uses are read from the volume;
+the rest of a full checkpoint is never touched. Headers of files on the
+volume are cached in an index on the volume, which is written once new
+headers have been read for SAVE_DELAY seconds, and when ComfyUI exits.
+
+Enabled by the MXC_SAFETENSORS_INDEX (index file) and
+MXC_SAFETENSORS_INDEX_ROOT (volume mount) environment variables, which
+main.py sets for the ComfyUI process. lazy_safetensors.py is copied into
+this package when the image is built.
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+import comfy.utils
+import torch
+
+from .lazy_safetensors import LazySafetensors, SafetensorsIndex
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+INDEX_PATH = os.environ.get("MXC_SAFETENSORS_INDEX")
+INDEX_ROOT = os.environ.get("MXC_SAFETENSORS_INDEX_ROOT")
+
+# Seconds new headers are collected before the index is written to the volume
+SAVE_DELAY = 60.0
+
+if INDEX_PATH and INDEX_ROOT:
+    index = SafetensorsIndex(INDEX_PATH, INDEX_ROOT)
+    root = os.path.normpath(INDEX_ROOT) + os.sep
+    _load_torch_file = comfy.utils.load_torch_file
+    # Pending delayed save of the index
+    save_state = {"timer": None}
+    save_lock = threading.Lock()
+
+    def save_index():
+        with save_lock:
+            save_state["timer"] = None
+        try:
+            index.save()
+        except OSError as e:
+            logging.warning(f"[mxc_lazy_safetensors] Could not save {INDEX_PATH}: {e}")
+
+    def load_lazy(ckpt):
+        # Only headers of volume files are cached; local copies are read directly
+        on_volume = os.path.abspath(ckpt).startswith(root)
+        lazy = LazySafetensors(ckpt, index if on_volume else None)
+        if index.dirty:
+            # Headers read for several models in a row are written to the volume together
+            with save_lock:
+                if save_state["timer"] is None:
+                    save_state["timer"] = threading.Timer(SAVE_DELAY, save_index)
+                    save_state["timer"].daemon = True
+                    save_state["timer"].start()
+        return lazy.state_dict(), lazy.metadata()
+
+    def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
+        on_cpu = device is None or torch.device(device).type == "cpu"
+        if on_cpu and ckpt.lower().endswith((".safetensors", ".sft")):
+            try:
+                sd, metadata = load_lazy(ckpt)
+                return (sd, metadata) if return_metadata else sd
+            except Exception as e:
+                logging.warning(f"[mxc_lazy_safetensors] Falling back to a full load of {ckpt}: {e}")
+        return _load_torch_file(ckpt, safe_load=safe_load, device=device, return_metadata=return_metadata)
+
+    comfy.utils.load_torch_file = load_torch_file
+    atexit.register(save_index)
+    logging.info(f"[mxc_lazy_safetensors] Loading safetensors lazily; headers cached in {INDEX_PATH} "
+                 f"({len(index.files)} files indexed)")
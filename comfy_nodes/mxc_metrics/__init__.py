@@ -0,0 +1,148 @@
+"""
+MxC metrics: per-node execution times, model load times and memory peaks.
+
+Follows the events ComfyUI sends to its clients (PromptServer.send_sync):
+the time between one "executing" event and the next is the execution time
+of that node, labelled with its class type. comfy.utils.load_torch_file
+(model files read) and comfy.model_management.load_models_gpu (models moved
+to the GPU) are timed, and the VRAM/RAM peaks are recorded after every
+prompt. torch.cuda.reset_peak_memory_stats is wrapped to record the VRAM peak
+before anything resets it (the mxc_profiler node pack does before every
+node), so the gauge keeps the peak of the whole process. The metrics are served in the Prometheus text format at
+/mxc/metrics, which the container's metrics endpoint includes.
+
+Enabled by the MXC_METRICS environment variable, which main.py sets for the
+ComfyUI process; MXC_METRICS_OTLP_PATH also appends them to an OTLP/JSON
+file. metrics.py is copied into this package when the image is built.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import comfy.model_management
+import comfy.utils
+import execution
+import torch
+from aiohttp import web
+from server import PromptServer
+
+from .metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry, OTLPFileExporter, process_peaks
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+if os.environ.get("MXC_METRICS") == "1":
+    registry = MetricsRegistry()
+    node_seconds = registry.histogram("mxc_node_execution_seconds", "Execution time of each node")
+    prompts = registry.counter("mxc_prompts_total", "Prompts executed")
+    prompt_seconds = registry.histogram("mxc_prompt_execution_seconds", "Execution time of each prompt")
+    load_seconds = registry.histogram("mxc_model_load_seconds", "Time to read a model file")
+    gpu_load_seconds = registry.histogram("mxc_model_gpu_load_seconds", "Time to load models onto the GPU")
+    vram_peak = registry.gauge("mxc_vram_peak_bytes", "Peak VRAM allocated by torch")
+
+    # Prompt id -> prompt, to look up the class type of executing nodes
+    prompt_graphs = {}
+    state = {"prompt_id": None, "prompt_start": None, "node": None, "node_start": None}
+    lock = threading.Lock()
+
+    def record_vram_peaks():
+        if torch.cuda.is_available():
+            for device in range(torch.cuda.device_count()):
+                vram_peak.set_max(torch.cuda.max_memory_allocated(device), device=str(device))
+
+    def record_peaks():
+        process_peaks(registry, "comfyui")
+        record_vram_peaks()
+
+    def finish_node(now):
+        if state["node"] is None:
+            return
+        graph = prompt_graphs.get(state["prompt_id"], {})
+        class_type = graph.get(state["node"], {}).get("class_type", "unknown")
+        node_seconds.observe(now - state["node_start"], class_type=class_type)
+        state["node"] = None
+
+    def on_event(event, data):
+        if not isinstance(data, dict):
+            return
+        now = time.monotonic()
+        with lock:
+            if event == "execution_start":
+                state.update(prompt_id=data.get("prompt_id"), prompt_start=now, node=None)
+            elif event == "executing" and data.get("node") is not None:
+                finish_node(now)
+                state.update(node=data["node"], node_start=now)
+            elif event in ("execution_success", "execution_error", "execution_interrupted") or (
+                    event == "executing" and data.get("node") is None):
+                finish_node(now)
+                if state["prompt_start"] is None:
+                    return
+                status = {"execution_error": "error", "execution_interrupted": "interrupted"}.get(event, "success")
+                prompts.inc(status=status)
+                prompt_seconds.observe(now - state["prompt_start"])
+                prompt_graphs.pop(state["prompt_id"], None)
+                state.update(prompt_id=None, prompt_start=None)
+                record_peaks()
+
+    _send_sync = PromptServer.send_sync
+
+    def send_sync(self, event, data, sid=None):
+        try:
+            on_event(event, data)
+        except Exception as e:
+            logging.warning(f"[mxc_metrics] {e}")
+        return _send_sync(self, event, data, sid)
+
+    _put = execution.PromptQueue.put
+
+    def put(self, item):
+        # Queue items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        with lock:
+            prompt_graphs[item[1]] = item[2]
+        return _put(self, item)
+
+    _reset_peak_memory_stats = torch.cuda.reset_peak_memory_stats
+
+    def reset_peak_memory_stats(*args, **kwargs):
+        try:
+            record_vram_peaks()
+        except Exception as e:
+            logging.warning(f"[mxc_metrics] {e}")
+        return _reset_peak_memory_stats(*args, **kwargs)
+
+    _load_torch_file = comfy.utils.load_torch_file
+
+    def load_torch_file(ckpt, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return _load_torch_file(ckpt, *args, **kwargs)
+        finally:
+            load_seconds.observe(time.monotonic() - start, model=os.path.basename(ckpt))
+
+    _load_models_gpu = comfy.model_management.load_models_gpu
+
+    def load_models_gpu(*args, **kwargs):
+        start = time.monotonic()
+        try:
+            return _load_models_gpu(*args, **kwargs)
+        finally:
+            gpu_load_seconds.observe(time.monotonic() - start)
+
+    PromptServer.send_sync = send_sync
+    execution.PromptQueue.put = put
+    comfy.utils.load_torch_file = load_torch_file
+    comfy.model_management.load_models_gpu = load_models_gpu
+    torch.cuda.reset_peak_memory_stats = reset_peak_memory_stats
+
+    @PromptServer.instance.routes.get("/mxc/metrics")
+    async def metrics(request):
+        record_peaks()
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    if os.environ.get("MXC_METRICS_OTLP_PATH"):
+        OTLPFileExporter(os.environ["MXC_METRICS_OTLP_PATH"], registry, resource={"service.name": "mxc-comfyui"},
+                         interval=float(os.environ.get("MXC_METRICS_OTLP_INTERVAL", "60")), before_export=record_peaks)
+
+    logging.info("[mxc_metrics] Recording node execution and model load times at /mxc/metrics")
@@ -0,0 +1,90 @@
+"""
+MxC model cache: load models from a local-disk (and RAM) copy of the volume.
+
+Wraps folder_paths.get_full_path so loaders receive the local copy of a
+volume model once it is cached, and wraps execution.PromptQueue.put so the
+models of every queued prompt are copied to local disk before it runs.
+execution.PromptExecutor.execute is wrapped so the copies of a prompt's models
+are held, and cannot be evicted, while the prompt runs.
+Metrics are served at /mxc/model_cache/metrics.
+
+Enabled by the MXC_MODEL_CACHE_DIR and MXC_MODEL_CACHE_ROOT environment
+variables, which main.py sets for the ComfyUI process. model_cache.py and
+model_loaders.py are copied into this package when the image is built.
+"""
+
+import logging
+import os
+
+import execution
+import folder_paths
+from aiohttp import web
+from server import PromptServer
+
+from .model_cache import TieredModelCache
+from .model_loaders import workflow_models
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+CACHE_DIR = os.environ.get("MXC_MODEL_CACHE_DIR")
+CACHE_ROOT = os.environ.get("MXC_MODEL_CACHE_ROOT")
+
+
+def prompt_models(prompt):
+    """Volume paths of the models a prompt loads."""
+    paths = []
+    for folder, name in workflow_models(prompt):
+        try:
+            path = _get_full_path(folder, name)
+        except KeyError:
+            # Unknown model folder in this ComfyUI version
+            continue
+        if path:
+            paths.append(path)
+    return paths
+
+
+if CACHE_DIR and CACHE_ROOT:
+    cache = TieredModelCache(
+        CACHE_ROOT,
+        CACHE_DIR,
+        disk_bytes=int(float(os.environ.get("MXC_MODEL_CACHE_DISK_GB", "50")) * 1024 ** 3),
+        ram_bytes=int(float(os.environ.get("MXC_MODEL_CACHE_RAM_GB", "0")) * 1024 ** 3),
+        workers=int(os.environ.get("MXC_MODEL_CACHE_WORKERS", "2")),
+    )
+    _get_full_path = folder_paths.get_full_path
+    _put = execution.PromptQueue.put
+    _execute = execution.PromptExecutor.execute
+
+    def get_full_path(folder_name, filename):
+        path = _get_full_path(folder_name, filename)
+        return cache.resolve(path) if path else path
+
+    def put(self, item):
+        # Queue items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        try:
+            cache.prefetch(prompt_models(item[2]))
+        except Exception as e:
+            logging.warning(f"[mxc_model_cache] Prefetch failed: {e}")
+        return _put(self, item)
+
+    def execute(self, prompt, *args, **kwargs):
+        try:
+            paths = prompt_models(prompt)
+        except Exception as e:
+            logging.warning(f"[mxc_model_cache] Could not list the models of the prompt: {e}")
+            paths = []
+        with cache.hold(paths):
+            return _execute(self, prompt, *args, **kwargs)
+
+    folder_paths.get_full_path = get_full_path
+    execution.PromptQueue.put = put
+    execution.PromptExecutor.execute = execute
+
+    @PromptServer.instance.routes.get("/mxc/model_cache/metrics")
+    async def model_cache_metrics(request):
+        return web.json_response(cache.metrics())
+
+    logging.info(f"[mxc_model_cache] Caching models below {CACHE_ROOT} in {CACHE_DIR} "
+                 f"({len(cache.disk)} file(s) already cached)")
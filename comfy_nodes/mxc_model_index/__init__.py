@@ -0,0 +1,44 @@
+"""
+MxC model index: serve ComfyUI's model listings from the precomputed index.
+
+Replaces folder_paths.recursive_search for directories below the volume
+mount, so listing the model folders stats the known directories instead of
+walking the network-backed volume. Directories that changed since the index
+was built are rescanned and the index is saved again.
+
+Enabled by the MXC_MODEL_INDEX (index file) and MXC_MODEL_INDEX_ROOT (volume
+mount) environment variables, which main.py sets for the ComfyUI process.
+model_index.py is copied into this package when the image is built.
+"""
+
+import logging
+import os
+
+import folder_paths
+
+from .model_index import ModelIndex
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+INDEX_PATH = os.environ.get("MXC_MODEL_INDEX")
+INDEX_ROOT = os.environ.get("MXC_MODEL_INDEX_ROOT")
+
+if INDEX_PATH and INDEX_ROOT:
+    index = ModelIndex(INDEX_PATH)
+    root = os.path.normpath(INDEX_ROOT) + os.sep
+    _recursive_search = folder_paths.recursive_search
+
+    def recursive_search(directory, excluded_dir_names=None):
+        if not (os.path.normpath(directory) + os.sep).startswith(root):
+            return _recursive_search(directory, excluded_dir_names)
+        files, dirs = index.search(directory, excluded_dir_names)
+        try:
+            index.save()
+        except OSError as e:
+            logging.warning(f"[mxc_model_index] Could not save {INDEX_PATH}: {e}")
+        return files, dirs
+
+    folder_paths.recursive_search = recursive_search
+    logging.info(f"[mxc_model_index] Serving model listings below {INDEX_ROOT} from {INDEX_PATH} "
+                 f"({len(index.dirs)} directories indexed)")
@@ -0,0 +1,79 @@
+"""
+MxC prefetch: read the models of upcoming prompts into the page cache.
+
+Wraps execution.PromptQueue.put and get, so whenever a prompt is queued or
+starts running, the models of the next pending prompts are resolved through
+ComfyUI's model folders and read ahead while the current prompt executes.
+Metrics are served at /mxc/prefetch/metrics.
+
+Enabled by the MXC_PREFETCH_LOOKAHEAD environment variable, which main.py
+sets for the ComfyUI process. prefetch.py and model_loaders.py are copied
+into this package when the image is built.
+"""
+
+import logging
+import os
+
+import execution
+import folder_paths
+from aiohttp import web
+from server import PromptServer
+
+from .prefetch import QueuePrefetcher
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+LOOKAHEAD = int(os.environ.get("MXC_PREFETCH_LOOKAHEAD", "0"))
+
+
+def resolve(folder, name):
+    """First file named `name` in ComfyUI's folders for `folder`."""
+    try:
+        directories = folder_paths.get_folder_paths(folder)
+    except KeyError:
+        return None
+    for directory in directories:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def pending_prompts(queue):
+    """Prompts waiting in a PromptQueue, in execution order."""
+    with queue.mutex:
+        # Queue items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        return [item[2] for item in sorted(queue.queue, key=lambda item: item[0])]
+
+
+if LOOKAHEAD > 0:
+    prefetcher = QueuePrefetcher(resolve, lookahead=LOOKAHEAD,
+                                 workers=int(os.environ.get("MXC_PREFETCH_WORKERS", "2")))
+    _put = execution.PromptQueue.put
+    _get = execution.PromptQueue.get
+
+    def update(queue):
+        try:
+            prefetcher.update(pending_prompts(queue))
+        except Exception as e:
+            logging.warning(f"[mxc_prefetch] Prefetch failed: {e}")
+
+    def put(self, item):
+        result = _put(self, item)
+        update(self)
+        return result
+
+    def get(self, *args, **kwargs):
+        result = _get(self, *args, **kwargs)
+        update(self)
+        return result
+
+    execution.PromptQueue.put = put
+    execution.PromptQueue.get = get
+
+    @PromptServer.instance.routes.get("/mxc/prefetch/metrics")
+    async def prefetch_metrics(request):
+        return web.json_response(prefetcher.metrics())
+
+    logging.info(f"[mxc_prefetch] Prefetching the models of the next {LOOKAHEAD} queued prompt(s)")
@@ -0,0 +1,73 @@
+"""
+MxC profiler: write a per-node Chrome trace of every prompt.
+
+Feeds the events ComfyUI sends to its clients (PromptServer.send_sync) to a
+NodeProfiler, which records each node's wall time, cache hit, GPU time and
+memory peaks. Every finished prompt is written to the trace directory on
+the volume as <time>_<prompt id>.json; rank the node types across them with
+`python profiler.py report <dir>`.
+
+Enabled by the MXC_PROFILER_DIR environment variable, which main.py sets for
+the ComfyUI process. profiler.py is copied into this package when the image
+is built.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import execution
+import nodes
+from server import PromptServer
+
+from .profiler import NodeProfiler, TorchHooks, save_trace
+
+NODE_CLASS_MAPPINGS = {}
+NODE_DISPLAY_NAME_MAPPINGS = {}
+
+TRACE_DIR = os.environ.get("MXC_PROFILER_DIR")
+
+
+def package_of(class_type):
+    """Node package defining a class type ("comfy" for ComfyUI's own nodes)."""
+    node_class = nodes.NODE_CLASS_MAPPINGS.get(class_type)
+    # Set by ComfyUI when it loads a custom node package, e.g. "custom_nodes.comfyui-easy-use"
+    module = getattr(node_class, "RELATIVE_PYTHON_MODULE", None)
+    return module.split(".")[-1] if module else "comfy"
+
+
+if TRACE_DIR:
+    # Trace files go to the volume off the executor thread
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mxc-profiler")
+
+    def write(profile):
+        try:
+            save_trace(profile, TRACE_DIR)
+        except OSError as e:
+            logging.warning(f"[mxc_profiler] Could not write the trace of {profile['prompt_id']}: {e}")
+
+    profiler = NodeProfiler(
+        package_of=package_of,
+        hooks=TorchHooks() if os.environ.get("MXC_PROFILER_GPU", "1") == "1" else None,
+        on_profile=lambda profile: writer.submit(write, profile),
+    )
+
+    _send_sync = PromptServer.send_sync
+
+    def send_sync(self, event, data, sid=None):
+        try:
+            profiler.on_event(event, data)
+        except Exception as e:
+            logging.warning(f"[mxc_profiler] {e}")
+        return _send_sync(self, event, data, sid)
+
+    _put = execution.PromptQueue.put
+
+    def put(self, item):
+        # Queue items are (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+        profiler.add_prompt(item[1], item[2])
+        return _put(self, item)
+
+    PromptServer.send_sync = send_sync
+    execution.PromptQueue.put = put
+    logging.info(f"[mxc_profiler] Writing a Chrome trace of every prompt to {TRACE_DIR}")
@@ -0,0 +1,679 @@
+"""
+Custom node dependency management for the ComfyUI container.
+
+Merges the requirements.txt files found in the persistent custom_nodes
+directory into a single install, and caches the resulting site-packages
+changes as a layer on the volume, so later cold starts can unpack the layer
+instead of running the resolver again.
+
+Nodes listed in a custom nodes manifest can also be baked into the image at
+build time; see `python dependencies.py --help`.
+"""
+
+import argparse
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tarfile
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import SpecifierSet
+    from packaging.version import InvalidVersion, Version
+except ImportError:
+    # Without packaging, requirements are merged verbatim and not checked for conflicts
+    Requirement = None
+
+
+def _normalize_name(name: str) -> str:
+    """Normalize a distribution name the way pip compares them."""
+    return name.lower().replace("_", "-").replace(".", "-")
+
+
+class DependencyCache:
+    """
+    Hash-keyed cache of custom node dependencies stored on the volume.
+
+    A cache entry is a tar archive of every file that pip added or changed
+    under the Python prefix, plus a small JSON manifest describing which
+    distributions were replaced. Entries are keyed by the content of all
+    requirements files and the Python/torch ABI of the image.
+    """
+
+    def __init__(self, cache_dir: str, prefix: str = sys.prefix):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory on the volume where layers are stored
+            prefix: Python prefix the layers are installed into
+        """
+        self.cache_dir = Path(cache_dir)
+        self.prefix = Path(prefix).resolve()
+        self.site_packages = sysconfig.get_paths()["purelib"]
+
+    @staticmethod
+    def find_requirement_files(nodes_path: Path) -> List[Path]:
+        """
+        Collect the requirements.txt of every custom node, sorted by node name.
+
+        Args:
+            nodes_path: Path to the custom_nodes directory
+
+        Returns:
+            List of requirements.txt paths
+        """
+        req_files = []
+        for node_dir in sorted(nodes_path.iterdir()):
+            req_file = node_dir / "requirements.txt"
+            if node_dir.is_dir() and req_file.exists():
+                req_files.append(req_file)
+        return req_files
+
+    @staticmethod
+    def abi_tag() -> str:
+        """
+        Describe the interpreter and torch build the layer is compatible with.
+
+        Returns:
+            String such as "cpython-311|linux-x86_64|torch=2.5.1+cu124"
+        """
+        try:
+            torch_version = importlib.metadata.version("torch")
+        except importlib.metadata.PackageNotFoundError:
+            torch_version = "none"
+        return f"{sys.implementation.cache_tag}|{sysconfig.get_platform()}|torch={torch_version}"
+
+    def compute_key(self, req_files: List[Path], base: str = "") -> str:
+        """
+        Compute the cache key for a set of requirements files.
+
+        Files they include with -r/--requirement or -c/--constraint are
+        hashed too, so editing one invalidates the layer.
+
+        Args:
+            req_files: Requirements files as returned by find_requirement_files
+            base: Fingerprint of the dependencies baked into the image, if any
+
+        Returns:
+            Hex sha256 digest
+        """
+        digest = hashlib.sha256()
+        digest.update(self.abi_tag().encode())
+        digest.update(f"|base={base}".encode())
+        for req_file in req_files:
+            digest.update(b"\0" + req_file.parent.name.encode() + b"\0")
+            self._hash_requirements(digest, req_file, set())
+        return digest.hexdigest()
+
+    @staticmethod
+    def includes(req_file: Path) -> List[Path]:
+        """
+        List the files a requirements file includes with -r/--requirement or -c/--constraint.
+
+        Args:
+            req_file: Requirements file
+
+        Returns:
+            Included paths, resolved against the including file's directory
+        """
+        included = []
+        for raw in req_file.read_text(errors="replace").splitlines():
+            line = raw.split(" #", 1)[0].strip()
+            for option in ("--requirement", "--constraint", "-r", "-c"):
+                if line.startswith(option):
+                    target = Path(line[len(option):].lstrip("=").strip())
+                    included.append(target if target.is_absolute() else req_file.parent / target)
+                    break
+        return included
+
+    def _hash_requirements(self, digest, req_file: Path, seen: set):
+        """Hash a requirements file and, depth first, every file it includes."""
+        seen.add(req_file.resolve())
+        digest.update(req_file.read_bytes())
+        for included in self.includes(req_file):
+            digest.update(b"\0")
+            if included.resolve() in seen:
+                continue
+            if not included.is_file():
+                # pip fails on it; hashed so the key changes once it appears
+                digest.update(b"missing")
+                continue
+            self._hash_requirements(digest, included, seen)
+
+    def _layer_paths(self, key: str):
+        return self.cache_dir / f"{key}.tar", self.cache_dir / f"{key}.json"
+
+    def snapshot(self) -> Dict[str, str]:
+        """
+        Record the distributions currently installed in site-packages.
+
+        Returns:
+            Mapping of normalized distribution name to version
+        """
+        installed = {}
+        for dist in importlib.metadata.distributions(path=[self.site_packages]):
+            name = dist.metadata["Name"]
+            if name:
+                installed[_normalize_name(name)] = dist.version
+        return installed
+
+    def _distribution(self, name: str) -> Optional[importlib.metadata.Distribution]:
+        for dist in importlib.metadata.distributions(path=[self.site_packages]):
+            if dist.metadata["Name"] and _normalize_name(dist.metadata["Name"]) == name:
+                return dist
+        return None
+
+    def _distribution_files(self, dist: importlib.metadata.Distribution) -> List[Path]:
+        """Absolute paths of a distribution's files that live under the prefix."""
+        files = []
+        for file in dist.files or []:
+            path = Path(dist.locate_file(file)).resolve()
+            if path.is_file() and path.is_relative_to(self.prefix):
+                files.append(path)
+        return files
+
+    def save(self, key: str, before: Dict[str, str]) -> int:
+        """
+        Store every distribution that changed since `before` as a layer.
+
+        The archive is written to a temporary file and renamed into place so
+        that a concurrently starting container never sees a partial layer.
+
+        Args:
+            key: Cache key from compute_key
+            before: Snapshot taken before installing
+
+        Returns:
+            Number of distributions stored in the layer
+        """
+        after = self.snapshot()
+        changed = [name for name, version in after.items() if before.get(name) != version]
+        replaced = {name: before[name] for name in changed if name in before}
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tar_path, manifest_path = self._layer_paths(key)
+
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            with tarfile.open(tmp_name, "w") as tar:
+                for name in changed:
+                    dist = self._distribution(name)
+                    if dist is None:
+                        continue
+                    for path in self._distribution_files(dist):
+                        tar.add(path, arcname=str(path.relative_to(self.prefix)))
+            os.replace(tmp_name, tar_path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+        manifest = {
+            "abi": self.abi_tag(),
+            "installed": {name: after[name] for name in changed},
+            "replaced": replaced,
+        }
+        manifest_path.write_text(json.dumps(manifest, indent=2))
+        return len(changed)
+
+    def restore(self, key: str) -> bool:
+        """
+        Unpack the layer for `key` into the Python prefix if it exists.
+
+        Distributions the layer replaces are removed first so that an upgraded
+        package does not leave its old dist-info behind.
+
+        Args:
+            key: Cache key from compute_key
+
+        Returns:
+            True on a cache hit, False if pip has to run
+        """
+        tar_path, manifest_path = self._layer_paths(key)
+        if not tar_path.exists() or not manifest_path.exists():
+            return False
+
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, json.JSONDecodeError):
+            return False
+
+        for name, version in manifest.get("replaced", {}).items():
+            dist = self._distribution(name)
+            if dist is not None and dist.version == version:
+                files = self._distribution_files(dist)
+                for path in files:
+                    path.unlink(missing_ok=True)
+                # Drop directories the old version leaves empty (e.g. its dist-info)
+                for parent in sorted({p.parent for p in files}, key=lambda p: len(p.parts), reverse=True):
+                    if parent != self.prefix and parent.exists() and not any(parent.iterdir()):
+                        parent.rmdir()
+
+        with tarfile.open(tar_path, "r") as tar:
+            tar.extractall(self.prefix, filter="tar")
+        return True
+
+    def prune(self, keep: int = 3):
+        """
+        Delete all but the `keep` most recently written layers.
+
+        Args:
+            keep: Number of layers to keep
+        """
+        if not self.cache_dir.exists():
+            return
+        layers = sorted(self.cache_dir.glob("*.tar"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for tar_path in layers[keep:]:
+            tar_path.unlink(missing_ok=True)
+            tar_path.with_suffix(".json").unlink(missing_ok=True)
+
+
+class RequirementsMerger:
+    """
+    Merge the requirements of every custom node into one constraint set.
+
+    Requirements naming the same package are combined into a single line with
+    the intersection of their specifiers. Packages whose specifiers cannot be
+    satisfied together are reported in `conflicts` and left unpinned so the
+    resolver picks one version for all nodes. Packages listed in `protected`
+    (torch and friends) are never installed by nodes; the image provides them.
+    """
+
+    def __init__(self, req_files: List[Path], protected: Optional[Dict[str, str]] = None):
+        """
+        Initialize the merger.
+
+        Args:
+            req_files: Requirements files, one per custom node
+            protected: Mapping of normalized package name to installed version
+        """
+        self.req_files = req_files
+        self.protected = protected or {}
+        self.conflicts: List[Dict[str, object]] = []
+
+    @staticmethod
+    def _read_lines(req_file: Path) -> List[str]:
+        """Read a requirements file, dropping comments and resolving relative includes."""
+        lines = []
+        for raw in req_file.read_text(errors="replace").splitlines():
+            line = raw.split(" #", 1)[0].strip()
+            if not line or line.startswith("#"):
+                continue
+            for option in ("-r ", "--requirement ", "-c ", "--constraint "):
+                if line.startswith(option):
+                    target = Path(line[len(option):].strip())
+                    if not target.is_absolute():
+                        target = req_file.parent / target
+                    line = f"{option.strip()} {target}"
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def _bounds_conflict(specifier: "SpecifierSet") -> bool:
+        """
+        Best-effort check whether a combined specifier excludes every version.
+
+        Only exact pins and lower/upper bounds are considered; wildcard pins and
+        exclusions are left to the resolver.
+        """
+        lower, upper, pins = None, None, set()
+        try:
+            for spec in specifier:
+                if spec.version.endswith(".*"):
+                    continue
+                version = Version(spec.version)
+                if spec.operator in ("==", "==="):
+                    pins.add(version)
+                elif spec.operator in (">=", ">", "~="):
+                    lower = version if lower is None else max(lower, version)
+                elif spec.operator in ("<=", "<"):
+                    upper = version if upper is None else min(upper, version)
+        except InvalidVersion:
+            return False
+        if len(pins) > 1:
+            return True
+        if pins and not specifier.contains(next(iter(pins)), prereleases=True):
+            return True
+        return lower is not None and upper is not None and lower > upper
+
+    def merge(self) -> List[str]:
+        """
+        Build the merged requirements.
+
+        Returns:
+            Lines of a requirements file covering every custom node
+        """
+        self.conflicts = []
+        options: List[str] = []
+        passthrough: List[str] = []
+        merged: Dict[str, Dict[str, object]] = {}
+
+        for req_file in self.req_files:
+            node = req_file.parent.name
+            for line in self._read_lines(req_file):
+                if line.startswith("-"):
+                    if line not in options:
+                        options.append(line)
+                    continue
+
+                req = None
+                if Requirement is not None:
+                    try:
+                        req = Requirement(line)
+                    except InvalidRequirement:
+                        req = None
+
+                # URLs, markers and unparsable lines are installed exactly as written
+                if req is None or req.url or req.marker:
+                    if line not in passthrough:
+                        passthrough.append(line)
+                    continue
+
+                name = _normalize_name(req.name)
+                entry = merged.setdefault(name, {"name": req.name, "extras": set(), "nodes": {}})
+                entry["extras"].update(req.extras)
+                previous = entry["nodes"].get(node)
+                entry["nodes"][node] = ",".join(filter(None, [previous, str(req.specifier)]))
+
+        requirements = []
+        for name, entry in merged.items():
+            specifier = SpecifierSet()
+            for spec in entry["nodes"].values():
+                specifier &= SpecifierSet(spec)
+
+            if name in self.protected:
+                installed = self.protected[name]
+                if specifier and not specifier.contains(installed, prereleases=True):
+                    self.conflicts.append({"package": name, "nodes": entry["nodes"], "installed": installed})
+                continue
+
+            if self._bounds_conflict(specifier):
+                self.conflicts.append({"package": name, "nodes": entry["nodes"]})
+                specifier = SpecifierSet()
+
+            extras = f"[{','.join(sorted(entry['extras']))}]" if entry["extras"] else ""
+            requirements.append(f"{entry['name']}{extras}{specifier}")
+
+        return options + sorted(requirements, key=str.lower) + passthrough
+
+
+class DependencyInstaller:
+    """Install a merged requirements set in a single resolver pass."""
+
+    def __init__(self, installer: str = "pip", protected: Optional[Dict[str, str]] = None):
+        """
+        Initialize the installer.
+
+        Args:
+            installer: "pip" or "uv"; uv falls back to pip if it is not on PATH
+            protected: Mapping of package name to version that must not change
+        """
+        self.installer = installer.strip().lower()
+        self.protected = protected or {}
+
+    @staticmethod
+    def installed_versions(names: List[str]) -> Dict[str, str]:
+        """
+        Look up the installed versions of the given packages.
+
+        Args:
+            names: Package names
+
+        Returns:
+            Mapping of normalized name to version, for the installed ones only
+        """
+        versions = {}
+        for name in names:
+            try:
+                versions[_normalize_name(name)] = importlib.metadata.version(name)
+            except importlib.metadata.PackageNotFoundError:
+                continue
+        return versions
+
+    def command(self, requirements_path: Path, constraints_path: Path) -> List[str]:
+        """
+        Build the install command for the configured backend.
+
+        Args:
+            requirements_path: Merged requirements file
+            constraints_path: Constraints pinning the protected packages
+
+        Returns:
+            Command line as a list
+        """
+        if self.installer == "uv" and shutil.which("uv"):
+            return ["uv", "pip", "install", "--system", "-r", str(requirements_path), "-c", str(constraints_path)]
+        if self.installer not in ("pip", "uv"):
+            print(f"⚠ Unknown installer '{self.installer}', using pip")
+        elif self.installer == "uv":
+            print("⚠ uv not found on PATH, using pip")
+        return [sys.executable, "-m", "pip", "install", "-r", str(requirements_path), "-c", str(constraints_path)]
+
+    def install(self, requirements: List[str]) -> int:
+        """
+        Install the merged requirements.
+
+        Args:
+            requirements: Lines from RequirementsMerger.merge
+
+        Returns:
+            Return code of the installer
+        """
+        if not requirements:
+            return 0
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            requirements_path = Path(tmp_dir) / "requirements.txt"
+            constraints_path = Path(tmp_dir) / "constraints.txt"
+            requirements_path.write_text("\n".join(requirements) + "\n")
+            constraints_path.write_text(
+                "".join(f"{name}=={version}\n" for name, version in self.protected.items()))
+            return subprocess.run(self.command(requirements_path, constraints_path), check=False).returncode
+
+
+def format_conflict(conflict: Dict[str, object]) -> str:
+    """
+    Describe a conflict reported by RequirementsMerger for the startup log.
+
+    Args:
+        conflict: Entry from RequirementsMerger.conflicts
+
+    Returns:
+        Human-readable one-line description
+    """
+    nodes = ", ".join(f"{node} ({spec or 'any'})" for node, spec in conflict["nodes"].items())
+    if "installed" in conflict:
+        return f"{conflict['package']} is provided by the image ({conflict['installed']}) but required as: {nodes}"
+    return f"{conflict['package']} has incompatible requirements: {nodes}"
+
+
+# ===========================
+# Build-time baking
+# ===========================
+
+def requirements_digest(data: bytes) -> str:
+    """
+    Hash the content of a requirements.txt file.
+
+    Args:
+        data: Raw file content
+
+    Returns:
+        Hex sha256 digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def build_manifest(requirements: Dict[str, bytes]) -> Dict[str, object]:
+    """
+    Build a custom nodes manifest from the raw requirements of each node.
+
+    Args:
+        requirements: Mapping of node directory name to requirements.txt content
+
+    Returns:
+        Manifest with a fingerprint over all nodes and their requirements
+    """
+    nodes = {
+        name: {"digest": requirements_digest(data), "requirements": data.decode(errors="replace")}
+        for name, data in sorted(requirements.items())
+    }
+    fingerprint = hashlib.sha256(
+        json.dumps({name: node["digest"] for name, node in nodes.items()}, sort_keys=True).encode()
+    ).hexdigest()
+    return {"fingerprint": fingerprint, "nodes": nodes}
+
+
+def manifest_from_directory(nodes_path: Path) -> Dict[str, object]:
+    """
+    Build a manifest from a local copy of the custom_nodes directory.
+
+    Args:
+        nodes_path: Path to the custom_nodes directory
+
+    Returns:
+        Manifest as returned by build_manifest
+    """
+    req_files = DependencyCache.find_requirement_files(nodes_path)
+    return build_manifest({req_file.parent.name: req_file.read_bytes() for req_file in req_files})
+
+
+def manifest_from_volume(volume_name: str, nodes_dir_name: str = "custom_nodes") -> Dict[str, object]:
+    """
+    Build a manifest from the custom_nodes directory of a Modal volume.
+
+    Args:
+        volume_name: Name of the Modal volume
+        nodes_dir_name: Directory inside the volume holding the custom nodes
+
+    Returns:
+        Manifest as returned by build_manifest
+    """
+    import modal
+
+    volume = modal.Volume.from_name(volume_name)
+    requirements = {}
+    for entry in volume.listdir(nodes_dir_name):
+        if entry.type != modal.volume.FileEntryType.DIRECTORY:
+            continue
+        node = Path(entry.path).name
+        try:
+            requirements[node] = b"".join(volume.read_file(f"{nodes_dir_name}/{node}/requirements.txt"))
+        except FileNotFoundError:
+            continue
+    return build_manifest(requirements)
+
+
+def load_baked_record(record_path: str) -> Dict[str, object]:
+    """
+    Load the record of dependencies baked into the image.
+
+    Args:
+        record_path: Path written by bake()
+
+    Returns:
+        Record with "fingerprint" and per-node "nodes" digests; empty if absent
+    """
+    try:
+        return json.loads(Path(record_path).read_text())
+    except (OSError, json.JSONDecodeError):
+        return {"fingerprint": "", "nodes": {}}
+
+
+def bake(manifest_path: str, record_path: str, installer: str = "pip", protected_names: Tuple[str, ...] = ()) -> int:
+    """
+    Install the merged requirements of a manifest into the current environment.
+
+    Runs during the image build. The record lists the nodes whose requirements
+    are covered, so setup_dependencies can skip them at runtime. If the
+    install fails the record stays empty and every node is installed at
+    runtime instead, so a broken node never blocks a deploy.
+
+    Args:
+        manifest_path: Manifest written by `python dependencies.py manifest`
+        record_path: Where to write the baked record
+        installer: "pip" or "uv"
+        protected_names: Packages provided by the image
+
+    Returns:
+        Return code of the installer
+    """
+    manifest = json.loads(Path(manifest_path).read_text())
+    record = {"fingerprint": manifest["fingerprint"], "nodes": {}}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        req_files = []
+        for name, node in manifest["nodes"].items():
+            req_file = Path(tmp_dir) / name / "requirements.txt"
+            req_file.parent.mkdir(parents=True)
+            req_file.write_text(node["requirements"])
+            req_files.append(req_file)
+
+        protected = DependencyInstaller.installed_versions(list(protected_names))
+        merger = RequirementsMerger(req_files, protected=protected)
+        requirements = merger.merge()
+        for conflict in merger.conflicts:
+            print(f"⚠ {format_conflict(conflict)}")
+
+        print(f"Baking {len(requirements)} merged requirement(s) from {len(req_files)} node(s)")
+        returncode = DependencyInstaller(installer, protected=protected).install(requirements)
+
+    if returncode == 0:
+        record["nodes"] = {name: node["digest"] for name, node in manifest["nodes"].items()}
+        print(f"✓ Baked dependencies ({record['fingerprint'][:12]})")
+    else:
+        print(f"⚠ Baking failed with code {returncode}; nodes will be installed at runtime")
+
+    Path(record_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(record_path).write_text(json.dumps(record, indent=2))
+    return returncode
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Manage custom node dependencies for the ComfyUI image.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    manifest_cmd = commands.add_parser("manifest", help="Snapshot custom node requirements into a manifest")
+    source = manifest_cmd.add_mutually_exclusive_group(required=True)
+    source.add_argument("--volume", help="Read custom nodes from this Modal volume")
+    source.add_argument("--local", help="Read custom nodes from this local directory")
+    manifest_cmd.add_argument("--nodes-dir", default="custom_nodes", help="custom_nodes directory inside the volume")
+    manifest_cmd.add_argument("-o", "--output", default="custom_nodes_manifest.json")
+
+    bake_cmd = commands.add_parser("bake", help="Install a manifest's requirements (image build step)")
+    bake_cmd.add_argument("manifest")
+    bake_cmd.add_argument("--record", required=True, help="Where to write the baked record")
+    bake_cmd.add_argument("--installer", default="pip")
+    bake_cmd.add_argument("--protected", nargs="*", default=[])
+    bake_cmd.add_argument("--fingerprint", help="Expected manifest fingerprint (tags the image layer)")
+
+    args = parser.parse_args()
+
+    if args.command == "manifest":
+        if args.volume:
+            manifest = manifest_from_volume(args.volume, args.nodes_dir)
+        else:
+            manifest = manifest_from_directory(Path(args.local))
+        Path(args.output).write_text(json.dumps(manifest, indent=2))
+        print(f"✓ Wrote {args.output} with {len(manifest['nodes'])} node(s) ({manifest['fingerprint'][:12]})")
+        return
+
+    if args.fingerprint:
+        actual = json.loads(Path(args.manifest).read_text())["fingerprint"]
+        if actual != args.fingerprint:
+            print(f"✗ Manifest fingerprint {actual[:12]} does not match {args.fingerprint[:12]}")
+            sys.exit(1)
+    bake(args.manifest, args.record, args.installer, tuple(args.protected))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Parallel, resumable model downloader for Hugging Face and CivitAI.
+
+Downloads the models listed in a manifest into the model folders configured
+in [MODEL_PATHS]. Large files are fetched in parallel chunks with HTTP range
+requests; finished chunks are recorded next to the partial file so an
+interrupted download resumes where it stopped. Each file is verified against
+its sha256 (when given) and moved into place atomically, so ComfyUI never
+sees a half-written model.
+
+Manifest format (YAML or JSON):
+
+    models:
+      - url: https://huggingface.co/<repo>/resolve/main/model.safetensors
+        folder: checkpoints            # a [MODEL_PATHS] key
+        filename: model.safetensors    # optional, defaults to the URL's file name
+        sha256: 0123abcd...            # optional
+
+Usage:
+
+    python downloader.py models.yaml --dest ./models
+    modal run main.py::download --manifest models.yaml     # into the volume
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# Size of each ranged request
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Read buffer for streaming responses and hashing
+BUFFER_SIZE = 1024 * 1024
+
+USER_AGENT = "MxC-downloader/1.0"
+
+
+class DownloadError(Exception):
+    """Raised when a model cannot be downloaded or fails verification."""
+
+
+class StripAuthRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """
+    Follow redirects, dropping the Authorization header when they leave the host.
+
+    urllib forwards every header to the redirect target, which would hand the
+    Hugging Face or CivitAI token to the CDN and can break presigned URLs.
+    """
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        request = super().redirect_request(req, fp, code, msg, headers, newurl)
+        old_host, new_host = (urllib.parse.urlparse(u).hostname for u in (req.full_url, newurl))
+        if request is not None and new_host != old_host:
+            request.remove_header("Authorization")
+        return request
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Load and validate a download manifest.
+
+    Args:
+        path: Manifest file (YAML or JSON)
+
+    Returns:
+        List of entries with url, folder, filename and optional sha256
+    """
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    entries = data.get("models", []) if isinstance(data, dict) else data
+    models = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("url") or not entry.get("folder"):
+            raise ValueError(f"Manifest entry {index} needs at least 'url' and 'folder'")
+        filename = entry.get("filename") or Path(urllib.parse.urlparse(entry["url"]).path).name
+        models.append({"url": entry["url"], "folder": entry["folder"], "filename": filename,
+                       "sha256": (entry.get("sha256") or "").lower() or None})
+    return models
+
+
+def volume_folders(model_paths: Dict[str, str], volume_mount_location: str) -> Dict[str, str]:
+    """
+    Map each [MODEL_PATHS] key to its first folder inside the volume.
+
+    Args:
+        model_paths: Output of ModelPathsGenerator.get_model_paths
+        volume_mount_location: Where the volume is mounted in the container
+
+    Returns:
+        Mapping of model type to folder relative to the volume root
+    """
+    mount = volume_mount_location.rstrip("/") + "/"
+    folders = {}
+    for key, value in model_paths.items():
+        for path in value.split("\n"):
+            path = path.strip()
+            if path.startswith(mount):
+                folders[key] = path[len(mount):].strip("/")
+                break
+    return folders
+
+
+def sha256_file(path: Path) -> str:
+    """Compute the sha256 of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Downloader:
+    """Download manifest entries with a bounded pool of ranged requests."""
+
+    def __init__(self, dest: str, folders: Optional[Dict[str, str]] = None,
+                 hf_token: Optional[str] = None, civitai_token: Optional[str] = None,
+                 concurrency: int = 8, chunk_size: int = DEFAULT_CHUNK_SIZE, retries: int = 3,
+                 store=None):
+        """
+        Initialize the downloader.
+
+        Args:
+            dest: Root directory to download into (the volume mount)
+            folders: Mapping of manifest folder to directory relative to dest
+            hf_token: Hugging Face token, sent to huggingface.co
+            civitai_token: CivitAI token, sent to civitai.com
+            concurrency: Maximum number of requests in flight across all files
+            chunk_size: Bytes per ranged request
+            retries: Attempts per request before giving up
+            store: ModelStore that downloaded files are moved into (optional)
+        """
+        self.dest = Path(dest)
+        self.folders = folders or {}
+        self.hf_token = hf_token
+        self.civitai_token = civitai_token
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.store = store
+        self.pool = ThreadPoolExecutor(max_workers=concurrency)
+        self.opener = urllib.request.build_opener(StripAuthRedirectHandler)
+
+    def target_path(self, entry: Dict[str, Any]) -> Path:
+        """Where a manifest entry is stored."""
+        return self.dest / self.folders.get(entry["folder"], entry["folder"]) / entry["filename"]
+
+    def _auth_headers(self, url: str) -> Dict[str, str]:
+        host = urllib.parse.urlparse(url).hostname or ""
+        if self.hf_token and (host == "huggingface.co" or host.endswith(".huggingface.co")):
+            return {"Authorization": f"Bearer {self.hf_token}"}
+        if self.civitai_token and (host == "civitai.com" or host.endswith(".civitai.com")):
+            return {"Authorization": f"Bearer {self.civitai_token}"}
+        return {}
+
+    def _open(self, url: str, headers: Dict[str, str]):
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, **headers})
+        return self.opener.open(request, timeout=60)
+
+    def probe(self, url: str) -> Tuple[str, Optional[int], bool]:
+        """
+        Resolve redirects and find the file size and range support.
+
+        Tokens are only sent to the original host: they are dropped when a
+        redirect leaves it, and the resolved URL (usually a signed CDN link)
+        is fetched without them.
+
+        Args:
+            url: Manifest URL
+
+        Returns:
+            Tuple of (resolved URL, size or None, whether ranges are supported)
+        """
+        with self._open(url, {**self._auth_headers(url), "Range": "bytes=0-0"}) as response:
+            resolved = response.geturl()
+            content_range = response.headers.get("Content-Range", "")
+            if response.status == 206 and "/" in content_range:
+                total = content_range.rsplit("/", 1)[1]
+                return resolved, int(total) if total.isdigit() else None, total.isdigit()
+            length = response.headers.get("Content-Length")
+            return resolved, int(length) if length else None, False
+
+    def _with_retries(self, func, *args):
+        for attempt in range(1, self.retries + 1):
+            try:
+                return func(*args)
+            except (urllib.error.URLError, ConnectionError, TimeoutError, DownloadError) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"{e} (after {attempt} attempts)") from e
+                time.sleep(2 ** attempt)
+
+    def _fetch_chunk(self, url: str, headers: Dict[str, str], part_path: Path, start: int, end: int):
+        with self._open(url, {**headers, "Range": f"bytes={start}-{end}"}) as response:
+            if response.status != 206:
+                raise DownloadError(f"Server ignored range request for bytes {start}-{end}")
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                written = 0
+                while data := response.read(BUFFER_SIZE):
+                    f.write(data)
+                    written += len(data)
+        if written != end - start + 1:
+            raise DownloadError(f"Short read for bytes {start}-{end}: got {written}")
+
+    def _fetch_whole(self, url: str, headers: Dict[str, str], part_path: Path):
+        with self._open(url, headers) as response, open(part_path, "wb") as f:
+            while data := response.read(BUFFER_SIZE):
+                f.write(data)
+
+    def download(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Download one manifest entry, resuming a previous partial download.
+
+        Args:
+            entry: Entry from load_manifest
+
+        Returns:
+            Summary with path, size, sha256 and whether it was skipped
+        """
+        target = self.target_path(entry)
+        if target.exists() and (entry["sha256"] is None or sha256_file(target) == entry["sha256"]):
+            return {"path": str(target), "size": target.stat().st_size, "skipped": True}
+        if self.store and entry["sha256"] and self.store.has(entry["sha256"]):
+            # Same content already downloaded for another folder
+            self.store.link(entry["sha256"], target)
+            return {"path": str(target), "size": target.stat().st_size, "skipped": True}
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        part_path = target.with_name(target.name + ".part")
+        state_path = target.with_name(target.name + ".part.json")
+
+        url, size, ranged = self.pool.submit(self._with_retries, self.probe, entry["url"]).result()
+        headers = self._auth_headers(url) if url == entry["url"] else {}
+
+        if ranged and size:
+            state = {}
+            if state_path.exists() and part_path.exists():
+                state = json.loads(state_path.read_text())
+            if state.get("url") != entry["url"] or state.get("size") != size or state.get("chunk_size") != self.chunk_size:
+                state = {"url": entry["url"], "size": size, "chunk_size": self.chunk_size, "done": []}
+                with open(part_path, "wb") as f:
+                    f.truncate(size)
+                state_path.write_text(json.dumps(state))
+
+            done = set(state["done"])
+            chunks = [i for i in range((size + self.chunk_size - 1) // self.chunk_size) if i not in done]
+            futures = {
+                self.pool.submit(self._with_retries, self._fetch_chunk, url, headers, part_path,
+                                 i * self.chunk_size, min(size, (i + 1) * self.chunk_size) - 1): i
+                for i in chunks
+            }
+            error = None
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # Stop queued chunks but keep recording the ones still finishing
+                    error = error or e
+                    for pending in futures:
+                        pending.cancel()
+                    continue
+                done.add(futures[future])
+                state["done"] = sorted(done)
+                state_path.write_text(json.dumps(state))
+            if error:
+                raise error
+        else:
+            # No range support: the file has to be fetched in one piece, still within the request pool
+            self.pool.submit(self._with_retries, self._fetch_whole, url, headers, part_path).result()
+
+        digest = sha256_file(part_path)
+        if entry["sha256"] and digest != entry["sha256"]:
+            part_path.unlink(missing_ok=True)
+            state_path.unlink(missing_ok=True)
+            raise DownloadError(f"sha256 mismatch for {entry['filename']}: expected {entry['sha256']}, got {digest}")
+
+        with open(part_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(part_path, target)
+        state_path.unlink(missing_ok=True)
+        if self.store:
+            self.store.ingest(target, digest)
+            self.store.save_index()
+        return {"path": str(target), "size": target.stat().st_size, "sha256": digest, "skipped": False}
+
+    def download_all(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Download every entry; files run side by side and share the request pool.
+
+        Args:
+            entries: Entries from load_manifest
+
+        Returns:
+            One summary per entry; failed entries carry an "error"
+        """
+        results = []
+        with ThreadPoolExecutor(max_workers=max(1, len(entries))) as files:
+            futures = {files.submit(self.download, entry): entry for entry in entries}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    result = future.result()
+                    status = "skipped (exists)" if result["skipped"] else f"{result['size'] / 1024 ** 2:.1f} MB"
+                    print(f"  ✓ {entry['folder']}/{entry['filename']} {status}")
+                except Exception as e:
+                    result = {"path": str(self.target_path(entry)), "error": str(e)}
+                    print(f"  ✗ {entry['folder']}/{entry['filename']}: {e}")
+                results.append(result)
+        return results
+
+    def close(self):
+        """Shut down the request pool."""
+        self.pool.shutdown()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Download models listed in a manifest.")
+    parser.add_argument("manifest")
+    parser.add_argument("--dest", required=True, help="Root directory, e.g. the volume mount")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chunk-size-mb", type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument("--config", default="config.ini", help="config.ini used to map folders to [MODEL_PATHS]")
+    args = parser.parse_args()
+
+    folders = {}
+    if Path(args.config).exists():
+        from generate_model_paths import ModelPathsGenerator
+
+        generator = ModelPathsGenerator(config_file=args.config)
+        if generator.load_config():
+            mount = generator.get_filesystem_config()["volume_mount_location"]
+            folders = volume_folders(generator.get_model_paths(), mount)
+
+    downloader = Downloader(
+        args.dest,
+        folders=folders,
+        hf_token=os.getenv("HF_TOKEN"),
+        civitai_token=os.getenv("CIVITAI_API_TOKEN"),
+        concurrency=args.concurrency,
+        chunk_size=args.chunk_size_mb * 1024 * 1024,
+    )
+    try:
+        results = downloader.download_all(load_manifest(args.manifest))
+    finally:
+        downloader.close()
+    if any("error" in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -144,6 +144,33 @@ class ModelPathsGenerator:
             "vae_approx": f"{comfyui}/models/vae_approx",
         }
 
+    def generate_model_index(self, index_path: str) -> Dict[str, int]:
+        """
+        Precompute the file listings of every model folder on the volume.
+
+        Must run where the volume is mounted (inside the container). An
+        existing index is refreshed incrementally: only directories whose
+        mtime changed are rescanned, and the sizes of files overwritten in
+        place are updated.
+
+        Args:
+            index_path: Index file, usually on the volume
+
+        Returns:
+            Number of directories rescanned and reused, and of file sizes updated
+        """
+        from model_index import ModelIndex
+        from model_store import volume_model_dirs
+
+        fs_config = self.get_filesystem_config() or {}
+        mount = fs_config.get("volume_mount_location", "/root/per_comfy-storage")
+        directories = [f"{mount}/{folder}" for folder in volume_model_dirs(self.get_model_paths(), mount)]
+
+        index = ModelIndex(index_path)
+        stats = index.refresh(directories, check_files=True)
+        index.save()
+        return stats
+
     def generate(self) -> bool:
         """
         Generate the extra_model_paths.yaml file.
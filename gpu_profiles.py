@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+GPU-type-aware cost and throughput profiles, and per-workflow GPU selection.
+
+Every API workflow normally runs on the single [RESOURCES] gpu_type, so a
+small SD 1.5 preview pays for the same GPU as a Flux upscale. With
+[GPU_PROFILES] enabled, main.py deploys one ComfyUIContainer pool per
+[GPU_PROFILE.<name>] section, and GPUClassifier sends each workflow to the
+cheapest pool that can run it:
+
+1. VRAM: the size of the workflow's model files, taken from the model index
+   (model_index.py) without touching the volume, times vram_overhead, plus
+   vram_per_megapixel_gb for every megapixel of its latent batch.
+2. Latency: the expected execution time on the pool must meet the request's
+   max_latency. Estimates come from ThroughputTable, filled offline from
+   bench_workload.py results with `fit`; pools not benchmarked yet are
+   scaled from one that was by their relative_speed.
+3. Cost: price_per_hour times the expected execution time.
+
+When no pool meets the latency target, the fastest pool with enough VRAM is
+used; when none has enough VRAM, the one with the most (ComfyUI offloads
+what does not fit).
+
+Fit the throughput table from a benchmark run against one pool, then check
+where a workflow would go:
+
+    python bench_workload.py workload.jsonl --url "<route url>?gpu_profile=t4" --label t4 --json t4.json
+    python gpu_profiles.py fit t4.json --profile t4 --index model_index.json --table gpu_throughput.json
+    python gpu_profiles.py classify workflow_api.json --index model_index.json --table gpu_throughput.json
+"""
+
+import argparse
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from batching import batch_signature
+from model_loaders import workflow_models
+
+# Bumped when the throughput table format changes
+TABLE_VERSION = 1
+
+# Latent size assumed for workflows that do not create an empty latent (img2img, upscales)
+DEFAULT_MEGAPIXELS = 1.0
+
+# Model weights assumed per workflow when none of its models are in the index
+DEFAULT_MODEL_GB = 2.0
+
+
+def workflow_work(workflow: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Size of the sampling work of a workflow.
+
+    Args:
+        workflow: Workflow graph in API format
+
+    Returns:
+        Largest latent batch in megapixels (width x height x batch size x
+        frames of every Empty*Latent* node) and the total sampler steps
+    """
+    megapixels, steps = 0.0, 0
+    for node in workflow.values():
+        inputs = node.get("inputs", {})
+        width, height = inputs.get("width"), inputs.get("height")
+        if "Latent" in node.get("class_type", "") and isinstance(width, int) and isinstance(height, int):
+            batch = inputs.get("batch_size") if isinstance(inputs.get("batch_size"), int) else 1
+            frames = inputs.get("length") if isinstance(inputs.get("length"), int) else 1
+            megapixels = max(megapixels, width * height * batch * frames / 1e6)
+        if isinstance(inputs.get("steps"), int):
+            steps += inputs["steps"]
+    return {"megapixels": megapixels or DEFAULT_MEGAPIXELS, "steps": max(steps, 1)}
+
+
+def index_model_size(index, folders: Dict[str, List[str]]) -> Callable[[str, str], Optional[int]]:
+    """
+    Look up model file sizes in the model index.
+
+    Args:
+        index: ModelIndex of the volume
+        folders: Model folder to absolute directories, in search order (ModelPathsResolver.folders)
+
+    Returns:
+        Function mapping (model folder, file name) to a size in bytes, or None
+    """
+    def size(folder: str, name: str) -> Optional[int]:
+        for directory in folders.get(folder, []):
+            found = index.size(os.path.join(directory, name))
+            if found is not None:
+                return found
+        return None
+
+    return size
+
+
+class ThroughputTable:
+    """Measured execution times of workflows on each GPU profile."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the table, reading the table file if it exists.
+
+        Args:
+            path: Table file (None keeps the table in memory)
+        """
+        self.path = path
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Read the table file again, e.g. after new benchmark results were fitted."""
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == TABLE_VERSION:
+            with self._lock:
+                self.profiles = data.get("profiles", {})
+
+    def record(self, profile: str, workflow: Dict[str, Any], seconds: float, work: float):
+        """
+        Add one execution of a workflow on a profile.
+
+        Args:
+            profile: GPU profile name
+            workflow: Workflow graph in API format
+            seconds: Execution time
+            work: Work units of the workflow (GPUClassifier.work_units)
+        """
+        with self._lock:
+            entry = self.profiles.setdefault(profile, {"work": 0.0, "seconds": 0.0, "runs": 0, "workflows": {}})
+            entry["work"] += work
+            entry["seconds"] += seconds
+            entry["runs"] += 1
+            known = entry["workflows"].setdefault(batch_signature(workflow), {"seconds": 0.0, "runs": 0})
+            known["seconds"] += (seconds - known["seconds"]) / (known["runs"] + 1)
+            known["runs"] += 1
+
+    def throughput(self, profile: str) -> Optional[float]:
+        """Work units per second of a profile, or None when it was never measured."""
+        entry = self.profiles.get(profile)
+        if not entry or entry["seconds"] <= 0:
+            return None
+        return entry["work"] / entry["seconds"]
+
+    def estimate(self, profile: str, workflow: Dict[str, Any], work: float,
+                 speeds: Dict[str, float]) -> Optional[float]:
+        """
+        Expected execution time of a workflow on a profile.
+
+        Args:
+            profile: GPU profile name
+            workflow: Workflow graph in API format
+            work: Work units of the workflow
+            speeds: relative_speed of every profile
+
+        Returns:
+            Seconds measured for this workflow on the profile, else its work
+            over the profile's throughput, else the same scaled from the most
+            measured other profile by relative speed; None without any data
+        """
+        signature = batch_signature(workflow)
+        with self._lock:
+            measured = [name for name in self.profiles if name in speeds and self.throughput(name)]
+            if profile in measured:
+                references = [profile]
+            else:
+                references = sorted(measured, key=lambda name: self.profiles[name]["runs"], reverse=True)[:1]
+            for reference in references:
+                scale = speeds[reference] / speeds[profile] if profile in speeds else 1.0
+                known = self.profiles[reference]["workflows"].get(signature)
+                if known:
+                    return known["seconds"] * scale
+                return work / self.throughput(reference) * scale
+        return None
+
+    def save(self):
+        """Write the table atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": TABLE_VERSION, "profiles": self.profiles}, f, indent=2)
+            os.replace(tmp, self.path)
+
+
+class GPUClassifier:
+    """Choose the cheapest GPU profile that fits a workflow's VRAM and latency needs."""
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], table: ThroughputTable,
+                 model_size: Callable[[str, str], Optional[int]], vram_overhead: float = 1.2,
+                 vram_per_megapixel_gb: float = 1.5):
+        """
+        Initialize the classifier.
+
+        Args:
+            profiles: [GPU_PROFILE.<name>] settings by name (gpu_type, vram_gb, price_per_hour, relative_speed)
+            table: Measured throughput of the profiles
+            model_size: Maps (model folder, file name) to a size in bytes, or None (index_model_size)
+            vram_overhead: Factor applied to the model weights for activations and framework memory
+            vram_per_megapixel_gb: VRAM needed per megapixel of latent batch
+        """
+        self.profiles = profiles
+        self.table = table
+        self.model_size = model_size
+        self.vram_overhead = vram_overhead
+        self.vram_per_megapixel_gb = vram_per_megapixel_gb
+        self.speeds = {name: profile["relative_speed"] for name, profile in profiles.items()}
+        self.stats: Dict[str, int] = {name: 0 for name in profiles}
+
+    def requirements(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Model weights, sampling work and VRAM needed by a workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+
+        Returns:
+            Dict with model_gb, unknown_models, megapixels, steps, work and vram_gb
+        """
+        total, unknown = 0, []
+        for folder, name in workflow_models(workflow):
+            size = self.model_size(folder, name)
+            if size is None:
+                unknown.append(f"{folder}/{name}")
+            else:
+                total += size
+        model_gb = total / 1024 ** 3 if total else DEFAULT_MODEL_GB
+        work = workflow_work(workflow)
+        return {
+            "model_gb": model_gb,
+            "unknown_models": unknown,
+            "megapixels": work["megapixels"],
+            "steps": work["steps"],
+            "work": self.work_units(model_gb, work),
+            "vram_gb": model_gb * self.vram_overhead + work["megapixels"] * self.vram_per_megapixel_gb,
+        }
+
+    @staticmethod
+    def work_units(model_gb: float, work: Dict[str, float]) -> float:
+        """Megapixel-steps weighted by model size, the unit throughput is measured in."""
+        return work["megapixels"] * work["steps"] * max(model_gb, 1.0)
+
+    def classify(self, workflow: Dict[str, Any], max_latency: float) -> Dict[str, Any]:
+        """
+        Choose the GPU profile for a workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+            max_latency: Latency target in seconds
+
+        Returns:
+            Dict with the chosen profile, the reason, the requirements and
+            the estimate (seconds, cost, fits) of every profile
+        """
+        needs = self.requirements(workflow)
+        estimates = {}
+        for name, profile in self.profiles.items():
+            seconds = self.table.estimate(name, workflow, needs["work"], self.speeds)
+            # Unmeasured profiles are costed as if they used the whole latency budget
+            cost = profile["price_per_hour"] * (seconds if seconds is not None else max_latency) / 3600
+            estimates[name] = {"seconds": seconds, "cost": cost, "fits": needs["vram_gb"] <= profile["vram_gb"]}
+
+        fitting = [name for name in self.profiles if estimates[name]["fits"]]
+        in_time = [name for name in fitting
+                   if estimates[name]["seconds"] is None or estimates[name]["seconds"] <= max_latency]
+        if in_time:
+            choice = min(in_time, key=lambda name: estimates[name]["cost"])
+            reason = "cheapest profile meeting the latency target"
+        elif fitting:
+            choice = min(fitting, key=lambda name: estimates[name]["seconds"])
+            reason = "no profile meets the latency target; fastest with enough VRAM"
+        else:
+            choice = max(self.profiles, key=lambda name: self.profiles[name]["vram_gb"])
+            reason = "no profile has enough VRAM; largest one, models will be offloaded"
+        self.stats[choice] = self.stats.get(choice, 0) + 1
+        return {"profile": choice, "reason": reason, "requirements": needs, "estimates": estimates}
+
+
+def _classifier(args) -> GPUClassifier:
+    """Classifier built from the config, a local copy of the model index and the table file."""
+    from generate_model_paths import ModelPathsGenerator
+    from loaders import ConfigLoader
+    from model_index import ModelIndex
+    from prefetch import ModelPathsResolver
+
+    cfg = ConfigLoader(config_path=args.config).load_configs()
+    settings = cfg["gpu_profiles"]
+    if not settings["profiles"]:
+        raise SystemExit(f"✗ No [GPU_PROFILE.<name>] sections listed in [GPU_PROFILES] profiles of {args.config}")
+    generator = ModelPathsGenerator(config_file=args.config)
+    if not generator.load_config():
+        raise SystemExit(1)
+    resolver = ModelPathsResolver.from_model_paths(generator.get_model_paths(), cfg["filesystem"]["comfyui_dir"])
+    index = ModelIndex(args.index)
+    if not index.dirs:
+        print(f"⚠ {args.index} is missing or has no file sizes; model sizes default to {DEFAULT_MODEL_GB} GB")
+    return GPUClassifier(settings["profiles"], ThroughputTable(args.table), index_model_size(index, resolver.folders),
+                         settings["vram_overhead"], settings["vram_per_megapixel_gb"])
+
+
+def fit(args):
+    """Add the execution times of bench_workload.py results to the throughput table."""
+    from bench_workload import load_workload
+
+    classifier = _classifier(args)
+    if args.profile not in classifier.profiles:
+        raise SystemExit(f"✗ Unknown profile {args.profile}; configured: {', '.join(classifier.profiles)}")
+    with open(args.results) as f:
+        runs = json.load(f)
+    runs = [run for run in runs if args.label is None or run.get("label") == args.label]
+    if not runs:
+        raise SystemExit(f"✗ No runs{f' labelled {args.label}' if args.label else ''} in {args.results}")
+
+    recorded = 0
+    for run in runs:
+        entries = load_workload(args.workload or run["workload"])
+        for record in run["requests"]:
+            seconds = record.get("timings", {}).get("execution")
+            if record.get("status") != "ok" or not seconds:
+                continue
+            # Micro-batched submissions share one execution
+            seconds /= record.get("batch_size", 1)
+            workflow = entries[record["index"] % len(entries)]["workflow"]
+            classifier.table.record(args.profile, workflow, seconds, classifier.requirements(workflow)["work"])
+            recorded += 1
+    if not recorded:
+        raise SystemExit("✗ No successful requests with an execution time in the selected runs")
+    classifier.table.save()
+    print(f"✓ Recorded {recorded} execution(s) on {args.profile}: "
+          f"{classifier.table.throughput(args.profile):.2f} work units/s")
+    print(f"📝 Throughput table written to {args.table}")
+
+
+def classify(args):
+    """Print the estimates of every profile for one workflow and the profile chosen."""
+    classifier = _classifier(args)
+    with open(args.workflow) as f:
+        workflow = json.load(f)
+    choice = classifier.classify(workflow, args.max_latency)
+    needs = choice["requirements"]
+    print(f"📦 Models {needs['model_gb']:.1f} GB, {needs['megapixels']:.2f} MP x {needs['steps']} steps, "
+          f"needs ~{needs['vram_gb']:.1f} GB VRAM")
+    for name in needs["unknown_models"]:
+        print(f"⚠ Not in the model index: {name}")
+    print(f"\n{'profile':<10}{'gpu':<10}{'vram':>6}{'est (s)':>10}{'cost ($)':>10}  fits")
+    for name, estimate in choice["estimates"].items():
+        profile = classifier.profiles[name]
+        seconds = f"{estimate['seconds']:.1f}" if estimate["seconds"] is not None else "-"
+        print(f"{name:<10}{profile['gpu_type']:<10}{profile['vram_gb']:>6.0f}{seconds:>10}"
+              f"{estimate['cost']:>10.6f}  {'yes' if estimate['fits'] else 'no'}")
+    print(f"\n✓ {choice['profile']}: {choice['reason']}")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Fit GPU throughput profiles and choose GPUs for workflows.")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--index", default="model_index.json",
+                        help="Copy of the volume's model index (`modal volume get`)")
+    parser.add_argument("--table", default="gpu_throughput.json", help="Throughput table to read and write")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit_parser = commands.add_parser("fit", help="Record bench_workload.py results of one profile")
+    fit_parser.add_argument("results", help="JSON file written by bench_workload.py --json")
+    fit_parser.add_argument("--profile", required=True, help="Profile the benchmark ran on")
+    fit_parser.add_argument("--label", help="Only use runs with this label")
+    fit_parser.add_argument("--workload", help="Workload file (default: the one recorded with each run)")
+    classify_parser = commands.add_parser("classify", help="Show the profile chosen for a workflow")
+    classify_parser.add_argument("workflow", help="Workflow graph in API format")
+    classify_parser.add_argument("--max-latency", type=float, default=120.0)
+    args = parser.parse_args()
+    if args.command == "fit":
+        fit(args)
+    else:
+        classify(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Headless workflow submission API.
+
+Accepts workflows in ComfyUI's API format, pushes them onto ComfyUI's /prompt
+queue, follows their progress over the websocket and returns the outputs.
+The number of workflows in flight is bounded by max_inputs: once every slot
+is taken, new submissions are rejected with QueueFullError instead of piling
+up in ComfyUI's queue. With a JobScheduler, accepted workflows are released to
+ComfyUI in priority, fair-share and shortest-job-first order.
+"""
+
+import base64
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from comfy_client import ComfyUIClient, ComfyUIError
+
+
+class QueueFullError(Exception):
+    """Raised when all max_inputs submission slots are in use."""
+
+
+class HeadlessAPI:
+    """Submit workflows to ComfyUI with bounded concurrency."""
+
+    def __init__(self, client: ComfyUIClient, max_inputs: int, queue_timeout: float = 0.0,
+                 scheduler=None):
+        """
+        Initialize the API.
+
+        Args:
+            client: Client for the local ComfyUI server
+            max_inputs: Maximum number of workflows queued or running at once
+            queue_timeout: Seconds a submission may wait for a free slot
+            scheduler: JobScheduler ordering accepted workflows before they reach ComfyUI's FIFO queue
+        """
+        self.client = client
+        self.max_inputs = max_inputs
+        self.queue_timeout = queue_timeout
+        self.scheduler = scheduler
+        self.slots = threading.BoundedSemaphore(max_inputs)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def parse_workflow(body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract the API-format workflow from a request body.
+
+        Accepts {"workflow": {...}} or {"prompt": {...}}.
+
+        Args:
+            body: Decoded JSON request body
+
+        Returns:
+            The workflow graph
+        """
+        workflow = body.get("workflow", body.get("prompt"))
+        if not isinstance(workflow, dict) or not workflow:
+            raise ValueError("Request body must contain a 'workflow' object in ComfyUI API format")
+        return workflow
+
+    def submit(self, workflow: Dict[str, Any], include_images: bool = False,
+               timeout: Optional[float] = None, priority: Optional[str] = None,
+               tenant: Optional[str] = None, reserved: bool = False,
+               shares: Optional[Dict[Optional[str], float]] = None) -> "Submission":
+        """
+        Reserve a slot and start a workflow.
+
+        The slot is reserved and the scheduler job enqueued immediately, so a
+        full queue is reported before any response is sent and the job keeps
+        its place in line. Both are released when the returned Submission is
+        exhausted, fails, is closed or is dropped without being iterated; a
+        job that is still waiting is withdrawn, so it never holds up the
+        scheduler's dispatch depth.
+
+        Args:
+            workflow: Workflow graph in API format
+            include_images: Embed output files as base64 in the result
+            timeout: Seconds to wait for each progress event
+            priority: Priority class, when a scheduler is set
+            tenant: Submitting client, for the scheduler's fair share
+            reserved: The caller already holds a slot from reserve(), which the submission takes over
+            shares: Fraction of the cost charged to each tenant (see JobScheduler.enqueue)
+
+        Returns:
+            Submission iterating the progress events, ending with a "result" event
+        """
+        if self.scheduler is not None:
+            # Unknown priorities are reported before a slot is taken
+            self.scheduler.rank(priority)
+        if not reserved:
+            self.reserve()
+        job = self.scheduler.enqueue(workflow, priority, tenant, shares) if self.scheduler is not None else None
+        return Submission(self, self._stream(workflow, include_images, timeout, job), job)
+
+    def reserve(self):
+        """
+        Take a submission slot, waiting up to queue_timeout for one.
+
+        Every reserve() must be matched by one release(), or by a submit(reserved=True).
+        """
+        acquired = (self.slots.acquire(timeout=self.queue_timeout) if self.queue_timeout > 0
+                    else self.slots.acquire(blocking=False))
+        if not acquired:
+            raise QueueFullError(f"All {self.max_inputs} submission slots are busy")
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self, job: Optional[Dict[str, Any]] = None):
+        """Give back a slot, and the scheduler job of a finished or abandoned submission."""
+        if job is not None:
+            self.scheduler.release(job)
+        with self._lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def _stream(self, workflow: Dict[str, Any], include_images: bool,
+                timeout: Optional[float], job: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        if job is not None:
+            self.scheduler.wait(job)
+        queued = started = time.monotonic()
+        for event in self.client.run(workflow, timeout=timeout):
+            data = event.get("data", {})
+            if event["type"] == "completed":
+                execution = time.monotonic() - started
+                if job is not None:
+                    # ComfyUI is done; the next job starts while outputs are collected
+                    self.scheduler.release(job, execution)
+                outputs = self._collect_outputs(data["outputs"], include_images)
+                # Time in ComfyUI's queue, and from execution start to outputs collected
+                timings = {"queue_wait": started - queued, "execution": time.monotonic() - started}
+                if job is not None:
+                    timings["schedule_wait"] = job["dispatched"] - job["enqueued"]
+                yield {"type": "result", "prompt_id": data["prompt_id"], "outputs": outputs, "timings": timings}
+            elif event["type"] == "queued":
+                queued = started = time.monotonic()
+                yield {"type": "queued", "prompt_id": data["prompt_id"]}
+            elif event["type"] == "execution_start":
+                started = time.monotonic()
+            elif event["type"] == "executing" and data.get("node") is not None:
+                yield {"type": "executing", "node": data["node"]}
+            elif event["type"] == "progress":
+                yield {"type": "progress", "node": data.get("node"),
+                       "value": data.get("value"), "max": data.get("max")}
+
+    def _collect_outputs(self, outputs: Dict[str, Any], include_images: bool) -> List[Dict[str, Any]]:
+        """Flatten a /history outputs mapping into a list of output files."""
+        files = []
+        for node_id, node_output in outputs.items():
+            for kind in ("images", "gifs", "audio"):
+                for item in node_output.get(kind, []):
+                    files.append({"node_id": node_id, "filename": item["filename"],
+                                  "subfolder": item.get("subfolder", ""), "type": item.get("type", "output")})
+        if include_images:
+            # This prompt's outputs may still be queued in the background writer
+            self.client.wait_outputs([entry for entry in files if entry["type"] == "output"])
+            for entry in files:
+                data = self.client.view(entry["filename"], entry["subfolder"], entry["type"])
+                entry["data"] = base64.b64encode(data).decode()
+        return files
+
+    @staticmethod
+    def result(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Consume a submission and return its final result.
+
+        Args:
+            events: Iterator returned by submit
+
+        Returns:
+            The "result" event
+        """
+        result = None
+        for event in events:
+            if event["type"] == "result":
+                result = event
+        if result is None:
+            raise ComfyUIError("Workflow finished without a result")
+        return result
+
+    @staticmethod
+    def ndjson(events: Iterator[Dict[str, Any]]) -> Iterator[str]:
+        """
+        Serialize a submission as newline-delimited JSON for streaming responses.
+
+        Errors raised while streaming are sent as a final "error" event.
+
+        Args:
+            events: Iterator returned by submit
+
+        Yields:
+            One JSON document per line
+        """
+        try:
+            for event in events:
+                yield json.dumps(event) + "\n"
+        except (ComfyUIError, ConnectionError, TimeoutError) as e:
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+        finally:
+            close = getattr(events, "close", None)
+            if close is not None:
+                close()
+
+
+class Submission:
+    """
+    Progress events of one submitted workflow, holding its submission slot.
+
+    The slot is given back exactly once: when the events are exhausted, when
+    iterating them fails, on close(), or when the Submission is garbage
+    collected. The last case covers streaming clients that disconnect before
+    the response starts, whose wrapped iterators are never run.
+
+    A submission given up before its result (a disconnected client, an event
+    timeout) also stops its prompt, so ComfyUI does not run work nobody reads.
+    """
+
+    def __init__(self, api: HeadlessAPI, events: Iterator[Dict[str, Any]], job: Optional[Dict[str, Any]] = None):
+        """
+        Initialize the submission.
+
+        Args:
+            api: API whose slot this submission holds
+            events: Progress event generator (HeadlessAPI._stream)
+            job: Scheduler job of the submission, if any
+        """
+        self.api = api
+        self.job = job
+        self.prompt_id: Optional[str] = None
+        self.finished = False
+        self._events = events
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> "Submission":
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        try:
+            event = next(self._events)
+        except BaseException:
+            self.close()
+            raise
+        if event["type"] == "queued":
+            self.prompt_id = event["prompt_id"]
+        elif event["type"] == "result":
+            self.finished = True
+        return event
+
+    def close(self):
+        """Stop following the workflow and give back its slot."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            if self.prompt_id is not None and not self.finished:
+                try:
+                    self.api.client.cancel(self.prompt_id)
+                except (ComfyUIError, OSError) as e:
+                    print(f"⚠ Could not stop abandoned prompt {self.prompt_id}: {e}")
+            self._events.close()
+        finally:
+            self.api.release(self.job)
+
+    def __del__(self):
+        self.close()
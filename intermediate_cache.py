@@ -0,0 +1,380 @@
+"""
+Persistent cache of intermediate node results: conditioning and latents.
+
+ComfyUI only reuses a node's output within one process, and only while the
+graph around it stays the same. Popular prompts are encoded by CLIP/T5 again
+in every container, and reused input images go through the VAE again on
+every prompt. IntermediateCache keeps such outputs on the container's local
+disk and on the volume, so they are computed once for every container.
+
+An entry is keyed by the encoder (the loader chain feeding the node, with the
+size and modification time of every model file it reads) and by the node's
+other inputs (prompt text as is, images by a hash of their pixels). Values
+are stored as safetensors files in their original dtype, with the nesting of
+lists, tuples and dicts in the metadata.
+
+Both tiers are size-bounded and evict least recently used entries. Reads go
+local disk -> volume, and a volume hit is copied to local disk; writes go to
+local disk at once and to the volume on a background thread.
+
+Used by the mxc_intermediate_cache node pack (comfy_nodes/mxc_intermediate_cache),
+which ships a copy of this module and of model_loaders.py. pack and unpack
+need torch and safetensors (part of ComfyUI); the cache itself only uses the
+standard library. bench_intermediate.py measures the time saved on a replay.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    # Inside the mxc_intermediate_cache node pack, which ships a copy of model_loaders.py
+    from .model_loaders import workflow_models
+except ImportError:
+    from model_loaders import workflow_models
+
+# Extension of the cache files
+EXTENSION = ".safetensors"
+
+
+def _is_link(value: Any) -> bool:
+    """Links are [node_id, output_index] pairs in ComfyUI's API format."""
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str) and isinstance(value[1], int)
+
+
+def encoder_key(prompt: Dict[str, Any], node_id: str, file_digest: Callable[[str, str], Optional[str]]) -> Optional[str]:
+    """
+    Hash of a node and everything upstream of it, including the model files read.
+
+    Args:
+        prompt: Prompt graph in API format
+        node_id: Node producing the encoder (e.g. the CLIP output of a loader)
+        file_digest: Maps (model folder, file name) to a digest of the file
+
+    Returns:
+        Hex digest, or None when the chain references an unknown node or file
+    """
+    hashes: Dict[str, str] = {}
+
+    def visit(current: str, path: Tuple[str, ...]) -> str:
+        if current in hashes:
+            return hashes[current]
+        if current in path or current not in prompt:
+            raise LookupError(current)
+        node = prompt[current]
+        inputs = {}
+        for name, value in sorted(node.get("inputs", {}).items()):
+            inputs[name] = ["link", visit(value[0], path + (current,)), value[1]] if _is_link(value) else value
+        files = []
+        for folder, name in workflow_models({current: node}):
+            digest = file_digest(folder, name)
+            if digest is None:
+                raise LookupError(name)
+            files.append([folder, name, digest])
+        payload = json.dumps([node.get("class_type"), inputs, files], sort_keys=True, default=str)
+        hashes[current] = hashlib.sha256(payload.encode()).hexdigest()
+        return hashes[current]
+
+    try:
+        return visit(node_id, ())
+    except LookupError:
+        return None
+
+
+def _is_tensor(value: Any) -> bool:
+    return hasattr(value, "detach") and hasattr(value, "dtype") and hasattr(value, "shape")
+
+
+def value_digest(value: Any) -> Optional[str]:
+    """
+    Digest of a node input: JSON for plain values, the raw bytes for tensors.
+
+    Returns:
+        Hex digest, or None for inputs that cannot be keyed (models, objects)
+    """
+    digest = hashlib.sha256()
+    if _is_tensor(value):
+        import torch
+
+        tensor = value.detach().cpu().contiguous()
+        digest.update(f"{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        digest.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    elif value is None or isinstance(value, (str, int, float, bool)):
+        digest.update(json.dumps(value).encode())
+    else:
+        return None
+    return digest.hexdigest()
+
+
+def pack(value: Any) -> bytes:
+    """
+    Serialize nested lists, tuples and string-keyed dicts of tensors and plain values.
+
+    Raises:
+        TypeError: The value holds something else (a model, a custom object)
+    """
+    from safetensors.torch import save
+
+    tensors = {}
+
+    def encode(item: Any) -> Any:
+        if _is_tensor(item):
+            name = str(len(tensors))
+            # Cloned so tensors sharing storage are saved independently
+            tensors[name] = item.detach().cpu().contiguous().clone()
+            return {"__tensor__": name}
+        if isinstance(item, tuple):
+            return {"__tuple__": [encode(element) for element in item]}
+        if isinstance(item, list):
+            return [encode(element) for element in item]
+        if isinstance(item, dict) and all(isinstance(key, str) for key in item):
+            return {"__dict__": {key: encode(element) for key, element in item.items()}}
+        if item is None or isinstance(item, (str, int, float, bool)):
+            return item
+        raise TypeError(f"Cannot cache values of type {type(item).__name__}")
+
+    structure = encode(value)
+    return save(tensors, metadata={"structure": json.dumps(structure)})
+
+
+def unpack(data: bytes) -> Any:
+    """Inverse of pack; tensors are returned on the CPU."""
+    from safetensors.torch import load
+
+    (length,) = struct.unpack("<Q", data[:8])
+    structure = json.loads(json.loads(data[8:8 + length])["__metadata__"]["structure"])
+    tensors = load(data)
+
+    def decode(item: Any) -> Any:
+        if isinstance(item, list):
+            return [decode(element) for element in item]
+        if isinstance(item, dict):
+            if "__tensor__" in item:
+                return tensors[item["__tensor__"]]
+            if "__tuple__" in item:
+                return tuple(decode(element) for element in item["__tuple__"])
+            return {key: decode(element) for key, element in item["__dict__"].items()}
+        return item
+
+    return decode(structure)
+
+
+class _Tier:
+    """Size-bounded directory of cache files, evicting least recently used."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files: "OrderedDict[str, int]" = OrderedDict()
+        self.size = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + EXTENSION)
+
+    def scan(self) -> List[Tuple[str, int]]:
+        """Files left by earlier runs (or other containers), oldest first."""
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(EXTENSION):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, name[:-len(EXTENSION)], stat.st_size))
+        return [(key, size) for _, key, size in sorted(found)]
+
+    def load(self, files: List[Tuple[str, int]]):
+        """Index scanned files, ahead of the ones recorded since the scan started."""
+        recent = self.files
+        self.files = OrderedDict((key, size) for key, size in files if key not in recent)
+        self.files.update(recent)
+        self.size = sum(self.files.values())
+
+    def touch(self, key: str):
+        if key in self.files:
+            self.files.move_to_end(key)
+
+    def add(self, key: str, size: int) -> int:
+        """Record a written file and evict until the tier fits; returns the evictions."""
+        self.size += size - self.files.pop(key, 0)
+        self.files[key] = size
+        evicted = 0
+        while self.size > self.max_bytes and len(self.files) > 1:
+            old, old_size = self.files.popitem(last=False)
+            self.size -= old_size
+            try:
+                os.remove(self.path(old))
+            except OSError:
+                pass
+            evicted += 1
+        return evicted
+
+    def remove(self, key: str):
+        self.size -= self.files.pop(key, 0)
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class IntermediateCache:
+    """Two-tier (local disk, volume) store of serialized node outputs."""
+
+    def __init__(self, local_dir: str, local_bytes: int, volume_dir: Optional[str] = None, volume_bytes: int = 0):
+        """
+        Initialize the cache; files left by earlier runs are reused.
+
+        Args:
+            local_dir: Directory on the container's local disk
+            local_bytes: Size bound of the local tier
+            volume_dir: Directory on the volume shared by all containers (None disables the tier)
+            volume_bytes: Size bound of the volume tier
+        """
+        self.local = _Tier(local_dir, local_bytes)
+        self.volume = _Tier(volume_dir, volume_bytes) if volume_dir else None
+        self.stats = {
+            "hits": 0, "local_hits": 0, "volume_hits": 0, "misses": 0, "stores": 0,
+            "bytes_read": 0, "bytes_written": 0, "evictions": 0, "volume_evictions": 0, "errors": 0,
+            "seconds_saved": 0.0,
+        }
+        self._lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mxc-intermediate")
+        self.pending: Dict[str, Future] = {}
+        os.makedirs(local_dir, exist_ok=True)
+        self.local.load(self.local.scan())
+        if self.volume:
+            # Listing the volume can take a while; it happens before the first volume write
+            self.pool.submit(self._load_volume)
+
+    def _load_volume(self):
+        files = self.volume.scan()
+        with self._lock:
+            self.volume.load(files)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read an entry.
+
+        Args:
+            key: Entry key
+
+        Returns:
+            The stored bytes, or None on a miss
+        """
+        tier = None
+        for candidate in (self.local, self.volume):
+            if candidate is None:
+                continue
+            try:
+                with open(candidate.path(key), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            tier = candidate
+            break
+        with self._lock:
+            if tier is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["bytes_read"] += len(data)
+            self.stats["local_hits" if tier is self.local else "volume_hits"] += 1
+            tier.touch(key)
+        if tier is self.volume:
+            try:
+                os.utime(self.volume.path(key))
+            except OSError:
+                pass
+            self._store_local(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """
+        Store an entry locally now and on the volume in the background.
+
+        Args:
+            key: Entry key
+            data: Serialized value
+        """
+        self._store_local(key, data)
+        with self._lock:
+            self.stats["stores"] += 1
+            self.stats["bytes_written"] += len(data)
+        if self.volume is not None:
+            future = self.pool.submit(self._store_volume, key, data)
+            with self._lock:
+                self.pending[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+
+    def record_saved(self, seconds: float):
+        """Count the compute time a hit avoided (estimated by the caller)."""
+        with self._lock:
+            self.stats["seconds_saved"] += seconds
+
+    def _done(self, key: str, future: Future):
+        with self._lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def _store_local(self, key: str, data: bytes):
+        try:
+            _write_atomic(self.local.path(key), data)
+        except OSError as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠ Could not write intermediate cache entry {key}: {e}")
+            return
+        with self._lock:
+            self.stats["evictions"] += self.local.add(key, len(data))
+
+    def _store_volume(self, key: str, data: bytes):
+        try:
+            _write_atomic(self.volume.path(key), data)
+        except OSError as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠ Could not write intermediate cache entry {key} to the volume: {e}")
+            return
+        with self._lock:
+            self.stats["volume_evictions"] += self.volume.add(key, len(data))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the pending volume writes; returns whether they finished in time."""
+        with self._lock:
+            futures = list(self.pending.values())
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Cache metrics.
+
+        Returns:
+            Counters, tier sizes and the hit rate
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "local_entries": len(self.local.files),
+                "local_bytes": self.local.size,
+                "volume_entries": len(self.volume.files) if self.volume else 0,
+                "volume_bytes": self.volume.size if self.volume else 0,
+                "pending": len(self.pending),
+            }
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish the pending volume writes and stop."""
+        self.flush(timeout)
+        self.pool.shutdown(wait=False)
@@ -0,0 +1,169 @@
+"""
+ComfyUI process launcher with a readiness probe and startup timings.
+
+The launcher starts ComfyUI, follows its log output to timestamp the startup
+phases, and polls /system_stats and /object_info until the node registry is
+populated. The timings are collected into a structured startup report so
+that cold-start regressions show up as numbers instead of a timeout.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional
+
+# Log lines that mark the end of a startup phase
+PHASE_MARKERS = {
+    "import": re.compile(r"^Total VRAM|^pytorch version:"),
+    "node_load": re.compile(r"^Import times for custom nodes:"),
+    "port_bind": re.compile(r"^To see the GUI go to:|^Starting server"),
+}
+
+# "   0.3 seconds: /root/comfy/ComfyUI/custom_nodes/comfyui-kjnodes"
+NODE_IMPORT_TIME = re.compile(r"^\s*([\d.]+) seconds(?: \(IMPORT FAILED\))?: (.+)$")
+
+
+class ComfyUILauncher:
+    """Launch ComfyUI and report when it is ready to serve requests."""
+
+    def __init__(self, command: str, base_url: str, env: Optional[Dict[str, str]] = None):
+        """
+        Initialize the launcher.
+
+        Args:
+            command: Shell command that starts ComfyUI
+            base_url: URL the server listens on, e.g. http://127.0.0.1:8000
+            env: Extra environment variables for the ComfyUI process
+        """
+        self.command = command
+        self.base_url = base_url.rstrip("/")
+        self.env = env or {}
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at: Optional[float] = None
+        self.marks: Dict[str, float] = {}
+        self.node_import_times: Dict[str, float] = {}
+        self.node_count = 0
+        self.ready = False
+
+    def start(self):
+        """Start the ComfyUI process and begin following its output."""
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env={**os.environ, **self.env},
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self._follow_output, daemon=True).start()
+
+    def is_running(self) -> bool:
+        """Check whether the ComfyUI process is alive."""
+        return self.process is not None and self.process.poll() is None
+
+    def _mark(self, phase: str):
+        self.marks.setdefault(phase, time.monotonic())
+
+    def _follow_output(self):
+        """Echo ComfyUI's log and timestamp the phase markers it prints."""
+        for line in self.process.stdout:
+            sys.stdout.write(line)
+            stripped = line.strip()
+            for phase, marker in PHASE_MARKERS.items():
+                if marker.search(stripped):
+                    self._mark(phase)
+            match = NODE_IMPORT_TIME.match(line)
+            if match and "node_load" in self.marks:
+                self.node_import_times[Path(match.group(2).strip()).name] = float(match.group(1))
+
+    def _get_json(self, endpoint: str):
+        with urllib.request.urlopen(f"{self.base_url}{endpoint}", timeout=10) as response:
+            return json.loads(response.read())
+
+    def wait_until_ready(self, timeout: float = 600.0, interval: float = 0.5) -> bool:
+        """
+        Poll ComfyUI until /object_info returns a populated node registry.
+
+        Args:
+            timeout: Seconds to wait before giving up
+            interval: Seconds between polls
+
+        Returns:
+            True once ready, False on timeout or if the process exited
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                print(f"✗ ComfyUI exited with code {self.process.returncode} during startup")
+                return False
+            try:
+                if "server" not in self.marks:
+                    self._get_json("/system_stats")
+                    self._mark("server")
+                object_info = self._get_json("/object_info")
+                if object_info:
+                    self.node_count = len(object_info)
+                    self._mark("registry")
+                    self.ready = True
+                    return True
+            except (urllib.error.URLError, ConnectionError, TimeoutError, json.JSONDecodeError):
+                pass
+            time.sleep(interval)
+        return False
+
+    def report(self) -> Dict[str, object]:
+        """
+        Build the structured startup report.
+
+        Phase durations are measured from the end of the previous phase that
+        was observed; phases whose log marker never appeared are omitted.
+
+        Returns:
+            Report dictionary (JSON serializable)
+        """
+        phases = {}
+        previous = self.started_at
+        for phase in ("import", "node_load", "port_bind", "server", "registry"):
+            if phase in self.marks and previous is not None:
+                phases[phase] = round(self.marks[phase] - previous, 3)
+                previous = self.marks[phase]
+
+        slowest_nodes = dict(sorted(self.node_import_times.items(), key=lambda kv: kv[1], reverse=True))
+        return {
+            "ready": self.ready,
+            "total": round(self.marks["registry"] - self.started_at, 3) if self.ready else None,
+            "phases": phases,
+            "node_count": self.node_count,
+            "custom_node_import_times": slowest_nodes,
+            "timestamp": time.time(),
+            "task_id": os.environ.get("MODAL_TASK_ID"),
+        }
+
+    def write_report(self, report_dir: str) -> Path:
+        """
+        Print the startup report as one JSON line and save it to report_dir.
+
+        Args:
+            report_dir: Directory for report files, one per container start
+
+        Returns:
+            Path of the written report
+        """
+        report = self.report()
+        print(f"STARTUP_REPORT {json.dumps(report)}")
+
+        path = Path(report_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{report['task_id'] or os.getpid()}.json"
+        report_path = path / name
+        report_path.write_text(json.dumps(report, indent=2))
+        return report_path
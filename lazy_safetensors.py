@@ -0,0 +1,231 @@
+"""
+Memory-mapped safetensors loading with a header index cache.
+
+A safetensors file is an 8-byte header length, a JSON header giving every
+tensor's dtype, shape and byte range, then the raw tensor data. Loading one
+normally reads the whole file, even when a workflow only needs part of it
+(for example the text encoder of a full checkpoint).
+
+LazySafetensors maps the file instead and hands out tensors that are views
+of the mapping: nothing is copied, and only the pages of tensors that are
+actually used are ever read from the volume. SafetensorsIndex caches the
+parsed headers of every file in one JSON file on the volume, so opening a
+known file costs a stat instead of a header read.
+
+Used by the mxc_lazy_safetensors node pack (comfy_nodes/mxc_lazy_safetensors),
+which ships a copy of this module. torch is only needed by get_tensor and
+state_dict; buffer works with the standard library alone.
+"""
+
+import json
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+INDEX_VERSION = 1
+
+# Headers larger than this are rejected as corrupt (same bound as the safetensors library)
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+
+# safetensors dtype to (torch dtype name, bytes per element)
+DTYPES = {
+    "F64": ("float64", 8), "F32": ("float32", 4), "F16": ("float16", 2), "BF16": ("bfloat16", 2),
+    "I64": ("int64", 8), "I32": ("int32", 4), "I16": ("int16", 2), "I8": ("int8", 1), "U8": ("uint8", 1),
+    "BOOL": ("bool", 1), "F8_E4M3": ("float8_e4m3fn", 1), "F8_E5M2": ("float8_e5m2", 1),
+}
+
+
+class SafetensorsError(Exception):
+    """Raised for files that are not valid safetensors files."""
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """
+    Parse the header of a safetensors file.
+
+    Args:
+        path: safetensors file
+
+    Returns:
+        Entry with the header length, the tensors (dtype, shape and absolute
+        byte range in the file) and the metadata
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(8)
+        if len(prefix) != 8:
+            raise SafetensorsError(f"{path}: file too short")
+        (header_len,) = struct.unpack("<Q", prefix)
+        if header_len > MAX_HEADER_SIZE:
+            raise SafetensorsError(f"{path}: header of {header_len} bytes")
+        try:
+            header = json.loads(f.read(header_len))
+        except ValueError as e:
+            raise SafetensorsError(f"{path}: invalid header: {e}") from e
+
+    data_start = 8 + header_len
+    metadata = header.pop("__metadata__", None) or {}
+    tensors = {}
+    for name, info in header.items():
+        start, end = info["data_offsets"]
+        tensors[name] = {"dtype": info["dtype"], "shape": info["shape"], "start": data_start + start, "end": data_start + end}
+    return {"header_len": header_len, "tensors": tensors, "metadata": metadata}
+
+
+class SafetensorsIndex:
+    """Parsed safetensors headers, keyed by file and validated by size and mtime."""
+
+    def __init__(self, path: str, root: Optional[str] = None):
+        """
+        Load the index, or start an empty one.
+
+        Args:
+            path: Index file (JSON)
+            root: Files below this directory are keyed by their relative path,
+                so the index stays valid wherever the volume is mounted
+        """
+        self.path = path
+        self.root = os.path.normpath(root) if root else None
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def key(self, path: str) -> str:
+        """Index key of a file."""
+        path = os.path.abspath(path)
+        if self.root and path.startswith(self.root + os.sep):
+            return os.path.relpath(path, self.root)
+        return path
+
+    def header(self, path: str) -> Dict[str, Any]:
+        """
+        Parsed header of a file, read from the file only if the index has no
+        entry for its current size and mtime.
+
+        Args:
+            path: safetensors file
+
+        Returns:
+            Entry as returned by read_header, plus the file's size and mtime
+        """
+        stat = os.stat(path)
+        key = self.key(path)
+        with self._lock:
+            entry = self.files.get(key)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                self.stats["hits"] += 1
+                return entry
+        entry = {**read_header(path), "size": stat.st_size, "mtime": stat.st_mtime}
+        with self._lock:
+            self.files[key] = entry
+            self.dirty = True
+            self.stats["misses"] += 1
+        return entry
+
+    def save(self):
+        """Write the index if it changed, atomically."""
+        with self._lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+
+class LazySafetensors:
+    """A safetensors file mapped into memory, handing out tensors without copying."""
+
+    def __init__(self, path: str, index: Optional[SafetensorsIndex] = None):
+        """
+        Open and map a file.
+
+        Args:
+            path: safetensors file
+            index: Header cache; without one the header is read from the file
+        """
+        self.path = path
+        self.entry = index.header(path) if index else read_header(path)
+        self.tensors: Dict[str, Dict[str, Any]] = self.entry["tensors"]
+        with open(path, "rb") as f:
+            # Copy-on-write: tensors are writable views, and writes never reach the file
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY) if os.fstat(f.fileno()).st_size else None
+
+    def __enter__(self) -> "LazySafetensors":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def keys(self) -> List[str]:
+        """Tensor names, in file order."""
+        return sorted(self.tensors, key=lambda name: self.tensors[name]["start"])
+
+    def metadata(self) -> Dict[str, str]:
+        """The file's __metadata__."""
+        return self.entry["metadata"]
+
+    def nbytes(self, names: Optional[Iterable[str]] = None) -> int:
+        """Data size of the given tensors (all by default)."""
+        names = self.tensors if names is None else names
+        return sum(self.tensors[name]["end"] - self.tensors[name]["start"] for name in names)
+
+    def buffer(self, name: str) -> memoryview:
+        """Raw bytes of a tensor, as a view of the mapping."""
+        info = self.tensors[name]
+        if info["start"] == info["end"]:
+            return memoryview(b"")
+        return memoryview(self.mmap)[info["start"]:info["end"]]
+
+    def get_tensor(self, name: str):
+        """
+        A tensor backed by the mapping; its pages are read when first touched.
+
+        Args:
+            name: Tensor name
+
+        Returns:
+            CPU torch tensor
+        """
+        import torch
+
+        info = self.tensors[name]
+        dtype_name, itemsize = DTYPES[info["dtype"]]
+        dtype = getattr(torch, dtype_name)
+        count = (info["end"] - info["start"]) // itemsize
+        if count == 0:
+            return torch.empty(info["shape"], dtype=dtype)
+        return torch.frombuffer(self.mmap, dtype=dtype, count=count, offset=info["start"]).reshape(info["shape"])
+
+    def state_dict(self, prefixes: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Tensors by name, all backed by the mapping.
+
+        Args:
+            prefixes: Only include tensors whose name starts with one of these
+
+        Returns:
+            Name to tensor
+        """
+        prefixes = tuple(prefixes) if prefixes else None
+        return {name: self.get_tensor(name) for name in self.keys() if prefixes is None or name.startswith(prefixes)}
+
+    def close(self):
+        """Unmap the file, unless tensors still use the mapping (it is then released with them)."""
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:
+                pass
+            self.mmap = None
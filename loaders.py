@@ -90,11 +90,24 @@ class ConfigLoader:
             "volume_mount_location": self.config.get("FILESYSTEM", "volume_mount_location"),
             "comfyui_dir": self.config.get("FILESYSTEM", "comfyui_dir"),
             "custom_nodes_dir_name": self.config.get("FILESYSTEM", "custom_nodes_dir_name", fallback="custom_nodes"),
-            "custom_output_dir_name": self.config.get("FILESYSTEM", "custom_output_dir_name", fallback="output")
+            "custom_output_dir_name": self.config.get("FILESYSTEM", "custom_output_dir_name", fallback="output"),
+            "dependency_cache_dir_name": self.config.get("FILESYSTEM", "dependency_cache_dir_name", fallback=".cache/dependencies"),
+            "startup_report_dir_name": self.config.get("FILESYSTEM", "startup_report_dir_name", fallback=".cache/startup_reports"),
+            "model_store_dir_name": self.config.get("FILESYSTEM", "model_store_dir_name", fallback=".cache/blobs"),
+            "model_store_link_mode": self.config.get("FILESYSTEM", "model_store_link_mode", fallback="symlink"),
+            "model_index_name": self.config.get("FILESYSTEM", "model_index_name", fallback=".cache/model_index.json"),
+            "model_index": self.config.getboolean("FILESYSTEM", "model_index", fallback=False),
+            "lazy_safetensors": self.config.getboolean("FILESYSTEM", "lazy_safetensors", fallback=False),
+            "safetensors_index_name": self.config.get("FILESYSTEM", "safetensors_index_name", fallback=".cache/safetensors_index.json")
         }
         # Dynamic path generation based on mount location
         fs["custom_nodes_dir"] = f"{fs['volume_mount_location']}/{fs['custom_nodes_dir_name']}"
         fs["custom_output_dir"] = f"{fs['volume_mount_location']}/{fs['custom_output_dir_name']}"
+        fs["dependency_cache_dir"] = f"{fs['volume_mount_location']}/{fs['dependency_cache_dir_name']}"
+        fs["startup_report_dir"] = f"{fs['volume_mount_location']}/{fs['startup_report_dir_name']}"
+        fs["model_store_dir"] = f"{fs['volume_mount_location']}/{fs['model_store_dir_name']}"
+        fs["model_index_path"] = f"{fs['volume_mount_location']}/{fs['model_index_name']}"
+        fs["safetensors_index_path"] = f"{fs['volume_mount_location']}/{fs['safetensors_index_name']}"
 
         # 4. Resources
         resources = {
@@ -104,15 +117,212 @@ class ConfigLoader:
             "max_containers": self.config.getint("RESOURCES", "max_containers", fallback=1),
             "scaledown_window": self.config.getint("RESOURCES", "scaledown_window", fallback=30),
             "timeout": self.config.getint("RESOURCES", "timeout", fallback=3200),
-            "max_inputs": self.config.getint("RESOURCES", "max_inputs", fallback=10)
+            "max_inputs": self.config.getint("RESOURCES", "max_inputs", fallback=10),
+            "startup_timeout": self.config.getint("RESOURCES", "startup_timeout", fallback=600),
+            "memory_snapshot": self.config.getboolean("RESOURCES", "memory_snapshot", fallback=False),
+            "snapshot_preload": [
+                line.strip() for line in self.config.get("RESOURCES", "snapshot_preload", fallback="").splitlines()
+                if line.strip()
+            ]
             # Additional resource settings can be added here
         }
 
+        # 5. Custom node dependencies
+        dependencies = {
+            "installer": self.config.get("DEPENDENCIES", "installer", fallback="pip"),
+            "protected_packages": self.config.get(
+                "DEPENDENCIES", "protected_packages", fallback="torch torchvision torchaudio").split()
+        }
+
+        # 6. Headless API
+        api = {
+            "queue_timeout": self.config.getfloat("API", "queue_timeout", fallback=0.0),
+            "max_batch": self.config.getint("API", "max_batch", fallback=1),
+            "max_wait_ms": self.config.getfloat("API", "max_wait_ms", fallback=50.0),
+        }
+
+        # 7. Model-affinity routing across containers
+        routing = {
+            "enabled": self.config.getboolean("ROUTING", "enabled", fallback=False),
+            "shards": self.config.getint("ROUTING", "shards", fallback=resources["max_containers"]),
+            "model_slots": self.config.getint("ROUTING", "model_slots", fallback=2),
+            "registry_ttl": self.config.getfloat("ROUTING", "registry_ttl", fallback=120.0),
+        }
+
+        # 8. Model downloads
+        downloads = {
+            "concurrency": self.config.getint("DOWNLOADS", "concurrency", fallback=8),
+            "chunk_size_mb": self.config.getint("DOWNLOADS", "chunk_size_mb", fallback=64),
+            "use_model_store": self.config.getboolean("DOWNLOADS", "use_model_store", fallback=True),
+        }
+
+        # 9. Tiered model cache (volume -> local disk -> RAM)
+        model_cache = {
+            "enabled": self.config.getboolean("MODEL_CACHE", "enabled", fallback=False),
+            "cache_dir": self.config.get("MODEL_CACHE", "cache_dir", fallback="/tmp/mxc-model-cache"),
+            "disk_gb": self.config.getfloat("MODEL_CACHE", "disk_gb", fallback=50.0),
+            "ram_gb": self.config.getfloat("MODEL_CACHE", "ram_gb", fallback=0.0),
+            "workers": self.config.getint("MODEL_CACHE", "workers", fallback=2),
+        }
+
+        # 10. Model prefetch from the workflow queue
+        prefetch = {
+            "lookahead": self.config.getint("PREFETCH", "lookahead", fallback=0),
+            "workers": self.config.getint("PREFETCH", "workers", fallback=2),
+        }
+
+        # 11. Output writer
+        outputs = {
+            "async_writes": self.config.getboolean("OUTPUTS", "async_writes", fallback=False),
+            "format": self.config.get("OUTPUTS", "format", fallback="png").lower(),
+            "png_compress_level": self.config.getint("OUTPUTS", "png_compress_level", fallback=4),
+            "lossless": self.config.getboolean("OUTPUTS", "lossless", fallback=True),
+            "quality": self.config.getint("OUTPUTS", "quality", fallback=90),
+            "workers": self.config.getint("OUTPUTS", "workers", fallback=2),
+            "max_pending": self.config.getint("OUTPUTS", "max_pending", fallback=32),
+            "commit_interval": self.config.getfloat("OUTPUTS", "commit_interval", fallback=10.0),
+        }
+        if outputs["format"] not in ("png", "webp", "avif"):
+            raise ValueError(f"[OUTPUTS] format must be png, webp or avif, not {outputs['format']}")
+
+        # 12. Metrics and traces
+        metrics = {
+            "node_metrics": self.config.getboolean("METRICS", "node_metrics", fallback=False),
+            "otlp_file_name": self.config.get("METRICS", "otlp_file_name", fallback="").strip(),
+            "otlp_interval": self.config.getfloat("METRICS", "otlp_interval", fallback=60.0),
+        }
+        metrics["otlp_path"] = (
+            f"{fs['volume_mount_location']}/{metrics['otlp_file_name']}" if metrics["otlp_file_name"] else ""
+        )
+
+        # 13. Per-node profiler
+        profiler = {
+            "enabled": self.config.getboolean("PROFILER", "enabled", fallback=False),
+            "trace_dir_name": self.config.get("PROFILER", "trace_dir_name", fallback=".cache/profiles"),
+            "gpu_timing": self.config.getboolean("PROFILER", "gpu_timing", fallback=True),
+        }
+        profiler["trace_dir"] = f"{fs['volume_mount_location']}/{profiler['trace_dir_name']}"
+
+        # 14. Result cache
+        result_cache = {
+            "enabled": self.config.getboolean("RESULT_CACHE", "enabled", fallback=False),
+            "index_name": self.config.get("RESULT_CACHE", "index_name", fallback=".cache/result_cache.json"),
+            "max_entries": self.config.getint("RESULT_CACHE", "max_entries", fallback=1000),
+            "ttl_hours": self.config.getfloat("RESULT_CACHE", "ttl_hours", fallback=168),
+            "model_hashes": self.config.get("RESULT_CACHE", "model_hashes", fallback="sha256").strip().lower(),
+        }
+        if result_cache["model_hashes"] not in ("sha256", "stat"):
+            raise ValueError(f"[RESULT_CACHE] model_hashes must be sha256 or stat, not {result_cache['model_hashes']}")
+        result_cache["index_path"] = f"{fs['volume_mount_location']}/{result_cache['index_name']}"
+
+        # 15. Intermediate (conditioning / latent) cache
+        intermediate_cache = {
+            "enabled": self.config.getboolean("INTERMEDIATE_CACHE", "enabled", fallback=False),
+            "nodes": self.config.get(
+                "INTERMEDIATE_CACHE", "nodes",
+                fallback="CLIPTextEncode CLIPTextEncodeSDXL CLIPTextEncodeFlux CLIPTextEncodeSD3 VAEEncode").split(),
+            "local_dir": self.config.get("INTERMEDIATE_CACHE", "local_dir", fallback="/tmp/mxc-intermediate-cache"),
+            "local_gb": self.config.getfloat("INTERMEDIATE_CACHE", "local_gb", fallback=5.0),
+            "volume_dir_name": self.config.get("INTERMEDIATE_CACHE", "volume_dir_name", fallback=".cache/intermediate"),
+            "volume_gb": self.config.getfloat("INTERMEDIATE_CACHE", "volume_gb", fallback=20.0),
+        }
+        intermediate_cache["volume_dir"] = (
+            f"{fs['volume_mount_location']}/{intermediate_cache['volume_dir_name']}"
+            if intermediate_cache["volume_gb"] > 0 else ""
+        )
+
+        # 16. Prompt queue scheduler
+        scheduler = {
+            "enabled": self.config.getboolean("SCHEDULER", "enabled", fallback=False),
+            "classes": self.config.get("SCHEDULER", "classes", fallback="high normal low").split(),
+            "default_class": self.config.get("SCHEDULER", "default_class", fallback="normal").strip(),
+            "aging": self.config.getfloat("SCHEDULER", "aging", fallback=120.0),
+            "dispatch_depth": self.config.getint("SCHEDULER", "dispatch_depth", fallback=1),
+            "cost_history_name": self.config.get("SCHEDULER", "cost_history_name", fallback=".cache/job_costs.json"),
+            "default_cost": self.config.getfloat("SCHEDULER", "default_cost", fallback=10.0),
+        }
+        if scheduler["default_class"] not in scheduler["classes"]:
+            raise ValueError(f"[SCHEDULER] default_class must be one of {', '.join(scheduler['classes'])}, "
+                             f"not {scheduler['default_class']}")
+        scheduler["cost_history_path"] = f"{fs['volume_mount_location']}/{scheduler['cost_history_name']}"
+
+        # 17. Adaptive autoscaling
+        autoscaling = {
+            "enabled": self.config.getboolean("AUTOSCALING", "enabled", fallback=False),
+            "interval": self.config.getint("AUTOSCALING", "interval", fallback=60),
+            "max_min_containers": self.config.getint("AUTOSCALING", "max_min_containers", fallback=1),
+            "max_buffer_containers": self.config.getint("AUTOSCALING", "max_buffer_containers", fallback=1),
+            "min_scaledown_window": self.config.getfloat("AUTOSCALING", "min_scaledown_window", fallback=30.0),
+            "max_scaledown_window": self.config.getfloat("AUTOSCALING", "max_scaledown_window", fallback=900.0),
+            "signal_window": self.config.getfloat("AUTOSCALING", "signal_window", fallback=300.0),
+            "warm_probability": self.config.getfloat("AUTOSCALING", "warm_probability", fallback=0.8),
+            "headroom": self.config.getfloat("AUTOSCALING", "headroom", fallback=1.0),
+            "cold_start_tolerance": self.config.getfloat("AUTOSCALING", "cold_start_tolerance", fallback=15.0),
+            "cold_start_seconds": self.config.getfloat("AUTOSCALING", "cold_start_seconds", fallback=60.0),
+            "cooldown": self.config.getfloat("AUTOSCALING", "cooldown", fallback=300.0),
+        }
+        if autoscaling["min_scaledown_window"] > autoscaling["max_scaledown_window"]:
+            raise ValueError("[AUTOSCALING] min_scaledown_window must not exceed max_scaledown_window")
+        if not 0 < autoscaling["warm_probability"] < 1:
+            raise ValueError("[AUTOSCALING] warm_probability must be between 0 and 1")
+
+        # 18. GPU profiles and per-workflow GPU selection
+        gpu_profiles = {
+            "enabled": self.config.getboolean("GPU_PROFILES", "enabled", fallback=False),
+            "max_latency": self.config.getfloat("GPU_PROFILES", "max_latency", fallback=120.0),
+            "vram_overhead": self.config.getfloat("GPU_PROFILES", "vram_overhead", fallback=1.2),
+            "vram_per_megapixel_gb": self.config.getfloat("GPU_PROFILES", "vram_per_megapixel_gb", fallback=1.5),
+            "throughput_table_name": self.config.get("GPU_PROFILES", "throughput_table_name",
+                                                     fallback=".cache/gpu_throughput.json"),
+            "reload_interval": self.config.getfloat("GPU_PROFILES", "reload_interval", fallback=300.0),
+            "profiles": {},
+        }
+        for name in self.config.get("GPU_PROFILES", "profiles", fallback="").split():
+            section = f"GPU_PROFILE.{name}"
+            if not self.config.has_section(section):
+                raise ValueError(f"[GPU_PROFILES] profile {name} has no [{section}] section")
+            profile = {
+                "gpu_type": self.config.get(section, "gpu_type", fallback="").strip(),
+                "vram_gb": self.config.getfloat(section, "vram_gb", fallback=0.0),
+                "price_per_hour": self.config.getfloat(section, "price_per_hour", fallback=0.0),
+                "relative_speed": self.config.getfloat(section, "relative_speed", fallback=1.0),
+                "cpu": self.config.get(section, "cpu", fallback=resources["cpu"]),
+                "memory": self.config.get(section, "memory", fallback=resources["memory"]),
+                "max_containers": self.config.getint(section, "max_containers", fallback=resources["max_containers"]),
+                "max_inputs": self.config.getint(section, "max_inputs", fallback=resources["max_inputs"]),
+                "scaledown_window": self.config.getint(section, "scaledown_window",
+                                                       fallback=resources["scaledown_window"]),
+            }
+            if not profile["gpu_type"] or profile["vram_gb"] <= 0 or profile["relative_speed"] <= 0:
+                raise ValueError(f"[{section}] needs a gpu_type, and a positive vram_gb and relative_speed")
+            gpu_profiles["profiles"][name] = profile
+        if gpu_profiles["enabled"] and not gpu_profiles["profiles"]:
+            raise ValueError("[GPU_PROFILES] enabled without any profiles")
+        if gpu_profiles["enabled"] and not fs["model_index"]:
+            raise ValueError("[GPU_PROFILES] needs model_index = True in [FILESYSTEM] to size the models")
+        gpu_profiles["throughput_table_path"] = (
+            f"{fs['volume_mount_location']}/{gpu_profiles['throughput_table_name']}"
+        )
+
         return {
             "tokens": tokens,
             "web": web,
             "filesystem": fs,
-            "resources": resources
+            "resources": resources,
+            "dependencies": dependencies,
+            "api": api,
+            "routing": routing,
+            "downloads": downloads,
+            "model_cache": model_cache,
+            "prefetch": prefetch,
+            "outputs": outputs,
+            "metrics": metrics,
+            "profiler": profiler,
+            "result_cache": result_cache,
+            "intermediate_cache": intermediate_cache,
+            "scheduler": scheduler,
+            "autoscaling": autoscaling,
+            "gpu_profiles": gpu_profiles
         }
 
 
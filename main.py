@@ -1,7 +1,33 @@
+import json
+import os
 import subprocess
+import threading
+import time
 from pathlib import Path
 import modal
 from loaders import ConfigLoader
+from dependencies import (
+    DependencyCache, DependencyInstaller, RequirementsMerger, format_conflict,
+    load_baked_record, requirements_digest
+)
+from launcher import ComfyUILauncher
+from comfy_client import ComfyUIClient, ComfyUIError
+from headless_api import HeadlessAPI, QueueFullError
+from batching import MicroBatcher
+from routing import AffinityRouter, LoadedModels, ShardRegistry, model_keys
+from snapshot import ModelPreloader
+from metrics import (
+    PROMETHEUS_CONTENT_TYPE, ComfyUIScraper, MetricsRegistry, OTLPFileExporter, Tracer,
+    lifecycle_step, process_peaks, record_launch,
+)
+from downloader import Downloader, load_manifest, volume_folders
+from model_store import ModelStore, volume_model_dirs
+from prefetch import ModelPathsResolver
+from result_cache import ModelHasher, ResultCache
+from scheduler import CostModel, JobScheduler
+from autoscaling import AutoscalePolicy, LoadTracker, ScalingRegistry
+from model_index import ModelIndex
+from gpu_profiles import GPUClassifier, ThroughputTable, index_model_size
 
 # ===========================
 # Global Configuration
@@ -13,6 +39,13 @@ APP_NAME = "comfyui-app"
 # Absolute path of current working directory
 CURRENT_DIR = Path(__file__).parent.resolve()
 
+# Snapshot of the volume's custom node requirements, written by `python dependencies.py manifest`
+CUSTOM_NODES_MANIFEST = CURRENT_DIR / "custom_nodes_manifest.json"
+# Models to download into the volume with `modal run main.py::download`
+MODELS_MANIFEST = CURRENT_DIR / "models.yaml"
+# Record of the custom node requirements baked into the image
+BAKED_DEPENDENCIES_RECORD = "/opt/mxc/baked_dependencies.json"
+
 # Load configurations from config.ini
 cfg = ConfigLoader(config_path="config.ini", env_path=".env").load_configs()
 HF_TOKEN = str(cfg["tokens"]["hf_token"])
@@ -24,6 +57,14 @@ VOLUME_MOUNT_LOCATION = str(cfg["filesystem"]["volume_mount_location"])
 COMFYUI_DIR = str(cfg["filesystem"]["comfyui_dir"])
 CUSTOM_NODES_DIR = str(cfg["filesystem"]["custom_nodes_dir"])
 CUSTOM_OUTPUT_DIR = str(cfg["filesystem"]["custom_output_dir"]) # "/root/per_comfy-storage/output"
+DEPENDENCY_CACHE_DIR = str(cfg["filesystem"]["dependency_cache_dir"])
+STARTUP_REPORT_DIR = str(cfg["filesystem"]["startup_report_dir"])
+MODEL_STORE_DIR_NAME = str(cfg["filesystem"]["model_store_dir_name"])
+MODEL_STORE_LINK_MODE = str(cfg["filesystem"]["model_store_link_mode"])
+MODEL_INDEX = cfg["filesystem"]["model_index"]
+MODEL_INDEX_PATH = str(cfg["filesystem"]["model_index_path"])
+LAZY_SAFETENSORS = cfg["filesystem"]["lazy_safetensors"]
+SAFETENSORS_INDEX_PATH = str(cfg["filesystem"]["safetensors_index_path"])
 GPU_TYPE = str(cfg["resources"]["gpu_type"]) or None
 CPU = cfg["resources"]["cpu"]
 MEMORY = cfg["resources"]["memory"]
@@ -31,6 +72,79 @@ MAX_CONTAINERS = cfg["resources"]["max_containers"]
 SCALEDOWN_WINDOW = cfg["resources"]["scaledown_window"]
 TIMEOUT = cfg["resources"]["timeout"]
 MAX_INPUTS = cfg["resources"]["max_inputs"]
+STARTUP_TIMEOUT = cfg["resources"]["startup_timeout"]
+MEMORY_SNAPSHOT = cfg["resources"]["memory_snapshot"]
+SNAPSHOT_PRELOAD = cfg["resources"]["snapshot_preload"]
+DEPENDENCY_INSTALLER = str(cfg["dependencies"]["installer"])
+PROTECTED_PACKAGES = cfg["dependencies"]["protected_packages"]
+API_QUEUE_TIMEOUT = cfg["api"]["queue_timeout"]
+API_MAX_BATCH = cfg["api"]["max_batch"]
+API_MAX_WAIT_MS = cfg["api"]["max_wait_ms"]
+ROUTING_ENABLED = cfg["routing"]["enabled"]
+ROUTING_SHARDS = cfg["routing"]["shards"]
+ROUTING_MODEL_SLOTS = cfg["routing"]["model_slots"]
+ROUTING_REGISTRY_TTL = cfg["routing"]["registry_ttl"]
+DOWNLOAD_CONCURRENCY = cfg["downloads"]["concurrency"]
+DOWNLOAD_CHUNK_SIZE_MB = cfg["downloads"]["chunk_size_mb"]
+DOWNLOAD_USE_MODEL_STORE = cfg["downloads"]["use_model_store"]
+MODEL_CACHE_ENABLED = cfg["model_cache"]["enabled"]
+MODEL_CACHE_DIR = str(cfg["model_cache"]["cache_dir"])
+MODEL_CACHE_DISK_GB = cfg["model_cache"]["disk_gb"]
+MODEL_CACHE_RAM_GB = cfg["model_cache"]["ram_gb"]
+MODEL_CACHE_WORKERS = cfg["model_cache"]["workers"]
+PREFETCH_LOOKAHEAD = cfg["prefetch"]["lookahead"]
+PREFETCH_WORKERS = cfg["prefetch"]["workers"]
+OUTPUT_ASYNC_WRITES = cfg["outputs"]["async_writes"]
+OUTPUT_FORMAT = cfg["outputs"]["format"]
+OUTPUT_PNG_COMPRESS_LEVEL = cfg["outputs"]["png_compress_level"]
+OUTPUT_LOSSLESS = cfg["outputs"]["lossless"]
+OUTPUT_QUALITY = cfg["outputs"]["quality"]
+OUTPUT_WORKERS = cfg["outputs"]["workers"]
+OUTPUT_MAX_PENDING = cfg["outputs"]["max_pending"]
+OUTPUT_COMMIT_INTERVAL = cfg["outputs"]["commit_interval"]
+NODE_METRICS = cfg["metrics"]["node_metrics"]
+METRICS_OTLP_PATH = str(cfg["metrics"]["otlp_path"])
+METRICS_OTLP_INTERVAL = cfg["metrics"]["otlp_interval"]
+PROFILER_ENABLED = cfg["profiler"]["enabled"]
+PROFILER_TRACE_DIR = str(cfg["profiler"]["trace_dir"])
+PROFILER_GPU_TIMING = cfg["profiler"]["gpu_timing"]
+RESULT_CACHE_ENABLED = cfg["result_cache"]["enabled"]
+RESULT_CACHE_INDEX_PATH = str(cfg["result_cache"]["index_path"])
+RESULT_CACHE_MAX_ENTRIES = cfg["result_cache"]["max_entries"]
+RESULT_CACHE_TTL_HOURS = cfg["result_cache"]["ttl_hours"]
+RESULT_CACHE_MODEL_HASHES = cfg["result_cache"]["model_hashes"]
+INTERMEDIATE_CACHE_ENABLED = cfg["intermediate_cache"]["enabled"]
+INTERMEDIATE_CACHE_NODES = cfg["intermediate_cache"]["nodes"]
+INTERMEDIATE_CACHE_LOCAL_DIR = str(cfg["intermediate_cache"]["local_dir"])
+INTERMEDIATE_CACHE_LOCAL_GB = cfg["intermediate_cache"]["local_gb"]
+INTERMEDIATE_CACHE_VOLUME_DIR = str(cfg["intermediate_cache"]["volume_dir"])
+INTERMEDIATE_CACHE_VOLUME_GB = cfg["intermediate_cache"]["volume_gb"]
+SCHEDULER_ENABLED = cfg["scheduler"]["enabled"]
+SCHEDULER_CLASSES = cfg["scheduler"]["classes"]
+SCHEDULER_DEFAULT_CLASS = cfg["scheduler"]["default_class"]
+SCHEDULER_AGING = cfg["scheduler"]["aging"]
+SCHEDULER_DISPATCH_DEPTH = cfg["scheduler"]["dispatch_depth"]
+SCHEDULER_COST_HISTORY_PATH = str(cfg["scheduler"]["cost_history_path"])
+SCHEDULER_DEFAULT_COST = cfg["scheduler"]["default_cost"]
+AUTOSCALING_ENABLED = cfg["autoscaling"]["enabled"]
+AUTOSCALING_INTERVAL = cfg["autoscaling"]["interval"]
+AUTOSCALING_MAX_MIN_CONTAINERS = cfg["autoscaling"]["max_min_containers"]
+AUTOSCALING_MAX_BUFFER_CONTAINERS = cfg["autoscaling"]["max_buffer_containers"]
+AUTOSCALING_MIN_SCALEDOWN_WINDOW = cfg["autoscaling"]["min_scaledown_window"]
+AUTOSCALING_MAX_SCALEDOWN_WINDOW = cfg["autoscaling"]["max_scaledown_window"]
+AUTOSCALING_SIGNAL_WINDOW = cfg["autoscaling"]["signal_window"]
+AUTOSCALING_WARM_PROBABILITY = cfg["autoscaling"]["warm_probability"]
+AUTOSCALING_HEADROOM = cfg["autoscaling"]["headroom"]
+AUTOSCALING_COLD_START_TOLERANCE = cfg["autoscaling"]["cold_start_tolerance"]
+AUTOSCALING_COLD_START_SECONDS = cfg["autoscaling"]["cold_start_seconds"]
+AUTOSCALING_COOLDOWN = cfg["autoscaling"]["cooldown"]
+GPU_PROFILES_ENABLED = cfg["gpu_profiles"]["enabled"]
+GPU_PROFILES = cfg["gpu_profiles"]["profiles"]
+GPU_PROFILES_MAX_LATENCY = cfg["gpu_profiles"]["max_latency"]
+GPU_PROFILES_VRAM_OVERHEAD = cfg["gpu_profiles"]["vram_overhead"]
+GPU_PROFILES_VRAM_PER_MEGAPIXEL_GB = cfg["gpu_profiles"]["vram_per_megapixel_gb"]
+GPU_PROFILES_RELOAD_INTERVAL = cfg["gpu_profiles"]["reload_interval"]
+GPU_THROUGHPUT_TABLE_PATH = str(cfg["gpu_profiles"]["throughput_table_path"])
 
 def debug_print_config_and_exit():
     """Utility function to print configuration and exit."""
@@ -47,6 +161,8 @@ def debug_print_config_and_exit():
     print(f"VOLUME_MOUNT_LOCATION: {VOLUME_MOUNT_LOCATION}")
     print(f"COMFYUI_DIR: {COMFYUI_DIR}")
     print(f"CUSTOM_NODES_DIR: {CUSTOM_NODES_DIR}")
+    print(f"DEPENDENCY_CACHE_DIR: {DEPENDENCY_CACHE_DIR}")
+    print(f"STARTUP_REPORT_DIR: {STARTUP_REPORT_DIR}")
     print(f"GPU_TYPE: {GPU_TYPE}")
     print(f"CPU: {CPU}")
     print(f"MEMORY: {MEMORY}")
@@ -54,6 +170,86 @@ def debug_print_config_and_exit():
     print(f"SCALEDOWN_WINDOW: {SCALEDOWN_WINDOW}")
     print(f"TIMEOUT: {TIMEOUT}")
     print(f"MAX_INPUTS: {MAX_INPUTS}")
+    print(f"STARTUP_TIMEOUT: {STARTUP_TIMEOUT}")
+    print(f"MEMORY_SNAPSHOT: {MEMORY_SNAPSHOT}")
+    print(f"SNAPSHOT_PRELOAD: {SNAPSHOT_PRELOAD}")
+    print(f"DEPENDENCY_INSTALLER: {DEPENDENCY_INSTALLER}")
+    print(f"PROTECTED_PACKAGES: {PROTECTED_PACKAGES}")
+    print(f"API_QUEUE_TIMEOUT: {API_QUEUE_TIMEOUT}")
+    print(f"API_MAX_BATCH: {API_MAX_BATCH}")
+    print(f"API_MAX_WAIT_MS: {API_MAX_WAIT_MS}")
+    print(f"ROUTING_ENABLED: {ROUTING_ENABLED}")
+    print(f"ROUTING_SHARDS: {ROUTING_SHARDS}")
+    print(f"ROUTING_MODEL_SLOTS: {ROUTING_MODEL_SLOTS}")
+    print(f"ROUTING_REGISTRY_TTL: {ROUTING_REGISTRY_TTL}")
+    print(f"MODELS_MANIFEST: {MODELS_MANIFEST}")
+    print(f"DOWNLOAD_CONCURRENCY: {DOWNLOAD_CONCURRENCY}")
+    print(f"DOWNLOAD_CHUNK_SIZE_MB: {DOWNLOAD_CHUNK_SIZE_MB}")
+    print(f"DOWNLOAD_USE_MODEL_STORE: {DOWNLOAD_USE_MODEL_STORE}")
+    print(f"MODEL_STORE_DIR_NAME: {MODEL_STORE_DIR_NAME}")
+    print(f"MODEL_STORE_LINK_MODE: {MODEL_STORE_LINK_MODE}")
+    print(f"MODEL_INDEX: {MODEL_INDEX}")
+    print(f"MODEL_INDEX_PATH: {MODEL_INDEX_PATH}")
+    print(f"LAZY_SAFETENSORS: {LAZY_SAFETENSORS}")
+    print(f"SAFETENSORS_INDEX_PATH: {SAFETENSORS_INDEX_PATH}")
+    print(f"MODEL_CACHE_ENABLED: {MODEL_CACHE_ENABLED}")
+    print(f"MODEL_CACHE_DIR: {MODEL_CACHE_DIR}")
+    print(f"MODEL_CACHE_DISK_GB: {MODEL_CACHE_DISK_GB}")
+    print(f"MODEL_CACHE_RAM_GB: {MODEL_CACHE_RAM_GB}")
+    print(f"MODEL_CACHE_WORKERS: {MODEL_CACHE_WORKERS}")
+    print(f"PREFETCH_LOOKAHEAD: {PREFETCH_LOOKAHEAD}")
+    print(f"PREFETCH_WORKERS: {PREFETCH_WORKERS}")
+    print(f"OUTPUT_ASYNC_WRITES: {OUTPUT_ASYNC_WRITES}")
+    print(f"OUTPUT_FORMAT: {OUTPUT_FORMAT}")
+    print(f"OUTPUT_PNG_COMPRESS_LEVEL: {OUTPUT_PNG_COMPRESS_LEVEL}")
+    print(f"OUTPUT_LOSSLESS: {OUTPUT_LOSSLESS}")
+    print(f"OUTPUT_QUALITY: {OUTPUT_QUALITY}")
+    print(f"OUTPUT_WORKERS: {OUTPUT_WORKERS}")
+    print(f"OUTPUT_MAX_PENDING: {OUTPUT_MAX_PENDING}")
+    print(f"OUTPUT_COMMIT_INTERVAL: {OUTPUT_COMMIT_INTERVAL}")
+    print(f"NODE_METRICS: {NODE_METRICS}")
+    print(f"METRICS_OTLP_PATH: {METRICS_OTLP_PATH}")
+    print(f"METRICS_OTLP_INTERVAL: {METRICS_OTLP_INTERVAL}")
+    print(f"PROFILER_ENABLED: {PROFILER_ENABLED}")
+    print(f"PROFILER_TRACE_DIR: {PROFILER_TRACE_DIR}")
+    print(f"PROFILER_GPU_TIMING: {PROFILER_GPU_TIMING}")
+    print(f"RESULT_CACHE_ENABLED: {RESULT_CACHE_ENABLED}")
+    print(f"RESULT_CACHE_INDEX_PATH: {RESULT_CACHE_INDEX_PATH}")
+    print(f"RESULT_CACHE_MAX_ENTRIES: {RESULT_CACHE_MAX_ENTRIES}")
+    print(f"RESULT_CACHE_TTL_HOURS: {RESULT_CACHE_TTL_HOURS}")
+    print(f"RESULT_CACHE_MODEL_HASHES: {RESULT_CACHE_MODEL_HASHES}")
+    print(f"INTERMEDIATE_CACHE_ENABLED: {INTERMEDIATE_CACHE_ENABLED}")
+    print(f"INTERMEDIATE_CACHE_NODES: {INTERMEDIATE_CACHE_NODES}")
+    print(f"INTERMEDIATE_CACHE_LOCAL_DIR: {INTERMEDIATE_CACHE_LOCAL_DIR}")
+    print(f"INTERMEDIATE_CACHE_LOCAL_GB: {INTERMEDIATE_CACHE_LOCAL_GB}")
+    print(f"INTERMEDIATE_CACHE_VOLUME_DIR: {INTERMEDIATE_CACHE_VOLUME_DIR}")
+    print(f"INTERMEDIATE_CACHE_VOLUME_GB: {INTERMEDIATE_CACHE_VOLUME_GB}")
+    print(f"SCHEDULER_ENABLED: {SCHEDULER_ENABLED}")
+    print(f"SCHEDULER_CLASSES: {SCHEDULER_CLASSES}")
+    print(f"SCHEDULER_DEFAULT_CLASS: {SCHEDULER_DEFAULT_CLASS}")
+    print(f"SCHEDULER_AGING: {SCHEDULER_AGING}")
+    print(f"SCHEDULER_DISPATCH_DEPTH: {SCHEDULER_DISPATCH_DEPTH}")
+    print(f"SCHEDULER_COST_HISTORY_PATH: {SCHEDULER_COST_HISTORY_PATH}")
+    print(f"SCHEDULER_DEFAULT_COST: {SCHEDULER_DEFAULT_COST}")
+    print(f"AUTOSCALING_ENABLED: {AUTOSCALING_ENABLED}")
+    print(f"AUTOSCALING_INTERVAL: {AUTOSCALING_INTERVAL}")
+    print(f"AUTOSCALING_MAX_MIN_CONTAINERS: {AUTOSCALING_MAX_MIN_CONTAINERS}")
+    print(f"AUTOSCALING_MAX_BUFFER_CONTAINERS: {AUTOSCALING_MAX_BUFFER_CONTAINERS}")
+    print(f"AUTOSCALING_MIN_SCALEDOWN_WINDOW: {AUTOSCALING_MIN_SCALEDOWN_WINDOW}")
+    print(f"AUTOSCALING_MAX_SCALEDOWN_WINDOW: {AUTOSCALING_MAX_SCALEDOWN_WINDOW}")
+    print(f"AUTOSCALING_SIGNAL_WINDOW: {AUTOSCALING_SIGNAL_WINDOW}")
+    print(f"AUTOSCALING_WARM_PROBABILITY: {AUTOSCALING_WARM_PROBABILITY}")
+    print(f"AUTOSCALING_HEADROOM: {AUTOSCALING_HEADROOM}")
+    print(f"AUTOSCALING_COLD_START_TOLERANCE: {AUTOSCALING_COLD_START_TOLERANCE}")
+    print(f"AUTOSCALING_COLD_START_SECONDS: {AUTOSCALING_COLD_START_SECONDS}")
+    print(f"AUTOSCALING_COOLDOWN: {AUTOSCALING_COOLDOWN}")
+    print(f"GPU_PROFILES_ENABLED: {GPU_PROFILES_ENABLED}")
+    print(f"GPU_PROFILES: {GPU_PROFILES}")
+    print(f"GPU_PROFILES_MAX_LATENCY: {GPU_PROFILES_MAX_LATENCY}")
+    print(f"GPU_PROFILES_VRAM_OVERHEAD: {GPU_PROFILES_VRAM_OVERHEAD}")
+    print(f"GPU_PROFILES_VRAM_PER_MEGAPIXEL_GB: {GPU_PROFILES_VRAM_PER_MEGAPIXEL_GB}")
+    print(f"GPU_PROFILES_RELOAD_INTERVAL: {GPU_PROFILES_RELOAD_INTERVAL}")
+    print(f"GPU_THROUGHPUT_TABLE_PATH: {GPU_THROUGHPUT_TABLE_PATH}")
     exit(1)
 
 # debug_print_config_and_exit()
@@ -70,7 +266,7 @@ comfy_image = (
         "git", "nano",
         "libgl1", "libglib2.0-0", "libsm6", "libxext6", "libxrender1"  # OpenCV dependencies
     )
-    .pip_install("comfy-cli", "gguf", "sentencepiece", "opencv-python-headless")
+    .pip_install("comfy-cli", "gguf", "sentencepiece", "opencv-python-headless", "uv", "fastapi[standard]")
     .run_commands("comfy --skip-prompt install --nvidia")
     .run_commands(
         # Some Useful Custom Nodes (Optional)
@@ -83,8 +279,31 @@ comfy_image = (
         "comfy node install seedvarianceenhancer",
         "comfy node install comfyui_controlnet_aux",
     )
+)
+
+# Bake the requirements of the custom nodes on the volume into their own layer.
+# The fingerprint is part of the build command, so the layer is rebuilt only
+# when the manifest changes.
+if CUSTOM_NODES_MANIFEST.exists():
+    manifest_fingerprint = json.loads(CUSTOM_NODES_MANIFEST.read_text())["fingerprint"]
+    comfy_image = (
+        comfy_image
+        .add_local_file(str(CURRENT_DIR / "dependencies.py"), remote_path="/opt/mxc/dependencies.py", copy=True)
+        .add_local_file(str(CUSTOM_NODES_MANIFEST), remote_path="/opt/mxc/custom_nodes_manifest.json", copy=True)
+        .run_commands(
+            "python /opt/mxc/dependencies.py bake /opt/mxc/custom_nodes_manifest.json"
+            f" --record {BAKED_DEPENDENCIES_RECORD} --installer {DEPENDENCY_INSTALLER}"
+            f" --protected {' '.join(PROTECTED_PACKAGES)} --fingerprint {manifest_fingerprint}"
+        )
+    )
+
+comfy_image = (
+    comfy_image
     # Add loaders.py file for configuration loading inside the container
-    .add_local_python_source("loaders", copy=False)
+    .add_local_python_source(
+        "loaders", "dependencies", "launcher", "snapshot", "comfy_client", "headless_api", "batching", "routing",
+        "model_loaders", "downloader", "model_store", "model_index", "generate_model_paths", "metrics", "prefetch",
+        "result_cache", "scheduler", "autoscaling", "gpu_profiles", copy=False)
     .add_local_file(str(CURRENT_DIR / "config.ini"), remote_path="/root/config.ini")
     .add_local_file(str(CURRENT_DIR / ".env"), remote_path="/root/.env")
     # Persistent comfyui settings and workflows
@@ -93,6 +312,33 @@ comfy_image = (
     .add_local_file(str(CURRENT_DIR / "config_comfyui.ini"), remote_path=str(COMFYUI_DIR + "/user/__manager/config.ini"))
     .add_local_file(str(CURRENT_DIR / "comfy.settings.json"), remote_path=str(COMFYUI_DIR + "/user/default/comfy.settings.json"))
     .add_local_dir(str(CURRENT_DIR / "workflows/"), remote_path=str(COMFYUI_DIR + "/user/default/workflows/"))
+    # Node pack serving model listings from the precomputed model index
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_model_index"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_model_index"))
+    .add_local_file(str(CURRENT_DIR / "model_index.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_model_index/model_index.py"))
+    # Node pack loading models through the tiered model cache
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_model_cache"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_model_cache"))
+    .add_local_file(str(CURRENT_DIR / "model_cache.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_model_cache/model_cache.py"))
+    .add_local_file(str(CURRENT_DIR / "model_loaders.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_model_cache/model_loaders.py"))
+    # Node pack reading the models of queued prompts ahead into the page cache
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_prefetch"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_prefetch"))
+    .add_local_file(str(CURRENT_DIR / "prefetch.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_prefetch/prefetch.py"))
+    .add_local_file(str(CURRENT_DIR / "model_loaders.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_prefetch/model_loaders.py"))
+    # Node pack loading safetensors files as views of a memory mapping
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_lazy_safetensors"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_lazy_safetensors"))
+    .add_local_file(str(CURRENT_DIR / "lazy_safetensors.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_lazy_safetensors/lazy_safetensors.py"))
+    # Node pack writing SaveImage outputs on a background writer pool
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_async_output"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_async_output"))
+    .add_local_file(str(CURRENT_DIR / "output_writer.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_async_output/output_writer.py"))
+    # Node pack recording node execution and model load times for the metrics endpoint
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_metrics"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_metrics"))
+    .add_local_file(str(CURRENT_DIR / "metrics.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_metrics/metrics.py"))
+    # Node pack writing a per-node Chrome trace of every prompt
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_profiler"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_profiler"))
+    .add_local_file(str(CURRENT_DIR / "profiler.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_profiler/profiler.py"))
+    # Node pack caching conditioning and latents across prompts and containers
+    .add_local_dir(str(CURRENT_DIR / "comfy_nodes/mxc_intermediate_cache"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_intermediate_cache"))
+    .add_local_file(str(CURRENT_DIR / "intermediate_cache.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_intermediate_cache/intermediate_cache.py"))
+    .add_local_file(str(CURRENT_DIR / "model_loaders.py"), remote_path=str(COMFYUI_DIR + "/custom_nodes/mxc_intermediate_cache/model_loaders.py"))
 )
 
 # ===========================
@@ -104,6 +350,11 @@ app = modal.App(name=APP_NAME, image=comfy_image)
 # Create a persistent volume
 model_volume = modal.Volume.from_name(VOLUME_NAME, create_if_missing=True)
 
+# Models loaded by each container shard, shared with the router
+routing_registry = modal.Dict.from_name(f"{APP_NAME}-routing", create_if_missing=True)
+# Load reported by the containers and the autoscaler settings chosen from it
+autoscaling_registry = modal.Dict.from_name(f"{APP_NAME}-autoscaling", create_if_missing=True)
+
 # Prepare the container arguments dynamically
 container_kwargs = {
     "max_containers": MAX_CONTAINERS,
@@ -120,17 +371,88 @@ if CPU is not None:
 if MEMORY is not None:
     container_kwargs["memory"] = MEMORY
 
+# Snapshot the container after ComfyUI is up; GPU snapshots keep its CUDA state
+if MEMORY_SNAPSHOT:
+    container_kwargs["enable_memory_snapshot"] = True
+    if GPU_TYPE:
+        container_kwargs["experimental_options"] = {"enable_gpu_snapshot": True}
+
+# Command used to start the ComfyUI server, and the local URL used to probe it
+COMFYUI_LAUNCH_COMMAND = (
+    f"comfy launch -- --output-directory {CUSTOM_OUTPUT_DIR} --listen {WEB_SERVER_HOST} --port {WEB_SERVER_PORT}"
+)
+COMFYUI_URL = f"http://127.0.0.1:{WEB_SERVER_PORT}"
+# Environment of the ComfyUI process; enables the mxc_* node packs
+COMFYUI_ENV = {}
+if MODEL_INDEX:
+    COMFYUI_ENV.update({"MXC_MODEL_INDEX": MODEL_INDEX_PATH, "MXC_MODEL_INDEX_ROOT": VOLUME_MOUNT_LOCATION})
+if LAZY_SAFETENSORS:
+    COMFYUI_ENV.update({"MXC_SAFETENSORS_INDEX": SAFETENSORS_INDEX_PATH, "MXC_SAFETENSORS_INDEX_ROOT": VOLUME_MOUNT_LOCATION})
+if MODEL_CACHE_ENABLED:
+    COMFYUI_ENV.update({
+        "MXC_MODEL_CACHE_DIR": MODEL_CACHE_DIR,
+        "MXC_MODEL_CACHE_ROOT": VOLUME_MOUNT_LOCATION,
+        "MXC_MODEL_CACHE_DISK_GB": str(MODEL_CACHE_DISK_GB),
+        "MXC_MODEL_CACHE_RAM_GB": str(MODEL_CACHE_RAM_GB),
+        "MXC_MODEL_CACHE_WORKERS": str(MODEL_CACHE_WORKERS),
+    })
+elif PREFETCH_LOOKAHEAD > 0:
+    # The model cache already copies the models of queued prompts ahead of use
+    COMFYUI_ENV.update({"MXC_PREFETCH_LOOKAHEAD": str(PREFETCH_LOOKAHEAD), "MXC_PREFETCH_WORKERS": str(PREFETCH_WORKERS)})
+if OUTPUT_ASYNC_WRITES:
+    COMFYUI_ENV.update({
+        "MXC_OUTPUT_FORMAT": OUTPUT_FORMAT,
+        "MXC_OUTPUT_PNG_COMPRESS_LEVEL": str(OUTPUT_PNG_COMPRESS_LEVEL),
+        "MXC_OUTPUT_LOSSLESS": "1" if OUTPUT_LOSSLESS else "0",
+        "MXC_OUTPUT_QUALITY": str(OUTPUT_QUALITY),
+        "MXC_OUTPUT_WORKERS": str(OUTPUT_WORKERS),
+        "MXC_OUTPUT_MAX_PENDING": str(OUTPUT_MAX_PENDING),
+        "MXC_OUTPUT_COMMIT_INTERVAL": str(OUTPUT_COMMIT_INTERVAL),
+        "MXC_OUTPUT_VOLUME": VOLUME_NAME,
+    })
+if NODE_METRICS:
+    COMFYUI_ENV.update({"MXC_METRICS": "1", "MXC_METRICS_OTLP_INTERVAL": str(METRICS_OTLP_INTERVAL)})
+    if METRICS_OTLP_PATH:
+        COMFYUI_ENV["MXC_METRICS_OTLP_PATH"] = METRICS_OTLP_PATH
+if PROFILER_ENABLED:
+    COMFYUI_ENV.update({"MXC_PROFILER_DIR": PROFILER_TRACE_DIR, "MXC_PROFILER_GPU": "1" if PROFILER_GPU_TIMING else "0"})
+if INTERMEDIATE_CACHE_ENABLED:
+    COMFYUI_ENV.update({
+        "MXC_INTERMEDIATE_CACHE_DIR": INTERMEDIATE_CACHE_LOCAL_DIR,
+        "MXC_INTERMEDIATE_CACHE_LOCAL_GB": str(INTERMEDIATE_CACHE_LOCAL_GB),
+        "MXC_INTERMEDIATE_CACHE_VOLUME_DIR": INTERMEDIATE_CACHE_VOLUME_DIR,
+        "MXC_INTERMEDIATE_CACHE_VOLUME_GB": str(INTERMEDIATE_CACHE_VOLUME_GB),
+        "MXC_INTERMEDIATE_CACHE_NODES": " ".join(INTERMEDIATE_CACHE_NODES),
+    })
+
+# Metrics and cold-start trace of this container, served by ComfyUIContainer.metrics
+METRICS = MetricsRegistry()
+TRACER = Tracer()
+
 # Use dictionary unpacking (**) to pass the arguments
 @app.cls(**container_kwargs)
 @modal.concurrent(max_inputs=MAX_INPUTS)
 
 class ComfyUIContainer:
-    @modal.enter()
+    # Container shard the router sends workflows to; the UI and api endpoints use shard 0
+    shard: int = modal.parameter(default=0)
+
+    # Dependencies must be installed before ComfyUI is launched for the snapshot
+    @modal.enter(snap=MEMORY_SNAPSHOT)
     def setup_dependencies(self):
         """
         Scans the persistent custom_nodes directory for requirements.txt files
         and installs the dependencies.
+
+        Nodes whose requirements were baked into the image are skipped. The
+        rest are merged and installed in a single resolver pass, and the
+        installed packages are cached on the volume, keyed by a hash of all
+        requirements files, so the resolver only runs when they change.
         """
+        with lifecycle_step(METRICS, TRACER, "setup_dependencies"):
+            self._setup_dependencies()
+
+    def _setup_dependencies(self):
         nodes_path = Path(CUSTOM_NODES_DIR)
 
         if not nodes_path.exists():
@@ -138,23 +460,591 @@ class ComfyUIContainer:
             return
 
         print("--- Checking for custom node requirements ---")
-        for node_dir in nodes_path.iterdir():
-            if node_dir.is_dir():
-                req_file = node_dir / "requirements.txt"
-                if req_file.exists():
-                    print(f"Installing requirements for: {node_dir.name}")
-                    # Install dependencies for each node
-                    subprocess.run(
-                        ["pip", "install", "-r", str(req_file)], check=False)
+        cache = DependencyCache(DEPENDENCY_CACHE_DIR)
+        baked = load_baked_record(BAKED_DEPENDENCIES_RECORD)
+        req_files = [
+            req_file for req_file in cache.find_requirement_files(nodes_path)
+            if baked["nodes"].get(req_file.parent.name) != requirements_digest(req_file.read_bytes())
+        ]
+        if baked["nodes"]:
+            print(f"{len(baked['nodes'])} node(s) baked into the image ({baked['fingerprint'][:12]})")
+        dependency_nodes = METRICS.gauge("mxc_dependency_nodes", "Custom nodes by where their requirements come from")
+        dependency_nodes.set(len(baked["nodes"]), source="image")
+        dependency_nodes.set(len(req_files), source="volume")
+        if not req_files:
+            print("--- Dependency check complete ---")
+            return
+
+        cache_key = cache.compute_key(req_files, base=baked["fingerprint"])
+
+        with METRICS.timer("mxc_dependency_restore_seconds", "Time to restore cached dependencies"):
+            restored = cache.restore(cache_key)
+        if restored:
+            print(f"Restored cached dependencies ({cache_key[:12]})")
+            print("--- Dependency check complete ---")
+            return
+
+        protected = DependencyInstaller.installed_versions(PROTECTED_PACKAGES)
+        merger = RequirementsMerger(req_files, protected=protected)
+        requirements = merger.merge()
+        for conflict in merger.conflicts:
+            print(f"⚠ {format_conflict(conflict)}")
+
+        print(f"Installing {len(requirements)} merged requirement(s) from {len(req_files)} node(s)")
+        before = cache.snapshot()
+        installer = DependencyInstaller(DEPENDENCY_INSTALLER, protected=protected)
+        with METRICS.timer("mxc_dependency_install_seconds", "Time of the merged install of the nodes' requirements",
+                           nodes=len(req_files)):
+            returncode = installer.install(requirements)
+
+        if returncode != 0:
+            # Don't cache a partial install; retry on the next cold start
+            print(f"Skipping dependency cache, installer exited with code {returncode}")
+        else:
+            count = cache.save(cache_key, before)
+            cache.prune()
+            model_volume.commit()
+            print(f"Cached {count} installed package(s) ({cache_key[:12]})")
         print("--- Dependency check complete ---")
 
-    @modal.web_server(WEB_SERVER_PORT, startup_timeout=60)
-    def ui(self):
+    @modal.enter(snap=MEMORY_SNAPSHOT)
+    def warm_for_snapshot(self):
         """
-        Launches the ComfyUI web server.
+        Launches ComfyUI and preloads models before the memory snapshot is taken.
+
+        Only active when memory_snapshot is enabled in config.ini. Containers
+        restored from the snapshot already have ComfyUI running with its node
+        registry populated and the preloaded models in host RAM.
         """
-        print(f"Starting ComfyUI on  {WEB_SERVER_HOST}:{WEB_SERVER_PORT}...")
-        subprocess.Popen(
-            f"comfy launch -- --output-directory {CUSTOM_OUTPUT_DIR} --listen {WEB_SERVER_HOST} --port {WEB_SERVER_PORT}",
-            shell=True
+        self.launcher = ComfyUILauncher(COMFYUI_LAUNCH_COMMAND, COMFYUI_URL, env=COMFYUI_ENV)
+        if not MEMORY_SNAPSHOT:
+            return
+
+        print("--- Warming ComfyUI for memory snapshot ---")
+        self._refresh_model_index()
+        with lifecycle_step(METRICS, TRACER, "comfyui_launch", snapshot=True) as span:
+            self.launcher.start()
+            if not self.launcher.wait_until_ready(STARTUP_TIMEOUT):
+                print("⚠ ComfyUI did not become ready before the snapshot")
+        record_launch(METRICS, TRACER, self.launcher, parent=span)
+        self.launcher.write_report(STARTUP_REPORT_DIR)
+
+        self.preloader = ModelPreloader(VOLUME_MOUNT_LOCATION)
+        preloaded = self.preloader.preload(SNAPSHOT_PRELOAD)
+        print(f"--- Snapshot warm-up complete ({preloaded / 1024 ** 3:.2f} GB preloaded) ---")
+
+    @modal.enter()
+    def launch_comfyui(self):
+        """
+        Launches the ComfyUI server and waits until its node registry is populated.
+
+        Startup phase timings are written to the startup report directory.
+        """
+        entered = time.monotonic()
+        self.scheduler = (
+            JobScheduler(CostModel(SCHEDULER_COST_HISTORY_PATH, SCHEDULER_DEFAULT_COST), SCHEDULER_CLASSES,
+                         SCHEDULER_DEFAULT_CLASS, SCHEDULER_AGING, SCHEDULER_DISPATCH_DEPTH)
+            if SCHEDULER_ENABLED else None
+        )
+        # Pools of a [GPU_PROFILE.<name>] section accept that section's max_inputs, and are scaled on their own
+        profile_name = os.environ.get("MXC_GPU_PROFILE", "")
+        profile = GPU_PROFILES.get(profile_name)
+        max_inputs = profile["max_inputs"] if profile else MAX_INPUTS
+        self.scaling_shard = f"gpu:{profile_name}" if profile else self.shard
+        self.headless_api = HeadlessAPI(ComfyUIClient(COMFYUI_URL), max_inputs, API_QUEUE_TIMEOUT, self.scheduler)
+        self.batcher = (
+            MicroBatcher(self.headless_api, API_MAX_BATCH, API_MAX_WAIT_MS, timeout=TIMEOUT)
+            if API_MAX_BATCH > 1 else None
         )
+        self.loaded_models = LoadedModels(ROUTING_MODEL_SLOTS)
+        self.registry = ShardRegistry(routing_registry, ROUTING_REGISTRY_TTL)
+        self.scraper = ComfyUIScraper(COMFYUI_URL)
+        self.result_cache = self._create_result_cache() if RESULT_CACHE_ENABLED else None
+        self.otlp = (
+            OTLPFileExporter(METRICS_OTLP_PATH, METRICS, TRACER, {"service.name": "mxc-container",
+                                                                  "modal.task_id": os.environ.get("MODAL_TASK_ID", "")},
+                             METRICS_OTLP_INTERVAL, before_export=self._collect_metrics)
+            if METRICS_OTLP_PATH else None
+        )
+        restored = self.launcher.is_running()
+        # Reported with the first result, so workload benchmarks can count cold starts
+        self.container = {"task_id": os.environ.get("MODAL_TASK_ID", ""), "cold_start": True,
+                          "snapshot_restored": restored}
+        self.load = LoadTracker(AUTOSCALING_SIGNAL_WINDOW)
+        if AUTOSCALING_ENABLED:
+            threading.Thread(target=self._publish_load, daemon=True).start()
+        METRICS.gauge("mxc_snapshot_restored", "Whether the container was restored from a memory snapshot").set(
+            1 if restored else 0)
+        if restored:
+            # Time the restored container spent getting ready here; the restore itself happens before
+            self.load.cold_start = time.monotonic() - entered
+            print(f"ComfyUI restored from memory snapshot on {WEB_SERVER_HOST}:{WEB_SERVER_PORT}")
+            return
+
+        with lifecycle_step(METRICS, TRACER, "model_index_refresh"):
+            self._refresh_model_index()
+        print(f"Starting ComfyUI on  {WEB_SERVER_HOST}:{WEB_SERVER_PORT}...")
+        with lifecycle_step(METRICS, TRACER, "comfyui_launch") as span:
+            self.launcher.start()
+            if self.launcher.wait_until_ready(STARTUP_TIMEOUT):
+                print(f"ComfyUI ready with {self.launcher.node_count} nodes")
+            else:
+                print(f"⚠ ComfyUI not ready after {STARTUP_TIMEOUT}s")
+        record_launch(METRICS, TRACER, self.launcher, parent=span)
+        self.launcher.write_report(STARTUP_REPORT_DIR)
+        total = self.launcher.report()["total"]
+        # A ComfyUI that never became ready still took at least this long
+        self.load.cold_start = total if total is not None else time.monotonic() - entered
+
+    def _publish_load(self):
+        """
+        Publishes this container's arrivals, execution times and queue depth for
+        the autoscale function, twice per decision interval.
+        """
+        registry = ScalingRegistry(autoscaling_registry)
+        container = self.container["task_id"] or str(os.getpid())
+        while True:
+            try:
+                registry.publish(self.scaling_shard, container, self.load.snapshot(self.headless_api.in_flight))
+            except Exception as e:
+                print(f"⚠ Could not publish the container load: {e}")
+            time.sleep(AUTOSCALING_INTERVAL / 2)
+
+    def _refresh_model_index(self):
+        """
+        Brings the model index up to date so ComfyUI lists the volume's models
+        without walking it.
+        """
+        if not MODEL_INDEX:
+            return
+        from generate_model_paths import ModelPathsGenerator
+
+        generator = ModelPathsGenerator(config_file=str(CURRENT_DIR / "config.ini"))
+        generator.load_config()
+        try:
+            stats = generator.generate_model_index(MODEL_INDEX_PATH)
+            print(f"Model index refreshed: {stats['scanned']} director(ies) rescanned, {stats['reused']} unchanged, "
+                  f"{stats['updated']} file size(s) updated")
+        except OSError as e:
+            print(f"⚠ Could not refresh the model index, ComfyUI will scan the volume: {e}")
+
+    def _create_result_cache(self) -> ResultCache:
+        """
+        Opens the result cache index on the volume, keying model files by the
+        [MODEL_PATHS] folders they resolve in.
+        """
+        from generate_model_paths import ModelPathsGenerator
+
+        generator = ModelPathsGenerator(config_file=str(CURRENT_DIR / "config.ini"))
+        generator.load_config()
+        resolver = ModelPathsResolver.from_model_paths(generator.get_model_paths(), COMFYUI_DIR)
+        hasher = ModelHasher(resolver.resolve, ModelStore(VOLUME_MOUNT_LOCATION, MODEL_STORE_DIR_NAME,
+                                                          MODEL_STORE_LINK_MODE), RESULT_CACHE_MODEL_HASHES)
+        cache = ResultCache(RESULT_CACHE_INDEX_PATH, CUSTOM_OUTPUT_DIR, hasher.digest, f"{COMFYUI_DIR}/input",
+                            RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_HOURS * 3600,
+                            flush=self.headless_api.client.wait_outputs, reload=model_volume.reload)
+        print(f"Result cache: {len(cache.entries)} stored result(s)")
+        return cache
+
+    @modal.exit()
+    def flush_metrics(self):
+        """
+        Appends the last metrics and the cold-start trace to the OTLP file, and
+        saves the scheduler's job cost history and the result cache index.
+        """
+        if self.otlp is not None:
+            self.otlp.close()
+        if self.scheduler is not None:
+            self.scheduler.costs.save()
+        if self.result_cache is not None:
+            self.result_cache.close()
+
+    def _collect_metrics(self) -> str:
+        """
+        Refreshes the gauges read on demand and returns the Prometheus text of
+        ComfyUI's mxc_metrics node pack.
+        """
+        METRICS.gauge("mxc_api_in_flight", "Headless API submissions in flight").set(self.headless_api.in_flight)
+        if self.result_cache is not None:
+            for key, value in self.result_cache.metrics().items():
+                METRICS.gauge(f"mxc_result_cache_{key}").set(value)
+        if self.scheduler is not None:
+            for key, value in self.scheduler.metrics().items():
+                METRICS.gauge(f"mxc_scheduler_{key}").set(value)
+        process_peaks(METRICS)
+        return self.scraper.scrape(METRICS)
+
+    @modal.fastapi_endpoint(method="GET")
+    def metrics(self):
+        """
+        Prometheus metrics of this container and its ComfyUI process: cold-start
+        phases, dependency install, queue depth, node execution and model load
+        times, VRAM/RAM peaks, output write latency and result cache hit rate.
+
+        Each request is served by one container; like any endpoint call it keeps
+        (or starts) a container, so scrape it no more often than scaledown_window.
+        """
+        from fastapi.responses import Response
+
+        comfyui = self._collect_metrics()
+        return Response(METRICS.render() + comfyui, media_type=PROMETHEUS_CONTENT_TYPE)
+
+    @modal.web_server(WEB_SERVER_PORT, startup_timeout=STARTUP_TIMEOUT)
+    def ui(self):
+        """
+        Exposes the ComfyUI web server, relaunching it if the process has exited.
+        """
+        if not self.launcher.is_running():
+            print(f"ComfyUI is not running, restarting on {WEB_SERVER_HOST}:{WEB_SERVER_PORT}...")
+            self.launcher.start()
+
+    @modal.fastapi_endpoint(method="POST")
+    def api(self, body: dict):
+        """
+        Headless workflow submission.
+
+        Expects {"workflow": {...}} in ComfyUI API format. Optional fields:
+        "stream" returns newline-delimited progress events instead of a
+        single JSON result, "include_images" embeds outputs as base64 and
+        "cache": false runs the workflow even if its result is cached.
+        With the scheduler enabled, "priority" picks a priority class and
+        "tenant" names the client for fair share.
+        Non-streaming requests are micro-batched when max_batch > 1.
+        """
+        from fastapi import HTTPException
+        from fastapi.responses import StreamingResponse
+
+        try:
+            workflow = HeadlessAPI.parse_workflow(body)
+            include_images = bool(body.get("include_images", False))
+            use_cache = self.result_cache is not None and bool(body.get("cache", True))
+            priority, tenant = body.get("priority"), body.get("tenant")
+            if not body.get("stream", False):
+                return self._run_workflow(workflow, include_images, use_cache, priority, tenant)
+            hit = self.result_cache.get(workflow, include_images) if use_cache else None
+            if hit is not None:
+                events = iter([hit])
+            else:
+                events = self.headless_api.submit(workflow, include_images=include_images, timeout=TIMEOUT,
+                                                  priority=priority, tenant=tenant)
+                self.load.arrival()
+                events = self.load.observe(events)
+                if use_cache:
+                    events = self.result_cache.tee(workflow, events)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+        except ComfyUIError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        return StreamingResponse(HeadlessAPI.ndjson(events), media_type="application/x-ndjson")
+
+    @modal.method()
+    def run_workflow(self, workflow: dict, include_images: bool = False, use_cache: bool = True,
+                     priority: str = None, tenant: str = None):
+        """
+        Runs a workflow sent by the router and returns its result.
+        """
+        return self._run_workflow(workflow, include_images, use_cache and self.result_cache is not None,
+                                  priority, tenant)
+
+    def _run_workflow(self, workflow: dict, include_images: bool, use_cache: bool = False,
+                      priority: str = None, tenant: str = None):
+        """
+        Runs a workflow to completion, micro-batching it when enabled, and
+        publishes the models this shard has loaded for the router. Cached
+        results are returned without running the workflow.
+        """
+        result = self.result_cache.get(workflow, include_images) if use_cache else None
+        if result is None:
+            self.load.arrival()
+            self.loaded_models.use(model_keys(workflow))
+            if self.batcher is not None:
+                result = self.batcher.submit(workflow, include_images, priority, tenant).result()
+            else:
+                result = HeadlessAPI.result(self.headless_api.submit(
+                    workflow, include_images=include_images, timeout=TIMEOUT, priority=priority, tenant=tenant))
+            if "execution" in result.get("timings", {}):
+                self.load.completed(result["timings"]["execution"])
+            if use_cache:
+                self.result_cache.put(workflow, result)
+            if ROUTING_ENABLED:
+                self.registry.publish(self.shard, self.loaded_models.models, self.headless_api.in_flight)
+        container, self.container = self.container, {**self.container, "cold_start": False}
+        return {**result, "container": container}
+
+
+if ROUTING_ENABLED:
+    @app.cls(max_containers=1, scaledown_window=SCALEDOWN_WINDOW, timeout=TIMEOUT)
+    @modal.concurrent(max_inputs=ROUTING_SHARDS * MAX_INPUTS)
+    class Router:
+        @modal.enter()
+        def setup_router(self):
+            """
+            Creates the in-memory router; one router container keeps consistent metrics.
+            """
+            self.router = AffinityRouter(ROUTING_SHARDS, ROUTING_MODEL_SLOTS)
+            self.registry = ShardRegistry(routing_registry, ROUTING_REGISTRY_TTL)
+
+        @modal.fastapi_endpoint(method="POST")
+        def route(self, body: dict):
+            """
+            Sends a workflow to the shard that already has its models loaded,
+            falling back to the least-loaded shard. Same body as the api endpoint.
+            """
+            from fastapi import HTTPException
+
+            try:
+                workflow = HeadlessAPI.parse_workflow(body)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+            self.registry.apply(self.router)
+            shard = self.router.route(model_keys(workflow))
+            try:
+                result = ComfyUIContainer(shard=shard).run_workflow.remote(
+                    workflow, bool(body.get("include_images", False)), bool(body.get("cache", True)),
+                    body.get("priority"), body.get("tenant"))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except QueueFullError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except ComfyUIError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            finally:
+                self.router.complete(shard)
+            return {**result, "shard": shard}
+
+        @modal.fastapi_endpoint(method="GET")
+        def metrics(self):
+            """
+            Routing decisions, affinity hit rate and model swap counts.
+            """
+            return self.router.metrics()
+
+
+def gpu_profile_pool(name: str):
+    """
+    ComfyUIContainer pool running on the GPU of a [GPU_PROFILE.<name>] section.
+
+    Args:
+        name: Profile name
+
+    Returns:
+        ComfyUIContainer class with the profile's GPU, resources and concurrency
+    """
+    profile = GPU_PROFILES[name]
+    options = {
+        "gpu": profile["gpu_type"],
+        "max_containers": profile["max_containers"],
+        "scaledown_window": profile["scaledown_window"],
+        "env": {"MXC_GPU_PROFILE": name},
+    }
+    if profile["cpu"] is not None:
+        options["cpu"] = float(profile["cpu"])
+    if profile["memory"] is not None:
+        options["memory"] = int(profile["memory"])
+    return ComfyUIContainer.with_options(**options).with_concurrency(max_inputs=profile["max_inputs"])
+
+
+if GPU_PROFILES_ENABLED:
+    @app.cls(volumes={VOLUME_MOUNT_LOCATION: model_volume}, max_containers=1, scaledown_window=SCALEDOWN_WINDOW,
+             timeout=TIMEOUT)
+    @modal.concurrent(max_inputs=sum(p["max_containers"] * p["max_inputs"] for p in GPU_PROFILES.values()))
+    class GPUSelector:
+        @modal.enter()
+        def setup_selector(self):
+            """
+            Builds the classifier from the model index and throughput table on the volume.
+            """
+            from generate_model_paths import ModelPathsGenerator
+
+            generator = ModelPathsGenerator(config_file=str(CURRENT_DIR / "config.ini"))
+            generator.load_config()
+            self.folders = ModelPathsResolver.from_model_paths(generator.get_model_paths(), COMFYUI_DIR).folders
+            self.table = ThroughputTable(GPU_THROUGHPUT_TABLE_PATH)
+            self.classifier = GPUClassifier(
+                GPU_PROFILES, self.table, index_model_size(ModelIndex(MODEL_INDEX_PATH), self.folders),
+                GPU_PROFILES_VRAM_OVERHEAD, GPU_PROFILES_VRAM_PER_MEGAPIXEL_GB)
+            self.loaded = time.monotonic()
+            self.reload_lock = threading.Lock()
+            measured = [name for name in GPU_PROFILES if self.table.throughput(name)]
+            print(f"✓ GPU selector ready: profiles {', '.join(GPU_PROFILES)}, "
+                  f"measured {', '.join(measured) or 'none (relative_speed only)'}")
+
+        def _reload(self):
+            """
+            Picks up a rebuilt model index and newly fitted throughput every reload_interval.
+            """
+            if time.monotonic() - self.loaded < GPU_PROFILES_RELOAD_INTERVAL or not self.reload_lock.acquire(False):
+                return
+            try:
+                model_volume.reload()
+                self.classifier.model_size = index_model_size(ModelIndex(MODEL_INDEX_PATH), self.folders)
+                self.table.load()
+            except Exception as e:
+                print(f"⚠ Could not reload the model index and throughput table: {e}")
+            finally:
+                self.loaded = time.monotonic()
+                self.reload_lock.release()
+
+        @modal.fastapi_endpoint(method="POST")
+        def route(self, body: dict, gpu_profile: str = None):
+            """
+            Runs a workflow on the cheapest GPU profile that fits its models
+            and meets its latency target. Same body as the api endpoint, plus
+            "max_latency" in seconds. The gpu_profile query parameter pins the
+            profile, e.g. to benchmark one pool.
+            """
+            from fastapi import HTTPException
+
+            try:
+                workflow = HeadlessAPI.parse_workflow(body)
+                max_latency = float(body.get("max_latency", GPU_PROFILES_MAX_LATENCY))
+            except (TypeError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            if gpu_profile is not None and gpu_profile not in GPU_PROFILES:
+                raise HTTPException(status_code=400, detail=f"Unknown GPU profile {gpu_profile}; "
+                                                            f"configured: {', '.join(GPU_PROFILES)}")
+
+            self._reload()
+            choice = self.classifier.classify(workflow, max_latency)
+            if gpu_profile is not None:
+                choice["profile"] = gpu_profile
+            try:
+                result = gpu_profile_pool(choice["profile"])().run_workflow.remote(
+                    workflow, bool(body.get("include_images", False)), bool(body.get("cache", True)),
+                    body.get("priority"), body.get("tenant"))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except QueueFullError as e:
+                raise HTTPException(status_code=429, detail=str(e))
+            except ComfyUIError as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            return {**result, "gpu_profile": choice["profile"],
+                    "estimated_seconds": choice["estimates"][choice["profile"]]["seconds"]}
+
+        @modal.fastapi_endpoint(method="GET")
+        def metrics(self):
+            """
+            Workflows sent to each profile and the measured throughput of each.
+            """
+            return {
+                "workflows": self.classifier.stats,
+                "throughput": {name: self.table.throughput(name) for name in GPU_PROFILES},
+            }
+
+
+if AUTOSCALING_ENABLED:
+    @app.function(schedule=modal.Period(seconds=AUTOSCALING_INTERVAL), timeout=AUTOSCALING_INTERVAL)
+    def autoscale():
+        """
+        Chooses min_containers, buffer_containers and scaledown_window for each
+        container shard and each GPU profile pool from the load its containers
+        report, and applies them to Modal's autoscaler when they change.
+        """
+        def policy(max_containers: int, max_inputs: int) -> AutoscalePolicy:
+            return AutoscalePolicy(
+                max_containers, max_inputs, AUTOSCALING_MAX_MIN_CONTAINERS, AUTOSCALING_MAX_BUFFER_CONTAINERS,
+                AUTOSCALING_MIN_SCALEDOWN_WINDOW, AUTOSCALING_MAX_SCALEDOWN_WINDOW, AUTOSCALING_WARM_PROBABILITY,
+                AUTOSCALING_HEADROOM, AUTOSCALING_COLD_START_TOLERANCE, AUTOSCALING_COOLDOWN)
+
+        # Shard: (policy, container of the pool)
+        pools = {shard: (policy(MAX_CONTAINERS, MAX_INPUTS), lambda shard=shard: ComfyUIContainer(shard=shard))
+                 for shard in range(ROUTING_SHARDS if ROUTING_ENABLED else 1)}
+        if GPU_PROFILES_ENABLED:
+            for name, profile in GPU_PROFILES.items():
+                pools[f"gpu:{name}"] = (policy(profile["max_containers"], profile["max_inputs"]),
+                                        lambda name=name: gpu_profile_pool(name)())
+        registry = ScalingRegistry(autoscaling_registry, 2 * AUTOSCALING_INTERVAL, AUTOSCALING_COLD_START_SECONDS)
+        for shard, (pool_policy, container) in pools.items():
+            signals = registry.signals(shard)
+            previous = registry.decision(shard)
+            decision = pool_policy.decide(signals, previous)
+            settings = {key: decision[key] for key in ("min_containers", "buffer_containers", "scaledown_window")}
+            if previous is None or any(previous[key] != value for key, value in settings.items()):
+                container().update_autoscaler(**settings)
+                print(f"✓ Shard {shard}: min_containers={settings['min_containers']}, "
+                      f"buffer_containers={settings['buffer_containers']}, "
+                      f"scaledown_window={settings['scaledown_window']}s (load {decision['load']:.2f}, "
+                      f"{signals['rate'] * 60:.1f} request(s)/min, {signals['in_flight']} in flight, "
+                      f"cold start {signals['cold_start']:.0f}s)")
+            registry.save_decision(shard, decision)
+
+
+@app.function(volumes={VOLUME_MOUNT_LOCATION: model_volume}, timeout=TIMEOUT)
+def download_models(entries: list, folders: dict):
+    """
+    Downloads manifest entries straight into the volume; no GPU is attached.
+    Interrupted downloads resume from their finished chunks on the next run.
+    """
+    downloader = Downloader(
+        VOLUME_MOUNT_LOCATION,
+        folders=folders,
+        hf_token=HF_TOKEN,
+        civitai_token=CIVITAI_API_TOKEN,
+        concurrency=DOWNLOAD_CONCURRENCY,
+        chunk_size=DOWNLOAD_CHUNK_SIZE_MB * 1024 * 1024,
+        store=ModelStore(VOLUME_MOUNT_LOCATION, MODEL_STORE_DIR_NAME, MODEL_STORE_LINK_MODE)
+        if DOWNLOAD_USE_MODEL_STORE else None,
+    )
+    try:
+        results = downloader.download_all(entries)
+    finally:
+        downloader.close()
+        model_volume.commit()
+    return results
+
+
+@app.local_entrypoint()
+def download(manifest: str = str(MODELS_MANIFEST)):
+    """
+    Downloads the models listed in a manifest into the volume:
+        modal run main.py::download --manifest models.yaml
+    """
+    from generate_model_paths import ModelPathsGenerator
+
+    generator = ModelPathsGenerator(config_file=str(CURRENT_DIR / "config.ini"))
+    generator.load_config()
+    folders = volume_folders(generator.get_model_paths(), VOLUME_MOUNT_LOCATION)
+
+    entries = load_manifest(manifest)
+    print(f"📥 Downloading {len(entries)} model(s) into volume {VOLUME_NAME}")
+    results = download_models.remote(entries, folders)
+    failed = [result for result in results if "error" in result]
+    print(f"✓ {len(results) - len(failed)} model(s) ready, {len(failed)} failed")
+    for result in failed:
+        print(f"  ✗ {result['path']}: {result['error']}")
+
+
+@app.function(volumes={VOLUME_MOUNT_LOCATION: model_volume}, timeout=TIMEOUT)
+def dedupe_models(dirs: list, dry_run: bool = False):
+    """
+    Replaces duplicate model files across the volume's model folders with
+    links to a single copy in the model store.
+    """
+    store = ModelStore(VOLUME_MOUNT_LOCATION, MODEL_STORE_DIR_NAME, MODEL_STORE_LINK_MODE)
+    result = store.dedupe(dirs, dry_run=dry_run)
+    if not dry_run:
+        model_volume.commit()
+    return result
+
+
+@app.local_entrypoint()
+def dedupe(dry_run: bool = False):
+    """
+    Deduplicates the model folders of [MODEL_PATHS] on the volume:
+        modal run main.py::dedupe [--dry-run]
+    """
+    from generate_model_paths import ModelPathsGenerator
+
+    generator = ModelPathsGenerator(config_file=str(CURRENT_DIR / "config.ini"))
+    generator.load_config()
+    dirs = volume_model_dirs(generator.get_model_paths(), VOLUME_MOUNT_LOCATION)
+
+    result = dedupe_models.remote(dirs, dry_run)
+    for digest, paths in result["duplicates"].items():
+        print(f"🔗 {digest[:12]}: {', '.join(paths)}")
+    verb = "Would save" if dry_run else "Saved"
+    print(f"✓ {verb} {result['bytes_saved'] / 1024 ** 3:.2f} GB across {len(result['duplicates'])} model(s)")
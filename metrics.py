@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Metrics and traces of the container lifecycle.
+
+MetricsRegistry holds counters, gauges and histograms and renders them in
+the Prometheus text format. Tracer records spans (the cold-start phases of
+a container form one trace). Both can be appended to a file as OTLP/JSON,
+one export request per line, which an OpenTelemetry collector's file
+receiver (or jq) can read.
+
+ComfyUIScraper collects what the ComfyUI process knows: queue depth, the
+Prometheus text of the mxc_metrics node pack (node execution and model load
+times, VRAM/RAM peaks) and the JSON stats of the other mxc_* node packs
+(output writer, model cache, prefetch). main.py serves the result on the
+metrics endpoint of ComfyUIContainer.
+
+Try it against the mock ComfyUI:
+
+    python metrics.py --mock --otlp /tmp/mxc-otlp.jsonl
+    python metrics.py --url http://127.0.0.1:8188
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import resource
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram buckets in seconds, from a fast node to a slow model load
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escape = lambda value: value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in key) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            encoded = {"boolValue": value}
+        elif isinstance(value, int):
+            encoded = {"intValue": str(value)}
+        elif isinstance(value, float):
+            encoded = {"doubleValue": value}
+        else:
+            encoded = {"stringValue": str(value)}
+        result.append({"key": key, "value": encoded})
+    return result
+
+
+class Metric:
+    """A named metric with one value per label set."""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.values: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        """(sample name, labels, value) triples, as rendered."""
+        for key, value in sorted(self.values.items()):
+            yield self.name, key, value
+
+
+class Counter(Metric):
+    """Monotonically increasing value; names should end in _total."""
+
+    kind = "counter"
+
+    def inc(self, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_label_key(labels)] = value
+
+    def set_max(self, value: float, **labels):
+        """Keep the highest value seen (peaks)."""
+        key = _label_key(labels)
+        with self._lock:
+            self.values[key] = max(self.values.get(key, value), value)
+
+
+class Histogram(Metric):
+    """Distribution of observations over fixed buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            entry = self.values.setdefault(key, {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+            entry["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        for key, entry in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry["counts"]):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", key, entry["sum"]
+            yield f"{self.name}_count", key, entry["count"]
+
+
+class MetricsRegistry:
+    """Set of metrics rendered together."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, **kwargs) -> Any:
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is a {metric.kind}, not a {cls.kind}")
+            return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        """Get or create a counter."""
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        """Get or create a gauge."""
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    @contextmanager
+    def timer(self, name: str, help: str = "", **labels):
+        """Observe the duration of a block in a histogram."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.histogram(name, help).observe(time.monotonic() - start, **labels)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text format (version 0.0.4).
+
+        Returns:
+            Exposition text
+        """
+        lines = []
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            with metric._lock:
+                samples = list(metric.samples())
+            if not samples:
+                continue
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(key)} {_format_value(value)}" for name, key, value in samples)
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def otlp(self, resource: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Every metric as an OTLP/JSON ExportMetricsServiceRequest.
+
+        Args:
+            resource: Resource attributes (service.name etc.)
+        """
+        now, start = str(time.time_ns()), str(int(self.started * 1e9))
+        exported = []
+        with self._lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            with metric._lock:
+                values = dict(metric.values)
+            points = []
+            for key, value in sorted(values.items()):
+                point = {"attributes": _otlp_attributes(dict(key)), "startTimeUnixNano": start, "timeUnixNano": now}
+                if metric.kind == "histogram":
+                    point.update({"count": str(value["count"]), "sum": value["sum"],
+                                  "bucketCounts": [str(count) for count in value["counts"]],
+                                  "explicitBounds": list(metric.buckets)})
+                else:
+                    point["asDouble"] = float(value)
+                points.append(point)
+            if not points:
+                continue
+            entry = {"name": metric.name, "description": metric.help}
+            if metric.kind == "counter":
+                entry["sum"] = {"dataPoints": points, "aggregationTemporality": 2, "isMonotonic": True}
+            elif metric.kind == "histogram":
+                entry["histogram"] = {"dataPoints": points, "aggregationTemporality": 2}
+            else:
+                entry["gauge"] = {"dataPoints": points}
+            exported.append(entry)
+        return {"resourceMetrics": [{
+            "resource": {"attributes": _otlp_attributes(resource or {})},
+            "scopeMetrics": [{"scope": {"name": "mxc"}, "metrics": exported}],
+        }]}
+
+
+class Tracer:
+    """Spans of one trace (a container's lifecycle), exported as OTLP/JSON."""
+
+    def __init__(self):
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Dict[str, Any]] = []
+        self._stack = threading.local()
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, end: float, parent: Optional[str] = None, **attributes) -> str:
+        """
+        Record a finished span.
+
+        Args:
+            name: Span name
+            start: Start time (time.time())
+            end: End time (time.time())
+            parent: Parent span id
+            **attributes: Span attributes
+
+        Returns:
+            The span id
+        """
+        span_id = uuid.uuid4().hex[:16]
+        self._record(span_id, name, start, end, parent, attributes)
+        return span_id
+
+    def _record(self, span_id: str, name: str, start: float, end: float, parent: Optional[str],
+                attributes: Dict[str, Any]):
+        span = {
+            "traceId": self.trace_id, "spanId": span_id, "name": name, "kind": 1,
+            "startTimeUnixNano": str(int(start * 1e9)), "endTimeUnixNano": str(int(end * 1e9)),
+            "attributes": _otlp_attributes(attributes),
+        }
+        if parent:
+            span["parentSpanId"] = parent
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Record a block as a span, nested under the enclosing span of this thread."""
+        stack = self._stack.__dict__.setdefault("ids", [])
+        parent = stack[-1] if stack else None
+        span_id = uuid.uuid4().hex[:16]
+        stack.append(span_id)
+        start = time.time()
+        try:
+            yield span_id
+        finally:
+            stack.pop()
+            self._record(span_id, name, start, time.time(), parent, attributes)
+
+    def otlp(self, resource: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Take the recorded spans as an OTLP/JSON ExportTraceServiceRequest (None if there are none)."""
+        with self._lock:
+            spans, self.spans = self.spans, []
+        if not spans:
+            return None
+        return {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes(resource or {})},
+            "scopeSpans": [{"scope": {"name": "mxc"}, "spans": spans}],
+        }]}
+
+
+class OTLPFileExporter:
+    """Append metrics and spans to a file as OTLP/JSON lines, periodically and on close."""
+
+    def __init__(self, path: str, registry: MetricsRegistry, tracer: Optional[Tracer] = None,
+                 resource: Optional[Dict[str, Any]] = None, interval: float = 60.0,
+                 before_export: Optional[Callable[[], None]] = None):
+        """
+        Initialize the exporter.
+
+        Args:
+            path: File appended to; several processes may share it
+            registry: Metrics exported
+            tracer: Spans exported (each span once)
+            resource: Resource attributes of every export
+            interval: Seconds between exports (0 only exports on export/close)
+            before_export: Called before each export, e.g. to refresh gauges
+        """
+        self.path = path
+        self.registry = registry
+        self.tracer = tracer
+        self.resource = resource or {}
+        self.before_export = before_export
+        self._closed = threading.Event()
+        if interval > 0:
+            threading.Thread(target=self._loop, args=(interval,), name="mxc-otlp", daemon=True).start()
+
+    def export(self):
+        """Append one metrics line and, if spans were recorded, one traces line."""
+        if self.before_export:
+            self.before_export()
+        requests = [self.registry.otlp(self.resource)]
+        if self.tracer:
+            requests.append(self.tracer.otlp(self.resource))
+        data = "".join(json.dumps(request) + "\n" for request in requests if request)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # One write on an O_APPEND descriptor keeps lines from different processes whole
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data.encode())
+        finally:
+            os.close(fd)
+
+    def _loop(self, interval: float):
+        while not self._closed.wait(interval):
+            try:
+                self.export()
+            except Exception as e:
+                print(f"⚠ OTLP export to {self.path} failed: {e}")
+
+    def close(self):
+        """Export a last time and stop."""
+        self._closed.set()
+        self.export()
+
+
+@contextmanager
+def lifecycle_step(registry: MetricsRegistry, tracer: Tracer, name: str, **attributes):
+    """Record a container lifecycle step as a span and as a duration gauge."""
+    start = time.monotonic()
+    try:
+        with tracer.span(name, **attributes) as span_id:
+            yield span_id
+    finally:
+        registry.gauge("mxc_lifecycle_step_seconds", "Duration of each container lifecycle step").set(
+            time.monotonic() - start, step=name)
+
+
+def record_launch(registry: MetricsRegistry, tracer: Tracer, launcher, parent: Optional[str] = None):
+    """
+    Record a ComfyUILauncher's startup report as metrics and spans.
+
+    Args:
+        registry: Metrics registry
+        tracer: Tracer receiving one span per startup phase
+        launcher: Launcher after wait_until_ready
+        parent: Span the phase spans are nested under
+    """
+    report = launcher.report()
+    phases = registry.gauge("mxc_cold_start_phase_seconds", "Duration of each ComfyUI startup phase")
+    for phase, seconds in report["phases"].items():
+        phases.set(seconds, phase=phase)
+    if report["total"] is not None:
+        registry.gauge("mxc_cold_start_seconds", "ComfyUI launch until its node registry is populated").set(report["total"])
+    imports = registry.gauge("mxc_custom_node_import_seconds", "Import time of each custom node package")
+    for node, seconds in report["custom_node_import_times"].items():
+        imports.set(seconds, node=node)
+    registry.gauge("mxc_comfyui_node_types", "Node types in ComfyUI's registry").set(report["node_count"])
+
+    # Launcher marks are monotonic; anchor them to the wall clock once
+    offset = time.time() - time.monotonic()
+    previous = launcher.started_at
+    for phase in report["phases"]:
+        end = launcher.marks[phase]
+        tracer.add_span(f"comfyui.{phase}", previous + offset, end + offset, parent=parent)
+        previous = end
+
+
+class ComfyUIScraper:
+    """Collect the metrics the ComfyUI process exposes."""
+
+    # JSON stats of the mxc_* node packs, and the metric name prefix they are exported with
+    JSON_ENDPOINTS = {
+        "/mxc/output/metrics": "mxc_output",
+        "/mxc/model_cache/metrics": "mxc_model_cache",
+        "/mxc/prefetch/metrics": "mxc_prefetch",
+        "/mxc/intermediate_cache/metrics": "mxc_intermediate_cache",
+    }
+
+    def __init__(self, base_url: str, timeout: float = 5.0):
+        """
+        Initialize the scraper.
+
+        Args:
+            base_url: ComfyUI URL, e.g. http://127.0.0.1:8000
+            timeout: Seconds per request
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _get(self, endpoint: str) -> Optional[bytes]:
+        try:
+            with urllib.request.urlopen(f"{self.base_url}{endpoint}", timeout=self.timeout) as response:
+                return response.read()
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            return None
+
+    def scrape(self, registry: MetricsRegistry) -> str:
+        """
+        Update `registry` with ComfyUI's queue and node pack stats.
+
+        Args:
+            registry: Registry receiving the gauges
+
+        Returns:
+            Prometheus text served by the mxc_metrics node pack ("" if not enabled)
+        """
+        up = registry.gauge("mxc_comfyui_up", "Whether ComfyUI answered the metrics scrape")
+        data = self._get("/queue")
+        up.set(1 if data is not None else 0)
+        if data is not None:
+            queue = json.loads(data)
+            depth = registry.gauge("mxc_comfyui_queue_depth", "Prompts in ComfyUI's queue")
+            depth.set(len(queue.get("queue_running", [])), state="running")
+            depth.set(len(queue.get("queue_pending", [])), state="pending")
+
+        for endpoint, prefix in self.JSON_ENDPOINTS.items():
+            data = self._get(endpoint)
+            if data is None:
+                continue
+            for key, value in json.loads(data).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    registry.gauge(f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', key)}").set(value)
+
+        text = self._get("/mxc/metrics")
+        return text.decode() if text else ""
+
+
+def process_peaks(registry: MetricsRegistry, process: str = "container"):
+    """Record the peak RSS of this process."""
+    registry.gauge("mxc_ram_peak_bytes", "Peak resident memory of the process").set_max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024, process=process)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Print the metrics of a (mock) ComfyUI in Prometheus format.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="ComfyUI URL to scrape")
+    target.add_argument("--mock", action="store_true", help="Start a mock ComfyUI and run a workflow on it first")
+    parser.add_argument("--otlp", help="Also append the metrics as OTLP/JSON to this file")
+    args = parser.parse_args()
+
+    registry, tracer = MetricsRegistry(), Tracer()
+    url, mock = args.url, None
+    if args.mock:
+        from comfy_client import ComfyUIClient
+        from mock_comfyui import MockComfyUI
+
+        mock = MockComfyUI().start()
+        url = mock.url
+        workflow = {"1": {"class_type": "KSampler", "inputs": {}}, "2": {"class_type": "SaveImage", "inputs": {}}}
+        with tracer.span("workflow"):
+            for _ in ComfyUIClient(url).run(workflow, timeout=30):
+                pass
+
+    process_peaks(registry)
+    text = ComfyUIScraper(url).scrape(registry)
+    print(registry.render() + text, end="")
+    if args.otlp:
+        OTLPFileExporter(args.otlp, registry, tracer, {"service.name": "mxc"}, interval=0).export()
+        print(f"📝 OTLP appended to {args.otlp}")
+    if mock:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a ComfyUI server.
+
+Implements the parts of ComfyUI's API that this project talks to: /prompt,
+/queue, /interrupt, /history, /view, /object_info, /system_stats and the /ws event
+websocket, plus the /mxc/metrics endpoint of the mxc_metrics node pack.
+Prompts are "executed" one at a time by a worker thread that sleeps for a
+configurable time per node and emits the same events ComfyUI does. Output
+nodes (SaveImage, PreviewImage, VHS_VideoCombine) produce a small PNG, and
+nodes whose "seed" input is in fail_seeds fail with an execution_error.
+
+Run standalone:
+
+    python mock_comfyui.py --port 8188 --node-time 0.2
+
+or in-process with MockComfyUI(port=0).start().
+"""
+
+import argparse
+import json
+import queue
+import select
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from comfy_client import OP_CLOSE, OP_TEXT, encode_frame, read_frame, websocket_accept_key
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry
+
+OUTPUT_NODE_TYPES = ("SaveImage", "PreviewImage", "VHS_VideoCombine")
+
+# Node types reported by /object_info
+MOCK_NODE_TYPES = (
+    "CheckpointLoaderSimple", "CLIPTextEncode", "EmptyLatentImage", "KSampler",
+    "VAEDecode", "SaveImage", "PreviewImage", "LoraLoader", "UNETLoader", "VHS_VideoCombine",
+)
+
+
+def make_png(width: int = 8, height: int = 8, value: int = 128) -> bytes:
+    """Build a tiny grayscale PNG."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack("!I", len(data)) + kind + data + struct.pack("!I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + bytes([value % 256]) * width for _ in range(height))
+    header = struct.pack("!IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+class MockComfyUI:
+    """In-process mock ComfyUI server."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, node_time: float = 0.05):
+        """
+        Initialize the mock.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 picks a free port)
+            node_time: Seconds each node takes to "execute"
+        """
+        self.node_time = node_time
+        self.pending: List[Dict[str, Any]] = []
+        self.running: Optional[Dict[str, Any]] = None
+        self.history: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.clients: Dict[str, "queue.Queue[Optional[str]]"] = {}
+        self.executed: List[str] = []
+        self.lock = threading.Condition()
+        self.counter = 0
+        self.metrics = MetricsRegistry()
+        # Seeds that make a node fail, to exercise error handling
+        self.fail_seeds: set = set()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockComfyUI":
+        """Start serving and executing prompts in background threads."""
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._worker, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _send_event(self, client_id: str, event_type: str, data: Dict[str, Any]):
+        client = self.clients.get(client_id)
+        if client is not None:
+            client.put(json.dumps({"type": event_type, "data": data}))
+
+    def queue_prompt(self, workflow: Dict[str, Any], client_id: str) -> Dict[str, Any]:
+        """Validate and enqueue a prompt the way ComfyUI's /prompt does."""
+        node_errors = {
+            node_id: {"errors": [{"type": "missing_class_type"}]}
+            for node_id, node in workflow.items()
+            if not isinstance(node, dict) or "class_type" not in node
+        }
+        if node_errors:
+            return {"error": "invalid prompt", "node_errors": node_errors}
+
+        with self.lock:
+            self.counter += 1
+            prompt_id = str(uuid.uuid4())
+            self.pending.append({"number": self.counter, "prompt_id": prompt_id,
+                                 "prompt": workflow, "client_id": client_id})
+            self.lock.notify_all()
+        return {"prompt_id": prompt_id, "number": self.counter, "node_errors": {}}
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.lock.wait()
+                self.running = self.pending.pop(0)
+            self._execute(self.running)
+            with self.lock:
+                self.running = None
+
+    def _execute(self, item: Dict[str, Any]):
+        prompt_id, client_id, workflow = item["prompt_id"], item["client_id"], item["prompt"]
+        self._send_event(client_id, "execution_start", {"prompt_id": prompt_id})
+        outputs = {}
+        for node_id, node in workflow.items():
+            if item.get("interrupted"):
+                self._send_event(client_id, "execution_interrupted", {
+                    "prompt_id": prompt_id, "node_id": node_id, "node_type": node["class_type"], "executed": []})
+                self.history[prompt_id] = {"prompt": [item["number"], prompt_id, workflow, {}, []], "outputs": {},
+                                           "status": {"status_str": "error", "completed": False}}
+                self.metrics.counter("mxc_prompts_total", "Prompts executed").inc(status="interrupted")
+                return
+            self._send_event(client_id, "executing", {"node": node_id, "prompt_id": prompt_id})
+            if node.get("inputs", {}).get("seed") in self.fail_seeds:
+                self._send_event(client_id, "execution_error", {
+                    "prompt_id": prompt_id, "node_id": node_id, "node_type": node["class_type"],
+                    "exception_message": "mock failure", "exception_type": "RuntimeError"})
+                self.history[prompt_id] = {"prompt": [item["number"], prompt_id, workflow, {}, []], "outputs": {},
+                                           "status": {"status_str": "error", "completed": False}}
+                self.metrics.counter("mxc_prompts_total", "Prompts executed").inc(status="error")
+                return
+            with self.metrics.timer("mxc_node_execution_seconds", "Execution time of each node",
+                                    class_type=node["class_type"]):
+                time.sleep(self.node_time)
+            self._send_event(client_id, "progress", {"value": 1, "max": 1, "node": node_id, "prompt_id": prompt_id})
+            self.executed.append(node["class_type"])
+            if node["class_type"] in OUTPUT_NODE_TYPES:
+                batch = int(node.get("inputs", {}).get("batch_size", 1) or 1)
+                images = []
+                for index in range(batch):
+                    filename = f"mock_{prompt_id[:8]}_{node_id}_{index:05}.png"
+                    self.files[filename] = make_png(value=len(self.files))
+                    images.append({"filename": filename, "subfolder": "", "type": "output"})
+                outputs[node_id] = {"images": images}
+                self._send_event(client_id, "executed", {"node": node_id, "output": outputs[node_id],
+                                                         "prompt_id": prompt_id})
+        self.history[prompt_id] = {"prompt": [item["number"], prompt_id, workflow, {}, list(outputs)],
+                                   "outputs": outputs, "status": {"status_str": "success", "completed": True}}
+        self.metrics.counter("mxc_prompts_total", "Prompts executed").inc(status="success")
+        self._send_event(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, data: Any, status: int = 200):
+                self._send(status, json.dumps(data).encode())
+
+            def do_GET(self):
+                parsed = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(parsed.query)
+                if parsed.path == "/ws":
+                    return self._websocket(query.get("clientId", [uuid.uuid4().hex])[0])
+                if parsed.path == "/system_stats":
+                    return self._send_json({"system": {"comfyui_version": "mock"}, "devices": []})
+                if parsed.path == "/object_info":
+                    return self._send_json({name: {"name": name, "output_node": name in OUTPUT_NODE_TYPES}
+                                            for name in MOCK_NODE_TYPES})
+                if parsed.path == "/queue":
+                    with mock.lock:
+                        running = [mock.running] if mock.running else []
+                        pending = list(mock.pending)
+                    as_list = lambda items: [[i["number"], i["prompt_id"], i["prompt"], {}, []] for i in items]
+                    return self._send_json({"queue_running": as_list(running), "queue_pending": as_list(pending)})
+                if parsed.path.startswith("/history/"):
+                    prompt_id = parsed.path.rsplit("/", 1)[-1]
+                    entry = mock.history.get(prompt_id)
+                    return self._send_json({prompt_id: entry} if entry else {})
+                if parsed.path == "/mxc/metrics":
+                    return self._send(200, mock.metrics.render().encode(), PROMETHEUS_CONTENT_TYPE)
+                if parsed.path == "/view":
+                    data = mock.files.get(query.get("filename", [""])[0])
+                    if data is None:
+                        return self._send(404, b"")
+                    return self._send(200, data, "image/png")
+                self._send(404, b"")
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/prompt":
+                    response = mock.queue_prompt(body.get("prompt", {}), body.get("client_id", ""))
+                    return self._send_json(response, 400 if response.get("node_errors") else 200)
+                if self.path == "/interrupt":
+                    with mock.lock:
+                        if mock.running and body.get("prompt_id") in (None, mock.running["prompt_id"]):
+                            mock.running["interrupted"] = True
+                    return self._send(200, b"")
+                if self.path == "/queue":
+                    with mock.lock:
+                        delete = set(body.get("delete", []))
+                        mock.pending = [] if body.get("clear") else [
+                            item for item in mock.pending if item["prompt_id"] not in delete]
+                    return self._send(200, b"")
+                self._send(404, b"")
+
+            def _websocket(self, client_id: str):
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", websocket_accept_key(self.headers["Sec-WebSocket-Key"]))
+                self.end_headers()
+                events: "queue.Queue[Optional[str]]" = queue.Queue()
+                mock.clients[client_id] = events
+                events.put(json.dumps({"type": "status", "data": {"sid": client_id}}))
+                try:
+                    while True:
+                        # Stop once the client closes its side of the connection
+                        if select.select([self.connection], [], [], 0)[0]:
+                            _, opcode, _ = read_frame(self.rfile)
+                            if opcode == OP_CLOSE:
+                                break
+                        try:
+                            message = events.get(timeout=0.2)
+                        except queue.Empty:
+                            continue
+                        self.wfile.write(encode_frame(message.encode(), OP_TEXT))
+                        self.wfile.flush()
+                except (OSError, ConnectionError):
+                    pass
+                finally:
+                    mock.clients.pop(client_id, None)
+                    self.close_connection = True
+
+        return Handler
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Run a mock ComfyUI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--node-time", type=float, default=0.05, help="Seconds per executed node")
+    args = parser.parse_args()
+
+    mock = MockComfyUI(args.host, args.port, args.node_time).start()
+    print(f"✓ Mock ComfyUI listening on {mock.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Tiered model cache: volume -> local disk -> host RAM.
+
+Model files live on the network-backed volume. The cache copies files that
+are used, or about to be used, to the container's local disk and hands
+ComfyUI the local copy from then on. The most recently used copies can also
+be pinned in host RAM (mapped and read through once, so every page stays
+resident). Both tiers are size-bounded and evict least recently used files.
+
+A miss returns the volume path, so the caller is never blocked by a copy;
+the file is copied in the background and served locally next time. Queued
+workflows can prefetch their models so they are local before they run.
+Files held by a running workflow (see hold) are never evicted, and copies in
+progress reserve their size up front so parallel copies cannot overfill the
+disk tier.
+
+Used by the mxc_model_cache node pack (comfy_nodes/mxc_model_cache), which
+ships a copy of this module; it only uses the standard library.
+"""
+
+import mmap
+import os
+import shutil
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+# Bytes read per step when pulling a file into RAM
+PIN_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+class TieredModelCache:
+    """Read-through cache of volume model files on local disk and in RAM."""
+
+    def __init__(self, source_root: str, cache_dir: str, disk_bytes: int, ram_bytes: int = 0, workers: int = 2):
+        """
+        Initialize the cache; copies left in cache_dir by an earlier run are reused.
+
+        Args:
+            source_root: Root of the cached files (the volume mount)
+            cache_dir: Directory on local disk holding the copies
+            disk_bytes: Size bound of the local disk tier
+            ram_bytes: Size bound of the RAM tier (0 disables it)
+            workers: Files copied in parallel
+        """
+        self.source_root = os.path.normpath(source_root)
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.ram_bytes = ram_bytes
+        self.disk: "OrderedDict[str, int]" = OrderedDict()
+        self.ram: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        self.pending: Dict[str, Future] = {}
+        # Bytes reserved on disk by copies in progress
+        self.incoming = 0
+        # Files in use, with the number of holders; they are not evicted
+        self.held: Counter = Counter()
+        self.stats = {
+            "hits": 0, "misses": 0, "ram_hits": 0,
+            "bytes_served_local": 0, "bytes_served_volume": 0,
+            "bytes_copied": 0, "copies": 0, "evictions": 0, "ram_evictions": 0,
+            "prefetches": 0, "errors": 0,
+        }
+        self._lock = threading.RLock()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        existing = []
+        for dirpath, _, filenames in os.walk(cache_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                existing.append((stat.st_atime, os.path.relpath(path, cache_dir), stat.st_size))
+        for _, rel, size in sorted(existing):
+            self.disk[rel] = size
+        self._evict_disk(0)
+
+    def relative(self, path: str) -> Optional[str]:
+        """Path relative to the source root, or None for files outside it."""
+        path = os.path.normpath(path)
+        if not path.startswith(self.source_root + os.sep):
+            return None
+        return os.path.relpath(path, self.source_root)
+
+    def local_path(self, rel: str) -> str:
+        """Where the local copy of a file lives."""
+        return os.path.join(self.cache_dir, rel)
+
+    def resolve(self, path: str) -> str:
+        """
+        Path to load a model from, recording a hit or a miss.
+
+        Args:
+            path: Model file on the volume
+
+        Returns:
+            The local copy on a hit; the volume path on a miss, while the file
+            is copied in the background. The local copy may be evicted
+            afterwards unless the file is held (see hold).
+        """
+        rel = self.relative(path)
+        if rel is None:
+            return path
+        with self._lock:
+            if rel in self.disk:
+                self.disk.move_to_end(rel)
+                self.stats["hits"] += 1
+                self.stats["bytes_served_local"] += self.disk[rel]
+                if rel in self.ram:
+                    self.ram.move_to_end(rel)
+                    self.stats["ram_hits"] += 1
+                elif self.ram_bytes:
+                    self.pool.submit(self.pin, rel)
+                return self.local_path(rel)
+            self.stats["misses"] += 1
+            try:
+                self.stats["bytes_served_volume"] += os.path.getsize(path)
+            except OSError:
+                return path
+        self._schedule(rel)
+        return path
+
+    def prefetch(self, paths: Iterable[str]) -> List[Future]:
+        """
+        Copy files to local disk ahead of use.
+
+        Args:
+            paths: Model files on the volume
+
+        Returns:
+            One future per file that is not cached yet
+        """
+        futures = []
+        for path in paths:
+            rel = self.relative(path)
+            if rel is None:
+                continue
+            with self._lock:
+                if rel in self.disk:
+                    continue
+                self.stats["prefetches"] += 1
+            futures.append(self._schedule(rel))
+        return futures
+
+    @contextmanager
+    def hold(self, paths: Iterable[str]):
+        """
+        Keep the local copies of files from being evicted while in use.
+
+        Holds nest; a file stays protected until its last holder exits.
+
+        Args:
+            paths: Model files on the volume
+        """
+        rels = [rel for rel in (self.relative(path) for path in paths) if rel is not None]
+        with self._lock:
+            self.held.update(rels)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.held.subtract(rels)
+                self.held += Counter()
+
+    def _schedule(self, rel: str) -> Future:
+        with self._lock:
+            future = self.pending.get(rel)
+            if future is None:
+                future = self.pool.submit(self.fetch, rel)
+                self.pending[rel] = future
+            return future
+
+    def fetch(self, rel: str) -> Optional[str]:
+        """
+        Copy a file from the volume to local disk, evicting older copies.
+
+        Args:
+            rel: File relative to the source root
+
+        Returns:
+            Path of the local copy, or None if it does not fit or failed
+        """
+        reserved = 0
+        try:
+            with self._lock:
+                if rel in self.disk:
+                    return self.local_path(rel)
+            source = os.path.join(self.source_root, rel)
+            size = os.path.getsize(source)
+            if size > self.disk_bytes:
+                return None
+            with self._lock:
+                if not self._evict_disk(size):
+                    return None
+                # Reserve the space until the copy is accounted for in self.disk
+                self.incoming += size
+                reserved = size
+
+            target = self.local_path(rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{threading.get_ident()}.tmp"
+            try:
+                shutil.copyfile(source, tmp)
+                os.replace(tmp, target)
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except FileNotFoundError:
+                    pass
+                raise
+            with self._lock:
+                self.incoming -= size
+                reserved = 0
+                self.disk[rel] = size
+                self.stats["bytes_copied"] += size
+                self.stats["copies"] += 1
+            return target
+        except OSError as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠ Model cache could not copy {rel}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self.incoming -= reserved
+                self.pending.pop(rel, None)
+
+    def _evict_disk(self, incoming: int) -> bool:
+        """
+        Drop least recently used copies that are not held until `incoming`
+        more bytes fit next to the copies in progress.
+
+        Returns:
+            Whether `incoming` bytes fit
+        """
+        while sum(self.disk.values()) + self.incoming + incoming > self.disk_bytes:
+            rel = next((rel for rel in self.disk if not self.held[rel]), None)
+            if rel is None:
+                return False
+            del self.disk[rel]
+            self._unpin(rel)
+            try:
+                # Readers that still have the file open keep reading it
+                os.remove(self.local_path(rel))
+            except FileNotFoundError:
+                pass
+            self.stats["evictions"] += 1
+        return True
+
+    def pin(self, rel: str) -> bool:
+        """
+        Keep a cached file resident in RAM, evicting older pinned files.
+
+        Args:
+            rel: File relative to the source root (must be on local disk)
+
+        Returns:
+            Whether the file is pinned
+        """
+        with self._lock:
+            size = self.disk.get(rel)
+            if size is None or size == 0 or size > self.ram_bytes:
+                return False
+            if rel in self.ram:
+                return True
+            while self.ram and sum(len(m) for m in self.ram.values()) + size > self.ram_bytes:
+                self._unpin(next(iter(self.ram)))
+                self.stats["ram_evictions"] += 1
+        try:
+            with open(self.local_path(rel), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        mapped.madvise(mmap.MADV_WILLNEED)
+        for offset in range(0, len(mapped), PIN_CHUNK_SIZE):
+            mapped[offset:offset + PIN_CHUNK_SIZE]
+        with self._lock:
+            if rel in self.ram or rel not in self.disk:
+                mapped.close()
+                return rel in self.ram
+            self.ram[rel] = mapped
+        return True
+
+    def _unpin(self, rel: str):
+        mapped = self.ram.pop(rel, None)
+        if mapped is not None:
+            mapped.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Cache metrics.
+
+        Returns:
+            Hit/miss counters, bytes served per tier and tier occupancy
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+                "disk_files": len(self.disk),
+                "disk_bytes": sum(self.disk.values()),
+                "disk_capacity": self.disk_bytes,
+                "disk_incoming": self.incoming,
+                "held_files": len(self.held),
+                "ram_files": len(self.ram),
+                "ram_bytes": sum(len(m) for m in self.ram.values()),
+                "ram_capacity": self.ram_bytes,
+                "pending": len(self.pending),
+            }
+
+    def close(self):
+        """Stop copying and unpin every file."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for rel in list(self.ram):
+                self._unpin(rel)
@@ -0,0 +1,180 @@
+"""
+Precomputed listing of the model folders on the volume.
+
+ComfyUI walks every model folder of every model type when it starts and
+whenever a folder changes, which is slow on the network-backed volume. The
+index stores the file names, file sizes and mtime of every directory below
+the model folders. Refreshing it only stats the known directories and
+rescans the ones whose mtime changed, so an unchanged library costs one
+stat per directory instead of a full walk. The sizes let gpu_profiles.py
+estimate the VRAM a workflow needs without touching the volume.
+
+A file overwritten in place does not change its directory's mtime, so the
+listing stays right but its size would not. refresh(check_files=True) also
+stats every file of the unchanged directories and updates the sizes that
+changed; ModelPathsGenerator.generate_model_index does so once per
+container start, while the lookups ComfyUI makes only need the names and
+skip it.
+
+The index is built by ModelPathsGenerator.generate_model_index before
+ComfyUI starts, and served to ComfyUI by the mxc_model_index node pack
+(comfy_nodes/mxc_model_index), which ships a copy of this module.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Directory names never descended into, like ComfyUI's own model search
+EXCLUDED_DIR_NAMES = {".git"}
+
+INDEX_VERSION = 3
+
+
+class ModelIndex:
+    """File listings of model directories, refreshed by directory mtime."""
+
+    def __init__(self, path: str):
+        """
+        Load the index, or start an empty one.
+
+        Args:
+            path: Index file (JSON)
+        """
+        self.path = path
+        self.dirs: Dict[str, Dict] = {}
+        self.dirty = False
+        self._lock = threading.RLock()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.dirs = data["dirs"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _refresh_dir(self, path: str, stats: Dict[str, int], check_files: bool = False):
+        """Refresh one directory and everything below it."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            if self.dirs.pop(path, None) is not None:
+                self.dirty = True
+            return
+
+        entry = self.dirs.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            files, subdirs, sizes, mtimes = [], [], {}, {}
+            with os.scandir(path) as entries:
+                for item in entries:
+                    try:
+                        is_dir = item.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        subdirs.append(item.name)
+                        continue
+                    files.append(item.name)
+                    try:
+                        stat = item.stat()
+                        sizes[item.name], mtimes[item.name] = stat.st_size, stat.st_mtime
+                    except OSError:
+                        sizes[item.name], mtimes[item.name] = 0, 0.0
+            entry = {"mtime": mtime, "files": sorted(files), "subdirs": sorted(subdirs), "sizes": sizes,
+                     "mtimes": mtimes}
+            self.dirs[path] = entry
+            self.dirty = True
+            stats["scanned"] += 1
+        else:
+            stats["reused"] += 1
+            if check_files:
+                self._refresh_files(path, entry, stats)
+
+        for name in entry["subdirs"]:
+            if name not in EXCLUDED_DIR_NAMES:
+                self._refresh_dir(os.path.join(path, name), stats, check_files)
+
+    def _refresh_files(self, path: str, entry: Dict, stats: Dict[str, int]):
+        """Update the sizes of files overwritten in place, which leaves the directory mtime alone."""
+        for name in entry["files"]:
+            try:
+                stat = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+            if entry["sizes"].get(name) != stat.st_size or entry["mtimes"].get(name) != stat.st_mtime:
+                entry["sizes"][name], entry["mtimes"][name] = stat.st_size, stat.st_mtime
+                self.dirty = True
+                stats["updated"] += 1
+
+    def refresh(self, directories: Iterable[str], check_files: bool = False) -> Dict[str, int]:
+        """
+        Bring the listings of `directories` up to date.
+
+        Args:
+            directories: Absolute model directories
+            check_files: Also stat the files of unchanged directories, to catch files overwritten in place
+
+        Returns:
+            Number of directories rescanned and reused, and of file sizes updated
+        """
+        stats = {"scanned": 0, "reused": 0, "updated": 0}
+        with self._lock:
+            for directory in directories:
+                self._refresh_dir(os.path.normpath(directory), stats, check_files)
+        return stats
+
+    def search(self, directory: str, excluded_dir_names: Optional[List[str]] = None) -> Tuple[List[str], Dict[str, float]]:
+        """
+        List a directory the way ComfyUI's folder_paths.recursive_search does.
+
+        Args:
+            directory: Model directory
+            excluded_dir_names: Directory names to skip
+
+        Returns:
+            Tuple of (file paths relative to directory, mtime of every directory)
+        """
+        directory = os.path.normpath(directory)
+        excluded = set(excluded_dir_names or [])
+        with self._lock:
+            self.refresh([directory])
+            files, dirs = [], {}
+            pending = [directory]
+            while pending:
+                path = pending.pop()
+                entry = self.dirs.get(path)
+                if entry is None:
+                    continue
+                dirs[path] = entry["mtime"]
+                rel = os.path.relpath(path, directory)
+                files.extend(name if rel == "." else os.path.join(rel, name) for name in entry["files"])
+                pending.extend(os.path.join(path, name) for name in entry["subdirs"] if name not in excluded)
+        return files, dirs
+
+    def size(self, path: str) -> Optional[int]:
+        """
+        Size of an indexed file, without touching the filesystem.
+
+        Args:
+            path: Absolute file path
+
+        Returns:
+            Size in bytes, or None when the file is not in the index
+        """
+        directory, name = os.path.split(os.path.normpath(path))
+        with self._lock:
+            entry = self.dirs.get(directory)
+            return entry["sizes"].get(name) if entry else None
+
+    def save(self):
+        """Write the index if it changed, atomically."""
+        with self._lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"version": INDEX_VERSION, "dirs": self.dirs}, f)
+            os.replace(tmp, self.path)
+            self.dirty = False
@@ -0,0 +1,51 @@
+"""
+Model files referenced by a workflow.
+
+Maps ComfyUI's loader nodes to the inputs holding model file names and the
+model folder (a [MODEL_PATHS] key) each name is resolved in. Used for
+routing, cache prefetching and model-aware scheduling; also shipped inside
+the node packs in comfy_nodes/, so it only uses the standard library.
+"""
+
+from typing import Any, Dict, List, Tuple
+
+# Loader node types and the inputs holding model file names, by model folder
+MODEL_LOADER_INPUTS: Dict[str, Dict[str, str]] = {
+    "CheckpointLoaderSimple": {"ckpt_name": "checkpoints"},
+    "CheckpointLoader": {"ckpt_name": "checkpoints"},
+    "ImageOnlyCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "unCLIPCheckpointLoader": {"ckpt_name": "checkpoints"},
+    "UNETLoader": {"unet_name": "diffusion_models"},
+    "UnetLoaderGGUF": {"unet_name": "diffusion_models"},
+    "LoraLoader": {"lora_name": "loras"},
+    "LoraLoaderModelOnly": {"lora_name": "loras"},
+    "VAELoader": {"vae_name": "vae"},
+    "CLIPLoader": {"clip_name": "text_encoders"},
+    "DualCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders"},
+    "TripleCLIPLoader": {"clip_name1": "text_encoders", "clip_name2": "text_encoders",
+                         "clip_name3": "text_encoders"},
+    "CLIPVisionLoader": {"clip_name": "clip_vision"},
+    "ControlNetLoader": {"control_net_name": "controlnet"},
+    "DiffControlNetLoader": {"control_net_name": "controlnet"},
+    "UpscaleModelLoader": {"model_name": "upscale_models"},
+    "StyleModelLoader": {"style_model_name": "style_models"},
+}
+
+
+def workflow_models(workflow: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    List the model files a workflow loads.
+
+    Args:
+        workflow: Workflow graph in API format
+
+    Returns:
+        (model folder, file name) pairs in graph order, without duplicates
+    """
+    models = []
+    for node in workflow.values():
+        for input_name, folder in MODEL_LOADER_INPUTS.get(node.get("class_type", ""), {}).items():
+            name = node.get("inputs", {}).get(input_name)
+            if isinstance(name, str) and (folder, name) not in models:
+                models.append((folder, name))
+    return models
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Content-addressed model store on the volume.
+
+[MODEL_PATHS] maps several volume folders to the same model type, so the same
+multi-GB file often ends up in checkpoints/, diffusion_models/ and unet/. The
+store keeps one blob per distinct file content, named by its sha256, and the
+model folders only hold links to it:
+
+    .cache/blobs/sha256/ab/abcdef...      the file content, stored once
+    checkpoints/model.safetensors   ->    ../.cache/blobs/sha256/ab/abcdef...
+
+Links are relative, so they resolve both in the container and in
+`modal shell --volume` where the volume is mounted elsewhere.
+
+Usage (inside `modal shell --volume <name>`, or `modal run main.py::dedupe`):
+
+    python model_store.py dedupe --root /mnt/<volume> --dry-run
+    python model_store.py dedupe --root /mnt/<volume>
+    python model_store.py gc --root /mnt/<volume>
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from downloader import sha256_file
+
+# Files considered model weights when scanning folders
+MODEL_EXTENSIONS = {".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".gguf", ".sft", ".onnx"}
+
+# Model types that are not model folders
+NON_MODEL_PATHS = {"custom_nodes"}
+
+
+def volume_model_dirs(model_paths: Dict[str, str], volume_mount_location: str) -> List[str]:
+    """
+    List every [MODEL_PATHS] folder that lives on the volume.
+
+    Args:
+        model_paths: Output of ModelPathsGenerator.get_model_paths
+        volume_mount_location: Where the volume is mounted in the container
+
+    Returns:
+        Folders relative to the volume root, without duplicates
+    """
+    mount = volume_mount_location.rstrip("/") + "/"
+    dirs = []
+    for key, value in model_paths.items():
+        if key in NON_MODEL_PATHS:
+            continue
+        for path in value.split("\n"):
+            path = path.strip()
+            if path.startswith(mount) and path[len(mount):].strip("/") not in dirs:
+                dirs.append(path[len(mount):].strip("/"))
+    return dirs
+
+
+class ModelStore:
+    """Blob store keyed by sha256, with model folders linking into it."""
+
+    def __init__(self, root: str, store_dir: str = ".cache/blobs", link_mode: str = "symlink"):
+        """
+        Initialize the store.
+
+        Args:
+            root: Volume root
+            store_dir: Blob directory relative to root
+            link_mode: "symlink" (relative symlinks) or "hardlink"
+        """
+        if link_mode not in ("symlink", "hardlink"):
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        self.root = Path(root)
+        self.store = self.root / store_dir
+        self.link_mode = link_mode
+        self.index_path = self.store / "index.json"
+        self.index: Dict[str, Dict[str, Any]] = (
+            json.loads(self.index_path.read_text()) if self.index_path.exists() else {})
+
+    def blob_path(self, digest: str) -> Path:
+        """Path of the blob holding content with this sha256."""
+        return self.store / "sha256" / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        """Whether the store holds content with this sha256."""
+        return self.blob_path(digest).exists()
+
+    def is_linked(self, path: Path) -> bool:
+        """Whether a model file already points into the store."""
+        if path.is_symlink():
+            return self.store.resolve() in path.resolve().parents
+        digest = self._cached_digest(path)
+        return digest is not None and self.has(digest) and self.blob_path(digest).samefile(path)
+
+    def _cached_digest(self, path: Path) -> Optional[str]:
+        """Digest of a file from the index, if its size and mtime are unchanged."""
+        entry = self.index.get(str(path.relative_to(self.root)))
+        stat = path.stat()
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry["sha256"]
+        return None
+
+    def digest(self, path: Path) -> str:
+        """sha256 of a model file, hashed only when it changed since the last scan."""
+        digest = self._cached_digest(path)
+        if digest is None:
+            digest = sha256_file(path)
+            stat = path.stat()
+            self.index[str(path.relative_to(self.root))] = {
+                "sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+        return digest
+
+    def link(self, digest: str, path: Path):
+        """Atomically replace `path` with a link to a blob."""
+        blob = self.blob_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.link")
+        tmp.unlink(missing_ok=True)
+        if self.link_mode == "symlink":
+            tmp.symlink_to(os.path.relpath(blob, path.parent))
+        else:
+            os.link(blob, tmp)
+        os.replace(tmp, path)
+
+    def ingest(self, path: Path, digest: Optional[str] = None) -> str:
+        """
+        Move a model file into the store and leave a link in its place.
+
+        When the store already holds the same content the file is dropped
+        instead.
+
+        Args:
+            path: Model file on the volume
+            digest: Known sha256 of the file, hashed when omitted
+
+        Returns:
+            The file's sha256
+        """
+        path = Path(path)
+        digest = digest or self.digest(path)
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, blob)
+        self.link(digest, path)
+        stat = path.stat()
+        self.index[str(path.relative_to(self.root))] = {
+            "sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+        return digest
+
+    def scan(self, dirs: List[str]) -> List[Path]:
+        """List the model files in `dirs` that are not links into the store yet."""
+        files = []
+        for folder in dirs:
+            base = self.root / folder
+            if not base.is_dir():
+                continue
+            for path in sorted(base.rglob("*")):
+                if path.suffix.lower() in MODEL_EXTENSIONS and path.is_file() and not self.is_linked(path):
+                    files.append(path)
+        return files
+
+    def dedupe(self, dirs: List[str], dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Convert duplicate model files in `dirs` into links to a single blob.
+
+        Files are grouped by size first, so only files that can be duplicates
+        are hashed. Files whose content is already in the store (for example
+        downloaded into another folder) count as duplicates too.
+
+        Args:
+            dirs: Model folders relative to the volume root
+            dry_run: Only report what would be linked
+
+        Returns:
+            Summary with the duplicate groups and the bytes saved
+        """
+        by_size: Dict[int, List[Path]] = {}
+        for path in self.scan(dirs):
+            by_size.setdefault(path.stat().st_size, []).append(path)
+
+        blob_sizes = {blob.stat().st_size for blob in self.store.glob("sha256/*/*")}
+        groups: Dict[str, List[Path]] = {}
+        for size, paths in by_size.items():
+            if len(paths) == 1 and size not in blob_sizes:
+                continue
+            for path in paths:
+                groups.setdefault(self.digest(path), []).append(path)
+
+        saved = 0
+        duplicates = {}
+        for digest, paths in groups.items():
+            copies = len(paths) - (0 if self.has(digest) else 1)
+            if copies < 1:
+                continue
+            saved += copies * paths[0].stat().st_size
+            duplicates[digest] = [str(path.relative_to(self.root)) for path in paths]
+            if not dry_run:
+                for path in paths:
+                    self.ingest(path, digest)
+
+        self.save_index()
+        return {"duplicates": duplicates, "bytes_saved": saved, "dry_run": dry_run}
+
+    def gc(self, dirs: List[str], dry_run: bool = False) -> List[str]:
+        """
+        Remove blobs that no model file links to anymore.
+
+        Args:
+            dirs: Model folders relative to the volume root
+            dry_run: Only report the unreferenced blobs
+
+        Returns:
+            sha256 digests of the removed blobs
+        """
+        blobs_dir = self.store / "sha256"
+        if not blobs_dir.is_dir():
+            return []
+        referenced = set()
+        for folder in dirs:
+            base = self.root / folder
+            if base.is_dir():
+                referenced.update(p.resolve().name for p in base.rglob("*") if p.is_symlink())
+
+        removed = []
+        for blob in blobs_dir.glob("*/*"):
+            unused = blob.stat().st_nlink == 1 if self.link_mode == "hardlink" else blob.name not in referenced
+            if unused:
+                removed.append(blob.name)
+                if not dry_run:
+                    blob.unlink()
+        return removed
+
+    def save_index(self):
+        """Persist the hash index so unchanged files are not hashed again."""
+        self.store.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.index, indent=2))
+        os.replace(tmp, self.index_path)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Deduplicate model files on the volume.")
+    parser.add_argument("command", choices=["dedupe", "gc"])
+    parser.add_argument("--root", required=True, help="Volume root, e.g. /mnt/<volume-name>")
+    parser.add_argument("--dirs", nargs="*", help="Model folders to scan (default: [MODEL_PATHS] folders)")
+    parser.add_argument("--store-dir", default=".cache/blobs")
+    parser.add_argument("--link-mode", choices=["symlink", "hardlink"], default="symlink")
+    parser.add_argument("--config", default="config.ini")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    dirs = args.dirs
+    if not dirs:
+        from generate_model_paths import ModelPathsGenerator
+
+        generator = ModelPathsGenerator(config_file=args.config)
+        generator.load_config()
+        mount = generator.get_filesystem_config()["volume_mount_location"]
+        dirs = volume_model_dirs(generator.get_model_paths(), mount)
+
+    store = ModelStore(args.root, args.store_dir, args.link_mode)
+    if args.command == "dedupe":
+        result = store.dedupe(dirs, dry_run=args.dry_run)
+        for digest, paths in result["duplicates"].items():
+            print(f"🔗 {digest[:12]}: {', '.join(paths)}")
+        verb = "Would save" if args.dry_run else "Saved"
+        print(f"✓ {verb} {result['bytes_saved'] / 1024 ** 3:.2f} GB across {len(result['duplicates'])} model(s)")
+    else:
+        removed = store.gc(dirs, dry_run=args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        print(f"✓ {verb} {len(removed)} unreferenced blob(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Asynchronous output writer.
+
+ComfyUI's SaveImage encodes every image as PNG and writes it to the output
+folder on the volume before the next node runs, so the executor waits on
+compression and on the network-backed volume. OutputWriter takes finished
+images off the executor: encoding and writing happen on a worker pool, and
+the volume is committed once per interval for every file written since the
+last commit instead of never or once per file.
+
+The number of images waiting to be written is bounded; when the bound is
+reached, submit blocks, so a slow volume slows the executor down instead of
+filling memory.
+
+Used by the mxc_async_output node pack (comfy_nodes/mxc_async_output),
+which ships a copy of this module. Encoding needs Pillow (part of ComfyUI);
+the writer itself only uses the standard library.
+"""
+
+import io
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Output formats and their file extension
+FORMATS = {"png": "png", "webp": "webp", "avif": "avif"}
+
+
+def usable_format(fmt: str) -> str:
+    """
+    Check that Pillow can encode an output format, falling back to PNG.
+
+    WebP and AVIF support depend on how Pillow was built (AVIF needs
+    Pillow 11.2+ with libavif).
+
+    Args:
+        fmt: Requested format
+
+    Returns:
+        `fmt`, or "png" if it is unknown or Pillow cannot encode it
+    """
+    if fmt not in FORMATS:
+        print(f"⚠ Unknown output format {fmt!r}, writing png")
+        return "png"
+    if fmt == "png":
+        return fmt
+    from PIL import features
+
+    # Pillow versions without the feature report it as unknown and return False
+    if not features.check(fmt):
+        print(f"⚠ Pillow cannot encode {fmt} here, writing png")
+        return "png"
+    return fmt
+
+
+def encode_image(image, fmt: str = "png", compress_level: int = 4, lossless: bool = True, quality: int = 90,
+                 prompt: Optional[Dict[str, Any]] = None, extra_pnginfo: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Encode an image, embedding the workflow like ComfyUI's save nodes do.
+
+    Args:
+        image: PIL image or HxWxC uint8 array
+        fmt: "png", "webp" or "avif"
+        compress_level: PNG zlib level (0-9)
+        lossless: Lossless WebP; for AVIF, which Pillow only encodes lossy,
+            quality 100 with 4:4:4 chroma (visually, not bit-exact, lossless)
+        quality: WebP/AVIF quality when not lossless
+        prompt: Prompt to embed
+        extra_pnginfo: Extra metadata to embed (the workflow)
+
+    Returns:
+        Encoded file content
+    """
+    from PIL import Image
+    from PIL.PngImagePlugin import PngInfo
+
+    if not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    buffer = io.BytesIO()
+    if fmt == "png":
+        info = PngInfo()
+        if prompt is not None:
+            info.add_text("prompt", json.dumps(prompt))
+        for key, value in (extra_pnginfo or {}).items():
+            info.add_text(key, json.dumps(value))
+        image.save(buffer, format="PNG", pnginfo=info, compress_level=compress_level)
+        return buffer.getvalue()
+
+    # Same EXIF layout as ComfyUI's SaveAnimatedWEBP
+    exif = image.getexif()
+    if prompt is not None:
+        exif[0x0110] = f"prompt:{json.dumps(prompt)}"
+    tag = 0x010F
+    for key, value in (extra_pnginfo or {}).items():
+        exif[tag] = f"{key}:{json.dumps(value)}"
+        tag -= 1
+    if fmt == "webp":
+        # With lossless, quality is the compression effort
+        image.save(buffer, format="WEBP", lossless=lossless, quality=100 if lossless else quality, exif=exif)
+    elif fmt == "avif":
+        image.save(buffer, format="AVIF", quality=100 if lossless else quality,
+                   subsampling="4:4:4" if lossless else "4:2:0", exif=exif)
+    else:
+        raise ValueError(f"Unknown output format: {fmt}")
+    return buffer.getvalue()
+
+
+class OutputWriter:
+    """Encode and write outputs on a worker pool, committing the volume periodically."""
+
+    def __init__(self, workers: int = 2, max_pending: int = 32, commit: Optional[Callable[[], None]] = None,
+                 commit_interval: float = 10.0):
+        """
+        Initialize the writer.
+
+        Args:
+            workers: Files encoded and written in parallel
+            max_pending: Outputs held in memory before submit blocks
+            commit: Makes written files durable and visible (the volume commit)
+            commit_interval: Seconds between commits (0 only commits on flush)
+        """
+        self.commit = commit
+        self.commit_interval = commit_interval
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mxc-output")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.max_pending = max_pending
+        self.pending: Dict[str, Future] = {}
+        self.uncommitted = 0
+        self.latencies: deque = deque(maxlen=1024)
+        self.stats = {
+            "submitted": 0, "written": 0, "bytes_written": 0, "errors": 0,
+            "blocked": 0, "blocked_seconds": 0.0, "commits": 0, "commit_errors": 0,
+        }
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        if commit and commit_interval > 0:
+            threading.Thread(target=self._commit_loop, name="mxc-output-commit", daemon=True).start()
+
+    def submit(self, path: str, encode: Callable[[], bytes]) -> Future:
+        """
+        Queue an output for writing; blocks while max_pending outputs are queued.
+
+        Args:
+            path: Destination file
+            encode: Produces the file content; called on a worker
+
+        Returns:
+            Future resolving to the number of bytes written
+        """
+        if not self.slots.acquire(blocking=False):
+            start = time.monotonic()
+            self.slots.acquire()
+            with self._lock:
+                self.stats["blocked"] += 1
+                self.stats["blocked_seconds"] += time.monotonic() - start
+        with self._lock:
+            self.stats["submitted"] += 1
+            future = self.pool.submit(self._write, path, encode, time.monotonic())
+            self.pending[path] = future
+        future.add_done_callback(lambda done: self._done(path, done))
+        return future
+
+    def _done(self, path: str, future: Future):
+        with self._lock:
+            if self.pending.get(path) is future:
+                del self.pending[path]
+        self.slots.release()
+
+    def _write(self, path: str, encode: Callable[[], bytes], enqueued: float) -> int:
+        try:
+            data = encode()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Readers never see a partial file
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            with self._lock:
+                self.stats["written"] += 1
+                self.stats["bytes_written"] += len(data)
+                self.latencies.append(time.monotonic() - enqueued)
+                self.uncommitted += 1
+            return len(data)
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠ Could not write output {path}: {e}")
+            raise
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for every queued output to be written, then commit.
+
+        Args:
+            timeout: Seconds to wait for the writes
+
+        Returns:
+            Whether every write finished in time
+        """
+        with self._lock:
+            futures = list(self.pending.values())
+        _, not_done = wait(futures, timeout=timeout)
+        self.commit_now()
+        return not not_done
+
+    def wait(self, paths: Iterable[str], timeout: Optional[float] = None) -> bool:
+        """
+        Wait for some outputs to be written, without committing.
+
+        Args:
+            paths: Destination files; files not queued are already written
+            timeout: Seconds to wait
+
+        Returns:
+            Whether every write finished in time
+        """
+        with self._lock:
+            futures = [self.pending[path] for path in paths if path in self.pending]
+        _, not_done = wait(futures, timeout=timeout)
+        return not not_done
+
+    def commit_now(self):
+        """Commit the files written since the last commit, if any."""
+        with self._lock:
+            count, self.uncommitted = self.uncommitted, 0
+        if not count or not self.commit:
+            return
+        try:
+            self.commit()
+            with self._lock:
+                self.stats["commits"] += 1
+        except Exception as e:
+            with self._lock:
+                self.uncommitted += count
+                self.stats["commit_errors"] += 1
+            print(f"⚠ Output commit failed: {e}")
+
+    def _commit_loop(self):
+        while not self._closed.wait(self.commit_interval):
+            self.commit_now()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Writer metrics.
+
+        Returns:
+            Counters, queue occupancy, write latency (queued to written, over
+            the last 1024 files) and throughput since start
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.monotonic() - self.started
+            return {
+                **self.stats,
+                "pending": len(self.pending),
+                "max_pending": self.max_pending,
+                "uncommitted": self.uncommitted,
+                "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+                "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+                "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                "files_per_second": self.stats["written"] / elapsed if elapsed else 0.0,
+                "bytes_per_second": self.stats["bytes_written"] / elapsed if elapsed else 0.0,
+            }
+
+    def close(self, timeout: Optional[float] = None):
+        """Write everything still queued, commit and stop."""
+        self.flush(timeout)
+        self._closed.set()
+        self.pool.shutdown(wait=False)
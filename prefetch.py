@@ -0,0 +1,191 @@
+"""
+Predictive model prefetch from the workflow queue.
+
+While one prompt runs, the loader nodes of the next prompts in the queue are
+parsed, their model names resolved against the [MODEL_PATHS] folders, and
+the files are read ahead into the page cache. When the next prompt starts,
+its models load from memory instead of the network-backed volume.
+
+Used by the mxc_prefetch node pack (comfy_nodes/mxc_prefetch), which ships a
+copy of this module; it only uses the standard library. bench_prefetch.py
+measures the effect with a mock executor.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    # Inside the mxc_prefetch node pack, which ships a copy of model_loaders.py
+    from .model_loaders import workflow_models
+except ImportError:
+    from model_loaders import workflow_models
+
+# Bytes read per step when warming a file
+WARM_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def warm_file(path: str) -> int:
+    """
+    Pull a file into the page cache.
+
+    The kernel is asked to read ahead, and the file is then read through
+    once, as read-ahead hints are ignored by some network filesystems.
+
+    Args:
+        path: File to warm
+
+    Returns:
+        Number of bytes read
+    """
+    total = 0
+    buffer = bytearray(WARM_CHUNK_SIZE)
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        while read := f.readinto(buffer):
+            total += read
+    return total
+
+
+class ModelPathsResolver:
+    """Resolve (model folder, file name) pairs against the [MODEL_PATHS] folders."""
+
+    def __init__(self, folders: Dict[str, List[str]]):
+        """
+        Initialize the resolver.
+
+        Args:
+            folders: Model folder to absolute directories, in search order
+        """
+        self.folders = folders
+
+    @classmethod
+    def from_model_paths(cls, model_paths: Dict[str, str], base_path: str) -> "ModelPathsResolver":
+        """
+        Build a resolver from [MODEL_PATHS].
+
+        Args:
+            model_paths: Output of ModelPathsGenerator.get_model_paths
+            base_path: Directory relative paths are based on (the ComfyUI directory)
+
+        Returns:
+            Resolver
+        """
+        folders = {}
+        for key, value in model_paths.items():
+            folders[key] = [os.path.join(base_path, path.strip()) for path in value.split("\n") if path.strip()]
+        return cls(folders)
+
+    def resolve(self, folder: str, name: str) -> Optional[str]:
+        """Path of the first matching file, or None."""
+        for directory in self.folders.get(folder, []):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+
+class QueuePrefetcher:
+    """Warm the models of upcoming workflows while the current one runs."""
+
+    def __init__(self, resolve: Callable[[str, str], Optional[str]], lookahead: int = 2, workers: int = 2,
+                 warm: Callable[[str], int] = warm_file, rewarm_after: float = 300.0):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            resolve: Maps (model folder, file name) to a path, or None
+            lookahead: Number of pending workflows whose models are warmed
+            workers: Files warmed in parallel
+            warm: Function that warms one file and returns the bytes read
+            rewarm_after: Seconds after which a warmed file may be warmed again
+        """
+        self.resolve = resolve
+        self.lookahead = lookahead
+        self.warm = warm
+        self.rewarm_after = rewarm_after
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.warmed: "OrderedDict[str, float]" = OrderedDict()
+        self.inflight: Dict[str, Future] = {}
+        self.stats = {"updates": 0, "scheduled": 0, "warmed": 0, "bytes_warmed": 0, "unresolved": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def upcoming_paths(self, pending: Iterable[Dict[str, Any]]) -> List[str]:
+        """Model files of the next `lookahead` pending workflows, in the order they are needed."""
+        paths = []
+        for index, workflow in enumerate(pending):
+            if index >= self.lookahead:
+                break
+            for folder, name in workflow_models(workflow):
+                path = self.resolve(folder, name)
+                if path is None:
+                    with self._lock:
+                        self.stats["unresolved"] += 1
+                elif path not in paths:
+                    paths.append(path)
+        return paths
+
+    def update(self, pending: Iterable[Dict[str, Any]]) -> List[Future]:
+        """
+        Warm the models of the next pending workflows.
+
+        Call whenever the queue changes; files warmed recently or still being
+        warmed are skipped.
+
+        Args:
+            pending: Pending workflows in execution order (API format)
+
+        Returns:
+            Futures of the newly scheduled warm-ups
+        """
+        futures = []
+        now = time.monotonic()
+        paths = self.upcoming_paths(pending)
+        with self._lock:
+            self.stats["updates"] += 1
+            for path in paths:
+                warmed_at = self.warmed.get(path)
+                if path in self.inflight or (warmed_at is not None and now - warmed_at < self.rewarm_after):
+                    continue
+                future = self.pool.submit(self._warm, path)
+                self.inflight[path] = future
+                self.stats["scheduled"] += 1
+                futures.append(future)
+        return futures
+
+    def _warm(self, path: str) -> int:
+        try:
+            read = self.warm(path)
+        except OSError:
+            with self._lock:
+                self.stats["errors"] += 1
+                self.inflight.pop(path, None)
+            return 0
+        with self._lock:
+            self.inflight.pop(path, None)
+            self.warmed[path] = time.monotonic()
+            self.warmed.move_to_end(path)
+            while len(self.warmed) > 1024:
+                self.warmed.popitem(last=False)
+            self.stats["warmed"] += 1
+            self.stats["bytes_warmed"] += read
+        return read
+
+    def forget(self, paths: Iterable[str]):
+        """Mark files as no longer warm, e.g. after they were evicted."""
+        with self._lock:
+            for path in paths:
+                self.warmed.pop(path, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Prefetch counters."""
+        with self._lock:
+            return {**self.stats, "inflight": len(self.inflight)}
+
+    def close(self):
+        """Stop warming."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
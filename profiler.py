@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Per-node execution profiler.
+
+NodeProfiler follows the events ComfyUI sends while it executes a prompt
+(execution_start, execution_cached, executing, execution_success, ...) and
+records for every node its wall time, whether it was served from ComfyUI's
+cache and, when torch hooks are given, its GPU time and memory peaks. Each
+prompt is written as a Chrome trace file (open it in chrome://tracing or
+https://ui.perfetto.dev); the report command ranks node types across many
+such files.
+
+Inside the container the mxc_profiler node pack (comfy_nodes/mxc_profiler)
+feeds ComfyUI's events to a profiler and writes the traces to the volume.
+Against any ComfyUI (or the mock), the run command profiles a workflow from
+its websocket events (wall time and cache hits only):
+
+    python profiler.py run workflow_api.json --url http://127.0.0.1:8188 --out ./profiles
+    python profiler.py report ./profiles --top 20 --by package
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Events that end a prompt, and the status they report
+END_EVENTS = {"execution_success": "success", "execution_error": "error", "execution_interrupted": "interrupted"}
+
+
+class TorchHooks:
+    """
+    GPU time and memory of each node, measured with torch.
+
+    GPU time is the time the current CUDA stream spends between CUDA events
+    recorded when a node starts and ends, so it counts the GPU work the node
+    launched. It is read when the prompt ends, to avoid synchronizing after
+    every node.
+
+    The VRAM peak of a node is measured by resetting torch's peak memory
+    counter when the node starts. That counter is process-wide: anything
+    reading torch.cuda.max_memory_allocated afterwards only sees the peak
+    since the last node started. The mxc_metrics node pack records the peak
+    before every reset to keep its process peak intact.
+    """
+
+    def __init__(self):
+        import torch
+
+        self.torch = torch
+        self.cuda = torch.cuda.is_available()
+
+    def node_start(self) -> Any:
+        if not self.cuda:
+            return None
+        # Looked up on every call, so mxc_metrics' wrapper sees the reset
+        self.torch.cuda.reset_peak_memory_stats()
+        start = self.torch.cuda.Event(enable_timing=True)
+        start.record()
+        return start
+
+    def node_end(self, token: Any) -> Dict[str, Any]:
+        result = {"rss": current_rss()}
+        if token is None:
+            return result
+        end = self.torch.cuda.Event(enable_timing=True)
+        end.record()
+        result["vram_peak"] = self.torch.cuda.max_memory_allocated()
+        result["_gpu_events"] = (token, end)
+        return result
+
+    def finalize(self, record: Dict[str, Any]):
+        events = record.pop("_gpu_events", None)
+        if events:
+            events[1].synchronize()
+            record["gpu"] = events[0].elapsed_time(events[1]) / 1000
+
+
+def current_rss() -> Optional[int]:
+    """Resident memory of this process in bytes (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class NodeProfiler:
+    """Build per-node profiles of prompts from ComfyUI's execution events."""
+
+    def __init__(self, package_of: Optional[Callable[[str], str]] = None, hooks: Optional[TorchHooks] = None,
+                 on_profile: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        Initialize the profiler.
+
+        Args:
+            package_of: Maps a class type to the node package that defines it
+            hooks: Measures GPU time and memory (TorchHooks inside ComfyUI)
+            on_profile: Called with every finished prompt profile
+        """
+        self.package_of = package_of or (lambda class_type: "")
+        self.hooks = hooks
+        self.on_profile = on_profile
+        self.graphs: Dict[str, Dict[str, Any]] = {}
+        self.profile: Optional[Dict[str, Any]] = None
+        self.node: Optional[Dict[str, Any]] = None
+        self._node_start = 0.0
+        self._token = None
+        self._prompt_start = 0.0
+
+    def add_prompt(self, prompt_id: str, prompt: Dict[str, Any]):
+        """Register a queued prompt, so its nodes' class types are known."""
+        self.graphs[prompt_id] = prompt
+
+    def _node_record(self, node_id: str, cached: bool = False) -> Dict[str, Any]:
+        graph = self.graphs.get(self.profile["prompt_id"], {})
+        class_type = graph.get(node_id, {}).get("class_type", "unknown")
+        return {"node_id": node_id, "class_type": class_type, "package": self.package_of(class_type),
+                "start": time.perf_counter() - self._prompt_start, "wall": 0.0, "cached": cached}
+
+    def _finish_node(self):
+        if self.node is None:
+            return
+        self.node["wall"] = time.perf_counter() - self._node_start
+        if self.hooks:
+            self.node.update(self.hooks.node_end(self._token))
+        self.profile["nodes"].append(self.node)
+        self.node = None
+
+    def on_event(self, event: str, data: Any) -> Optional[Dict[str, Any]]:
+        """
+        Feed one event.
+
+        Args:
+            event: Event type, as sent on ComfyUI's websocket
+            data: Event data
+
+        Returns:
+            The prompt's profile when the event ends a prompt, otherwise None
+        """
+        if not isinstance(data, dict):
+            return None
+        if event == "execution_start":
+            self._prompt_start = time.perf_counter()
+            self.profile = {"prompt_id": data.get("prompt_id"), "started": time.time(), "nodes": []}
+            self.node = None
+        elif self.profile is None:
+            return None
+        elif event == "execution_cached":
+            for node_id in data.get("nodes", []):
+                self.profile["nodes"].append(self._node_record(node_id, cached=True))
+        elif event == "executing" and data.get("node") is not None:
+            self._finish_node()
+            self.node = self._node_record(data["node"])
+            self._node_start = time.perf_counter()
+            self._token = self.hooks.node_start() if self.hooks else None
+        elif event in END_EVENTS or (event == "executing" and data.get("node") is None):
+            self._finish_node()
+            profile, self.profile = self.profile, None
+            profile["status"] = END_EVENTS.get(event, "success")
+            profile["wall"] = time.perf_counter() - self._prompt_start
+            if self.hooks:
+                for node in profile["nodes"]:
+                    self.hooks.finalize(node)
+            self.graphs.pop(profile["prompt_id"], None)
+            if self.on_profile:
+                self.on_profile(profile)
+            return profile
+        return None
+
+
+def to_chrome_trace(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a prompt profile to the Chrome trace event format.
+
+    Executed nodes are complete ("X") events and cached nodes instant ("i")
+    events, both named by class type with the node's measurements as args;
+    VRAM and RSS are counter ("C") tracks.
+
+    Args:
+        profile: Profile returned by NodeProfiler.on_event
+
+    Returns:
+        Trace (JSON object format)
+    """
+    base = profile["started"] * 1e6
+    events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"prompt {profile['prompt_id']}"}}]
+    for node in profile["nodes"]:
+        args = {key: value for key, value in node.items() if key not in ("class_type", "start", "wall")}
+        event = {"name": node["class_type"], "cat": "node", "pid": 1, "tid": 1,
+                 "ts": base + node["start"] * 1e6, "args": args}
+        if node["cached"]:
+            event.update({"ph": "i", "s": "t"})
+        else:
+            event.update({"ph": "X", "dur": node["wall"] * 1e6})
+        events.append(event)
+        end = base + (node["start"] + node["wall"]) * 1e6
+        for counter in ("vram_peak", "rss"):
+            if node.get(counter) is not None:
+                events.append({"name": counter, "ph": "C", "pid": 1, "ts": end, "args": {"bytes": node[counter]}})
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"prompt_id": profile["prompt_id"], "status": profile["status"], "wall": profile["wall"]}}
+
+
+def save_trace(profile: Dict[str, Any], directory: str) -> str:
+    """
+    Write a prompt profile as a Chrome trace file.
+
+    Args:
+        profile: Profile returned by NodeProfiler.on_event
+        directory: Directory of the trace files
+
+    Returns:
+        Path of the written file
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(profile["started"]))
+    path = os.path.join(directory, f"{stamp}_{profile['prompt_id']}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(to_chrome_trace(profile), f)
+    os.replace(tmp, path)
+    return path
+
+
+def aggregate(paths: List[str], by: str = "class_type") -> List[Dict[str, Any]]:
+    """
+    Rank node types across trace files by total wall time.
+
+    Args:
+        paths: Chrome trace files written by save_trace
+        by: "class_type" or "package"
+
+    Returns:
+        One row per node type (or package), slowest first
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    for path in paths:
+        with open(path) as f:
+            trace = json.load(f)
+        for event in trace.get("traceEvents", []):
+            if event.get("cat") != "node":
+                continue
+            args = event.get("args", {})
+            key = event["name"] if by == "class_type" else (args.get("package") or "unknown")
+            group = groups.setdefault(key, {"walls": [], "gpu": 0.0, "cached": 0, "vram_peak": None, "prompts": set()})
+            group["prompts"].add(path)
+            if event["ph"] == "i":
+                group["cached"] += 1
+                continue
+            group["walls"].append(event["dur"] / 1e6)
+            group["gpu"] += args.get("gpu") or 0.0
+            if args.get("vram_peak") is not None:
+                group["vram_peak"] = max(group["vram_peak"] or 0, args["vram_peak"])
+
+    rows = []
+    for key, group in groups.items():
+        walls = sorted(group["walls"])
+        runs = len(walls) + group["cached"]
+        rows.append({
+            by: key,
+            "executed": len(walls),
+            "cached": group["cached"],
+            "cache_hit_rate": group["cached"] / runs if runs else 0.0,
+            "total": sum(walls),
+            "mean": statistics.mean(walls) if walls else 0.0,
+            "p95": walls[min(len(walls) - 1, int(len(walls) * 0.95))] if walls else 0.0,
+            "max": walls[-1] if walls else 0.0,
+            "gpu": group["gpu"],
+            "vram_peak": group["vram_peak"],
+            "prompts": len(group["prompts"]),
+        })
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+def trace_files(targets: List[str]) -> List[str]:
+    """Trace files in the given files and directories."""
+    paths = []
+    for target in targets:
+        paths.extend(sorted(glob.glob(os.path.join(target, "*.json"))) if os.path.isdir(target) else [target])
+    return paths
+
+
+def print_report(rows: List[Dict[str, Any]], by: str, top: int):
+    """Print the ranking as a table."""
+    total = sum(row["total"] for row in rows) or 1.0
+    print(f"{by:<40}{'exec':>6}{'cached':>8}{'total s':>10}{'share':>7}{'mean s':>9}{'p95 s':>9}{'gpu s':>9}{'VRAM GB':>9}")
+    for row in rows[:top]:
+        vram = f"{row['vram_peak'] / 1024 ** 3:.2f}" if row["vram_peak"] is not None else "-"
+        print(f"{row[by][:39]:<40}{row['executed']:>6}{row['cached']:>8}{row['total']:>10.2f}"
+              f"{row['total'] / total:>7.0%}{row['mean']:>9.3f}{row['p95']:>9.3f}{row['gpu']:>9.2f}{vram:>9}")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Profile ComfyUI prompts per node and rank the slowest node types.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="Rank node types across trace files")
+    report.add_argument("targets", nargs="+", help="Trace files or directories of trace files")
+    report.add_argument("--by", choices=["class_type", "package"], default="class_type")
+    report.add_argument("--top", type=int, default=20)
+    report.add_argument("--json", action="store_true", help="Print the rows as JSON")
+
+    run = commands.add_parser("run", help="Run a workflow and profile it from ComfyUI's websocket events")
+    run.add_argument("workflow", help="Workflow in API format (JSON)")
+    run.add_argument("--url", default="http://127.0.0.1:8188")
+    run.add_argument("--out", default="profiles", help="Directory for the trace file")
+    run.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        paths = trace_files(args.targets)
+        rows = aggregate(paths, args.by)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print(f"📊 {len(paths)} trace file(s)\n")
+            print_report(rows, args.by, args.top)
+        return
+
+    from comfy_client import ComfyUIClient
+
+    with open(args.workflow) as f:
+        workflow = json.load(f)
+    client = ComfyUIClient(args.url)
+    profiler = NodeProfiler()
+    for _ in range(args.runs):
+        for event in client.run(workflow):
+            if event["type"] == "queued":
+                profiler.add_prompt(event["data"]["prompt_id"], workflow)
+            profile = profiler.on_event(event["type"], event.get("data", {}))
+            if profile:
+                print(f"✓ {profile['prompt_id']}: {profile['wall']:.2f}s, {len(profile['nodes'])} node(s) "
+                      f"-> {save_trace(profile, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Result cache for deterministic workflows.
+
+API traffic often repeats the same workflow: same graph, same seed, same
+models. ComfyUI's own cache only covers the last prompt of one process, so
+every repeat runs the whole GPU job again. ResultCache keys a workflow by
+a canonical hash of its graph and the content of the files it reads, and
+answers repeats with the outputs already stored in the output folder.
+
+The canonical hash ignores node ids, node order and UI-only fields (titles
+in "_meta"): every node is hashed with everything upstream of it, as the
+micro-batcher does. Model files are keyed by their sha256 (free for files
+linked into the model store, indexed by size and mtime otherwise) and input
+images by size and mtime.
+
+The index lives on the volume, so containers share it. A background thread
+syncs it once per save interval: it reloads the volume, merges the entries
+other containers stored and writes the result back, without holding the
+lock lookups take. Results stored by this container reach the volume, and
+results stored by others are seen, at the next sync. It holds at most max_entries
+results, evicted least recently used first, and entries expire after ttl
+seconds. Evicting an entry leaves its output files in place; an entry whose
+files were deleted is dropped when it is next looked up.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from batching import node_hashes
+from model_loaders import workflow_models
+
+# Loader nodes reading a file from ComfyUI's input folder, and the input holding its name
+INPUT_FILE_NODES = {"LoadImage": "image", "LoadImageMask": "image", "LoadAudio": "audio"}
+
+# Bumped when the key format changes, so old entries are never served
+KEY_VERSION = 1
+
+
+class ModelHasher:
+    """Content hashes of the model files a workflow loads."""
+
+    def __init__(self, resolve: Callable[[str, str], Optional[str]], store=None, mode: str = "sha256"):
+        """
+        Initialize the hasher.
+
+        Args:
+            resolve: Maps (model folder, file name) to a path (ModelPathsResolver.resolve)
+            store: ModelStore of the volume; its index caches sha256 digests
+            mode: "sha256" (file content) or "stat" (size and mtime)
+        """
+        if mode not in ("sha256", "stat"):
+            raise ValueError(f"Unknown model hash mode: {mode}")
+        self.resolve = resolve
+        self.store = store
+        self.mode = mode
+        self.hashed = 0
+
+    def digest(self, folder: str, name: str) -> Optional[str]:
+        """Hash of a model file, or None when it cannot be resolved."""
+        path = self.resolve(folder, name)
+        if path is None:
+            return None
+        real = Path(os.path.realpath(path))
+        if self.store is not None:
+            # Blobs of the model store are named by their sha256
+            if self.store.store.resolve() in real.parents:
+                return real.name
+            if self.mode == "sha256" and Path(path).is_relative_to(self.store.root):
+                relative = str(Path(path).relative_to(self.store.root))
+                indexed = self.store.index.get(relative)
+                digest = self.store.digest(Path(path))
+                if self.store.index.get(relative) is not indexed:
+                    # Hashed now; keep the digest for the next container
+                    self.hashed += 1
+                    self.store.save_index()
+                return digest
+        stat = real.stat()
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ResultCache:
+    """Index of stored workflow results, keyed by canonical graph and file hashes."""
+
+    def __init__(self, index_path: str, output_dir: str, model_digest: Callable[[str, str], Optional[str]],
+                 input_dir: Optional[str] = None, max_entries: int = 1000, ttl: float = 7 * 24 * 3600,
+                 flush: Optional[Callable[[List[Dict[str, Any]]], Any]] = None, save_interval: float = 60.0,
+                 reload: Optional[Callable[[], Any]] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            index_path: Index file on the volume
+            output_dir: ComfyUI's output folder, where cached outputs are read from
+            model_digest: Hash of a model file (ModelHasher.digest)
+            input_dir: ComfyUI's input folder, for LoadImage and similar nodes
+            max_entries: Results kept in the index
+            ttl: Seconds a result is served after it was stored
+            flush: Waits for the given outputs still being written (ComfyUIClient.wait_outputs)
+            save_interval: Seconds between syncs of the index with the volume
+                (0 only syncs on sync() and close())
+            reload: Makes other containers' writes visible (the volume reload)
+        """
+        self.index_path = index_path
+        self.output_dir = output_dir
+        self.model_digest = model_digest
+        self.input_dir = input_dir
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush = flush
+        self.save_interval = save_interval
+        self.reload = reload
+        self.entries: Dict[str, Dict[str, Any]] = self._read_index()
+        self.removed: set = set()
+        self.stats = {"hits": 0, "misses": 0, "uncacheable": 0, "stores": 0,
+                      "evictions": 0, "expired": 0, "stale": 0, "syncs": 0}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._closed = threading.Event()
+        if save_interval > 0:
+            threading.Thread(target=self._sync_loop, name="mxc-result-cache-sync", daemon=True).start()
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("entries", {}) if data.get("version") == KEY_VERSION else {}
+
+    def key(self, workflow: Dict[str, Any]) -> Optional[str]:
+        """
+        Cache key of a workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+
+        Returns:
+            Hex digest, or None when a model or input file cannot be found
+        """
+        graph = sorted(node_hashes(workflow).values())
+        files = []
+        for folder, name in sorted(workflow_models(workflow)):
+            digest = self.model_digest(folder, name)
+            if digest is None:
+                return None
+            files.append([folder, name, digest])
+        for node in workflow.values():
+            name = node.get("inputs", {}).get(INPUT_FILE_NODES.get(node.get("class_type"), ""))
+            if isinstance(name, str):
+                if self.input_dir is None:
+                    return None
+                try:
+                    stat = os.stat(os.path.join(self.input_dir, name.split(" [")[0]))
+                except OSError:
+                    return None
+                files.append(["input", name, f"{stat.st_size}:{stat.st_mtime_ns}"])
+        payload = json.dumps([KEY_VERSION, graph, sorted(files)])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, output: Dict[str, Any]) -> str:
+        return os.path.join(self.output_dir, output.get("subfolder", ""), output["filename"])
+
+    def get(self, workflow: Dict[str, Any], include_images: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Look up the stored result of a workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+            include_images: Embed output files as base64, as HeadlessAPI does
+
+        Returns:
+            A "result" event in HeadlessAPI format with "cached": True, or None
+        """
+        key = self.key(workflow)
+        with self._lock:
+            entry = self.entries.get(key) if key else None
+            if entry is None:
+                self.stats["misses" if key else "uncacheable"] += 1
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+        paths = [self._path(output) for output in entry["outputs"]]
+        if not all(os.path.isfile(path) for path in paths) and self.flush is not None:
+            # Outputs may still be queued in the background writer
+            self.flush(entry["outputs"])
+        if not all(os.path.isfile(path) for path in paths):
+            with self._lock:
+                self._remove(key)
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+            return None
+
+        node_ids = {}
+        for node_id, digest in node_hashes(workflow).items():
+            node_ids.setdefault(digest, node_id)
+        outputs = []
+        for output, path in zip(entry["outputs"], paths):
+            item = {"node_id": node_ids.get(output["node_hash"], ""), "filename": output["filename"],
+                    "subfolder": output.get("subfolder", ""), "type": "output"}
+            if include_images:
+                with open(path, "rb") as f:
+                    item["data"] = base64.b64encode(f.read()).decode()
+            outputs.append(item)
+
+        with self._lock:
+            entry["last_used"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.stats["hits"] += 1
+        return {"type": "result", "prompt_id": entry["prompt_id"], "outputs": outputs, "cached": True}
+
+    def put(self, workflow: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """
+        Store the result of a workflow that just ran.
+
+        Only results whose files are all in the output folder are stored;
+        outputs still queued in the background writer are flushed first.
+
+        Args:
+            workflow: Workflow graph in API format
+            result: "result" event returned by HeadlessAPI
+
+        Returns:
+            Whether the result was stored
+        """
+        outputs = result.get("outputs", [])
+        if result.get("cached") or not outputs or any(output.get("type") != "output" for output in outputs):
+            return False
+        key = self.key(workflow)
+        if key is None:
+            return False
+        paths = [self._path(output) for output in outputs]
+        if not all(os.path.isfile(path) for path in paths) and self.flush is not None:
+            self.flush(outputs)
+        if not all(os.path.isfile(path) for path in paths):
+            return False
+        hashes = node_hashes(workflow)
+        now = time.time()
+        entry = {
+            "prompt_id": result["prompt_id"], "created": now, "last_used": now, "hits": 0,
+            "outputs": [{"node_hash": hashes.get(output["node_id"], ""), "filename": output["filename"],
+                         "subfolder": output.get("subfolder", "")} for output in outputs],
+        }
+        with self._lock:
+            self.entries[key] = entry
+            self.removed.discard(key)
+            self.stats["stores"] += 1
+            self._evict()
+        return True
+
+    def tee(self, workflow: Dict[str, Any], events: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Pass a streamed submission through, storing its result."""
+        for event in events:
+            if event["type"] == "result":
+                self.put(workflow, event)
+            yield event
+
+    def _remove(self, key: str):
+        self.entries.pop(key, None)
+        self.removed.add(key)
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]:
+            self._remove(key)
+            self.stats["expired"] += 1
+        if len(self.entries) > self.max_entries:
+            by_use = sorted(self.entries, key=lambda key: self.entries[key]["last_used"])
+            for key in by_use[:len(self.entries) - self.max_entries]:
+                self._remove(key)
+                self.stats["evictions"] += 1
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.save_interval):
+            self.sync()
+
+    def sync(self):
+        """
+        Merge the entries other containers stored into the index and write it back.
+
+        The volume is reloaded, read and written outside the lock lookups take;
+        only the merge itself holds it.
+        """
+        with self._sync_lock:
+            if self.reload is not None:
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"⚠ Could not reload the result cache index: {e}")
+            stored = self._read_index()
+            with self._lock:
+                for key, entry in stored.items():
+                    if key in self.removed:
+                        continue
+                    ours = self.entries.get(key)
+                    if ours is None or entry["last_used"] > ours["last_used"]:
+                        self.entries[key] = entry
+                self._evict()
+                self.stats["syncs"] += 1
+                if self.entries == stored:
+                    return
+                data = json.dumps({"version": KEY_VERSION, "entries": self.entries})
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp = f"{self.index_path}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self.index_path)
+            except OSError as e:
+                print(f"⚠ Could not save the result cache index: {e}")
+
+    def close(self):
+        """Stop the background sync and write what is left."""
+        self._closed.set()
+        self.sync()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Cache metrics.
+
+        Returns:
+            Counters, index size and the hit rate over cacheable lookups
+        """
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "entries": len(self.entries), "max_entries": self.max_entries,
+                    "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
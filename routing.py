@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Model-affinity-aware routing of workflows across ComfyUI containers.
+
+Each container shard publishes which models it has loaded and how busy it
+is. The router sends a workflow to the shard that already holds the most of
+its models, falling back to the least-loaded shard, and counts how many model
+swaps its decisions cause.
+
+The module doubles as a simulator that replays a recorded workload and
+compares routing policies:
+
+    python routing.py simulate workload.jsonl --containers 3 --slots 2
+
+Each workload line is a JSON object with a "workflow" (or "prompt") graph in
+ComfyUI API format and optional "arrival" and "duration" fields in seconds.
+"""
+
+import argparse
+import heapq
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from model_loaders import workflow_models
+
+
+def model_keys(workflow: Dict[str, Any]) -> Set[str]:
+    """Model identifiers ("folder/name") used for affinity decisions."""
+    return {f"{folder}/{name}" for folder, name in workflow_models(workflow)}
+
+
+class AffinityRouter:
+    """Pick a container shard for each workflow based on loaded models and load."""
+
+    def __init__(self, shards: int, model_slots: int = 2):
+        """
+        Initialize the router.
+
+        Args:
+            shards: Number of container shards
+            model_slots: Number of models a shard is assumed to keep loaded
+        """
+        self.shards = shards
+        self.model_slots = model_slots
+        self.loaded: Dict[int, List[str]] = {shard: [] for shard in range(shards)}
+        # Workflows this router sent to each shard that have not completed yet
+        self.load: Dict[int, int] = {shard: 0 for shard in range(shards)}
+        # Workflows queued or running on each shard as it last reported, from any source
+        self.reported_load: Dict[int, int] = {shard: 0 for shard in range(shards)}
+        # Time (time.time) the router last assumed models for each shard
+        self.changed: Dict[int, float] = {shard: 0.0 for shard in range(shards)}
+        self.decisions = {"hit": 0, "partial": 0, "miss": 0}
+        self.swaps = 0
+        self.routed_by_shard = {shard: 0 for shard in range(shards)}
+        # Route requests are served from concurrent threads
+        self._lock = threading.Lock()
+
+    def update(self, shard: int, models: Iterable[str], load: int, reported_at: Optional[float] = None) -> bool:
+        """
+        Apply the state a shard reported, unless the router's own state is newer.
+
+        The router's count of workflows it routed and that have not completed
+        is kept; the reported load only raises the shard's effective load.
+
+        Args:
+            shard: Shard index
+            models: Models loaded on the shard, least recently used first
+            load: Workflows queued or running on the shard
+            reported_at: Time (time.time) of the report; None applies it unconditionally
+
+        Returns:
+            Whether the report was applied
+        """
+        with self._lock:
+            if reported_at is not None and reported_at < self.changed[shard]:
+                return False
+            self.loaded[shard] = list(models)[-self.model_slots:]
+            self.reported_load[shard] = load
+            return True
+
+    def route(self, models: Set[str]) -> int:
+        """
+        Choose a shard for a workflow and record the decision.
+
+        Shards holding more of the workflow's models win; ties and workflows
+        without a resident model go to the least-loaded shard.
+
+        Args:
+            models: Model keys of the workflow
+
+        Returns:
+            Shard index
+        """
+        def score(shard: int) -> Tuple[int, int, int]:
+            load = max(self.load[shard], self.reported_load[shard])
+            return (len(models & set(self.loaded[shard])), -load, -shard)
+
+        with self._lock:
+            shard = max(range(self.shards), key=score)
+            resident = models & set(self.loaded[shard])
+            if models and resident == models:
+                self.decisions["hit"] += 1
+            elif resident:
+                self.decisions["partial"] += 1
+            else:
+                self.decisions["miss"] += 1
+            self.swaps += len(models - resident)
+            self.routed_by_shard[shard] += 1
+
+            # Assume the shard loads the workflow's models until it reports otherwise
+            self.loaded[shard] = ([m for m in self.loaded[shard] if m not in models]
+                                  + sorted(models))[-self.model_slots:]
+            self.load[shard] += 1
+            self.changed[shard] = time.time()
+            return shard
+
+    def complete(self, shard: int):
+        """Record that a workflow routed to `shard` finished."""
+        with self._lock:
+            self.load[shard] = max(0, self.load[shard] - 1)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Routing metrics.
+
+        Returns:
+            Decision counts, model swaps, affinity hit rate and per-shard state
+        """
+        with self._lock:
+            total = sum(self.decisions.values())
+            return {
+                "decisions": dict(self.decisions),
+                "routed": total,
+                "hit_rate": self.decisions["hit"] / total if total else 0.0,
+                "model_swaps": self.swaps,
+                "routed_by_shard": dict(self.routed_by_shard),
+                "loaded": {shard: list(models) for shard, models in self.loaded.items()},
+                "load": dict(self.load),
+                "reported_load": dict(self.reported_load),
+            }
+
+
+class ShardRegistry:
+    """Shard state shared between containers and the router through a dict-like store."""
+
+    def __init__(self, store, ttl: float = 120.0):
+        """
+        Initialize the registry.
+
+        Args:
+            store: Mapping shared between processes (a modal.Dict in the app)
+            ttl: Seconds after which a shard's report is ignored
+        """
+        self.store = store
+        self.ttl = ttl
+
+    def publish(self, shard: int, models: List[str], load: int):
+        """Publish a shard's loaded models and load."""
+        self.store[f"shard:{shard}"] = {"models": models, "load": load, "updated": time.time()}
+
+    def apply(self, router: AffinityRouter):
+        """
+        Refresh a router with the shard reports made after its own routing decisions.
+
+        A shard that has neither reported nor been routed to within the TTL
+        has probably scaled down, and looks empty.
+        """
+        now = time.time()
+        for shard in range(router.shards):
+            report = self.store.get(f"shard:{shard}")
+            if report and now - report["updated"] <= self.ttl:
+                router.update(shard, report["models"], report["load"], report["updated"])
+            elif now - router.changed[shard] > self.ttl:
+                router.update(shard, [], 0)
+
+
+class LoadedModels:
+    """Track the models a container has recently used, least recent first."""
+
+    def __init__(self, slots: int = 2):
+        self.slots = slots
+        self.models: List[str] = []
+
+    def use(self, models: Set[str]):
+        """Record that a workflow loaded `models`."""
+        self.models = ([m for m in self.models if m not in models] + sorted(models))[-self.slots:]
+
+
+# ===========================
+# Workload simulation
+# ===========================
+
+def load_workload(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Read a JSONL workload.
+
+    Args:
+        path: Workload file
+
+    Returns:
+        Tuple of (entries with a workflow, number of skipped lines)
+    """
+    entries, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            workflow = record.get("workflow", record.get("prompt")) if isinstance(record, dict) else None
+            if isinstance(workflow, dict) and workflow:
+                entries.append({**record, "workflow": workflow})
+            else:
+                skipped += 1
+    return entries, skipped
+
+
+def simulate(entries: List[Dict[str, Any]], policy: str, containers: int, slots: int,
+             interval: float = 1.0, duration: float = 5.0, swap_time: float = 10.0) -> Dict[str, Any]:
+    """
+    Replay a workload against simulated containers.
+
+    Every container runs one workflow at a time and keeps its `slots` most
+    recently used models; each model it has to load adds `swap_time`.
+
+    Args:
+        entries: Workload entries from load_workload
+        policy: "affinity", "least_loaded" or "round_robin"
+        containers: Number of containers
+        slots: Models each container keeps loaded
+        interval: Seconds between arrivals when entries have no "arrival"
+        duration: Execution seconds when entries have no "duration"
+        swap_time: Seconds to load one model
+
+    Returns:
+        Hit rate, swap count and latency statistics
+    """
+    router = AffinityRouter(containers, slots)
+    resident = {shard: LoadedModels(slots) for shard in range(containers)}
+    free_at = {shard: 0.0 for shard in range(containers)}
+    finishing: List[Tuple[float, int]] = []
+    latencies = []
+    hits = swaps = 0
+
+    for index, entry in enumerate(entries):
+        now = float(entry.get("arrival", index * interval))
+        while finishing and finishing[0][0] <= now:
+            router.complete(heapq.heappop(finishing)[1])
+        models = model_keys(entry["workflow"])
+
+        if policy == "affinity":
+            shard = router.route(models)
+        elif policy == "least_loaded":
+            shard = min(range(containers), key=lambda s: (router.load[s], s))
+            router.load[shard] += 1
+        else:
+            shard = index % containers
+            router.load[shard] += 1
+
+        missing = models - set(resident[shard].models)
+        hits += bool(models) and not missing
+        swaps += len(missing)
+        resident[shard].use(models)
+
+        start = max(now, free_at[shard])
+        free_at[shard] = start + float(entry.get("duration", duration)) + swap_time * len(missing)
+        heapq.heappush(finishing, (free_at[shard], shard))
+        latencies.append(free_at[shard] - now)
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "policy": policy,
+        "requests": count,
+        "hit_rate": hits / count if count else 0.0,
+        "model_swaps": swaps,
+        "mean_latency": sum(latencies) / count if count else 0.0,
+        "p95_latency": latencies[min(count - 1, int(count * 0.95))] if count else 0.0,
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Simulate model-affinity routing on a recorded workload.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sim = commands.add_parser("simulate", help="Compare routing policies on a JSONL workload")
+    sim.add_argument("workload")
+    sim.add_argument("--containers", type=int, default=2)
+    sim.add_argument("--slots", type=int, default=2, help="Models each container keeps loaded")
+    sim.add_argument("--interval", type=float, default=1.0, help="Seconds between arrivals without 'arrival'")
+    sim.add_argument("--duration", type=float, default=5.0, help="Execution seconds without 'duration'")
+    sim.add_argument("--swap-time", type=float, default=10.0, help="Seconds to load one model")
+    sim.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    entries, skipped = load_workload(args.workload)
+    print(f"📂 {len(entries)} workflow(s) loaded, {skipped} line(s) without a workflow skipped")
+    if not entries:
+        return
+
+    results = [
+        simulate(entries, policy, args.containers, args.slots, args.interval, args.duration, args.swap_time)
+        for policy in ("affinity", "least_loaded", "round_robin")
+    ]
+    print(f"\n{'policy':<14}{'hit rate':>10}{'swaps':>8}{'mean (s)':>10}{'p95 (s)':>10}")
+    for r in results:
+        print(f"{r['policy']:<14}{r['hit_rate']:>10.1%}{r['model_swaps']:>8}"
+              f"{r['mean_latency']:>10.1f}{r['p95_latency']:>10.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Priority, fair-share and shortest-job-first scheduling of headless API workflows.
+
+ComfyUI executes its queue first in, first out, so with max_inputs workflows
+accepted per container a long upscale job delays every preview queued behind
+it. JobScheduler holds submissions back and releases at most `depth` of them
+to ComfyUI at a time (one by default), picking the next one when a job
+finishes:
+
+1. Priority class: "high" before "normal" before "low". A job gains one
+   class for every `aging` seconds it waits, so low priority work cannot
+   starve.
+2. Fair share: within a class, the tenant (API client) that has been granted
+   the least estimated GPU time goes first.
+3. Shortest estimated job first within the tenant's jobs.
+
+Jobs are never preempted once released to ComfyUI; a high priority arrival
+waits for the running job and overtakes everything still waiting. Cost
+estimates come from CostModel, the mean execution time of earlier runs of
+the same workflow (same graph and models, see batching.batch_signature),
+stored on the volume so new containers start with the history.
+
+Simulate the policies on a synthetic workload with a mock executor:
+
+    python scheduler.py simulate --jobs 300 --rate 0.15 --json scheduler_results.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from batching import batch_signature
+
+# Priority classes, highest first
+DEFAULT_CLASSES = ("high", "normal", "low")
+
+# Tenant of submissions that do not name one
+DEFAULT_TENANT = "default"
+
+# Bumped when the cost history format changes
+HISTORY_VERSION = 1
+
+
+class CostModel:
+    """Execution time estimates of workflows, learned from earlier runs."""
+
+    def __init__(self, path: Optional[str] = None, default: float = 10.0, alpha: float = 0.2,
+                 save_interval: float = 60.0):
+        """
+        Initialize the model, reading the history file if it exists.
+
+        Args:
+            path: History file on the volume (None keeps the history in memory)
+            default: Seconds assumed for a workflow never seen before
+            alpha: Weight of the newest run in the moving average
+            save_interval: Seconds between history saves
+        """
+        self.path = path
+        self.default = default
+        self.alpha = alpha
+        self.save_interval = save_interval
+        self.costs: Dict[str, Dict[str, float]] = self._read()
+        self.saved = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data.get("costs", {}) if data.get("version") == HISTORY_VERSION else {}
+
+    @staticmethod
+    def shape(workflow: Dict[str, Any]) -> str:
+        """Node types of a workflow; the fallback key for graphs never run with these models."""
+        return "shape:" + ",".join(sorted(node.get("class_type", "") for node in workflow.values()))
+
+    def estimate(self, workflow: Dict[str, Any]) -> float:
+        """
+        Expected execution time of a workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+
+        Returns:
+            Mean seconds of earlier runs of the same workflow, else of workflows
+            with the same node types, else the default
+        """
+        with self._lock:
+            for key in (batch_signature(workflow), self.shape(workflow)):
+                if key in self.costs:
+                    return self.costs[key]["mean"]
+        return self.default
+
+    def record(self, workflow: Dict[str, Any], seconds: float):
+        """
+        Add the execution time of a finished workflow.
+
+        Args:
+            workflow: Workflow graph in API format
+            seconds: Time from execution start to completion
+        """
+        with self._lock:
+            for key in (batch_signature(workflow), self.shape(workflow)):
+                entry = self.costs.get(key)
+                if entry is None:
+                    self.costs[key] = {"mean": seconds, "runs": 1}
+                else:
+                    entry["mean"] += self.alpha * (seconds - entry["mean"])
+                    entry["runs"] += 1
+        if self.path and time.monotonic() - self.saved > self.save_interval:
+            self.save()
+
+    def save(self):
+        """Write the history, keeping workflows other containers recorded since it was read."""
+        if not self.path:
+            return
+        with self._lock:
+            for key, entry in self._read().items():
+                if key not in self.costs or entry["runs"] > self.costs[key]["runs"]:
+                    self.costs[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    json.dump({"version": HISTORY_VERSION, "costs": self.costs}, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"⚠ Could not save the job cost history: {e}")
+            self.saved = time.monotonic()
+
+
+class JobScheduler:
+    """Orders submissions by priority class, tenant fair share and estimated cost."""
+
+    def __init__(self, costs: CostModel, classes: Sequence[str] = DEFAULT_CLASSES,
+                 default_class: str = "normal", aging: float = 120.0, depth: int = 1,
+                 fair_share: bool = True, shortest_first: bool = True,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the scheduler.
+
+        Args:
+            costs: Execution time estimates
+            classes: Priority classes, highest first
+            default_class: Class of submissions that do not name one
+            aging: Seconds of waiting that raise a job by one class (0 disables aging)
+            depth: Jobs released to ComfyUI at once; 1 picks every job at a job boundary
+            fair_share: Order tenants by the GPU time they were granted
+            shortest_first: Order a tenant's jobs by estimated cost instead of arrival
+            clock: Time source (the simulator passes its virtual clock)
+        """
+        if default_class not in classes:
+            raise ValueError(f"Default priority class {default_class!r} is not one of {', '.join(classes)}")
+        self.costs = costs
+        self.classes = list(classes)
+        self.default_class = default_class
+        self.aging = aging
+        self.depth = depth
+        self.fair_share = fair_share
+        self.shortest_first = shortest_first
+        self.clock = clock
+        self.waiting: List[Dict[str, Any]] = []
+        self.running: List[Dict[str, Any]] = []
+        # Estimated seconds granted to each tenant, and the share of the last tenant served
+        self.usage: Dict[str, float] = {}
+        self.virtual = 0.0
+        self.counter = 0
+        self.stats = {name: {"submitted": 0, "dispatched": 0, "wait": 0.0} for name in self.classes}
+        self._cond = threading.Condition()
+
+    def rank(self, priority: Optional[str]) -> int:
+        """Position of a priority class, 0 being the highest."""
+        priority = priority or self.default_class
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {', '.join(self.classes)}")
+        return self.classes.index(priority)
+
+    def enqueue(self, workflow: Dict[str, Any], priority: Optional[str] = None,
+                tenant: Optional[str] = None, shares: Optional[Dict[Optional[str], float]] = None) -> Dict[str, Any]:
+        """
+        Add a job; it is released right away if ComfyUI has room.
+
+        Args:
+            workflow: Workflow graph in API format
+            priority: Priority class (default_class when None)
+            tenant: Submitting client, for fair share
+            shares: Fraction of the job's cost charged to each tenant, for jobs
+                run on behalf of several (merged batches); all of it goes to
+                `tenant` by default
+
+        Returns:
+            The job, to pass to wait and release
+        """
+        rank = self.rank(priority)
+        job = {"workflow": workflow, "class": self.classes[rank], "rank": rank, "tenant": tenant or DEFAULT_TENANT,
+               "estimate": self.costs.estimate(workflow), "enqueued": self.clock(), "dispatched": None,
+               "done": False}
+        job["shares"] = ({(name or DEFAULT_TENANT): share for name, share in shares.items()} if shares
+                         else {job["tenant"]: 1.0})
+        with self._cond:
+            self.counter += 1
+            job["number"] = self.counter
+            for name in {job["tenant"], *job["shares"]}:
+                if not any(name in j["shares"] for j in self.waiting + self.running):
+                    # A tenant returning after a pause gets no credit for the time it was idle
+                    self.usage[name] = max(self.usage.get(name, 0.0), self.virtual)
+            self.waiting.append(job)
+            self.stats[job["class"]]["submitted"] += 1
+            self._dispatch()
+        return job
+
+    def _pick(self) -> Dict[str, Any]:
+        now = self.clock()
+
+        def effective(job: Dict[str, Any]) -> int:
+            if self.aging <= 0:
+                return job["rank"]
+            return max(0, job["rank"] - int((now - job["enqueued"]) // self.aging))
+
+        top = min(effective(job) for job in self.waiting)
+        candidates = [job for job in self.waiting if effective(job) == top]
+        if self.fair_share:
+            share = min(self.usage[job["tenant"]] for job in candidates)
+            candidates = [job for job in candidates if self.usage[job["tenant"]] == share]
+        if self.shortest_first:
+            return min(candidates, key=lambda job: (job["estimate"], job["number"]))
+        return min(candidates, key=lambda job: job["number"])
+
+    def _dispatch(self):
+        while self.waiting and len(self.running) < self.depth:
+            job = self._pick()
+            self.waiting.remove(job)
+            self.running.append(job)
+            job["dispatched"] = self.clock()
+            self.virtual = self.usage[job["tenant"]]
+            for name, share in job["shares"].items():
+                self.usage[name] += job["estimate"] * share
+            stats = self.stats[job["class"]]
+            stats["dispatched"] += 1
+            stats["wait"] += job["dispatched"] - job["enqueued"]
+        self._cond.notify_all()
+
+    def wait(self, job: Dict[str, Any], timeout: Optional[float] = None) -> bool:
+        """
+        Block until a job is released to ComfyUI.
+
+        Args:
+            job: Job returned by enqueue
+            timeout: Seconds to wait (None waits until released)
+
+        Returns:
+            Whether the job was released
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: job["dispatched"] is not None, timeout)
+
+    def release(self, job: Dict[str, Any], seconds: Optional[float] = None):
+        """
+        Finish a job, or withdraw it if it was never released, and release the next one.
+
+        Safe to call more than once for the same job.
+
+        Args:
+            job: Job returned by enqueue
+            seconds: Execution time of a completed job, added to the cost history
+        """
+        with self._cond:
+            if job["done"]:
+                return
+            job["done"] = True
+            if job in self.running:
+                self.running.remove(job)
+            elif job in self.waiting:
+                self.waiting.remove(job)
+            self._dispatch()
+        if seconds is not None:
+            self.costs.record(job["workflow"], seconds)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Scheduler metrics.
+
+        Returns:
+            Jobs waiting and running, and per class the submitted and
+            dispatched counts and the mean wait before dispatch
+        """
+        with self._cond:
+            result: Dict[str, Any] = {"waiting": len(self.waiting), "running": len(self.running),
+                                      "tenants": len(self.usage)}
+            for name, stats in self.stats.items():
+                result[f"{name}_waiting"] = sum(1 for job in self.waiting if job["class"] == name)
+                result[f"{name}_submitted"] = stats["submitted"]
+                result[f"{name}_dispatched"] = stats["dispatched"]
+                result[f"{name}_mean_wait"] = stats["wait"] / stats["dispatched"] if stats["dispatched"] else 0.0
+            return result
+
+
+# ===========================
+# Simulation
+# ===========================
+
+# Synthetic job types: (priority class, node types, mean execution seconds, share of arrivals)
+JOB_TYPES = {
+    "preview": ("high", ["CheckpointLoaderSimple", "CLIPTextEncode", "KSampler", "VAEDecode", "PreviewImage"],
+                2.0, 0.5),
+    "txt2img": ("normal", ["CheckpointLoaderSimple", "CLIPTextEncode", "KSampler", "VAEDecode", "SaveImage"],
+                6.0, 0.35),
+    "upscale": ("low", ["CheckpointLoaderSimple", "LoadImage", "UltimateSDUpscale", "SaveImage"], 45.0, 0.15),
+}
+
+# Scheduling policies compared by the simulator
+POLICIES = {
+    "fifo": {"priorities": False, "fair_share": False, "shortest_first": False},
+    "priority": {"priorities": True, "fair_share": False, "shortest_first": False},
+    "priority+sjf": {"priorities": True, "fair_share": False, "shortest_first": True},
+    "priority+fair+sjf": {"priorities": True, "fair_share": True, "shortest_first": True},
+}
+
+
+def synthetic_workload(jobs: int, rate: float, tenants: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Poisson arrivals of the JOB_TYPES mix from several tenants.
+
+    Tenant 0 submits half of the upscale jobs, as a batch client would.
+
+    Args:
+        jobs: Number of submissions
+        rate: Mean arrivals per second
+        tenants: Number of tenants
+        seed: Random seed
+
+    Returns:
+        Submissions with arrival time, type, class, tenant, workflow and true duration
+    """
+    rng = random.Random(seed)
+    names = list(JOB_TYPES)
+    weights = [JOB_TYPES[name][3] for name in names]
+    now, entries = 0.0, []
+    for _ in range(jobs):
+        now += rng.expovariate(rate)
+        kind = rng.choices(names, weights)[0]
+        priority, node_types, mean, _ = JOB_TYPES[kind]
+        tenant = 0 if kind == "upscale" and rng.random() < 0.5 else rng.randrange(tenants)
+        # Each job type comes in a few variants (checkpoints), with their own cost history
+        variant = rng.randrange(3)
+        workflow = {str(i): {"class_type": t, "inputs": {"variant": variant} if i == 1 else {}}
+                    for i, t in enumerate(node_types, 1)}
+        entries.append({"arrival": now, "type": kind, "class": priority, "tenant": f"tenant-{tenant}",
+                        "workflow": workflow, "duration": mean * (0.8 + 0.1 * variant) * rng.uniform(0.9, 1.1)})
+    return entries
+
+
+def simulate(entries: List[Dict[str, Any]], policy: str, aging: float = 120.0,
+             default_cost: float = 10.0) -> Dict[str, Any]:
+    """
+    Run a workload through JobScheduler with a mock executor.
+
+    The executor runs one job at a time for its true duration; the cost model
+    starts empty and learns from the jobs that finish, as in a new deployment.
+
+    Args:
+        entries: Submissions from synthetic_workload (or a workload file)
+        policy: Key of POLICIES
+        aging: Seconds of waiting that raise a job by one class
+        default_cost: Estimate for workflows never seen before
+
+    Returns:
+        Latency percentiles per class and per job type, and the GPU seconds per tenant
+    """
+    options = POLICIES[policy]
+    clock = [0.0]
+    scheduler = JobScheduler(CostModel(default=default_cost), aging=aging if options["priorities"] else 0.0,
+                             fair_share=options["fair_share"], shortest_first=options["shortest_first"],
+                             clock=lambda: clock[0])
+    pending = sorted(entries, key=lambda entry: entry["arrival"])
+    entry_of: Dict[int, Dict[str, Any]] = {}
+    running, finish_at = None, math.inf
+    records = []
+    index = 0
+    while index < len(pending) or running is not None:
+        next_arrival = pending[index]["arrival"] if index < len(pending) else math.inf
+        if finish_at <= next_arrival:
+            clock[0] = finish_at
+            job, entry = running, entry_of[id(running)]
+            records.append({"class": entry["class"], "type": entry["type"], "tenant": entry["tenant"],
+                            "latency": clock[0] - entry["arrival"], "duration": entry["duration"]})
+            running, finish_at = None, math.inf
+            scheduler.release(job, entry["duration"])
+        else:
+            clock[0] = next_arrival
+            entry = pending[index]
+            index += 1
+            job = scheduler.enqueue(entry["workflow"], entry["class"] if options["priorities"] else None,
+                                    entry["tenant"])
+            entry_of[id(job)] = entry
+        if running is None and scheduler.running:
+            running = scheduler.running[0]
+            finish_at = clock[0] + entry_of[id(running)]["duration"]
+
+    def latencies(key: str, value: str) -> Dict[str, float]:
+        values = sorted(r["latency"] for r in records if r[key] == value)
+        return {"jobs": len(values), "mean": sum(values) / len(values),
+                **{f"p{q}": values[max(0, math.ceil(q / 100 * len(values)) - 1)] for q in (50, 95, 99)}}
+
+    tenants: Dict[str, float] = {}
+    for r in records:
+        tenants[r["tenant"]] = tenants.get(r["tenant"], 0.0) + r["duration"]
+    return {
+        "policy": policy,
+        "jobs": len(records),
+        "makespan": clock[0],
+        "classes": {name: latencies("class", name) for name in DEFAULT_CLASSES
+                    if any(r["class"] == name for r in records)},
+        "types": {name: latencies("type", name) for name in JOB_TYPES if any(r["type"] == name for r in records)},
+        "tenant_seconds": dict(sorted(tenants.items())),
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Simulate workflow scheduling policies with a mock executor.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sim = commands.add_parser("simulate", help="Compare FIFO and priority/fair-share/SJF scheduling")
+    sim.add_argument("--jobs", type=int, default=300)
+    sim.add_argument("--rate", type=float, default=0.1, help="Mean arrivals per second (Poisson)")
+    sim.add_argument("--tenants", type=int, default=4)
+    sim.add_argument("--aging", type=float, default=120.0, help="Seconds of waiting that raise a job by one class")
+    sim.add_argument("--default-cost", type=float, default=10.0, help="Estimate for workflows never seen before")
+    sim.add_argument("--seed", type=int, default=0)
+    sim.add_argument("--json", help="Append the results to this JSON file")
+    args = parser.parse_args()
+
+    entries = synthetic_workload(args.jobs, args.rate, args.tenants, args.seed)
+    load = sum(entry["duration"] for entry in entries) / entries[-1]["arrival"]
+    print(f"⏱  Simulating {len(entries)} job(s) from {args.tenants} tenant(s), executor utilization {load:.0%}")
+    results = [simulate(entries, policy, args.aging, args.default_cost) for policy in POLICIES]
+
+    print(f"\n{'policy':<20}{'class':<8}{'jobs':>6}{'mean (s)':>10}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}")
+    for r in results:
+        for name, stats in r["classes"].items():
+            print(f"{r['policy']:<20}{name:<8}{stats['jobs']:>6}{stats['mean']:>10.1f}{stats['p50']:>10.1f}"
+                  f"{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    baseline, best = results[0]["classes"].get("high"), results[-1]["classes"].get("high")
+    if baseline and best and baseline["p95"] > 0:
+        print(f"\n✓ p95 latency of high priority jobs: {baseline['p95']:.1f}s (fifo) -> {best['p95']:.1f}s "
+              f"({results[-1]['policy']})")
+
+    if args.json:
+        history = []
+        if os.path.exists(args.json):
+            with open(args.json) as f:
+                history = json.load(f)
+        history.append({"timestamp": time.time(), "args": vars(args), "results": results})
+        with open(args.json, "w") as f:
+            json.dump(history, f, indent=2)
+        print(f"📝 Results appended to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,18 @@ Automates volume creation, model downloading, folder structure setup, and config
 
 import os
 import sys
+import json
 import subprocess
 from pathlib import Path
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 import shutil
 
 try:
     from loaders import ConfigLoader
-    from generate_model_paths import generate_extra_model_paths
+    from generate_model_paths import generate_extra_model_paths, ModelPathsGenerator
+    from dependencies import manifest_from_volume
+    from volume_ops import ModalVolumeBackend, bootstrap_folders
 except ImportError:
     print("Error: Required modules not found. Make sure you're in the project root directory.")
     sys.exit(1)
@@ -135,86 +139,120 @@ class ModalSetup:
             print(f"✗ Error creating volume: {e}")
             return False
 
-    def setup_folder_structure(self):
-        """Create folder structure in the persistent volume."""
+    def setup_folder_structure(self, backend=None):
+        """
+        Create the [MODEL_PATHS] folder structure in the persistent volume.
+
+        Args:
+            backend: Volume backend to use instead of the configured Modal volume
+        """
         print("\n" + "=" * 60)
         print("📁 SETTING UP FOLDER STRUCTURE")
         print("=" * 60)
 
         volume_name = self.config["filesystem"]["volume_name"]
-        folders = [
-            "checkpoints",
-            "text_encoders",
-            "diffusion_models",
-            "embeddings",
-            "loras",
-            "unet",
-            "vae",
-            "model_patches",
-            "custom_nodes",
-            "output"
-        ]
+        generator = ModelPathsGenerator(config_file=str(self.project_dir / "config.ini"))
+        generator.load_config()
+        folders = bootstrap_folders(generator.get_model_paths(), self.config["filesystem"])
 
-        print(f"Creating folder structure in '{volume_name}'... will take a moment.")
-
-        for folder in folders:
-            try:
-                # Create folder using modal volume with a simple touch command
-                subprocess.run(
-                    #modal volume put my-comfy-models ./.emptyfile YOYOYOYO1234/
-                    ["modal", "volume", "put", f"{volume_name}", 
-                     "./.emptyfile", f"{folder}/"],
-                    capture_output=True,
-                    check=False
-                )
-                print(f"  ✓ {folder}/")
-            except Exception as e:
-                print(f"  ✗ Failed to create {folder}: {e}")
+        print(f"Creating {len(folders)} folders in '{volume_name}'...")
+        try:
+            if backend is None:
+                backend = ModalVolumeBackend(volume_name)
+            backend.makedirs(folders)
+            created = backend.check_folders(folders)
+        except Exception as e:
+            print(f"✗ Failed to create folder structure: {e}")
+            return False
 
+        for folder, exists in created.items():
+            print(f"  {'✓' if exists else '✗'} {folder}/")
+        if not all(created.values()):
+            print("✗ Some folders are missing from the volume")
+            return False
         print("✓ Folder structure created")
+        return True
+
+    def prepare_volume(self, backend=None):
+        """
+        Create the volume and its folder structure.
+
+        Args:
+            backend: Existing volume backend to prepare instead of creating the Modal volume
+        """
+        if backend is not None or self.create_volume():
+            return self.setup_folder_structure(backend)
+        return False
 
     def download_models(self):
-        """Download essential models from Hugging Face."""
+        """Download the models listed in models.yaml into the volume."""
         print("\n" + "=" * 60)
         print("🤖 DOWNLOADING MODELS (OPTIONAL)")
         print("=" * 60)
-        print("Model downloading is disabled by default to save setup time.")
-        print(f"Drop into your Modal volume's shell using:")
-        print(f"    modal shell --volume {self.config['filesystem']['volume_name']}")
-        print(f"and then use \"wget\" utility to download models manually.")
-        print(f"Alternatively, you can use the 'modal volume put' command to upload models from your local machine to the volume.")
-        print(f"Do not forget to run \"sync\" command inside volume's shell after downloading models to ensure they are properly saved in the volume.")
-        input("Press Enter to continue...")
-        return
-        print("Model downloading from Hugging Face can be time-consuming.")
-        response = input("Do you want to download essential models now? (y/n): ").strip().lower()
 
-        if response != 'y':
-            print("Skipping model download. You can download them later manually.")
+        manifest = self.project_dir / "models.yaml"
+        if not manifest.exists():
+            print("No models.yaml found, skipping model download.")
+            print("List the models you need in models.yaml (see models.example.yaml) and run:")
+            print("    modal run main.py::download --manifest models.yaml")
+            print(f"Alternatively, drop into your Modal volume's shell using:")
+            print(f"    modal shell --volume {self.config['filesystem']['volume_name']}")
+            print(f"and use \"wget\" to download models manually, or use 'modal volume put' to upload them.")
+            print(f"Do not forget to run \"sync\" command inside volume's shell after downloading models to ensure they are properly saved in the volume.")
+            input("Press Enter to continue...")
             return
 
-        hf_token = self.config["tokens"].get("hf_token")
-        if not hf_token or hf_token == ".env":
-            print("⚠ Hugging Face token not configured. Skipping model download.")
+        try:
+            from downloader import load_manifest
+            entries = load_manifest(str(manifest))
+        except (OSError, ValueError) as e:
+            print(f"✗ Invalid models.yaml: {e}")
             return
 
-        # Example models (customize as needed)
-        models = [
-            # "black-forest-labs/FLUX.1-dev",  # Large model, requires authentication
-            # "stabilityai/stable-diffusion-3-medium",
-            # Add more models as needed
-        ]
+        print(f"{len(entries)} model(s) listed in models.yaml:")
+        for entry in entries:
+            print(f"  - {entry['folder']}/{entry['filename']}")
+        response = input("Do you want to download them into the volume now? (y/n): ").strip().lower()
+        if response != 'y':
+            print("Skipping model download. Run it later with:")
+            print("    modal run main.py::download --manifest models.yaml")
+            return
+
+        if not self.config["tokens"].get("hf_token"):
+            print("⚠ Hugging Face token not configured. Gated models will fail to download.")
+
+        result = subprocess.run(
+            ["modal", "run", "main.py::download", "--manifest", str(manifest)],
+            cwd=self.project_dir,
+            check=False
+        )
+        if result.returncode == 0:
+            print("✓ Models downloaded")
+        else:
+            print("✗ Model download failed; rerun the command above to resume it")
+
+    def snapshot_custom_nodes(self):
+        """Snapshot the volume's custom node requirements so they are baked into the image."""
+        print("\n" + "=" * 60)
+        print("🧩 SNAPSHOTTING CUSTOM NODE REQUIREMENTS")
+        print("=" * 60)
 
-        if not models:
-            print("No models configured for download.")
-            print("You can manually download models using:")
-            print("  huggingface-cli download <model-id> --local-dir ./checkpoints")
+        volume_name = self.config["filesystem"]["volume_name"]
+        nodes_dir_name = self.config["filesystem"]["custom_nodes_dir_name"]
+        try:
+            manifest = manifest_from_volume(volume_name, nodes_dir_name)
+        except Exception as e:
+            print(f"⚠ Could not read custom nodes from '{volume_name}': {e}")
             return
 
-        print("Note: Model downloading is disabled by default to save setup time.")
-        print("Download models manually when needed:")
-        for model in models:
-            print(f"  huggingface-cli download {model} --local-dir ./checkpoints")
+        if not manifest["nodes"]:
+            print("No custom nodes with requirements found; nothing to bake.")
+            return
+
+        output_file = self.project_dir / "custom_nodes_manifest.json"
+        output_file.write_text(json.dumps(manifest, indent=2))
+        print(f"✓ Wrote {output_file.name} with {len(manifest['nodes'])} node(s)")
+        print("  Their requirements will be installed into the image on the next deploy.")
 
     def generate_yaml_config(self):
         """Generate extra_model_paths.yaml from config.ini"""
@@ -315,11 +353,15 @@ CIVITAI_API_TOKEN = "your_civitai_token_here"
         print("\n3. Download custom nodes (optional):")
         print("   Visit https://registry.comfy.org to find and clone nodes")
         print("   Place them in your Modal volume's custom_nodes/ folder")
+        print("   Then bake their requirements into the image on the next deploy:")
+        print(f"   python dependencies.py manifest --volume {self.config['filesystem']['volume_name']}")
 
         print("\n4. Download models (optional):")
         print("   Place .safetensors, .ckpt, or .gguf files in appropriate folders")
         print("   Upload to Modal volume using:")
         print(f"   modal volume put {self.config['filesystem']['volume_name']} <local-path> <remote-path>")
+        print("   Or upload only new and changed files of a local folder laid out like the volume:")
+        print("   python volume_sync.py <local-models-dir> [--prune] [--dry-run]")
         print(f"OR".center(25))
         print(f"   Drop into volume shell:")
         print(f"      modal shell --volume {self.config['filesystem']['volume_name']}")
@@ -359,17 +401,21 @@ CIVITAI_API_TOKEN = "your_civitai_token_here"
             # Step 2: Authenticate with Modal
             self.authenticate_modal()
 
-            # Step 3: Create volume
-            self.create_volume()
-
-            # Step 4: Setup folder structure
-            self.setup_folder_structure()
+            # Step 3: Create volume and its folder structure, while generating the
+            # YAML config locally (Step 4) as it does not depend on the volume
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                volume_ready = pool.submit(self.prepare_volume)
+                yaml_config = pool.submit(self.generate_yaml_config)
+                yaml_config.result()
+                if not volume_ready.result():
+                    print("\n⚠️  Volume setup failed. Please review the output above.")
+                    sys.exit(1)
 
             # Step 5: Download models (optional)
             self.download_models()
 
-            # Step 6: Generate YAML config
-            self.generate_yaml_config()
+            # Step 6: Snapshot custom node requirements for the image build
+            self.snapshot_custom_nodes()
 
             # Step 7: Setup .env file
             # self.setup_env_file() # Already called in load_config if missing
@@ -0,0 +1,28 @@
+"""Shared fixtures: the project modules are top-level, so the repository root goes on sys.path."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_comfyui import MockComfyUI  # noqa: E402
+
+
+@pytest.fixture
+def mock():
+    """Mock ComfyUI server, executing each node in 10 ms."""
+    server = MockComfyUI(node_time=0.01).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def workflow():
+    """Small text-to-image workflow with one output node."""
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "test", "images": ["5", 0]}},
+    }
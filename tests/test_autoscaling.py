@@ -0,0 +1,51 @@
+import time
+
+from autoscaling import ScalingRegistry
+
+
+def report(cold_start, age=0.0, **overrides):
+    return {"arrivals": 0, "window": 300.0, "execution_seconds": 0.0, "executions": 0, "in_flight": 0,
+            "cold_start": cold_start, "updated": time.time() - age, **overrides}
+
+
+def test_stale_reports_are_dropped_keeping_their_cold_starts():
+    store = {}
+    registry = ScalingRegistry(store, ttl=60, cold_start_samples=3)
+    registry.publish(0, "live", report(10.0, in_flight=2))
+    for index in range(5):
+        registry.publish(0, f"stopped-{index}", report(100.0 + index, age=120))
+    registry.publish(0, "never-ready", report(None, age=120))
+    registry.publish(1, "other-shard", report(500.0, age=120))
+
+    signals = registry.signals(0)
+    assert signals["containers"] == 1
+    assert signals["in_flight"] == 2
+    assert sorted(key for key in store if key.startswith("load:0:")) == ["load:0:live"]
+    # Only the last three stopped containers' cold starts are kept
+    assert store["cold_starts:0"] == [102.0, 103.0, 104.0]
+    assert signals["cold_start"] == 102.5
+    assert "load:1:other-shard" in store
+
+    registry.publish(0, "stopped-5", report(20.0, age=120))
+    registry.signals(0)
+    assert store["cold_starts:0"] == [103.0, 104.0, 20.0]
+
+
+def test_default_cold_start_without_reports():
+    registry = ScalingRegistry({}, default_cold_start=45.0, default_service_time=8.0)
+    signals = registry.signals(0)
+    assert signals["cold_start"] == 45.0
+    assert signals["service_time"] == 8.0
+    assert signals["containers"] == 0
+
+
+def test_gpu_profile_pools_are_scaled_apart_from_shards():
+    registry = ScalingRegistry({})
+    registry.publish(0, "default", report(10.0, in_flight=1))
+    registry.publish("gpu:t4", "t4", report(20.0, in_flight=3))
+    registry.save_decision("gpu:t4", {"min_containers": 1})
+
+    assert registry.signals(0)["in_flight"] == 1
+    assert registry.signals("gpu:t4")["in_flight"] == 3
+    assert registry.decision("gpu:t4") == {"min_containers": 1}
+    assert registry.decision(0) is None
@@ -0,0 +1,105 @@
+import pytest
+
+from batching import MicroBatcher, batch_signature, merge_workflows
+from comfy_client import ComfyUIClient, ComfyUIError
+from headless_api import HeadlessAPI, QueueFullError
+from scheduler import CostModel, JobScheduler
+
+
+def with_prompt(workflow, text, output_type="SaveImage"):
+    workflow = {node_id: {**node, "inputs": dict(node["inputs"])} for node_id, node in workflow.items()}
+    workflow["6"] = {"class_type": "CLIPTextEncode", "inputs": {"text": text, "clip": ["4", 1]}}
+    workflow["9"]["class_type"] = output_type
+    return workflow
+
+
+def test_merge_shares_everything_but_outputs(workflow):
+    first, second = with_prompt(workflow, "a cat"), with_prompt(workflow, "a dog")
+    assert batch_signature(first) == batch_signature(second)
+    merged = merge_workflows([first, second])
+    assert sorted(merged) == ["0:4", "0:5", "0:6", "0:9", "1:6", "1:9"]
+
+
+def test_custom_output_nodes_come_from_object_info(mock, workflow):
+    first, second = (with_prompt(workflow, "same", "VHS_VideoCombine") for _ in range(2))
+    # Without /object_info the custom output node looks like any other node and is shared
+    assert "1:9" not in merge_workflows([first, second])
+    output_types = ComfyUIClient(mock.url).output_node_types()
+    assert "VHS_VideoCombine" in output_types
+    assert "1:9" in merge_workflows([first, second], output_types)
+
+
+def test_batched_callers_get_their_own_outputs(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=4)
+    batcher = MicroBatcher(api, max_batch=2, max_wait_ms=1000, timeout=10)
+    futures = [batcher.submit(with_prompt(workflow, "same", "VHS_VideoCombine")) for _ in range(2)]
+    results = [future.result(timeout=10) for future in futures]
+    assert [result["batch_size"] for result in results] == [2, 2]
+    filenames = [result["outputs"][0]["filename"] for result in results]
+    assert len(set(filenames)) == 2
+    assert api.in_flight == 0
+
+
+def test_queued_workflows_hold_submission_slots(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=2)
+    batcher = MicroBatcher(api, max_batch=4, max_wait_ms=500, timeout=10)
+    futures = [batcher.submit(with_prompt(workflow, f"prompt {i}")) for i in range(2)]
+    assert api.in_flight == 2
+    with pytest.raises(QueueFullError):
+        batcher.submit(with_prompt(workflow, "rejected"))
+    for future in futures:
+        future.result(timeout=10)
+    assert api.in_flight == 0
+    batcher.submit(with_prompt(workflow, "accepted")).result(timeout=10)
+
+
+def with_sampler(workflow, seed, tenant=None):
+    workflow = with_prompt(workflow, "same")
+    workflow["7"] = {"class_type": "KSampler", "inputs": {"seed": seed, "model": ["4", 0], "positive": ["6", 0],
+                                                         "latent_image": ["5", 0]}}
+    workflow["9"]["inputs"]["images"] = ["7", 0]
+    return workflow
+
+
+def test_an_error_fails_only_the_branch_it_came_from(mock, workflow):
+    mock.fail_seeds.add(13)
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=3)
+    batcher = MicroBatcher(api, max_batch=3, max_wait_ms=1000, timeout=10)
+    futures = [batcher.submit(with_sampler(workflow, seed)) for seed in (1, 13, 2)]
+
+    with pytest.raises(ComfyUIError) as error:
+        futures[1].result(timeout=10)
+    assert error.value.node_ids == {"1:7"}
+    results = [futures[0].result(timeout=10), futures[2].result(timeout=10)]
+    # The other two were run again on their own
+    assert [result["batch_size"] for result in results] == [1, 1]
+    assert [result["outputs"][0]["node_id"] for result in results] == ["9", "9"]
+    assert batcher.retries == 2
+    assert api.in_flight == 0
+
+
+def test_an_error_in_a_shared_node_fails_every_request(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=2)
+    batcher = MicroBatcher(api, max_batch=2, max_wait_ms=1000, timeout=10)
+    workflows = [with_prompt(workflow, f"prompt {i}") for i in range(2)]
+    for item in workflows:
+        # The shared latent node fails
+        item["5"]["inputs"]["seed"] = 99
+    mock.fail_seeds.add(99)
+    futures = [batcher.submit(item) for item in workflows]
+    for future in futures:
+        with pytest.raises(ComfyUIError):
+            future.result(timeout=10)
+    assert batcher.retries == 0
+    assert api.in_flight == 0
+
+
+def test_batches_are_charged_to_each_tenant(mock, workflow):
+    scheduler = JobScheduler(CostModel(default=10.0))
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=4, scheduler=scheduler)
+    batcher = MicroBatcher(api, max_batch=4, max_wait_ms=1000, timeout=10)
+    futures = [batcher.submit(with_prompt(workflow, f"prompt {i}"), tenant=tenant)
+               for i, tenant in enumerate(["a", "a", "a", "b"])]
+    for future in futures:
+        future.result(timeout=10)
+    assert scheduler.usage == {"a": 7.5, "b": 2.5}
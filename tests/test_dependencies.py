@@ -0,0 +1,20 @@
+from dependencies import DependencyCache
+
+
+def test_cache_key_covers_included_requirements(tmp_path):
+    node = tmp_path / "custom_nodes" / "node-a"
+    (node / "reqs").mkdir(parents=True)
+    (node / "requirements.txt").write_text("numpy\n-r reqs/extra.txt\n--constraint=reqs/pins.txt\n")
+    (node / "reqs" / "extra.txt").write_text("scipy\n-r ../requirements.txt\n")
+    (node / "reqs" / "pins.txt").write_text("numpy<2\n")
+    cache = DependencyCache(str(tmp_path / "cache"))
+    req_files = cache.find_requirement_files(tmp_path / "custom_nodes")
+    assert cache.includes(req_files[0]) == [node / "reqs" / "extra.txt", node / "reqs" / "pins.txt"]
+
+    key = cache.compute_key(req_files)
+    assert cache.compute_key(req_files) == key
+    (node / "reqs" / "extra.txt").write_text("scipy==1.13\n-r ../requirements.txt\n")
+    changed = cache.compute_key(req_files)
+    assert changed != key
+    (node / "reqs" / "pins.txt").unlink()
+    assert cache.compute_key(req_files) not in (key, changed)
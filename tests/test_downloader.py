@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import Downloader
+
+PAYLOAD = b"model weights " * 4096
+
+
+class Server:
+    """Origin on 127.0.0.1 redirecting to a CDN stand-in on localhost, without range support."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.requests = []
+        self.active = self.peak = 0
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.headers["Host"], self.path, self.headers.get("Authorization")))
+                if self.path.startswith("/origin/"):
+                    self.send_response(302)
+                    self.send_header("Location", f"http://localhost:{server.port}/cdn/{self.path[8:]}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with server.lock:
+                    server.active += 1
+                    server.peak = max(server.peak, server.active)
+                try:
+                    time.sleep(server.delay)
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(PAYLOAD)))
+                    self.end_headers()
+                    self.wfile.write(PAYLOAD)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TokenDownloader(Downloader):
+    """Treats the local origin like huggingface.co."""
+
+    def _auth_headers(self, url):
+        host = urllib.parse.urlparse(url).hostname
+        return {"Authorization": "Bearer SECRET"} if host == "127.0.0.1" else {}
+
+
+@pytest.fixture
+def server():
+    instance = Server(delay=0.1)
+    yield instance
+    instance.stop()
+
+
+def entry(server, name):
+    return {"url": f"http://127.0.0.1:{server.port}/origin/{name}", "folder": "checkpoints",
+            "filename": name, "sha256": hashlib.sha256(PAYLOAD).hexdigest()}
+
+
+def test_token_is_not_forwarded_to_the_redirect_target(server, tmp_path):
+    downloader = TokenDownloader(str(tmp_path), retries=1)
+    try:
+        result = downloader.download(entry(server, "model.safetensors"))
+    finally:
+        downloader.close()
+    assert (tmp_path / "checkpoints" / "model.safetensors").read_bytes() == PAYLOAD
+    assert not result["skipped"]
+    origin = [auth for host, path, auth in server.requests if path.startswith("/origin/")]
+    cdn = [auth for host, path, auth in server.requests if path.startswith("/cdn/")]
+    assert origin and set(origin) == {"Bearer SECRET"}
+    assert cdn and set(cdn) == {None}
+
+
+def test_whole_file_downloads_share_the_request_pool(server, tmp_path):
+    downloader = Downloader(str(tmp_path), concurrency=2, retries=1)
+    try:
+        results = downloader.download_all([entry(server, f"model_{i}.safetensors") for i in range(6)])
+    finally:
+        downloader.close()
+    assert not any("error" in result for result in results)
+    assert server.peak <= 2
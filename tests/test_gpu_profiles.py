@@ -0,0 +1,107 @@
+import argparse
+import json
+import os
+
+import pytest
+
+from gpu_profiles import GPUClassifier, ThroughputTable, fit
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini")
+
+PROFILES = {
+    "small": {"gpu_type": "t4", "vram_gb": 16, "price_per_hour": 0.59, "relative_speed": 1.0},
+    "mid": {"gpu_type": "a10g", "vram_gb": 24, "price_per_hour": 1.10, "relative_speed": 2.0},
+    "big": {"gpu_type": "a100", "vram_gb": 80, "price_per_hour": 3.00, "relative_speed": 5.0},
+}
+
+
+def make_workflow(steps=20):
+    return {
+        "4": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "model.safetensors"}},
+        "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+        "3": {"class_type": "KSampler", "inputs": {"seed": 1, "steps": steps, "model": ["4", 0],
+                                                   "latent_image": ["5", 0]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "test", "images": ["3", 0]}},
+    }
+
+
+def make_classifier(model_gb, table=None):
+    return GPUClassifier(PROFILES, table or ThroughputTable(), lambda folder, name: int(model_gb * 1024 ** 3))
+
+
+def test_profiles_without_enough_vram_are_skipped():
+    choice = make_classifier(20).classify(make_workflow(), max_latency=120)
+    assert [name for name, estimate in choice["estimates"].items() if estimate["fits"]] == ["big"]
+    assert choice["profile"] == "big"
+    assert choice["requirements"]["vram_gb"] == pytest.approx(20 * 1.2 + 512 * 512 / 1e6 * 1.5)
+
+
+def test_cheapest_profile_meeting_the_latency_target():
+    workflow = make_workflow()
+    classifier = make_classifier(2)
+    classifier.table.record("small", workflow, 100.0, classifier.requirements(workflow)["work"])
+
+    choice = classifier.classify(workflow, max_latency=120)
+    # Scaled by relative speed from the one measured profile
+    assert {name: estimate["seconds"] for name, estimate in choice["estimates"].items()} == pytest.approx(
+        {"small": 100.0, "mid": 50.0, "big": 20.0})
+    # 0.0164 $, 0.0153 $ and 0.0167 $
+    assert choice["profile"] == "mid"
+    assert choice["reason"] == "cheapest profile meeting the latency target"
+    # Only the fastest one is quick enough
+    assert classifier.classify(workflow, max_latency=30)["profile"] == "big"
+
+
+def test_fallbacks_when_no_profile_fits():
+    workflow = make_workflow()
+    classifier = make_classifier(15)
+    classifier.table.record("small", workflow, 100.0, classifier.requirements(workflow)["work"])
+    choice = classifier.classify(workflow, max_latency=1)
+    assert choice["profile"] == "big"
+    assert choice["reason"].startswith("no profile meets the latency target")
+
+    choice = make_classifier(100).classify(workflow, max_latency=120)
+    assert choice["profile"] == "big"
+    assert choice["reason"].startswith("no profile has enough VRAM")
+    assert not any(estimate["fits"] for estimate in choice["estimates"].values())
+
+
+def test_fit_records_benchmark_rows(tmp_path):
+    workflows = [make_workflow(steps=20), make_workflow(steps=40)]
+    workload = tmp_path / "workload.jsonl"
+    workload.write_text("".join(json.dumps({"workflow": workflow}) + "\n" for workflow in workflows))
+    results = tmp_path / "results.json"
+    results.write_text(json.dumps([
+        {"label": "t4", "workload": str(workload), "requests": [
+            {"index": 0, "status": "ok", "timings": {"execution": 4.0}},
+            {"index": 0, "status": "ok", "timings": {"execution": 6.0}},
+            # Shared a micro-batch of two
+            {"index": 1, "status": "ok", "timings": {"execution": 16.0}, "batch_size": 2},
+            {"index": 1, "status": "error"},
+        ]},
+        {"label": "other", "workload": str(workload), "requests": [
+            {"index": 0, "status": "ok", "timings": {"execution": 99.0}},
+        ]},
+    ]))
+    table_path = tmp_path / "table.json"
+    fit(argparse.Namespace(config=CONFIG, index=str(tmp_path / "missing.json"), table=str(table_path),
+                           results=str(results), profile="t4", label="t4", workload=None))
+
+    table = ThroughputTable(str(table_path))
+    entry = table.profiles["t4"]
+    assert entry["runs"] == 3
+    assert entry["seconds"] == pytest.approx(18.0)
+    speeds = {"t4": 1.0, "a100": 4.0}
+    # Known workflows use their own mean time, scaled to other profiles by relative speed
+    assert table.estimate("t4", workflows[0], 0.0, speeds) == pytest.approx(5.0)
+    assert table.estimate("a100", workflows[1], 0.0, speeds) == pytest.approx(2.0)
+    # Unknown ones use the profile's throughput
+    unknown = make_workflow(steps=10)
+    assert table.estimate("t4", unknown, entry["work"], speeds) == pytest.approx(18.0)
+
+
+def test_fit_rejects_unknown_profiles(tmp_path):
+    with pytest.raises(SystemExit):
+        fit(argparse.Namespace(config=CONFIG, index=str(tmp_path / "missing.json"),
+                               table=str(tmp_path / "table.json"), results=str(tmp_path / "results.json"),
+                               profile="h100", label=None, workload=None))
@@ -0,0 +1,147 @@
+import base64
+import gc
+import time
+
+import pytest
+
+from comfy_client import ComfyUIClient
+from headless_api import HeadlessAPI, QueueFullError
+from scheduler import CostModel, JobScheduler
+
+
+def test_result(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=2)
+    result = HeadlessAPI.result(api.submit(workflow, timeout=10))
+    assert result["type"] == "result"
+    assert [output["node_id"] for output in result["outputs"]] == ["9"]
+    assert set(result["timings"]) == {"queue_wait", "execution"}
+    assert api.in_flight == 0
+
+
+def test_include_images(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=1)
+    result = HeadlessAPI.result(api.submit(workflow, include_images=True, timeout=10))
+    assert base64.b64decode(result["outputs"][0]["data"]).startswith(b"\x89PNG")
+
+
+def test_streaming(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=1)
+    events = list(api.submit(workflow, timeout=10))
+    types = [event["type"] for event in events]
+    assert types[0] == "queued"
+    assert types[-1] == "result"
+    assert [event["node"] for event in events if event["type"] == "executing"] == ["4", "5", "9"]
+    lines = list(HeadlessAPI.ndjson(api.submit(workflow, timeout=10)))
+    assert lines[-1].startswith('{"type": "result"')
+    assert api.in_flight == 0
+
+
+def test_queue_full(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=1)
+    first = api.submit(workflow, timeout=10)
+    with pytest.raises(QueueFullError):
+        api.submit(workflow, timeout=10)
+    HeadlessAPI.result(first)
+    HeadlessAPI.result(api.submit(workflow, timeout=10))
+    assert api.in_flight == 0
+
+
+def test_queue_timeout_waits_for_a_slot(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=1, queue_timeout=0.05)
+    first = api.submit(workflow, timeout=10)
+    with pytest.raises(QueueFullError):
+        api.submit(workflow, timeout=10)
+    first.close()
+    HeadlessAPI.result(api.submit(workflow, timeout=10))
+
+
+def test_event_timeout_releases_the_slot(workflow):
+    from mock_comfyui import MockComfyUI
+
+    slow = MockComfyUI(node_time=1.0).start()
+    try:
+        api = HeadlessAPI(ComfyUIClient(slow.url), max_inputs=1)
+        with pytest.raises(TimeoutError):
+            HeadlessAPI.result(api.submit(workflow, timeout=0.2))
+        assert api.in_flight == 0
+    finally:
+        slow.stop()
+
+
+def test_abandoned_submissions_release_their_slots(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=2)
+    first = api.submit(workflow, timeout=10)
+    # A wrapper generator that is never started, like a streaming response whose client left
+    wrapped = (event for event in api.submit(workflow, timeout=10))
+    assert api.in_flight == 2
+    del first, wrapped
+    gc.collect()
+    assert api.in_flight == 0
+    HeadlessAPI.result(api.submit(workflow, timeout=10))
+    HeadlessAPI.result(api.submit(workflow, timeout=10))
+
+
+def test_close_releases_once(mock, workflow):
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=1)
+    submission = api.submit(workflow, timeout=10)
+    next(submission)
+    submission.close()
+    submission.close()
+    assert api.in_flight == 0
+
+
+def test_abandoned_submissions_release_their_scheduler_jobs(mock, workflow):
+    scheduler = JobScheduler(CostModel(), depth=1)
+    api = HeadlessAPI(ComfyUIClient(mock.url), max_inputs=4, scheduler=scheduler)
+
+    # Dispatched to ComfyUI's queue but never iterated
+    running = api.submit(workflow, timeout=10)
+    # Still waiting for the first job when it is abandoned
+    waiting = api.submit(workflow, timeout=10)
+    assert scheduler.metrics()["running"] == 1 and scheduler.metrics()["waiting"] == 1
+    waiting.close()
+    del running
+    gc.collect()
+    assert scheduler.metrics()["running"] == 0 and scheduler.metrics()["waiting"] == 0
+
+    # Abandoned after its first event
+    started = api.submit(workflow, timeout=10)
+    assert next(started)["type"] == "queued"
+    del started
+    gc.collect()
+
+    result = HeadlessAPI.result(api.submit(workflow, timeout=10))
+    assert result["type"] == "result"
+    assert api.in_flight == 0
+    assert scheduler.metrics()["running"] == 0
+
+
+def test_abandoned_prompts_are_stopped(workflow):
+    from mock_comfyui import MockComfyUI
+
+    slow = MockComfyUI(node_time=0.2).start()
+    try:
+        api = HeadlessAPI(ComfyUIClient(slow.url), max_inputs=2)
+        running = api.submit(workflow, timeout=10)
+        waiting = api.submit(workflow, timeout=10)
+        running_id = next(running)["prompt_id"]
+        waiting_id = next(waiting)["prompt_id"]
+
+        # Still in ComfyUI's queue: deleted from it
+        waiting.close()
+        assert waiting_id not in [item[1] for item in api.client.get_queue()["queue_pending"]]
+        # Running: interrupted
+        running.close()
+        deadline = time.monotonic() + 5
+        while running_id not in slow.history and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert slow.history[running_id]["status"]["status_str"] == "error"
+        assert waiting_id not in slow.history
+        assert api.in_flight == 0
+
+        # A finished prompt is left alone
+        finished = api.submit(workflow, timeout=10)
+        HeadlessAPI.result(finished)
+        assert api.client.cancel(finished.prompt_id) is None
+    finally:
+        slow.stop()
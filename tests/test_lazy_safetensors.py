@@ -0,0 +1,98 @@
+import json
+import os
+import struct
+
+import pytest
+
+from lazy_safetensors import LazySafetensors, SafetensorsError, SafetensorsIndex, read_header
+
+# name -> (dtype, shape, struct format, values)
+TENSORS = {
+    "model.weight": ("F32", [2, 3], "<6f", [0.5, -1.0, 2.0, 3.25, 4.0, -5.5]),
+    "model.bias": ("F16", [2], "<2e", [1.0, -2.0]),
+    "text.ids": ("I64", [3], "<3q", [7, -8, 9]),
+    "empty": ("F32", [0], "<0f", []),
+}
+
+
+def write_safetensors(path, tensors=TENSORS, metadata=None):
+    """Build a safetensors file by hand: header length, JSON header, tensor data."""
+    header, data = {}, b""
+    for name, (dtype, shape, fmt, values) in tensors.items():
+        raw = struct.pack(fmt, *values)
+        header[name] = {"dtype": dtype, "shape": shape, "data_offsets": [len(data), len(data) + len(raw)]}
+        data += raw
+    if metadata:
+        header["__metadata__"] = metadata
+    encoded = json.dumps(header).encode()
+    encoded += b" " * (-len(encoded) % 8)
+    path.write_bytes(struct.pack("<Q", len(encoded)) + encoded + data)
+    return str(path)
+
+
+def test_buffers_match_the_written_data(tmp_path):
+    path = write_safetensors(tmp_path / "model.safetensors", metadata={"format": "pt"})
+    with LazySafetensors(path) as lazy:
+        assert lazy.keys() == ["model.weight", "model.bias", "text.ids", "empty"]
+        assert lazy.metadata() == {"format": "pt"}
+        for name, (_, _, fmt, values) in TENSORS.items():
+            assert list(struct.unpack(fmt, lazy.buffer(name))) == values
+        assert lazy.nbytes() == 24 + 4 + 24
+
+
+def test_index_serves_headers_until_the_file_changes(tmp_path):
+    volume = tmp_path / "volume"
+    volume.mkdir()
+    path = write_safetensors(volume / "model.safetensors")
+    index = SafetensorsIndex(str(tmp_path / "index.json"), str(volume))
+    assert index.header(path)["tensors"] == read_header(path)["tensors"]
+    assert index.stats == {"hits": 0, "misses": 1}
+    index.save()
+    assert not index.dirty
+
+    reopened = SafetensorsIndex(str(tmp_path / "index.json"), str(volume))
+    assert list(reopened.files) == ["model.safetensors"]
+    assert reopened.header(path)["header_len"] == read_header(path)["header_len"]
+    assert reopened.stats == {"hits": 1, "misses": 0}
+
+    write_safetensors(volume / "model.safetensors", {"other": TENSORS["model.bias"]})
+    os.utime(path, (1_000_000, 1_000_000))
+    assert list(reopened.header(path)["tensors"]) == ["other"]
+    assert reopened.dirty
+
+
+def test_invalid_files_are_rejected(tmp_path):
+    short = tmp_path / "short.safetensors"
+    short.write_bytes(b"\x01")
+    with pytest.raises(SafetensorsError):
+        read_header(str(short))
+    garbage = tmp_path / "garbage.safetensors"
+    garbage.write_bytes(struct.pack("<Q", 4) + b"{{{{")
+    with pytest.raises(SafetensorsError):
+        read_header(str(garbage))
+
+
+def test_tensors_match_safetensors_load_file(tmp_path):
+    torch = pytest.importorskip("torch")
+    safetensors_torch = pytest.importorskip("safetensors.torch")
+
+    path = str(tmp_path / "model.safetensors")
+    expected = {
+        "float": torch.randn(4, 5),
+        "half": torch.randn(3, dtype=torch.float16),
+        "bfloat": torch.randn(2, 2, dtype=torch.bfloat16),
+        "int": torch.arange(6, dtype=torch.int64).reshape(2, 3),
+        "flag": torch.tensor([True, False]),
+        "empty": torch.empty(0, 3),
+    }
+    safetensors_torch.save_file(expected, path, metadata={"format": "pt"})
+    loaded = safetensors_torch.load_file(path)
+
+    index = SafetensorsIndex(str(tmp_path / "index.json"), str(tmp_path))
+    assert index.header(path)["metadata"] == {"format": "pt"}
+    with LazySafetensors(path, index) as lazy:
+        for name, tensor in loaded.items():
+            lazy_tensor = lazy.get_tensor(name)
+            assert lazy_tensor.dtype == tensor.dtype and lazy_tensor.shape == tensor.shape
+            assert torch.equal(lazy_tensor, tensor)
+        assert set(lazy.state_dict(["f"])) == {"float", "flag"}
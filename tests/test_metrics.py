@@ -0,0 +1,54 @@
+import time
+
+from metrics import ComfyUIScraper, MetricsRegistry
+
+
+def test_render_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("mxc_prompts_total", "Prompts executed").inc(status="success")
+    registry.counter("mxc_prompts_total").inc(2, status="success")
+    registry.gauge("mxc_vram_peak_bytes", "Peak VRAM").set(1.5e9, device='cuda "0"')
+    registry.histogram("mxc_node_execution_seconds", "Node time", buckets=(0.1, 1.0)).observe(0.5, class_type="KSampler")
+    registry.gauge("mxc_empty")
+
+    text = registry.render()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert "# HELP mxc_prompts_total Prompts executed" in lines
+    assert "# TYPE mxc_prompts_total counter" in lines
+    assert 'mxc_prompts_total{status="success"} 3' in lines
+    assert 'mxc_vram_peak_bytes{device="cuda \\"0\\""} 1500000000' in lines
+    assert 'mxc_node_execution_seconds_bucket{class_type="KSampler",le="0.1"} 0' in lines
+    assert 'mxc_node_execution_seconds_bucket{class_type="KSampler",le="1"} 1' in lines
+    assert 'mxc_node_execution_seconds_bucket{class_type="KSampler",le="+Inf"} 1' in lines
+    assert 'mxc_node_execution_seconds_count{class_type="KSampler"} 1' in lines
+    # Metrics without samples are left out
+    assert "mxc_empty" not in text
+    assert MetricsRegistry().render() == ""
+
+
+def test_scrape_mock(mock, workflow):
+    prompt_id = mock.queue_prompt(workflow, "test")["prompt_id"]
+    deadline = time.monotonic() + 5
+    while (prompt_id not in mock.history or mock.running) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    registry = MetricsRegistry()
+    text = ComfyUIScraper(mock.url).scrape(registry)
+    assert 'mxc_prompts_total{status="success"} 1' in text
+    assert 'mxc_node_execution_seconds_count{class_type="SaveImage"} 1' in text
+
+    rendered = registry.render()
+    assert "mxc_comfyui_up 1" in rendered
+    assert 'mxc_comfyui_queue_depth{state="pending"} 0' in rendered
+    assert 'mxc_comfyui_queue_depth{state="running"} 0' in rendered
+    # The mock has none of the JSON node pack endpoints
+    assert "mxc_output_" not in rendered
+
+
+def test_scrape_unreachable_comfyui(mock):
+    url = mock.url
+    mock.stop()
+    registry = MetricsRegistry()
+    assert ComfyUIScraper(url, timeout=1).scrape(registry) == ""
+    assert "mxc_comfyui_up 0" in registry.render()
@@ -0,0 +1,77 @@
+import os
+import threading
+
+import model_cache
+from model_cache import TieredModelCache
+
+
+def make_volume(root, sizes):
+    paths = {}
+    for name, size in sizes.items():
+        path = root / "checkpoints" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        paths[name] = str(path)
+    return paths
+
+
+def test_parallel_copies_stay_within_the_disk_bound(tmp_path, monkeypatch):
+    make_volume(tmp_path / "volume", {"a.safetensors": 600, "b.safetensors": 600})
+    cache = TieredModelCache(str(tmp_path / "volume"), str(tmp_path / "cache"), disk_bytes=1000)
+
+    copying = threading.Barrier(2, timeout=1)
+    copyfile = model_cache.shutil.copyfile
+
+    def slow_copy(source, target):
+        try:
+            # Both copies would be in flight at once without the reservation
+            copying.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return copyfile(source, target)
+
+    monkeypatch.setattr(model_cache.shutil, "copyfile", slow_copy)
+    results = []
+    threads = [threading.Thread(target=lambda rel=rel: results.append(cache.fetch(rel)))
+               for rel in ("checkpoints/a.safetensors", "checkpoints/b.safetensors")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics = cache.metrics()
+    assert sorted(result is None for result in results) == [False, True]
+    assert metrics["disk_bytes"] <= 1000
+    assert metrics["disk_incoming"] == 0
+    assert sum(len(files) for _, _, files in os.walk(tmp_path / "cache")) == 1
+    cache.close()
+
+
+def test_held_files_are_not_evicted(tmp_path):
+    paths = make_volume(tmp_path / "volume", {"a.safetensors": 600, "b.safetensors": 600})
+    cache = TieredModelCache(str(tmp_path / "volume"), str(tmp_path / "cache"), disk_bytes=1000)
+    local = cache.fetch("checkpoints/a.safetensors")
+    assert cache.resolve(paths["a.safetensors"]) == local
+
+    with cache.hold([paths["a.safetensors"]]):
+        # No room for b while a is in use
+        assert cache.fetch("checkpoints/b.safetensors") is None
+        assert os.path.exists(local)
+    assert cache.metrics()["held_files"] == 0
+
+    assert cache.fetch("checkpoints/b.safetensors") is not None
+    assert not os.path.exists(local)
+    assert cache.metrics()["evictions"] == 1
+    cache.close()
+
+
+def test_nested_holds(tmp_path):
+    paths = make_volume(tmp_path / "volume", {"a.safetensors": 600, "b.safetensors": 600})
+    cache = TieredModelCache(str(tmp_path / "volume"), str(tmp_path / "cache"), disk_bytes=1000)
+    cache.fetch("checkpoints/a.safetensors")
+    with cache.hold([paths["a.safetensors"]]):
+        with cache.hold([paths["a.safetensors"]]):
+            pass
+        assert cache.fetch("checkpoints/b.safetensors") is None
+    assert cache.fetch("checkpoints/b.safetensors") is not None
+    cache.close()
@@ -0,0 +1,40 @@
+import os
+
+from model_index import ModelIndex
+
+
+def test_refresh_rescans_changed_directories_only(tmp_path):
+    models = tmp_path / "checkpoints"
+    (models / "sdxl").mkdir(parents=True)
+    (models / "sd15.safetensors").write_bytes(b"x" * 10)
+    (models / "sdxl" / "base.safetensors").write_bytes(b"x" * 20)
+    index = ModelIndex(str(tmp_path / "index.json"))
+    assert index.refresh([str(models)]) == {"scanned": 2, "reused": 0, "updated": 0}
+    index.save()
+
+    (models / "sdxl" / "refiner.safetensors").write_bytes(b"x" * 30)
+    index = ModelIndex(str(tmp_path / "index.json"))
+    assert index.refresh([str(models)]) == {"scanned": 1, "reused": 1, "updated": 0}
+    files, _ = index.search(str(models))
+    assert sorted(files) == ["sd15.safetensors", os.path.join("sdxl", "base.safetensors"),
+                             os.path.join("sdxl", "refiner.safetensors")]
+    assert index.size(str(models / "sdxl" / "refiner.safetensors")) == 30
+
+
+def test_files_overwritten_in_place_are_resized_when_checked(tmp_path):
+    models = tmp_path / "checkpoints"
+    models.mkdir()
+    model = models / "sd15.safetensors"
+    model.write_bytes(b"x" * 10)
+    index = ModelIndex(str(tmp_path / "index.json"))
+    index.refresh([str(models)])
+
+    # Keep the directory mtime, as overwriting an existing file does
+    mtime = os.stat(models).st_mtime_ns
+    model.write_bytes(b"x" * 50)
+    os.utime(models, ns=(mtime, mtime))
+    assert index.refresh([str(models)]) == {"scanned": 0, "reused": 1, "updated": 0}
+    assert index.size(str(model)) == 10
+    assert index.refresh([str(models)], check_files=True) == {"scanned": 0, "reused": 1, "updated": 1}
+    assert index.size(str(model)) == 50
+    assert index.dirty
@@ -0,0 +1,88 @@
+import hashlib
+
+import pytest
+
+from model_store import ModelStore
+
+
+def write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+@pytest.mark.parametrize("link_mode", ["symlink", "hardlink"])
+def test_dedupe_links_duplicates_to_one_blob(tmp_path, link_mode):
+    content = b"weights" * 100
+    digest = hashlib.sha256(content).hexdigest()
+    first = write(tmp_path / "checkpoints" / "model.safetensors", content)
+    second = write(tmp_path / "unet" / "sub" / "model.safetensors", content)
+    unique = write(tmp_path / "unet" / "other.safetensors", b"other" * 100)
+    store = ModelStore(str(tmp_path), link_mode=link_mode)
+
+    planned = store.dedupe(["checkpoints", "unet"], dry_run=True)
+    assert planned["bytes_saved"] == len(content)
+    assert not store.has(digest) and not store.is_linked(first)
+
+    summary = store.dedupe(["checkpoints", "unet"])
+    assert summary["duplicates"] == {digest: ["checkpoints/model.safetensors", "unet/sub/model.safetensors"]}
+    assert store.has(digest)
+    for path in (first, second):
+        assert path.read_bytes() == content
+        assert store.is_linked(path)
+        assert path.is_symlink() == (link_mode == "symlink")
+    assert not store.is_linked(unique)
+    # Linked files are not scanned again
+    assert store.scan(["checkpoints", "unet"]) == [unique]
+
+    # A copy downloaded later into another folder is a duplicate of the blob
+    third = write(tmp_path / "diffusion_models" / "model.safetensors", content)
+    assert store.dedupe(["diffusion_models"])["bytes_saved"] == len(content)
+    assert store.is_linked(third)
+
+
+def test_symlinks_are_relative(tmp_path):
+    content = b"weights" * 100
+    write(tmp_path / "checkpoints" / "a.safetensors", content)
+    write(tmp_path / "unet" / "b.safetensors", content)
+    ModelStore(str(tmp_path)).dedupe(["checkpoints", "unet"])
+
+    # The volume mounted elsewhere, as in `modal shell --volume`
+    moved = tmp_path.parent / f"{tmp_path.name}-moved"
+    tmp_path.rename(moved)
+    assert (moved / "checkpoints" / "a.safetensors").read_bytes() == content
+    assert ModelStore(str(moved)).is_linked(moved / "unet" / "b.safetensors")
+
+
+@pytest.mark.parametrize("link_mode", ["symlink", "hardlink"])
+def test_gc_removes_only_unreferenced_blobs(tmp_path, link_mode):
+    kept, dropped = b"kept" * 100, b"dropped" * 100
+    for folder in ("checkpoints", "unet"):
+        write(tmp_path / folder / "kept.safetensors", kept)
+        write(tmp_path / folder / "dropped.safetensors", dropped)
+    store = ModelStore(str(tmp_path), link_mode=link_mode)
+    store.dedupe(["checkpoints", "unet"])
+    assert store.gc(["checkpoints", "unet"]) == []
+
+    for folder in ("checkpoints", "unet"):
+        (tmp_path / folder / "dropped.safetensors").unlink()
+    dropped_digest = hashlib.sha256(dropped).hexdigest()
+    assert store.gc(["checkpoints", "unet"], dry_run=True) == [dropped_digest]
+    assert store.has(dropped_digest)
+    assert store.gc(["checkpoints", "unet"]) == [dropped_digest]
+    assert not store.has(dropped_digest)
+    assert store.has(hashlib.sha256(kept).hexdigest())
+    assert (tmp_path / "unet" / "kept.safetensors").read_bytes() == kept
+
+
+def test_unchanged_files_are_not_hashed_again(tmp_path, monkeypatch):
+    write(tmp_path / "checkpoints" / "a.safetensors", b"a" * 100)
+    write(tmp_path / "unet" / "b.safetensors", b"b" * 100)
+    ModelStore(str(tmp_path)).dedupe(["checkpoints", "unet"])
+
+    import model_store
+    hashed = []
+    monkeypatch.setattr(model_store, "sha256_file", lambda path: hashed.append(path) or "0" * 64)
+    store = ModelStore(str(tmp_path))
+    store.dedupe(["checkpoints", "unet"])
+    assert hashed == []
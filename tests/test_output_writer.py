@@ -0,0 +1,36 @@
+import threading
+
+from output_writer import OutputWriter, usable_format
+
+
+def test_unknown_formats_fall_back_to_png(capsys):
+    assert usable_format("png") == "png"
+    assert usable_format("jxl") == "png"
+    assert "Unknown output format" in capsys.readouterr().out
+
+
+def test_writes_and_commits_on_flush(tmp_path):
+    commits = []
+    writer = OutputWriter(workers=2, max_pending=2, commit=lambda: commits.append(1), commit_interval=0)
+    futures = [writer.submit(str(tmp_path / f"out_{index}.png"), lambda index=index: bytes([index]) * 10)
+               for index in range(5)]
+    assert writer.flush(timeout=5)
+    assert [future.result() for future in futures] == [10] * 5
+    assert (tmp_path / "out_3.png").read_bytes() == b"\x03" * 10
+    assert commits == [1]
+    assert writer.metrics()["written"] == 5
+    writer.close()
+
+
+def test_wait_covers_only_the_given_files_and_does_not_commit(tmp_path):
+    commits, release = [], threading.Event()
+    writer = OutputWriter(workers=2, commit=lambda: commits.append(1), commit_interval=0)
+    slow = writer.submit(str(tmp_path / "other.png"), lambda: release.wait(5) and b"other")
+    mine = writer.submit(str(tmp_path / "mine.png"), lambda: b"mine")
+    assert writer.wait([str(tmp_path / "mine.png"), str(tmp_path / "written_earlier.png")], timeout=5)
+    assert mine.done() and not slow.done()
+    assert not writer.wait([str(tmp_path / "other.png")], timeout=0.05)
+    assert commits == []
+    release.set()
+    writer.close()
+    assert commits == [1]
@@ -0,0 +1,100 @@
+import time
+
+from result_cache import ResultCache
+
+WORKFLOW = {
+    "5": {"class_type": "EmptyLatentImage", "inputs": {"width": 512, "height": 512, "batch_size": 1}},
+    "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": "test", "images": ["5", 0]}},
+}
+
+
+def make_cache(tmp_path, **kwargs):
+    kwargs.setdefault("save_interval", 0)
+    return ResultCache(str(tmp_path / "index.json"), str(tmp_path / "output"), lambda folder, name: "digest",
+                       **kwargs)
+
+
+def result(filename, prompt_id="p1"):
+    return {"type": "result", "prompt_id": prompt_id,
+            "outputs": [{"node_id": "9", "filename": filename, "subfolder": "", "type": "output"}]}
+
+
+def test_results_with_missing_files_are_not_stored(tmp_path):
+    flushed = []
+    cache = make_cache(tmp_path, flush=lambda outputs: flushed.append(outputs))
+    assert not cache.put(WORKFLOW, result("missing.png"))
+    assert [[output["filename"] for output in outputs] for outputs in flushed] == [["missing.png"]]
+    assert cache.get(WORKFLOW) is None
+
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "out.png").write_bytes(b"png")
+    assert cache.put(WORKFLOW, result("out.png"))
+    hit = cache.get(WORKFLOW)
+    assert hit["cached"] and hit["outputs"][0]["node_id"] == "9"
+
+
+def test_outputs_written_by_flush_are_stored(tmp_path):
+    def flush(outputs):
+        (tmp_path / "output").mkdir()
+        (tmp_path / "output" / "late.png").write_bytes(b"png")
+
+    cache = make_cache(tmp_path, flush=flush)
+    assert cache.put(WORKFLOW, result("late.png"))
+
+
+def test_syncs_exchange_results_between_containers(tmp_path):
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "out.png").write_bytes(b"png")
+    reloads = []
+    reader = make_cache(tmp_path, reload=lambda: reloads.append(1))
+    writer = make_cache(tmp_path, reload=lambda: reloads.append(1))
+    assert writer.put(WORKFLOW, result("out.png"))
+    # Storing a result does not touch the volume
+    assert not reloads and not (tmp_path / "index.json").exists()
+
+    writer.sync()
+    assert reader.get(WORKFLOW) is None
+    reader.sync()
+    assert reader.get(WORKFLOW)["prompt_id"] == "p1"
+    assert len(reloads) == 2
+
+
+def test_sync_reloads_the_volume_without_blocking_lookups(tmp_path):
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "out.png").write_bytes(b"png")
+    free = []
+
+    def reload():
+        free.append(cache._lock.acquire(blocking=False))
+        if free[-1]:
+            cache._lock.release()
+
+    cache = make_cache(tmp_path, reload=reload)
+    assert cache.put(WORKFLOW, result("out.png"))
+    cache.sync()
+    assert free == [True]
+
+
+def test_background_sync_writes_the_index(tmp_path):
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "out.png").write_bytes(b"png")
+    cache = make_cache(tmp_path, save_interval=0.05)
+    assert cache.put(WORKFLOW, result("out.png"))
+    deadline = time.monotonic() + 5
+    while not (tmp_path / "index.json").exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    cache.close()
+    assert make_cache(tmp_path).get(WORKFLOW) is not None
+
+
+def test_failed_reload_still_merges_the_index(tmp_path, capsys):
+    def reload():
+        raise RuntimeError("open files")
+
+    (tmp_path / "output").mkdir()
+    (tmp_path / "output" / "out.png").write_bytes(b"png")
+    cache = make_cache(tmp_path, reload=reload)
+    assert cache.put(WORKFLOW, result("out.png"))
+    cache.close()
+    assert "Could not reload" in capsys.readouterr().out
+    assert make_cache(tmp_path).get(WORKFLOW) is not None
@@ -0,0 +1,64 @@
+import threading
+import time
+
+from routing import AffinityRouter, ShardRegistry
+
+
+def test_concurrent_misses_spread_over_shards():
+    router = AffinityRouter(shards=3)
+    registry = ShardRegistry({})
+    shards = []
+    for index in range(4):
+        registry.apply(router)
+        shards.append(router.route({f"checkpoints/model_{index}.safetensors"}))
+    assert sorted(shards[:3]) == [0, 1, 2]
+    assert router.metrics()["load"] == {0: 2, 1: 1, 2: 1}
+
+
+def test_reports_older_than_a_routing_decision_are_ignored():
+    router = AffinityRouter(shards=2)
+    registry = ShardRegistry({})
+    registry.publish(0, [], 0)
+    time.sleep(0.01)
+    shard = router.route({"checkpoints/sdxl.safetensors"})
+    registry.apply(router)
+    # The shard's earlier report does not undo the models the router just sent it
+    assert router.loaded[shard] == ["checkpoints/sdxl.safetensors"]
+    assert router.route({"checkpoints/sdxl.safetensors"}) == shard
+
+    registry.publish(shard, ["checkpoints/flux.safetensors"], 3)
+    registry.apply(router)
+    assert router.loaded[shard] == ["checkpoints/flux.safetensors"]
+    # The router's own in-flight count is kept; the report only raises the effective load
+    assert router.load[shard] == 2
+    assert router.reported_load[shard] == 3
+
+
+def test_stale_shards_look_empty_once_idle():
+    router = AffinityRouter(shards=2)
+    registry = ShardRegistry({}, ttl=0.05)
+    shard = router.route({"checkpoints/sdxl.safetensors"})
+    registry.apply(router)
+    assert router.loaded[shard]
+    time.sleep(0.1)
+    registry.apply(router)
+    assert router.loaded[shard] == []
+
+
+def test_route_and_complete_from_many_threads():
+    router = AffinityRouter(shards=4)
+
+    def worker(index):
+        for step in range(200):
+            shard = router.route({f"loras/lora_{(index + step) % 7}.safetensors"})
+            router.complete(shard)
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics = router.metrics()
+    assert metrics["routed"] == 1600
+    assert sum(metrics["routed_by_shard"].values()) == 1600
+    assert set(metrics["load"].values()) == {0}
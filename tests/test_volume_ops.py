@@ -0,0 +1,61 @@
+import setup_modal
+from setup_modal import ModalSetup
+from volume_ops import PLACEHOLDER, LocalVolumeBackend
+
+FILESYSTEM = {
+    "volume_name": "test-volume",
+    "volume_mount_location": "/root/per_comfy-storage",
+    "custom_nodes_dir_name": "custom_nodes",
+    "custom_output_dir_name": "output",
+}
+
+
+def make_setup(tmp_path, model_paths):
+    """ModalSetup reading [MODEL_PATHS] from a config in tmp_path, without loading .env."""
+    (tmp_path / "config.ini").write_text("[MODEL_PATHS]\n" + "".join(
+        f"{key} =\n" + "".join(f"    {path}\n" for path in paths) for key, paths in model_paths.items()))
+    setup = ModalSetup.__new__(ModalSetup)
+    setup.project_dir = tmp_path
+    setup.config = {"filesystem": FILESYSTEM}
+    return setup
+
+
+def test_prepare_volume_creates_model_paths_folders(tmp_path, monkeypatch):
+    monkeypatch.setattr(setup_modal.ModalSetup, "create_volume",
+                        lambda self: (_ for _ in ()).throw(AssertionError("must not create a Modal volume")))
+    setup = make_setup(tmp_path, {
+        "checkpoints": ["models/checkpoints/", "/root/per_comfy-storage/checkpoints/"],
+        "text_encoders": ["/root/per_comfy-storage/text_encoders", "models/clip/"],
+        "loras": ["/root/per_comfy-storage/models/loras/"],
+    })
+    volume = tmp_path / "volume"
+    backend = LocalVolumeBackend(str(volume))
+
+    assert setup.prepare_volume(backend)
+    for folder in ("checkpoints", "text_encoders", "models/loras", "custom_nodes", "output"):
+        assert (volume / folder / PLACEHOLDER).is_file()
+    # Paths outside the volume are left alone
+    assert not (volume / "models" / "checkpoints").exists()
+    assert not (volume / "models" / "clip").exists()
+
+    # Preparing an existing volume again keeps it as it is
+    (volume / "checkpoints" / "sd15.safetensors").write_bytes(b"weights")
+    assert setup.prepare_volume(backend)
+    assert (volume / "checkpoints" / "sd15.safetensors").read_bytes() == b"weights"
+
+
+def test_missing_folders_fail_setup(tmp_path):
+    class LosingBackend(LocalVolumeBackend):
+        def makedirs(self, folders):
+            super().makedirs([folder for folder in folders if folder != "output"])
+
+    setup = make_setup(tmp_path, {"checkpoints": ["/root/per_comfy-storage/checkpoints/"]})
+    backend = LosingBackend(str(tmp_path / "volume"))
+    assert not setup.prepare_volume(backend)
+    assert backend.check_folders(["checkpoints", "output"]) == {"checkpoints": True, "output": False}
+
+
+def test_check_folders_on_an_empty_volume(tmp_path):
+    backend = LocalVolumeBackend(str(tmp_path / "missing"))
+    assert backend.check_folders(["checkpoints", "models/loras"]) == {"checkpoints": False, "models/loras": False}
+    assert not (tmp_path / "missing").exists()
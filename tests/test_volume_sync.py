@@ -0,0 +1,76 @@
+import os
+
+import volume_sync
+from volume_ops import LocalVolumeBackend
+from volume_sync import MANIFEST_PATH, VolumeSync
+
+
+def write(path, data, mtime=None):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_sync_uploads_only_what_changed(tmp_path):
+    local, volume = tmp_path / "models", tmp_path / "volume"
+    write(local / "checkpoints" / "a.safetensors", b"a" * 100)
+    write(local / "loras" / "b.safetensors", b"b" * 50)
+    write(local / ".hidden", b"x")
+    backend = LocalVolumeBackend(str(volume))
+    sync = VolumeSync(backend, str(local), "models", workers=2, batch_bytes=120)
+
+    summary = sync.run()
+    assert summary["uploaded"] == ["checkpoints/a.safetensors", "loras/b.safetensors"]
+    assert summary["bytes"] == 150
+    assert (volume / "models" / "loras" / "b.safetensors").read_bytes() == b"b" * 50
+    assert not (volume / "models" / ".hidden").exists()
+    assert backend.read_file(MANIFEST_PATH)
+
+    # Unchanged, touched (new mtime, same content), changed and new files
+    write(local / "loras" / "b.safetensors", b"b" * 50, mtime=1_000_000)
+    write(local / "checkpoints" / "a.safetensors", b"A" * 100)
+    write(local / "vae" / "c.safetensors", b"c" * 10)
+    summary = sync.run()
+    assert summary["uploaded"] == ["checkpoints/a.safetensors", "vae/c.safetensors"]
+    assert summary["touched"] == ["loras/b.safetensors"]
+    assert (volume / "models" / "checkpoints" / "a.safetensors").read_bytes() == b"A" * 100
+
+    summary = sync.run()
+    assert summary["uploaded"] == [] and summary["touched"] == []
+    assert summary["unchanged"] == 3
+
+
+def test_prune_removes_only_synced_files(tmp_path):
+    local, volume = tmp_path / "models", tmp_path / "volume"
+    write(local / "a.safetensors", b"a")
+    write(local / "b.safetensors", b"b")
+    write(volume / "downloaded.safetensors", b"d")
+    sync = VolumeSync(LocalVolumeBackend(str(volume)), str(local))
+    sync.run()
+
+    (local / "b.safetensors").unlink()
+    assert sync.run()["pruned"] == []
+    assert (volume / "b.safetensors").exists()
+    assert sync.run(prune=True)["pruned"] == ["b.safetensors"]
+    assert not (volume / "b.safetensors").exists()
+    assert (volume / "downloaded.safetensors").exists()
+    assert "b.safetensors" not in sync.load_manifest()
+
+
+def test_dry_run_changes_nothing_and_hashes_no_new_files(tmp_path, monkeypatch):
+    local, volume = tmp_path / "models", tmp_path / "volume"
+    write(local / "a.safetensors", b"a" * 10)
+    hashed = []
+    sha256_file = volume_sync.sha256_file
+    monkeypatch.setattr(volume_sync, "sha256_file", lambda path: hashed.append(path) or sha256_file(path))
+    sync = VolumeSync(LocalVolumeBackend(str(volume)), str(local))
+
+    summary = sync.run(dry_run=True)
+    assert summary["uploaded"] == ["a.safetensors"] and summary["dry_run"]
+    assert hashed == []
+    assert not volume.exists()
+
+    sync.run()
+    assert len(hashed) == 1
+    assert sync.load_manifest()["a.safetensors"]["size"] == 10
@@ -0,0 +1,196 @@
+"""
+Operations on the persistent volume behind a small backend interface.
+
+ModalVolumeBackend talks to a Modal volume through the SDK, so a whole batch
+of changes costs one upload instead of one `modal volume put` process per
+path. LocalVolumeBackend uses a local directory as the volume, for trying
+things out without a Modal account.
+"""
+
+import io
+import os
+import posixpath
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from model_store import volume_model_dirs
+
+# Placeholder file that makes a directory exist on the volume
+PLACEHOLDER = ".emptyfile"
+
+
+def bootstrap_folders(model_paths: Dict[str, str], filesystem: Dict[str, str]) -> List[str]:
+    """
+    Folders the volume needs: every [MODEL_PATHS] folder on the volume plus
+    the custom nodes and output folders.
+
+    Args:
+        model_paths: Output of ModelPathsGenerator.get_model_paths
+        filesystem: The "filesystem" section of ConfigLoader.load_configs
+
+    Returns:
+        Folders relative to the volume root
+    """
+    folders = volume_model_dirs(model_paths, filesystem["volume_mount_location"])
+    folders += [filesystem["custom_nodes_dir_name"], filesystem["custom_output_dir_name"]]
+    return list(dict.fromkeys(folders))
+
+
+class VolumeBackend:
+    """Interface of a volume backend."""
+
+    def makedirs(self, folders: List[str]):
+        """Create all `folders` in one batch."""
+        raise NotImplementedError
+
+    def listdir(self, path: str) -> List[str]:
+        """Names of the directories directly inside `path` ("" is the root)."""
+        raise NotImplementedError
+
+    def list_files(self, path: str) -> Dict[str, Tuple[int, float]]:
+        """All files below `path`, relative to the volume root, with their size and mtime."""
+        raise NotImplementedError
+
+    def upload(self, files: List[Tuple[str, str]]):
+        """Upload (local path, volume path) pairs in one batch, replacing existing files."""
+        raise NotImplementedError
+
+    def remove(self, paths: List[str]):
+        """Remove files from the volume."""
+        raise NotImplementedError
+
+    def read_file(self, path: str) -> Optional[bytes]:
+        """Content of a volume file, or None if it does not exist."""
+        raise NotImplementedError
+
+    def write_file(self, path: str, data: bytes):
+        """Create or replace a small volume file."""
+        raise NotImplementedError
+
+    def check_folders(self, folders: List[str]) -> Dict[str, bool]:
+        """
+        Check which folders exist, listing every parent directory only once.
+
+        Args:
+            folders: Folders relative to the volume root
+
+        Returns:
+            Mapping of folder to whether it exists
+        """
+        listings: Dict[str, List[str]] = {}
+        result = {}
+        for folder in folders:
+            parent, name = posixpath.split(folder.strip("/"))
+            if parent not in listings:
+                try:
+                    listings[parent] = self.listdir(parent)
+                except FileNotFoundError:
+                    listings[parent] = []
+            result[folder] = name in listings[parent]
+        return result
+
+
+class ModalVolumeBackend(VolumeBackend):
+    """A Modal volume, accessed through the Modal SDK."""
+
+    def __init__(self, volume_name: str):
+        import modal
+
+        self.volume = modal.Volume.from_name(volume_name, create_if_missing=True)
+
+    def makedirs(self, folders: List[str]):
+        # Volumes have no empty directories; a placeholder file creates each one
+        placeholder = Path(__file__).parent / PLACEHOLDER
+        with self.volume.batch_upload(force=True) as batch:
+            for folder in folders:
+                batch.put_file(str(placeholder), f"/{folder.strip('/')}/{PLACEHOLDER}")
+
+    def listdir(self, path: str) -> List[str]:
+        from modal.volume import FileEntryType
+
+        entries = self.volume.listdir(f"/{path}")
+        return [posixpath.basename(entry.path.rstrip("/")) for entry in entries
+                if entry.type == FileEntryType.DIRECTORY]
+
+    def list_files(self, path: str) -> Dict[str, Tuple[int, float]]:
+        from modal.volume import FileEntryType
+
+        try:
+            entries = self.volume.listdir(f"/{path.strip('/')}", recursive=True)
+        except FileNotFoundError:
+            return {}
+        return {entry.path.lstrip("/"): (entry.size, entry.mtime) for entry in entries
+                if entry.type == FileEntryType.FILE}
+
+    def upload(self, files: List[Tuple[str, str]]):
+        with self.volume.batch_upload(force=True) as batch:
+            for local_path, remote_path in files:
+                batch.put_file(local_path, f"/{remote_path.lstrip('/')}")
+
+    def remove(self, paths: List[str]):
+        for path in paths:
+            self.volume.remove_file(f"/{path.lstrip('/')}")
+
+    def read_file(self, path: str) -> Optional[bytes]:
+        try:
+            return b"".join(self.volume.read_file(f"/{path.lstrip('/')}"))
+        except FileNotFoundError:
+            return None
+
+    def write_file(self, path: str, data: bytes):
+        with self.volume.batch_upload(force=True) as batch:
+            batch.put_file(io.BytesIO(data), f"/{path.lstrip('/')}")
+
+
+class LocalVolumeBackend(VolumeBackend):
+    """A local directory standing in for the volume."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def makedirs(self, folders: List[str]):
+        for folder in folders:
+            path = self.root / folder.strip("/")
+            path.mkdir(parents=True, exist_ok=True)
+            (path / PLACEHOLDER).touch()
+
+    def listdir(self, path: str) -> List[str]:
+        base = self.root / path
+        if not base.is_dir():
+            raise FileNotFoundError(str(base))
+        return [entry.name for entry in os.scandir(base) if entry.is_dir()]
+
+    def list_files(self, path: str) -> Dict[str, Tuple[int, float]]:
+        base = self.root / path.strip("/")
+        if not base.is_dir():
+            return {}
+        files = {}
+        for file in base.rglob("*"):
+            if file.is_file():
+                stat = file.stat()
+                files[file.relative_to(self.root).as_posix()] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def upload(self, files: List[Tuple[str, str]]):
+        for local_path, remote_path in files:
+            self._write(remote_path, lambda tmp: shutil.copyfile(local_path, tmp))
+
+    def remove(self, paths: List[str]):
+        for path in paths:
+            (self.root / path.lstrip("/")).unlink(missing_ok=True)
+
+    def read_file(self, path: str) -> Optional[bytes]:
+        file = self.root / path.lstrip("/")
+        return file.read_bytes() if file.is_file() else None
+
+    def write_file(self, path: str, data: bytes):
+        self._write(path, lambda tmp: Path(tmp).write_bytes(data))
+
+    def _write(self, path: str, writer):
+        # Write next to the target and rename, like a volume commit
+        target = self.root / path.lstrip("/")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.tmp")
+        writer(tmp)
+        os.replace(tmp, target)
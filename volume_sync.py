@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Sync local model folders to the volume, uploading only what changed.
+
+A manifest on the volume records the size, mtime and sha256 of every file
+uploaded by sync. Files whose size and mtime still match the manifest are
+skipped without hashing; files that only got a new mtime are hashed and
+skipped if their content is unchanged. Everything else is uploaded in
+parallel batches, hashed by the worker uploading it, and the manifest is
+updated after each batch, so an interrupted sync picks up where it stopped.
+A dry run only hashes the files with a new mtime.
+
+Usage:
+
+    python volume_sync.py ./models --dry-run
+    python volume_sync.py ./models/loras --remote loras --prune
+    python volume_sync.py ./models --local-volume /tmp/fake-volume
+
+With --prune, files that an earlier sync uploaded and that were deleted
+locally are removed from the volume. Files put on the volume any other way
+(downloads, ComfyUI outputs) are never pruned.
+"""
+
+import argparse
+import json
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from downloader import sha256_file
+from volume_ops import LocalVolumeBackend, ModalVolumeBackend, VolumeBackend
+
+# Manifest location on the volume
+MANIFEST_PATH = ".cache/sync_manifest.json"
+
+# Upper bound for the bytes uploaded in one batch
+DEFAULT_BATCH_BYTES = 2 * 1024 ** 3
+
+
+class VolumeSync:
+    """Delta sync of a local directory to a folder on the volume."""
+
+    def __init__(self, backend: VolumeBackend, local_root: str, remote_root: str = "",
+                 workers: int = 4, batch_bytes: int = DEFAULT_BATCH_BYTES, manifest_path: str = MANIFEST_PATH):
+        """
+        Initialize the sync.
+
+        Args:
+            backend: Volume backend
+            local_root: Local directory to upload
+            remote_root: Folder on the volume it maps to ("" is the root)
+            workers: Batches uploaded (and files hashed) in parallel
+            batch_bytes: Upper bound for the bytes uploaded in one batch
+            manifest_path: Manifest location on the volume
+        """
+        self.backend = backend
+        self.local_root = Path(local_root)
+        self.remote_root = remote_root.strip("/")
+        self.workers = workers
+        self.batch_bytes = batch_bytes
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+
+    def remote_path(self, rel: str) -> str:
+        """Volume path of a file relative to the local root."""
+        return posixpath.join(self.remote_root, rel) if self.remote_root else rel
+
+    def scan_local(self) -> Dict[str, Tuple[int, float]]:
+        """Local files (relative POSIX paths) with their size and mtime; hidden and partial files are skipped."""
+        files = {}
+        for path in self.local_root.rglob("*"):
+            rel = path.relative_to(self.local_root)
+            if any(part.startswith(".") for part in rel.parts) or path.suffix == ".part" or not path.is_file():
+                continue
+            stat = path.stat()
+            files[rel.as_posix()] = (stat.st_size, stat.st_mtime)
+        return files
+
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """The sync manifest stored on the volume, keyed by volume path."""
+        data = self.backend.read_file(self.manifest_path)
+        return json.loads(data) if data else {}
+
+    def _hash_all(self, rels: List[str]) -> Dict[str, str]:
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(sha256_file, self.local_root / rel): rel for rel in rels}
+            return {futures[future]: future.result() for future in as_completed(futures)}
+
+    def plan(self, prune: bool = False) -> Dict[str, Any]:
+        """
+        Compare the local files with the manifest and the volume.
+
+        Args:
+            prune: Also plan the removal of synced files deleted locally
+
+        Returns:
+            Plan with "upload", "unchanged", "touched" (new mtime, same content)
+            and "prune" lists, plus the local scan, hashes of the files with a
+            new mtime and the manifest
+        """
+        local = self.scan_local()
+        manifest = self.load_manifest()
+        remote = self.backend.list_files(self.remote_root)
+
+        upload, unchanged, suspect = [], [], []
+        for rel, (size, mtime) in sorted(local.items()):
+            path = self.remote_path(rel)
+            entry = manifest.get(path)
+            on_volume = remote.get(path, (None, None))[0] == size
+            if entry and entry["size"] == size and on_volume:
+                (unchanged if entry["mtime"] == mtime else suspect).append(rel)
+            else:
+                upload.append(rel)
+
+        # Only files with a new mtime and the same size need hashing
+        hashes = self._hash_all(suspect)
+        touched = [rel for rel in suspect if hashes[rel] == manifest[self.remote_path(rel)]["sha256"]]
+        upload += [rel for rel in suspect if rel not in touched]
+
+        stale = []
+        if prune:
+            prefix = f"{self.remote_root}/" if self.remote_root else ""
+            local_paths = {self.remote_path(rel) for rel in local}
+            stale = sorted(path for path in manifest
+                           if path.startswith(prefix) and path not in local_paths and path in remote)
+
+        return {"upload": sorted(upload), "unchanged": unchanged, "touched": touched, "prune": stale,
+                "local": local, "hashes": hashes, "manifest": manifest}
+
+    def _batches(self, rels: List[str], local: Dict[str, Tuple[int, float]]) -> List[List[str]]:
+        batches, current, current_bytes = [], [], 0
+        for rel in rels:
+            size = local[rel][0]
+            if current and current_bytes + size > self.batch_bytes:
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(rel)
+            current_bytes += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def _upload(self, batch: List[str], hashes: Dict[str, str]):
+        """Upload a batch, hashing the files not hashed by plan first."""
+        for rel in batch:
+            if rel not in hashes:
+                digest = sha256_file(self.local_root / rel)
+                with self._lock:
+                    hashes[rel] = digest
+        self.backend.upload([(str(self.local_root / rel), self.remote_path(rel)) for rel in batch])
+
+    def _record(self, manifest: Dict[str, Dict[str, Any]], rels: List[str], plan: Dict[str, Any]):
+        with self._lock:
+            for rel in rels:
+                size, mtime = plan["local"][rel]
+                manifest[self.remote_path(rel)] = {"size": size, "mtime": mtime, "sha256": plan["hashes"][rel]}
+            self.backend.write_file(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    def run(self, prune: bool = False, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Sync the local directory to the volume.
+
+        Args:
+            prune: Remove synced files that were deleted locally
+            dry_run: Only report what would change
+
+        Returns:
+            Summary with the uploaded, touched, pruned and unchanged files and bytes uploaded
+        """
+        plan = self.plan(prune)
+        summary = {
+            "uploaded": plan["upload"], "touched": plan["touched"], "pruned": plan["prune"],
+            "unchanged": len(plan["unchanged"]),
+            "bytes": sum(plan["local"][rel][0] for rel in plan["upload"]), "dry_run": dry_run,
+        }
+        if dry_run:
+            return summary
+
+        manifest = plan["manifest"]
+        if plan["touched"]:
+            self._record(manifest, plan["touched"], plan)
+
+        batches = self._batches(plan["upload"], plan["local"])
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._upload, batch, plan["hashes"]): batch for batch in batches}
+            for future in as_completed(futures):
+                future.result()
+                self._record(manifest, futures[future], plan)
+                for rel in futures[future]:
+                    print(f"  ⬆ {self.remote_path(rel)}")
+
+        if plan["prune"]:
+            self.backend.remove(plan["prune"])
+            with self._lock:
+                for path in plan["prune"]:
+                    manifest.pop(path, None)
+                    print(f"  🗑 {path}")
+            self._record(manifest, [], plan)
+        return summary
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Sync local model folders to the volume.")
+    parser.add_argument("local", help="Local directory to upload")
+    parser.add_argument("--remote", default="", help="Folder on the volume (default: the volume root)")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--volume", help="Modal volume name (default: volume_name from config.ini)")
+    target.add_argument("--local-volume", help="Use a local directory as the volume")
+    parser.add_argument("--prune", action="store_true", help="Remove synced files that were deleted locally")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size-mb", type=int, default=DEFAULT_BATCH_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    if args.local_volume:
+        backend = LocalVolumeBackend(args.local_volume)
+    else:
+        volume_name = args.volume
+        if not volume_name:
+            from loaders import ConfigLoader
+
+            volume_name = ConfigLoader().load_configs()["filesystem"]["volume_name"]
+        backend = ModalVolumeBackend(volume_name)
+
+    sync = VolumeSync(backend, args.local, args.remote, args.workers, args.batch_size_mb * 1024 * 1024)
+    summary = sync.run(prune=args.prune, dry_run=args.dry_run)
+    if args.dry_run:
+        for rel in summary["uploaded"]:
+            print(f"  ⬆ {sync.remote_path(rel)}")
+        for path in summary["pruned"]:
+            print(f"  🗑 {path}")
+    verb = "Would upload" if args.dry_run else "Uploaded"
+    print(f"✓ {verb} {len(summary['uploaded'])} file(s) ({summary['bytes'] / 1024 ** 2:.1f} MB), "
+          f"{len(summary['pruned'])} pruned, {summary['unchanged'] + len(summary['touched'])} unchanged")
+
+
+if __name__ == "__main__":
+    main()